@@ -75,6 +75,6 @@ for ($i = 0; $i < 10; $i++) {
   $all[] = microtime(true) - $start;
 }
 foreach ($all as $t) {
-  echo $t, "\n";
+  echo "time: ", $t, "\n";
 }
 ?>
\ No newline at end of file
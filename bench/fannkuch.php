@@ -70,7 +70,7 @@ for ($i = 0; $i < 3; $i++) {
   $all[] = microtime(true) - $start;
 }
 foreach ($all as $t) {
-  echo $t, "\n";
+  echo "time: ", $t, "\n";
 }
 
 ?>
\ No newline at end of file
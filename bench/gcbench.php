@@ -114,6 +114,6 @@ for ($i = 0; $i < 3; $i++) {
 	if ($debug)
 		printf("Completed in %f ms.\n", ($t*1000.));
 	else
-		printf("$t\n");
+		printf("time: $t\n");
 }
 ?>
\ No newline at end of file
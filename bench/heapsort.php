@@ -51,6 +51,6 @@ function heapsort($N) {
 for ($i = 0; $i < 10; $i++) {
   $start = microtime(true);
   heapsort(200000);
-  echo microtime(true) - $start, "\n";
+  echo "time: ", microtime(true) - $start, "\n";
 }
 ?>
\ No newline at end of file
@@ -0,0 +1,29 @@
+<?
+function make_record($i) {
+  return array(
+    'id' => $i,
+    'name' => "record number $i",
+    'score' => $i * 0.25,
+    'active' => ($i % 3) == 0,
+    'tags' => array('alpha', 'beta/gamma', "t\"$i"),
+    'owner' => array('first' => 'Ann', 'last' => "L\xc3\xa9vy", 'age' => 30 + $i % 40),
+  );
+}
+
+function make_doc($n) {
+  $items = array();
+  for ($i = 0; $i < $n; $i++) {
+    $items[] = make_record($i);
+  }
+  return array('count' => $n, 'items' => $items, 'meta' => array('page' => 1));
+}
+
+$doc = make_doc(20000);
+for ($i = 0; $i < 10; $i++) {
+  $start = microtime(true);
+  $s = json_encode($doc);
+  $back = json_decode($s, true);
+  $obj = json_decode($s);
+  echo "time: ", microtime(true) - $start, "\n";
+}
+?>
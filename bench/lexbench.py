@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+""" ./lexbench.py [options] [files or directories]
+
+Measures the throughput of hippy.lexer.Lexer, untranslated, over the
+code of PHP sources: by default the --FILE-- sections of test_phpt/,
+followed by a generated file of --lines lines.  Prints the best time of
+--runs passes over each input, in MB/s and tokens/s.
+"""
+
+import optparse
+import os
+import sys
+import time
+
+import py
+
+BENCH_DIR = py.path.local(__file__).dirpath()
+sys.path.insert(0, str(BENCH_DIR.dirpath()))
+
+from hippy.lexer import Lexer, LexerError
+
+
+def phpt_code(path):
+    source = path.read()
+    start = source.find('--FILE--\n')
+    if start < 0:
+        return None
+    start += len('--FILE--\n')
+    end = source.find('\n--', start)
+    if end < 0:
+        end = len(source)
+    return source[start:end]
+
+
+def collect(paths):
+    sources = []
+    for path in paths:
+        path = py.path.local(path)
+        if path.check(dir=1):
+            files = sorted(path.visit('*.php*'))
+        else:
+            files = [path]
+        for f in files:
+            if f.ext == '.phpt':
+                code = phpt_code(f)
+            else:
+                code = f.read()
+            if code is not None:
+                sources.append(code)
+    return sources
+
+
+def generate(lines):
+    """A large PHP file made of ordinary classes and functions."""
+    chunk = '''
+class Item%(i)d extends Base implements Countable {
+    private $values = array(1, 2.5, 0x1F, "x$y{$z['k']}", 'lit\\'eral');
+    /* a block
+       comment */
+    public function count() {
+        // a comment
+        for ($i = 0; $i < 10; $i++) {
+            if ($this->values[$i] >= 3 && !isset($cache[$i])) {
+                $cache[$i] = (int)$this->values[$i] . "-$i";
+            }
+        }
+        return count($this->values) + Item%(i)d::SIZE;
+    }
+}
+'''
+    parts = []
+    n = 0
+    i = 0
+    while n < lines:
+        parts.append(chunk % {'i': i})
+        n += chunk.count('\n')
+        i += 1
+    return ''.join(parts)
+
+
+def lex_all(code):
+    """Lex the code of every '<?php' block, return the token count."""
+    count = 0
+    start = code.find('<?')
+    while start >= 0:
+        lexer = Lexer()
+        lexer.input(code, start + 2, 0)
+        try:
+            while True:
+                tok = lexer.token()
+                if tok is None or tok.name == 'B_END_OF_CODE_BLOCK':
+                    break
+                count += 1
+        except LexerError:
+            break
+        start = code.find('<?', lexer.pos)
+    return count
+
+
+def measure(sources, runs):
+    best = None
+    for i in range(runs):
+        t0 = time.time()
+        tokens = 0
+        for code in sources:
+            tokens += lex_all(code)
+        elapsed = time.time() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    size = sum([len(code) for code in sources])
+    return size, tokens, best
+
+
+def report(name, size, tokens, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    print '%-12s %8.2f MB %9d tokens %8.3f s %7.2f MB/s %10.0f tokens/s' % (
+        name, size / 1e6, tokens, elapsed, size / 1e6 / elapsed,
+        tokens / elapsed)
+
+
+def main(argv):
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('-n', '--runs', type='int', default=3,
+                      help='passes over each input, the best one counts')
+    parser.add_option('-l', '--lines', type='int', default=40000,
+                      help='size of the generated file, 0 to skip it')
+    options, paths = parser.parse_args(argv)
+    if not paths:
+        paths = [str(BENCH_DIR.dirpath().join('test_phpt'))]
+    sources = collect(paths)
+    report('corpus', *measure(sources, options.runs))
+    if options.lines > 0:
+        report('generated', *measure([generate(options.lines)],
+                                     options.runs))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,43 +1,51 @@
 #!/usr/bin/env python
-""" ./plotter.py <out json>
+""" ./plotter.py <history json> [revision ...]
+
+Prints a table of the medians recorded by runner.py for the given
+revisions, by default the baseline and the latest one, with the ratio
+of the last revision to the first.
 """
 
 import json, sys
 
-WARMUP = 3
-
-def avg(lst):
-    return sum(lst) / len(lst)
-
-def count_dev(lst):
-    a = avg(lst)
-    s = 0
-    for k in lst:
-        s += (a - k) * (a - k)
-    return s**0.5 / len(lst)
 
 def sep(maxcounts):
     return '+'.join([''] + ['-' * (k + 2) for k in maxcounts] + [''])
 
+
+def cell(result):
+    low, high = result['ci95']
+    dev = int((high - low) / 2 / result['median'] * 100)
+    return '%.3f+-%d%%' % (result['median'], dev)
+
+
 def main(argv):
-    data = json.load(open(argv[0]))
-    data2 = json.load(open(argv[1]))
-    lines = [['benchmark', 'zend', 'hiphop VM', 'hiphop interpreted', 'hippy VM', 'hippy / zend', 'hippy / hiphop', 'hippy / hiphop interpreted']]
-    for bench, d in data['modified'].iteritems():
-        hippy = avg(d[WARMUP:])
-        zend = avg(data['base'][bench])
-        hphp = avg(data2['base'][bench])
-        hphp_dev = int((count_dev(data2['base'][bench]) / hphp) * 100)
-        hphp_interp_raw = data2['modified'][bench]
-        hphp_interp = avg(hphp_interp_raw)
-        hphp_interp_dev = int((count_dev(hphp_interp_raw) / hphp_interp) * 100)
-        dev = int((count_dev(d[WARMUP:]) / hippy) * 100)
-        lines.append([bench, '%.3f' % zend, '%.3f+-%d%%' % (hphp, hphp_dev),
-                      '%.3f+-%d%%' % (hphp_interp, hphp_interp_dev),
-                      '%.3f+-%d%%' % (hippy, dev),
-                      '%.1fx' % (zend / hippy),
-                      '%.1fx' % (hphp / hippy),
-                      '%.1fx' % (hphp_interp / hippy)])
+    history = json.load(open(argv[0]))
+    revisions = argv[1:]
+    if not revisions:
+        by_time = sorted(history['revisions'], key=lambda rev:
+                         history['revisions'][rev]['timestamp'])
+        revisions = [by_time[-1]]
+        if history.get('baseline') and history['baseline'] != by_time[-1]:
+            revisions.insert(0, history['baseline'])
+    runs = [history['revisions'][rev]['results'] for rev in revisions]
+    lines = [['benchmark'] + revisions]
+    if len(runs) > 1:
+        lines[0].append('%s / %s' % (revisions[-1], revisions[0]))
+    for bench in sorted(runs[-1]):
+        line = [bench]
+        for results in runs:
+            if bench in results:
+                line.append(cell(results[bench]))
+            else:
+                line.append('-')
+        if len(runs) > 1:
+            if bench in runs[0]:
+                line.append('%.2fx' % (runs[-1][bench]['median'] /
+                                       runs[0][bench]['median']))
+            else:
+                line.append('-')
+        lines.append(line)
     maxcounts = [0] * len(lines[0])
     for line in lines:
         for i, elem in enumerate(line):
@@ -1,54 +1,265 @@
 #!/usr/bin/env python
-""" ./runner.py -b <base php> -m <modified php>
+""" ./runner.py -i <php interpreter> [options] [benchmark names]
+
+Runs every bench/*.php (or the ones named) in fresh processes and
+reports, per benchmark, the median, standard deviation and 95%
+confidence interval of the measured times, plus the peak RSS.
+
+Benchmarks that print the time of each of their iterations, as lines
+'time: <seconds>', are measured by these times, the first --warmup of
+each of --runs processes being dropped. Other benchmarks are measured
+by the wall-clock time of the whole process, after --warmup discarded
+runs.
+
+Results are appended to a JSON history keyed by git revision. With
+--baseline REV, or when a baseline was recorded with --set-baseline,
+the run fails if a benchmark got slower than the baseline by more than
+--threshold percent, with non-overlapping confidence intervals.
 """
 
-import optparse, sys, envoy, py, json
+import json
+import optparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
 
-ALL_BENCHMARKS = ['arr', 'fib', 'binary_trees', 'fannkuch',
-                  'fasta', 'heapsort']
-ALL_BENCHMARKS.sort()
+import py
+
+BENCH_DIR = py.path.local(__file__).dirpath()
+DEFAULT_HISTORY = str(BENCH_DIR.join('history.json'))
+
+TIME_RE = re.compile(r'^time: (-?\d+(\.\d*)?([eE][-+]?\d+)?)$')
+
+# two-sided 95% Student t values, by degrees of freedom
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+        2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101,
+        2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052,
+        2.048, 2.045, 2.042]
+
+
+def discover(names=None):
+    found = sorted(p.purebasename for p in BENCH_DIR.listdir('*.php'))
+    if not names:
+        return found
+    missing = [name for name in names if name not in found]
+    if missing:
+        raise ValueError("unknown benchmarks: %s" % ', '.join(missing))
+    return names
+
+
+def git_revision():
+    try:
+        out = subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=str(BENCH_DIR), stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return out.strip()
+
+
+def iteration_times(output):
+    """The times of the iterations reported by the benchmark itself, on
+    the 'time: <seconds>' lines of 'output'."""
+    times = []
+    for line in output.splitlines():
+        m = TIME_RE.match(line.strip())
+        if m:
+            times.append(float(m.group(1)))
+    return times
+
+
+def run_once(php, filename):
+    """Run one process, return (wall time, peak RSS in bytes, stdout)."""
+    out = tempfile.TemporaryFile()
+    err = tempfile.TemporaryFile()
+    start = time.time()
+    p = subprocess.Popen([php, filename], stdout=out, stderr=err,
+                         cwd=str(BENCH_DIR))
+    # wait4() rather than p.wait(), for the rusage of this child only
+    _, status, rusage = os.wait4(p.pid, 0)
+    p.returncode = status
+    wall = time.time() - start
+    out.seek(0)
+    err.seek(0)
+    output = out.read()
+    if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+        raise RuntimeError("%s failed with status %d:\n%s%s" %
+                           (filename, status, output, err.read()))
+    maxrss = rusage.ru_maxrss
+    if sys.platform != 'darwin':
+        maxrss *= 1024          # kilobytes
+    return wall, maxrss, output
+
+
+def mean(samples):
+    return sum(samples) / float(len(samples))
+
+
+def median(samples):
+    s = sorted(samples)
+    n = len(s)
+    if n % 2:
+        return s[n // 2]
+    return (s[n // 2 - 1] + s[n // 2]) / 2.0
+
+
+def stddev(samples):
+    if len(samples) < 2:
+        return 0.0
+    m = mean(samples)
+    return (sum((x - m) ** 2 for x in samples) / (len(samples) - 1)) ** 0.5
+
+
+def confidence_interval(samples):
+    """The 95% confidence interval of the mean of 'samples'."""
+    m = mean(samples)
+    n = len(samples)
+    if n < 2:
+        return m, m
+    t = T_95[n - 2] if n - 2 < len(T_95) else 1.96
+    half = t * stddev(samples) / n ** 0.5
+    return m - half, m + half
+
+
+def summarize(samples, rss):
+    low, high = confidence_interval(samples)
+    return {'samples': samples,
+            'median': median(samples),
+            'mean': mean(samples),
+            'stddev': stddev(samples),
+            'ci95': [low, high],
+            'peak_rss': rss}
+
+
+def run_bench(php, name, runs, warmup):
+    filename = str(BENCH_DIR.join(name + '.php'))
+    samples = []
+    wall_times = []
+    rss = 0
+    total = runs + warmup
+    i = 0
+    while i < total:
+        wall, maxrss, output = run_once(php, filename)
+        rss = max(rss, maxrss)
+        times = iteration_times(output)
+        if len(times) > warmup:
+            # the warmup iterations are dropped from every process, no
+            # need for warmup processes
+            samples.extend(times[warmup:])
+            total = runs
+        elif i >= warmup:
+            wall_times.append(wall)
+        i += 1
+    if not samples:
+        samples = wall_times
+    return summarize(samples, rss)
+
+
+def regressions(results, baseline, threshold):
+    """Return the (name, baseline median, median) of the benchmarks of
+    'results' slower than in 'baseline' by more than 'threshold' (a
+    fraction), with confidence intervals that do not overlap."""
+    res = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        cur = results[name]
+        base = baseline[name]
+        if (cur['median'] > base['median'] * (1 + threshold) and
+                cur['ci95'][0] > base['ci95'][1]):
+            res.append((name, base['median'], cur['median']))
+    return res
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return {'baseline': None, 'revisions': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(history, f, indent=1, sort_keys=True)
+    os.rename(tmp, path)
+
+
+def format_result(name, r):
+    low, high = r['ci95']
+    return ('%-20s median %9.4f  stddev %8.4f  ci95 [%.4f, %.4f]  '
+            'rss %6.1f MB' % (name, r['median'], r['stddev'], low, high,
+                              r['peak_rss'] / (1024.0 * 1024.0)))
 
-def run_bench(php):
-    bench_dir = py.path.local(__file__).dirpath()
-    results = {}
-    for bench in ALL_BENCHMARKS:
-        fullname = str(bench_dir.join(bench + '.php'))
-        print "Running %s %s" % (php, fullname)
-        r = envoy.run(php + " " + fullname)
-        if r.status_code != 0:
-            print r.std_out
-            print r.std_err
-            raise Exception("Non zero status code")
-        all_t = r.std_out.splitlines()[-10:]
-        try:
-            for i in range(len(all_t)):
-                all_t[i] = float(all_t[i])
-        except ValueError:
-            print r.std_out
-            print r.std_err
-            raise Exception("Did not complete correctly")
-        else:
-            print "Measured %r" % all_t
-            results[bench] = all_t
-    return results
 
 def main(argv):
-    parser = optparse.OptionParser()
-    parser.add_option('-b', '--base')
-    parser.add_option('-m', '--modified')
-    parser.add_option('-o', '--output')
-    options, args = parser.parse_args(argv)
-    assert not args
-    if not options.base:
-        raise Exception("Specify base interpreter")
-    base = run_bench(options.base)
-    if options.modified:
-        modified = run_bench(options.modified)
-    else:
-        modified = None
-    if options.output:
-        json.dump({'base': base, 'modified': modified},
-                  open(options.output, "w"))
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('-i', '--interpreter',
+                      help='the php binary to benchmark')
+    parser.add_option('-n', '--runs', type='int', default=5,
+                      help='measured process runs per benchmark')
+    parser.add_option('-w', '--warmup', type='int', default=1,
+                      help='warmup iterations (or runs) to discard')
+    parser.add_option('--history', default=DEFAULT_HISTORY)
+    parser.add_option('--revision', default=None,
+                      help='record under this name instead of the git '
+                           'revision')
+    parser.add_option('--baseline', default=None,
+                      help='revision of the history to compare with')
+    parser.add_option('--set-baseline', action='store_true',
+                      help='make this run the baseline of later runs')
+    parser.add_option('-t', '--threshold', type='float', default=5.0,
+                      help='tolerated slowdown, in percent')
+    options, names = parser.parse_args(argv)
+    if not options.interpreter:
+        parser.error("specify the interpreter with -i")
+    if options.runs < 1:
+        parser.error("--runs must be at least 1")
+    try:
+        names = discover(names)
+    except ValueError, e:
+        parser.error(str(e))
+    revision = options.revision or git_revision()
+    interpreter = options.interpreter
+    if os.sep in interpreter:
+        # benchmarks run from the bench directory
+        interpreter = os.path.abspath(interpreter)
+    results = {}
+    for name in names:
+        print "Running %s %s.php" % (options.interpreter, name)
+        results[name] = run_bench(interpreter, name, options.runs,
+                                  options.warmup)
+        print format_result(name, results[name])
+    history = load_history(options.history)
+    baseline_rev = options.baseline or history.get('baseline')
+    history['revisions'][revision] = {
+        'timestamp': time.time(),
+        'interpreter': options.interpreter,
+        'runs': options.runs,
+        'warmup': options.warmup,
+        'results': results,
+    }
+    if options.set_baseline:
+        history['baseline'] = revision
+    save_history(options.history, history)
+    if not baseline_rev or baseline_rev == revision:
+        return 0
+    if baseline_rev not in history['revisions']:
+        print "Baseline %s not found in %s" % (baseline_rev, options.history)
+        return 2
+    baseline = history['revisions'][baseline_rev]['results']
+    slower = regressions(results, baseline, options.threshold / 100.0)
+    for name, base, cur in slower:
+        print "REGRESSION %s: %.4f -> %.4f (+%.1f%%) against %s" % (
+            name, base, cur, (cur / base - 1) * 100, baseline_rev)
+    if slower:
+        return 1
+    print "No regression against %s" % baseline_rev
+    return 0
+
 
 if __name__ == '__main__':
-    main(sys.argv[1:])
+    sys.exit(main(sys.argv[1:]))
@@ -36,6 +36,10 @@ class DelayedArray(W_Root):
         vals = [value.eval_static(space) for value in self.values]
         return space.new_array_from_list(vals)
 
+    def ll_serialize(self, serializer):
+        serializer.write_char("A")
+        serializer.write_wrapped_list(self.values)
+
     def repr(self):
         return "array(%s)" % ", ".join([value.repr() for value in self.values])
 
@@ -55,6 +59,13 @@ class DelayedHash(W_Root):
             pairs_ww.append((w_key, w_value))
         return space.new_array_from_pairs(pairs_ww)
 
+    def ll_serialize(self, serializer):
+        serializer.write_char("H")
+        serializer.write_int(len(self.pairs))
+        for key, value in self.pairs:
+            serializer.write_optional_wrapped_item(key)
+            serializer.write_wrapped_item(value)
+
     def repr(self):
         return "array(%s)" % ", ".join(["%s=%s" % (key, value.repr())
                                         for key, value in self.pairs])
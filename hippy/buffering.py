@@ -5,6 +5,45 @@ from hippy.error import InvalidCallback
 
 
 FLUSH = 4
+OUTPUT_CHUNK_SIZE = 8192
+
+
+class OutputSink(object):
+    """ The bottom of the output stack, below the ob_start() buffers.
+    Collects what goes to the client and hands it to the interpreter in
+    chunks of up to 'limit' bytes, so that a page made of many small
+    echos costs one write per chunk rather than one per echo. With
+    implicit_flush, the default of the CLI, every write goes out at once.
+    """
+    def __init__(self, interp, limit=OUTPUT_CHUNK_SIZE):
+        self.interp = interp
+        self.limit = limit
+        self.implicit_flush = True
+        self.pending = []
+        self.pending_len = 0
+
+    def write(self, data):
+        if len(data) >= self.limit:
+            # big enough on its own: don't copy it into the pending chunk
+            self.flush()
+            self.interp.write_output(data)
+            return
+        self.pending.append(data)
+        self.pending_len += len(data)
+        if self.implicit_flush or self.pending_len >= self.limit:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        if len(self.pending) == 1:
+            data = self.pending[0]
+        else:
+            data = ''.join(self.pending)
+        self.pending = []
+        self.pending_len = 0
+        self.interp.write_output(data)
+
 
 class Buffer(object):
     def __init__(self, space, callback, chunk_size, prev):
@@ -140,6 +179,13 @@ def ob_end_clean(interp):
     interp.output_buffer = buffer.prev
     return interp.space.w_True
 
+@wrap(['interp', Optional(int)])
+def ob_implicit_flush(interp, flag=1):
+    interp.output_sink.implicit_flush = flag != 0
+    if flag:
+        interp.output_sink.flush()
+
+
 @wrap(['interp'])
 def ob_get_level(interp):
     if interp.output_buffer:
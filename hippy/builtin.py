@@ -39,6 +39,7 @@ RPython level while `incr(0)` will generate `incr(space, 0)`.
 
 """
 import py
+import re
 import time
 import os
 import inspect
@@ -595,6 +596,16 @@ class BuiltinSignature(object):
         return len(self.unwrappers)
 
 
+# builtins taking at most that many arguments are called without building
+# the list 'args_w'
+FAST_CALL_MAX_ARGS = 4
+
+_args_w_item = re.compile(r'args_w\[(\d+)\]')
+
+def _frame_item(match):
+    return 'frame.peek_nth(nb_args - %d)' % (int(match.group(1)) + 1)
+
+
 class BuiltinFunctionBuilder(object):
     def __init__(self, signature, functocall, funcname=None):
         self.signature = BuiltinSignature(signature)
@@ -609,6 +620,10 @@ class BuiltinFunctionBuilder(object):
         return range(len(args) - len(defaults), len(args))
 
     def make_source(self, check_num_args=True):
+        lines = self.header(check_num_args) + self.body() + self.footer()
+        return '\n'.join(lines)
+
+    def body(self):
         sig = self.signature
         lines = []
         if self.defaults:
@@ -618,17 +633,51 @@ class BuiltinFunctionBuilder(object):
             lines.append('    %s = %s' % (args_with_defaults, default_vars))
         for i, (unwrapper, input_i) in enumerate(zip(sig, sig.php_indices)):
             lines.extend(unwrapper.line_for_arg(i, input_i))
-        lines = self.header(check_num_args) + lines + self.footer()
-        return '\n'.join(lines)
+        return lines
+
+    def make_frame_source(self, check_num_args=True):
+        """The source of a function that takes its arguments directly from
+        the stack of the calling frame, and calls the builtin itself, or
+        None if the builtin is not simple enough for that: see
+        BuiltinFunction.call_from_frame()."""
+        max_args = self.signature.max_args
+        if (not check_num_args or max_args is None or
+                max_args > FAST_CALL_MAX_ARGS):
+            return None
+        body = '\n'.join(self.body())
+        body = _args_w_item.sub(_frame_item, body)
+        body = body.replace('len(args_w)', 'nb_args')
+        if ('args_w' in body or 'w_this' in body or 'thisclass' in body):
+            return None
+        header = self.header(check_num_args)
+        assert header[1].startswith('def ') and header[2].startswith(
+            '    nb_args = ')
+        header[1] = 'def %s_from_frame(interp, frame, nb_args):' % (
+            self.internal_funcname,)
+        del header[2]
+        allargs = ['arg%d' % i for i in range(len(self.signature))]
+        footer = ['    return ll_func(%s)\n' % ', '.join(allargs)]
+        return '\n'.join(header + [body] + footer)
 
     def build(self, error_handler, check_num_args=True):
+        return self._build(self.make_source(check_num_args),
+                           self.internal_funcname, error_handler)
+
+    def build_frame_caller(self, error_handler, check_num_args=True):
+        source = self.make_frame_source(check_num_args)
+        if source is None:
+            return None
+        return self._build(source, self.internal_funcname + '_from_frame',
+                           error_handler)
+
+    def _build(self, source, funcname, error_handler):
         from hippy.objects.resources.file_resource import W_FileResource
         from hippy.objects.resources.dir_resource import W_DirResource
         from hippy.objects.arrayobject import W_ArrayObject
 
-        source = self.make_source(check_num_args)
         d = {
              'fname': self.funcname,
+             'll_func': self.functocall,
 
              'argument_not': argument_not,
              'arguments_exactly': arguments_exactly,
@@ -677,7 +726,7 @@ class BuiltinFunctionBuilder(object):
         except:
             print source
             raise
-        return d[self.internal_funcname]
+        return d[funcname]
 
     def header(self, check_num_args=True):
         lines = []
@@ -834,13 +883,14 @@ class ArgumentError(InterpreterError):
 
 
 class BuiltinFunction(AbstractFunction):
-    _immutable_fields_ = ['runner']
+    _immutable_fields_ = ['runner', 'frame_runner']
 
-    def __init__(self, funcname, runner):
+    def __init__(self, funcname, runner, frame_runner=None):
         self.name = funcname.split('::')[-1]
         self.identifier = self.name.lower()
         self._fullname = funcname
         self.runner = runner
+        self.frame_runner = frame_runner
 
     def __repr__(self):
         return "BuiltinFunction(%s)" % (self.name,)
@@ -852,6 +902,13 @@ class BuiltinFunction(AbstractFunction):
                   closureargs=None):
         return self.runner(interp, args_w, w_this, thisclass)
 
+    def call_from_frame(self, interp, frame, nb_args):
+        """Call the builtin with the 'nb_args' arguments on top of the
+        stack of 'frame', which are left there.  Only possible if
+        'frame_runner' is not None, i.e. for the functions with a fixed
+        list of at most FAST_CALL_MAX_ARGS arguments."""
+        return self.frame_runner(interp, frame, nb_args)
+
     def get_identifier(self):
         return self.identifier
 
@@ -865,8 +922,8 @@ class BuiltinFunction(AbstractFunction):
 class BuiltinFunctionWithReferences(BuiltinFunction):
     _immutable_fields_ = ['references', 'runner']
 
-    def __init__(self, signature, funcname, runner):
-        BuiltinFunction.__init__(self, funcname, runner)
+    def __init__(self, signature, funcname, runner, frame_runner=None):
+        BuiltinFunction.__init__(self, funcname, runner, frame_runner)
         self.references = signature.references
 
     def needs_ref(self, i):
@@ -881,6 +938,12 @@ def register_builtin_function(name, func):
         raise ValueError("Duplicate definition for builtin %s()" % name)
     BUILTIN_FUNCTIONS[name] = func
 
+def _exit_with_error(interp, e, fname, error):
+    e.handle(interp, fname)
+    if e.return_value is not None:
+        return e.return_value
+    return interp.space.wrap(error)
+
 def make_runner(signature, ll_func, fname, error, error_handler,
                 check_num_args=True):
     builder = BuiltinFunctionBuilder(signature, ll_func, fname)
@@ -892,16 +955,30 @@ def make_runner(signature, ll_func, fname, error, error_handler,
             ll_args = parse_args(interp, args_w, w_this, thisclass)
             res = ll_func(*ll_args)
         except ExitFunctionWithError as e:
-            e.handle(interp, fname)
-            if e.return_value is not None:
-                return e.return_value
-            return space.wrap(error)
+            return _exit_with_error(interp, e, fname, error)
         if res is None:
             return space.w_Null
         return res
     call_args.ll_func = ll_func  # for debugging
     return call_args
 
+def make_frame_runner(signature, ll_func, fname, error, error_handler,
+                      check_num_args=True):
+    builder = BuiltinFunctionBuilder(signature, ll_func, fname)
+    call_ll_func = builder.build_frame_caller(error_handler, check_num_args)
+    if call_ll_func is None:
+        return None
+
+    def call_from_frame(interp, frame, nb_args):
+        try:
+            res = call_ll_func(interp, frame, nb_args)
+        except ExitFunctionWithError as e:
+            return _exit_with_error(interp, e, fname, error)
+        if res is None:
+            return interp.space.w_Null
+        return res
+    return call_from_frame
+
 
 def wrap(signature, name=None, aliases=(), error=None,
          error_handler=handle_as_warning, check_num_args=True):
@@ -913,17 +990,23 @@ def wrap(signature, name=None, aliases=(), error=None,
         fname = name or ll_func.func_name
         runner = make_runner(signature, ll_func, fname, error,
                              error_handler, check_num_args)
+        frame_runner = make_frame_runner(signature, ll_func, fname, error,
+                                         error_handler, check_num_args)
         if sig.has_references:
-            res = BuiltinFunctionWithReferences(sig, fname, runner)
+            res = BuiltinFunctionWithReferences(sig, fname, runner,
+                                                frame_runner)
         else:
-            res = BuiltinFunction(fname, runner)
+            res = BuiltinFunction(fname, runner, frame_runner)
         register_builtin_function(fname, res)
         for alias in aliases:
             # not so nice, but allows to raise warinings
             # with funcname set to called alias
             runner = make_runner(signature, ll_func, alias, error,
                                  error_handler, check_num_args)
-            res = BuiltinFunction(alias, runner)
+            frame_runner = make_frame_runner(signature, ll_func, alias,
+                                             error, error_handler,
+                                             check_num_args)
+            res = BuiltinFunction(alias, runner, frame_runner)
             register_builtin_function(alias, res)
         return res
     return inner
@@ -1128,7 +1211,7 @@ def restore_error_handler(space):
 
 @wrap(['space', 'args_w'])
 def flush(space, args_w):
-    pass
+    space.ec.interpreter.output_sink.flush()
 
 
 @wrap(['space', str])
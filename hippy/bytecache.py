@@ -0,0 +1,134 @@
+""" Persistent on-disk cache of compiled bytecode, the equivalent of
+PHP's opcache.file_cache. Entries are keyed by the absolute path of the
+source file and validated against its mtime, its size and the compiler
+version, so a stale entry is simply ignored and overwritten.
+"""
+
+import os
+import stat
+import time
+
+from hippy.bytecode import (Serializer, Unserializer, UnserializerException,
+                            COMPILER_VERSION)
+from rpython.rlib.rarithmetic import intmask
+from rpython.rlib.rmd5 import RMD5
+
+CACHE_MAGIC = "HIPPYBC"
+CACHE_SUFFIX = ".hbc"
+
+# Files modified less than this many seconds ago are not cached: they
+# may still be in the middle of being written, and a second edit within
+# the same mtime tick would not be noticed.
+FILE_UPDATE_PROTECTION = 2
+
+
+def open_bytecode_cache(config):
+    """Return a BytecodeCache for the 'opcache.file_cache' ini setting,
+    or None if it is unset or does not name a directory."""
+    cache_dir = config.get_ini_str('opcache.file_cache')
+    if not cache_dir:
+        return None
+    try:
+        st = os.stat(cache_dir)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return None
+    return BytecodeCache(cache_dir)
+
+
+def _read_file(path):
+    fd = os.open(path, os.O_RDONLY, 0)
+    try:
+        chunks = []
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        os.close(fd)
+    return ''.join(chunks)
+
+
+def _write_file(path, data):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+    try:
+        pos = 0
+        while pos < len(data):
+            pos += os.write(fd, data[pos:])
+    finally:
+        os.close(fd)
+
+
+class BytecodeCache(object):
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def cache_path(self, absname):
+        digest = RMD5(absname).hexdigest()
+        return os.path.join(self.cache_dir, digest + CACHE_SUFFIX)
+
+    def _header(self, absname, st):
+        s = Serializer()
+        s.write_str(CACHE_MAGIC)
+        s.write_str(COMPILER_VERSION)
+        s.write_str(absname)
+        s.write_int(int(st.st_mtime))
+        s.write_int(intmask(st.st_size))
+        return s.finish()
+
+    def load(self, interp, absname):
+        """Return the cached ByteCode of 'absname', or None if there is
+        no valid entry for the current version of the file."""
+        try:
+            st = os.stat(absname)
+            data = _read_file(self.cache_path(absname))
+        except OSError:
+            self.misses += 1
+            return None
+        header = self._header(absname, st)
+        if not data.startswith(header):
+            self.misses += 1
+            return None
+        try:
+            bc = Unserializer(data, interp.space,
+                              pos=len(header)).unserialize(interp)
+        except UnserializerException:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bc
+
+    def store(self, absname, source, bc):
+        """Write 'bc', compiled from 'source', to the cache. Silently
+        does nothing if the bytecode cannot be cached."""
+        try:
+            st = os.stat(absname)
+        except OSError:
+            return False
+        if int(st.st_mtime) > time.time() - FILE_UPDATE_PROTECTION:
+            return False
+        if '__halt_compiler' in source.lower():
+            # compiling sets __COMPILER_HALT_OFFSET__ as a side-effect
+            return False
+        try:
+            payload = Serializer().write_bytecode(bc).finish()
+        except NotImplementedError:
+            return False
+        path = self.cache_path(absname)
+        # write to a private file and rename it over the entry, so that
+        # concurrent readers only ever see complete entries
+        tmppath = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            _write_file(tmppath, self._header(absname, st) + payload)
+            os.rename(tmppath, path)
+        except OSError:
+            try:
+                os.unlink(tmppath)
+            except OSError:
+                pass
+            return False
+        return True
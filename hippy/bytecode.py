@@ -4,11 +4,20 @@ from collections import OrderedDict
 from hippy.consts import BYTECODE_STACK_EFFECTS, ARGVAL, BYTECODE_HAS_ARG,\
      BYTECODE_NAMES, ARGVAL1, ARGVAL2, _CHECKSTACK
 from hippy.error import IllegalInstruction
+from hippy.inlinecache import new_call_site_cache
+from hippy.objects.reference import W_Reference
 from rpython.rlib import jit
 from rpython.rlib.unroll import unrolling_iterable
 from rpython.rlib.objectmodel import we_are_translated
 from rpython.rlib.rstring import StringBuilder
-from rpython.rlib.rstruct.runpack import runpack
+from rpython.rlib.rarithmetic import r_uint, r_ulonglong, intmask
+from rpython.rlib.rstruct.ieee import float_pack, float_unpack
+
+# Bump this whenever the compiler or the serialized format changes in a
+# way that makes previously cached bytecode invalid.
+COMPILER_VERSION = "hippy-bc-2"
+
+LONG_SIZE = struct.calcsize('l')
 
 
 class ByteCode(object):
@@ -17,7 +26,8 @@ class ByteCode(object):
     _immutable_fields_ = ['code', 'consts[*]', 'varnames[*]',
                           'functions[*]', 'names[*]', 'stackdepth',
                           'var_to_pos', 'names_to_pos', 'user_functions[*]',
-                          'method_of_class', 'superglobals[*]', 'this_var_num']
+                          'method_of_class', 'superglobals[*]', 'this_var_num',
+                          'static_vars_w[*]', 'call_caches[*]']
     _marker = None
 
     def __init__(self, code, consts, names, varnames, user_functions,
@@ -33,6 +43,7 @@ class ByteCode(object):
         self.names = names
         self.varnames = varnames # named variables
         self.stackdepth = self.count_stack_depth()
+        self.call_caches = self.make_call_caches()
         self.var_to_pos = {}
         self.names_to_pos = {}
         self.user_functions = user_functions[:]
@@ -45,6 +56,17 @@ class ByteCode(object):
             self.names_to_pos[v] = i
         self.superglobals = superglobals
         self.this_var_num = this_var_num
+        # the references of 'static' variables, with their initial value
+        self.static_vars_w = [(w_ref, w_ref.deref_temp()) for w_ref in consts
+                              if isinstance(w_ref, W_Reference)]
+
+    def reset_static_state(self):
+        """Give 'static' variables, here and in the functions and classes
+        declared by this code, their initial value again."""
+        for w_ref, w_initial in self.static_vars_w:
+            w_ref.store(w_initial)
+        for func in self.user_functions:
+            func.reset_static_state()
 
     def getline(self, no):
         return self.sourcelines[no - 1]
@@ -98,6 +120,19 @@ class ByteCode(object):
         assert counter == 0
         return max_eff
 
+    def make_call_caches(self):
+        """The inline caches of the call sites, by position in the code
+        (see inlinecache.py)."""
+        caches = [None] * len(self.code)
+        i = 0
+        while i < len(self.code):
+            c = ord(self.code[i])
+            caches[i] = new_call_site_cache(c)
+            i += 1
+            if c >= BYTECODE_HAS_ARG:
+                i, _ = self.next_arg(i)
+        return caches
+
     def dump(self):
         i = 0
         lines = []
@@ -132,22 +167,54 @@ class ByteCode(object):
 unroll_k = unrolling_iterable([7, 14, 21, 28])
 
 class Serializer(object):
+    """ Writes a ByteCode (and everything it references) into a flat
+    string, see Unserializer for the reverse operation. The format
+    is native-endian and is only meant to be read on the same machine,
+    e.g. by the on-disk bytecode cache.
+    """
     def __init__(self):
         self.builder = StringBuilder()
 
     def write_int(self, i):
-        self.builder.append(struct.pack("l", i))
+        u = r_uint(i)
+        for k in range(LONG_SIZE):
+            self.builder.append(chr(intmask((u >> (k * 8)) & 0xff)))
+
+    def write_float(self, f):
+        # always 8 bytes, whatever the size of a long
+        u = float_pack(f, 8)
+        for k in range(8):
+            self.builder.append(chr(intmask((u >> (k * 8)) & 0xff)))
 
     def write_char(self, c):
         assert len(c) == 1
         self.builder.append(c)
 
+    def write_bool(self, b):
+        if b:
+            self.write_char('t')
+        else:
+            self.write_char('f')
+
     def write_str(self, s):
         self.write_int(len(s))
         self.builder.append(s)
 
+    def write_optional_str(self, s):
+        if s is None:
+            self.write_char('-')
+        else:
+            self.write_char('s')
+            self.write_str(s)
+
     def write_wrapped_item(self, w_item):
-        w_item.ll_serialize(self.builder)
+        w_item.ll_serialize(self)
+
+    def write_optional_wrapped_item(self, w_item):
+        if w_item is None:
+            self.write_char('-')
+        else:
+            self.write_wrapped_item(w_item)
 
     def write_wrapped_list(self, lst_w):
         self.write_int(len(lst_w))
@@ -172,7 +239,7 @@ class Serializer(object):
     def write_list_of_functions(self, lst):
         from hippy.function import Function
         from hippy.klass import UserClass
-        
+
         self.write_int(len(lst))
         for func in lst:
             if isinstance(func, Function):
@@ -188,19 +255,44 @@ class Serializer(object):
         self.write_bytecode(func.bytecode)
         self.write_list_of_str(func.names)
         self.write_list_of_char(func.types)
-        # closuredecls, defaults_w, typehints are missing
+        self.write_int(len(func.defaults_w))
+        for w_default in func.defaults_w:
+            self.write_optional_wrapped_item(w_default)
+        self.write_int(len(func.typehints))
+        for i, typehint, allow_null in func.typehints:
+            self.write_int(i)
+            self.write_str(typehint)
+            self.write_bool(allow_null)
+        self.write_int(len(func.closuredecls))
+        for decl in func.closuredecls:
+            self.write_str(decl.name)
+            self.write_bool(decl.isref)
 
     def write_class(self, klass):
-        # extends_name, property_decl, all_parents, access_flags,
-        # const_decl, constructor_method, constants_w, initial_instance_dct_w,
-        # base_interface_names, identifier, properties, methods
+        # only what UserClass.initialize() computes at compile time;
+        # everything that depends on the parents is recomputed by
+        # class_declaration_now_encountered() when DECLARE_CLASS runs
         self.write_str(klass.name)
+        self.write_int(klass.access_flags)
+        self.write_optional_str(klass.extends_name)
+        base_interface_names = klass.base_interface_names
+        if base_interface_names is None:
+            base_interface_names = []
+        self.write_list_of_str(base_interface_names)
+        self.write_int(len(klass.constants_w))
+        for k, w_value in klass.constants_w.iteritems():
+            self.write_str(k)
+            self.write_wrapped_item(w_value)
+        self.write_int(len(klass.property_decl))
+        for prop in klass.property_decl:
+            self.write_str(prop.name)
+            self.write_int(prop.access_flags)
+            self.write_wrapped_item(prop.value)
         self.write_int(len(klass.methods))
         for k, v in klass.methods.iteritems():
             self.write_str(k)
             self.write_int(v.access_flags)
             self.write_function(v.method_func)
-        # XXX
 
     def write_bytecode(self, bc):
         self.write_str(bc.code)
@@ -213,6 +305,7 @@ class Serializer(object):
         self.write_list_of_str(bc.varnames[:])
         self.write_list_of_int(bc.superglobals[:])
         self.write_int(bc.this_var_num)
+        self.write_bool(bc.method_of_class is not None)
         self.write_list_of_functions(bc.user_functions[:])
         self.write_list_of_int(bc.bc_mapping[:])
         return self
@@ -220,53 +313,125 @@ class Serializer(object):
     def finish(self):
         return self.builder.build()
 
-LONG_SIZE = struct.calcsize('l')
 
 class UnserializerException(Exception):
     pass
 
 class Unserializer(object):
-    def __init__(self, repr, space):
+    def __init__(self, repr, space, pos=0):
         self.repr = repr
-        self.pos = 0
+        self.pos = pos
         self.lgt = len(repr)
         self.space = space
+        self.current_class = None
 
     def read_char(self):
         if self.pos + 1 > self.lgt:
             raise UnserializerException
         self.pos += 1
         return self.repr[self.pos - 1]
-        
+
+    def read_bool(self):
+        c = self.read_char()
+        if c == 't':
+            return True
+        elif c == 'f':
+            return False
+        raise UnserializerException
+
     def read_int(self):
         if self.pos + LONG_SIZE > self.lgt:
             raise UnserializerException
-        stop = self.pos + LONG_SIZE
-        assert stop >= 0
-        res = runpack('l', self.repr[self.pos:stop])
+        res = r_uint(0)
+        for k in range(LONG_SIZE):
+            res |= r_uint(ord(self.repr[self.pos + k])) << (k * 8)
         self.pos += LONG_SIZE
-        return res
+        return intmask(res)
+
+    def read_float(self):
+        if self.pos + 8 > self.lgt:
+            raise UnserializerException
+        res = r_ulonglong(0)
+        for k in range(8):
+            res |= r_ulonglong(ord(self.repr[self.pos + k])) << (k * 8)
+        self.pos += 8
+        return float_unpack(res, 8)
 
     def read_str(self):
         lgt = self.read_int()
-        if self.pos + lgt > self.lgt:
+        if lgt < 0 or self.pos + lgt > self.lgt:
             raise UnserializerException
         stop = self.pos + lgt
         assert stop >= 0
         res = self.repr[self.pos:stop]
-        assert lgt >= 0
         self.pos += lgt
         return res
 
+    def read_optional_str(self):
+        c = self.read_char()
+        if c == '-':
+            return None
+        elif c == 's':
+            return self.read_str()
+        raise UnserializerException
+
     def read_wrapped_item(self):
+        from hippy.objects.interpolate import W_StrInterpolation
+        from hippy.objects.reference import W_Reference
+        from hippy.function import W_Constant
+        from hippy.ast import DelayedArray, DelayedHash
+        from hippy.klass import DelayedClassConstant
+
+        space = self.space
         type = self.read_char()
         if type == 'i':
-            return self.space.wrap(self.read_int())
+            return space.wrap(self.read_int())
+        elif type == 'd':
+            return space.newfloat(self.read_float())
+        elif type == 's':
+            return space.newstr(self.read_str())
+        elif type == 't':
+            return space.w_True
+        elif type == 'f':
+            return space.w_False
+        elif type == 'n':
+            return space.w_Null
+        elif type == 'I':
+            return W_StrInterpolation(self.read_list_of_optional_str())
+        elif type == 'r':
+            return W_Reference(self.read_wrapped_item())
+        elif type == 'l':
+            return space.new_array_from_list(self.read_wrapped_list())
+        elif type == 'h':
+            lgt = self.read_int()
+            dct_w = OrderedDict()
+            for i in range(lgt):
+                key = self.read_str()
+                dct_w[key] = self.read_wrapped_item()
+            return space.new_array_from_rdict(dct_w)
+        elif type == 'C':
+            return W_Constant(self.read_str())
+        elif type == 'A':
+            return DelayedArray(self.read_wrapped_list())
+        elif type == 'H':
+            lgt = self.read_int()
+            pairs = []
+            for i in range(lgt):
+                w_key = self.read_wrapped_item()
+                pairs.append((w_key, self.read_wrapped_item()))
+            return DelayedHash(pairs)
+        elif type == 'K':
+            cls_name = self.read_str()
+            return DelayedClassConstant(cls_name, self.read_str())
+        elif type == '-':
+            return None
         else:
             raise UnserializerException("unknown type %s" % (type,))
 
     def read_wrapped_list(self):
         lgt = self.read_int()
+        if lgt < 0:
+            raise UnserializerException
         lst_w = [None] * lgt
         for i in range(lgt):
             lst_w[i] = self.read_wrapped_item()
@@ -274,13 +439,26 @@ class Unserializer(object):
 
     def read_list_of_str(self):
         lgt = self.read_int()
+        if lgt < 0:
+            raise UnserializerException
         lst = [None] * lgt
         for i in range(lgt):
             lst[i] = self.read_str()
         return lst
 
+    def read_list_of_optional_str(self):
+        lgt = self.read_int()
+        if lgt < 0:
+            raise UnserializerException
+        lst = [None] * lgt
+        for i in range(lgt):
+            lst[i] = self.read_optional_str()
+        return lst
+
     def read_list_of_chars(self):
         lgt = self.read_int()
+        if lgt < 0:
+            raise UnserializerException
         lst = ['\x00'] * lgt
         for i in range(lgt):
             lst[i] = self.read_char()
@@ -288,6 +466,8 @@ class Unserializer(object):
 
     def read_list_of_int(self):
         lgt = self.read_int()
+        if lgt < 0:
+            raise UnserializerException
         lst = [0] * lgt
         for i in range(lgt):
             lst[i] = self.read_int()
@@ -295,6 +475,8 @@ class Unserializer(object):
 
     def read_list_of_functions(self, interp):
         lgt = self.read_int()
+        if lgt < 0:
+            raise UnserializerException
         lst = [None] * lgt
         for i in range(lgt):
             lst[i] = self.read_callable(interp)
@@ -302,34 +484,57 @@ class Unserializer(object):
 
     def read_class(self, interp):
         from hippy.klass import UserClass, Method
-        
+
         name = self.read_str()
         cls = UserClass(name)
+        cls.access_flags = self.read_int()
+        cls.extends_name = self.read_optional_str()
+        cls.base_interface_names = self.read_list_of_str()
+        no_of_constants = self.read_int()
+        for i in range(no_of_constants):
+            name = self.read_str()
+            cls.constants_w[name] = self.read_wrapped_item()
+        no_of_properties = self.read_int()
+        for i in range(no_of_properties):
+            name = self.read_str()
+            access_flags = self.read_int()
+            w_value = self.read_wrapped_item()
+            cls._make_property((name, access_flags), w_value)
+        prev_class = self.current_class
+        self.current_class = cls
         no_of_methods = self.read_int()
         methods = OrderedDict()
         for i in range(no_of_methods):
             name = self.read_str()
             access_flags = self.read_int()
             func = self.read_function(interp)
-            func.bytecode.method_of_class = cls
-            meth = Method(func, access_flags, cls)
-            methods[name] = meth
-            if name == '__construct':
-                cls.constructor_method = meth
+            methods[name] = Method(func, access_flags, cls)
+        self.current_class = prev_class
         cls.methods = methods
-        cls.class_declaration_now_encountered(interp)
+        cls._init_constructor()
         return cls
 
     def read_function(self, interp):
-        from hippy.function import Function
+        from hippy.function import Function, ClosureArgDesc
 
         bytecode = self.unserialize(interp)
         names = self.read_list_of_str()
         types = self.read_list_of_chars()
-        if len(names) != len(types):
+        defaults_w = self.read_wrapped_list()
+        if len(names) != len(types) or len(names) != len(defaults_w):
             raise UnserializerException
-        args = [(types[i], names[i], None) for i in range(len(names))]
-        return Function(args, [], [], bytecode)
+        args = [(types[i], names[i], defaults_w[i])
+                for i in range(len(names))]
+        typehints = []
+        for i in range(self.read_int()):
+            argnum = self.read_int()
+            typehint = self.read_str()
+            typehints.append((argnum, typehint, self.read_bool()))
+        closuredecls = []
+        for i in range(self.read_int()):
+            declname = self.read_str()
+            closuredecls.append(ClosureArgDesc(declname, self.read_bool()))
+        return Function(args, closuredecls, typehints, bytecode)
 
     def read_callable(self, interp):
         c = self.read_char()
@@ -339,7 +544,7 @@ class Unserializer(object):
             return self.read_class(interp)
         else:
             raise UnserializerException
-    
+
     def unserialize(self, interp):
         code = self.read_str()
         consts_w = self.read_wrapped_list()[:]
@@ -351,14 +556,19 @@ class Unserializer(object):
         varnames = self.read_list_of_str()[:]
         superglobals = self.read_list_of_int()[:]
         this_var_num = self.read_int()
+        if self.read_bool():
+            method_of_class = self.current_class
+        else:
+            method_of_class = None
         user_functions = self.read_list_of_functions(interp)[:]
         bc_mapping = self.read_list_of_int()[:]
         return ByteCode(code, consts_w, names, varnames, user_functions,
-                        filename,
-                        sourcelines, name=name, startlineno=startlineno,
+                        filename, sourcelines,
+                        method_of_class=method_of_class,
+                        name=name, startlineno=startlineno,
                         superglobals=superglobals, this_var_num=this_var_num,
                         bc_mapping=bc_mapping)
-    
+
 def unserialize(bytecode_as_str, interp):
     space = interp.space
     return Unserializer(bytecode_as_str, space).unserialize(interp)
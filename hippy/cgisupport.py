@@ -1,7 +1,6 @@
 
 from collections import OrderedDict
 from rpython.rlib.rsre.rsre_re import search
-import os
 
 from hippy.module.url import _urldecode
 
@@ -27,10 +26,10 @@ def setup_cgi(interp, argv):
     get = OrderedDict()
     post = OrderedDict()
     space = interp.space
-    query = os.environ.get('QUERY_STRING')
+    query = interp.getenv('QUERY_STRING')
     if query is not None:
         unpack_query(get, query, space)
-    script_name = os.environ.get('SCRIPT_NAME')
+    script_name = interp.getenv('SCRIPT_NAME')
     initial_server_dict = OrderedDict()
     if script_name is not None:
         initial_server_dict['PHP_SELF'] = space.wrap(script_name)
@@ -39,9 +38,9 @@ def setup_cgi(interp, argv):
         initial_server_dict['argv'] = space.new_array_from_list(
             [space.wrap(x) for x in argv])
 
-    cookie = os.environ.get('HTTP_COOKIE')
-    content_length = os.environ.get('CONTENT_LENGTH')
-    content_type = os.environ.get('CONTENT_TYPE')
+    cookie = interp.getenv('HTTP_COOKIE')
+    content_length = interp.getenv('CONTENT_LENGTH')
+    content_type = interp.getenv('CONTENT_TYPE')
     if content_type is not None and content_length is not None:
         m = search("[; ,]", content_type)
         if m:
@@ -52,8 +51,7 @@ def setup_cgi(interp, argv):
         if (content_type == 'x-www-form-urlencoded' or
             content_type == 'application/x-www-form-urlencoded'):
             content_length = int(content_length)
-            stdin = interp.open_stdin_stream()
-            post_data = stdin.read(content_length)
+            post_data = interp.read_request_body(content_length)
             unpack_query(post, post_data, space)
         else:
             interp.warn("Unknown content type: %s, ignoring post" %
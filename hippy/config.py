@@ -1,5 +1,7 @@
 
 from hippy.constants import E_ALL
+from hippy.module.regex.cache import DEFAULT_CACHE_SIZE
+from hippy.statcache import DEFAULT_REALPATH_CACHE_TTL, parse_ini_size
 from rpython.rlib.rsre.rsre_re import compile, M, IGNORECASE
 from rply import Token, ParserGenerator
 from rply.token import BaseBox
@@ -40,8 +42,17 @@ class Config(object):
             'session.serialize_handler': space.wrap('php'),
             'session.hash_function': space.wrap(0),
             'session.save_handler': space.wrap("files"),
+            'session.lazy_write': space.wrap(1),
+            'session.gc_probability': space.wrap(1),
+            'session.gc_divisor': space.wrap(100),
+            'session.gc_maxlifetime': space.wrap(1440),
+            'session.gc_batch_size': space.wrap(1000),
             'register_argc_argv': space.wrap(0),
             'error_reporting': space.wrap(E_ALL),
+            'opcache.file_cache': space.wrap(""),
+            'pcre.cache_size': space.wrap(DEFAULT_CACHE_SIZE),
+            'realpath_cache_size': space.wrap('16K'),
+            'realpath_cache_ttl': space.wrap(DEFAULT_REALPATH_CACHE_TTL),
             }
 
     def set_precision(self, prec):
@@ -65,6 +76,13 @@ class Config(object):
         if key == 'precision':
             self.set_precision(self.space.int_w(w_value))
             return
+        if key == 'pcre.cache_size':
+            self.space.regex_cache.set_capacity(self.space.int_w(w_value))
+        elif key == 'realpath_cache_size':
+            self.space.stat_cache.set_size(
+                parse_ini_size(self.space.str_w(w_value)))
+        elif key == 'realpath_cache_ttl':
+            self.space.stat_cache.set_ttl(self.space.int_w(w_value))
         if key == 'open_basedir':
             # we can set this only once
             if self.ini.get(key, None):
@@ -0,0 +1,118 @@
+""" The CSV record parser of fgetcsv(), str_getcsv() and
+SplFileObject::fgetcsv(), following PHP's rules:
+
+  * fields are separated by 'delimiter'; a field may be enclosed in
+    'enclosure' characters, in which a doubled enclosure stands for one;
+  * inside an enclosure, the character after 'escape' is taken as is,
+    and the escape character is kept;
+  * whitespace before an opening enclosure is skipped, and anything
+    between the closing enclosure and the next delimiter is kept;
+  * an enclosed field may span several lines: they are pulled from the
+    stream as needed.
+
+A blank line gives a single null field, represented by None.
+"""
+
+from rpython.rlib.rstring import StringBuilder
+
+
+def _line_end(line):
+    """Where the line ending of 'line' starts, if any."""
+    end = len(line)
+    if end > 0 and line[end - 1] == '\n':
+        end -= 1
+    if end > 0 and line[end - 1] == '\r':
+        end -= 1
+    return end
+
+
+def parse_csv(line, stream, delimiter, enclosure, escape, limit=-1):
+    """Parse the record starting with 'line'.  If an enclosed field is
+    not closed on that line, the next ones are read with
+    stream.readline(), unless 'stream' is None.  Returns the list of
+    fields, or None for a blank line."""
+    lend = _line_end(line)
+    if lend == 0:
+        return None
+    fields = []
+    pos = 0
+    while True:
+        # whitespace before an enclosure is skipped
+        i = pos
+        while (i < lend and line[i] != delimiter and
+               line[i] in ' \t\x0b\x0c'):
+            i += 1
+        if i < lend and line[i] == enclosure:
+            builder = StringBuilder()
+            pos = i + 1
+            closed = False
+            while not closed:
+                if pos >= len(line):
+                    if stream is None:
+                        break
+                    line = stream.readline(False, limit)
+                    pos = 0
+                    if not line:
+                        break
+                    continue
+                j = line.find(enclosure, pos)
+                if j < 0:
+                    j = len(line)
+                if escape != enclosure:
+                    k = line.find(escape, pos, j)
+                    if k >= 0:
+                        # keep the escape and the character after it
+                        builder.append_slice(line, pos, k + 1)
+                        pos = k + 1
+                        if pos < len(line):
+                            builder.append(line[pos])
+                            pos += 1
+                        continue
+                builder.append_slice(line, pos, j)
+                pos = j
+                if j < len(line):
+                    if j + 1 < len(line) and line[j + 1] == enclosure:
+                        builder.append(enclosure)
+                        pos = j + 2
+                    else:
+                        pos = j + 1
+                        closed = True
+            lend = _line_end(line)
+            if pos < lend:
+                # text after the closing enclosure is kept as is
+                j = line.find(delimiter, pos, lend)
+                if j < 0:
+                    j = lend
+                builder.append_slice(line, pos, j)
+                pos = j
+            fields.append(builder.build())
+        else:
+            j = line.find(delimiter, pos, lend)
+            if j < 0:
+                j = lend
+            assert j >= pos
+            fields.append(line[pos:j])
+            pos = j
+        if pos < lend and line[pos] == delimiter:
+            pos += 1
+            continue
+        return fields
+
+
+def csv_char(space, funcname, what, s):
+    """Check a delimiter, enclosure or escape argument: return it as a
+    one-character string, or None after a warning."""
+    if len(s) == 0:
+        space.ec.warn("%s(): %s must be a character" % (funcname, what))
+        return None
+    if len(s) > 1:
+        space.ec.notice("%s(): %s must be a single character"
+                        % (funcname, what))
+    return s[:1]
+
+
+def wrap_csv_fields(space, fields):
+    if fields is None:
+        return space.new_array_from_list([space.w_Null])
+    return space.new_array_from_list([space.newstr(field)
+                                      for field in fields])
@@ -62,6 +62,10 @@ class W_Constant(W_Root):
     def eval_static(self, space):
         return space.ec.interpreter.locate_constant(self.name)
 
+    def ll_serialize(self, serializer):
+        serializer.write_char("C")
+        serializer.write_str(self.name)
+
     def repr(self):
         return self.name
 
@@ -82,6 +86,9 @@ class AbstractFunction(W_Root):
                   closureargs=None):
         raise NotImplementedError("abstract base class")
 
+    def reset_static_state(self):
+        pass
+
 
 class Function(AbstractFunction):
     _immutable_fields_ = ['tp[*]', 'names[*]',
@@ -101,6 +108,9 @@ class Function(AbstractFunction):
     def get_names(self):
         return self.names
 
+    def reset_static_state(self):
+        self.bytecode.reset_static_state()
+
     def get_identifier(self):
         return self.identifier
 
@@ -0,0 +1,143 @@
+""" Inline caches of the call sites, i.e. of the GETFUNC, GETMETH and
+GETSTATICMETH instructions.
+
+Every such instruction of a ByteCode has its own cache, which remembers
+what the last lookups done there found, so that the interpreter can skip
+lowercasing the name, the dictionary lookups and the visibility checks
+when a call site keeps calling the same functions or methods.  A cache
+starts empty, is monomorphic after the first lookup, polymorphic up to
+MAX_ENTRIES entries, and megamorphic after that, when it stops recording
+anything.
+
+The entries are only valid for one version of the tables of the
+interpreter: Interpreter.function_version is replaced whenever a function
+is declared and Interpreter.class_version whenever a class is, and a
+cache that sees another version starts again from empty.  Both are new
+for every request too, as in worker mode a ByteCode serves many of them.
+
+Traces do not use the caches: the JIT constant-folds the elidable
+lookups instead.
+"""
+
+from hippy import consts
+
+MAX_ENTRIES = 4
+
+
+class VersionTag(object):
+    pass
+
+
+class CallSiteCache(object):
+    version = None
+    megamorphic = False
+
+    def check_version(self, version):
+        """Empty the cache if it was filled under another 'version'.
+        Returns False if it did."""
+        if self.version is version:
+            return True
+        self.version = version
+        self.megamorphic = False
+        self.clear()
+        return False
+
+    def clear(self):
+        raise NotImplementedError
+
+    def is_full(self):
+        """Called before adding an entry: True if the cache is or just
+        went megamorphic."""
+        if self.megamorphic:
+            return True
+        if self.size() >= MAX_ENTRIES:
+            self.megamorphic = True
+            self.clear()
+            return True
+        return False
+
+    def size(self):
+        raise NotImplementedError
+
+
+class FunctionEntry(object):
+    _immutable_fields_ = ['name', 'func']
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+
+
+class FunctionCache(CallSiteCache):
+    """ The cache of a GETFUNC: function name -> function """
+
+    def __init__(self):
+        self.entries = []
+
+    def clear(self):
+        self.entries = []
+
+    def size(self):
+        return len(self.entries)
+
+    def lookup(self, version, name):
+        if not self.check_version(version):
+            return None
+        for entry in self.entries:
+            if entry.name == name:
+                return entry.func
+        return None
+
+    def store(self, name, func):
+        if not self.is_full():
+            self.entries.append(FunctionEntry(name, func))
+
+
+class MethodEntry(object):
+    _immutable_fields_ = ['klass', 'contextclass', 'name', 'static', 'method']
+
+    def __init__(self, klass, contextclass, name, static, method):
+        self.klass = klass
+        self.contextclass = contextclass
+        self.name = name
+        self.static = static
+        self.method = method
+
+
+class MethodCache(CallSiteCache):
+    """ The cache of a GETMETH or GETSTATICMETH:
+    (class, context class, method name, static) -> Method
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def clear(self):
+        self.entries = []
+
+    def size(self):
+        return len(self.entries)
+
+    def lookup(self, version, klass, contextclass, name, static):
+        if not self.check_version(version):
+            return None
+        for entry in self.entries:
+            if (entry.klass is klass and entry.contextclass is contextclass
+                    and entry.static == static and entry.name == name):
+                return entry.method
+        return None
+
+    def store(self, klass, contextclass, name, static, method):
+        if not self.is_full():
+            self.entries.append(
+                MethodEntry(klass, contextclass, name, static, method))
+
+
+def new_call_site_cache(opcode):
+    """The cache for an instruction 'opcode', or None if it is not a call
+    site."""
+    if opcode == consts.GETFUNC:
+        return FunctionCache()
+    if opcode == consts.GETMETH or opcode == consts.GETSTATICMETH:
+        return MethodCache()
+    return None
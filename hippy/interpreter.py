@@ -4,7 +4,7 @@ from collections import OrderedDict
 from hippy.consts import BYTECODE_HAS_ARG, BYTECODE_NAMES,\
     BINOP_LIST, BINOP_BITWISE, RETURN
 from hippy.function import AbstractFunction
-from hippy.builtin import BUILTIN_FUNCTIONS
+from hippy.builtin import BUILTIN_FUNCTIONS, BuiltinFunction
 from hippy.error import (IllegalInstruction, FatalError, PHPException,
                          ExplicitExitException, VisibilityError)
 from hippy.lexer import LexerError
@@ -28,12 +28,14 @@ from hippy import constants
 from hippy import pointer
 from hippy.sourceparser import parse
 from hippy.astcompiler import compile_ast
+from hippy.bytecache import open_bytecode_cache
+from hippy.inlinecache import VersionTag, FunctionCache, MethodCache
 from hippy.module.standard.directory import php_dir
 from hippy.module.spl import spl
 from rpython.rlib.objectmodel import we_are_translated
 from rpython.rlib import jit
 from rpython.rlib.unroll import unrolling_iterable
-from rpython.rlib.rpath import exists, dirname
+from rpython.rlib.rpath import dirname
 from rpython.rlib.rfile import create_popen_file
 
 from hippy.constants import get_constants, CONST_KEYS
@@ -55,6 +57,7 @@ import hippy.module.session.funcs
 import hippy.module.internal
 import hippy.module.regex.interface
 import hippy.module.url
+import hippy.module.json
 
 import hippy.module.date.funcs
 #import hippy.module.xml.interface
@@ -73,7 +76,7 @@ import hippy.module.date.dateinterval_klass
 import hippy.module.date.datetimezone_klass
 
 from hippy.module.date import default_timezone
-from hippy.buffering import Buffer
+from hippy.buffering import Buffer, OutputSink
 
 
 def get_printable_location(pc, bytecode, interp):
@@ -96,6 +99,9 @@ class W_Globals(W_RDictArrayObject):
     def as_unique_arraydict(self):
         return self
 
+    def copy(self):
+        return self
+
     def lookup_var(self, name):
         try:
             return self.dct_w[name]
@@ -111,6 +117,8 @@ class W_Globals(W_RDictArrayObject):
 
     def set_var(self, name, r_var):
         assert isinstance(r_var, W_Reference)
+        if self._slots is not None and name not in self.dct_w:
+            self._key_added(name)
         self.dct_w[name] = r_var
 
     def _setitem_str(self, key, w_value, as_ref,
@@ -127,6 +135,8 @@ class W_Globals(W_RDictArrayObject):
                 return self
         assert isinstance(w_value, W_Reference)
 
+        if self._slots is not None and key not in dct_w:
+            self._key_added(key)
         dct_w[key] = w_value
         gframe = self.space.ec.interpreter.global_frame
         if gframe is not None:
@@ -134,10 +144,9 @@ class W_Globals(W_RDictArrayObject):
         return self
 
     def unset_var(self, name):
-        try:
+        if name in self.dct_w:
+            self._remove_key_slot(name)
             del self.dct_w[name]
-        except KeyError:
-            pass
 
     def _unsetitem_str(self, key):
         self.unset_var(key)
@@ -174,8 +183,10 @@ class OutputBufferingLock(object):
 
 
 class Interpreter(object):
-    """ Interpreter keeps the state of the current run. There will be a new
-    interpreter instance per run of script
+    """ Interpreter keeps the state of the current run. There is usually a
+    new interpreter instance per run of script; in worker mode the same
+    instance serves many requests and reset_request_state() is called in
+    between, so that compiled bytecode and JIT traces stay warm.
     """
     _immutable_fields_ = ['debugger?']
     cgi = False
@@ -184,10 +195,25 @@ class Interpreter(object):
     allow_direct_class_access = False
     last_strtok_str = None
     last_strtok_pos = 0
+    bytecode_cache = None
+    environ = None          # request environment, if not os.environ
+    request_body = None     # request body, if not read from stdin
+    request_output = None   # worker connection receiving the output
 
     def __init__(self, space):
         self.space = space
+        self.cached_files = {}
+        self.cached_mtimes = {}
+        self.init_request_state()
+
+    def init_request_state(self):
+        space = self.space
+        self.cgi = False
+        self.web_config = None
+        self.last_strtok_str = None
+        self.last_strtok_pos = 0
         self.functions = BUILTIN_FUNCTIONS.copy()
+        self.function_version = VersionTag()
 
         self.error_level = 0xffffff
         self.topframeref = jit.vref_None
@@ -198,6 +224,7 @@ class Interpreter(object):
         for name, cls in all_builtin_classes.items():
             cls.space = space
             self._class_set(name, cls)
+        self.class_version = VersionTag()
 
         self._autoloading = {}
         self.constants = OrderedDict()
@@ -205,8 +232,10 @@ class Interpreter(object):
         self.w_globals_ref = W_Reference(self.globals)
         self.setup_constants(space)
         self.config = Config(space)
-        self.cached_files = {}
         self.included_files = []
+        self.included_set = {}
+        space.stat_cache.clear_stats()
+        space.ec.array_copies = 0
         self.session = Session(self)
         self.w_exception_handler = None
         self.last_error_handler = None
@@ -215,6 +244,7 @@ class Interpreter(object):
         self.output_buffer = None
         self.ob_lock = False
         self.any_output = False
+        self.output_sink = OutputSink(self)
         self.last_resource_id = 4
         self.last_dir_resource = None
         self.include_path = [space.str_w(self.config.get_ini_w(
@@ -229,11 +259,21 @@ class Interpreter(object):
         self.regexp_backtrack_limit = 1000000   # XXX
         self.regexp_recursion_limit = 100000    # XXX
         self.regexp_error_code = hippy.module.regex.interface.PREG_NO_ERROR
+        self.json_error_code = hippy.module.json.JSON_ERROR_NONE
         self._setup = False
         self.header_keys = {"content-type": 0}
         self.headers = ['Content-Type: text/html']
         self.extra_headers = []
 
+    def reset_request_state(self):
+        """Forget everything the previous request did, but keep the
+        compiled files: their 'static' variables and the static
+        properties of their classes are reset to the initial values.
+        """
+        for bc in self.cached_files.itervalues():
+            bc.reset_static_state()
+        self.init_request_state()
+
     def _class_set(self, class_name, class_obj):
         self.classes[class_name.lower()] = class_obj
 
@@ -250,6 +290,16 @@ class Interpreter(object):
 
         return fdopen_as_stream(0, "r")
 
+    def read_request_body(self, length):
+        if self.request_body is not None:
+            return self.request_body[:length]
+        return self.open_stdin_stream().read(length)
+
+    def getenv(self, name):
+        if self.environ is not None:
+            return self.environ.get(name, None)
+        return os.environ.get(name)
+
     def setup(self, cgi=False, argv=None):
         if self._setup:
             return
@@ -259,8 +309,10 @@ class Interpreter(object):
             from hippy.cgisupport import setup_cgi
             self.web_config = setup_cgi(self, argv)
             self.cgi = True
+            self.output_sink.implicit_flush = False
         self.error_level = space.int_w(self.config.get_ini_w(
             'error_reporting'))
+        self.bytecode_cache = open_bytecode_cache(self.config)
         self._setup = True
         self.setup_globals(space, argv)
 
@@ -299,9 +351,14 @@ class Interpreter(object):
             initial_server_dict = OrderedDict()
         else:
             initial_server_dict = self.web_config.initial_server_dict
-        for k, v in os.environ.items():
-            if k not in initial_server_dict:
-                initial_server_dict[k] = space.wrap(v)
+        if self.environ is not None:
+            for k, v in self.environ.items():
+                if k not in initial_server_dict:
+                    initial_server_dict[k] = space.wrap(v)
+        else:
+            for k, v in os.environ.items():
+                if k not in initial_server_dict:
+                    initial_server_dict[k] = space.wrap(v)
         return space.new_array_from_rdict(initial_server_dict)
 
     def initialize_cookie_variable(self, space):
@@ -373,6 +430,42 @@ class Interpreter(object):
         except KeyError:
             self.fatal("Call to undefined function %s()" % name)
 
+    def locate_function_at(self, bytecode, pc, name):
+        """locate_function(), through the inline cache of the GETFUNC at
+        'pc' of 'bytecode'."""
+        if jit.we_are_jitted():
+            return self.locate_function(name)
+        cache = bytecode.call_caches[pc]
+        assert isinstance(cache, FunctionCache)
+        func = cache.lookup(self.function_version, name)
+        if func is None:
+            func = self.locate_function(name)
+            cache.store(name, func)
+        return func
+
+    def lookup_method_at(self, bytecode, pc, klass, contextclass, name,
+                         static):
+        """The method 'name' of 'klass', through the inline cache of the
+        GETMETH or GETSTATICMETH at 'pc' of 'bytecode'.  Returns None if
+        the slow path must do the lookup: the calls that end up in
+        __call() or __callStatic() or in an error, constructors, and
+        while the debugger bypasses the visibility checks."""
+        if jit.we_are_jitted() or self.allow_direct_class_access:
+            return None
+        cache = bytecode.call_caches[pc]
+        assert isinstance(cache, MethodCache)
+        method = cache.lookup(self.class_version, klass, contextclass, name,
+                              static)
+        if method is None:
+            if name.lower() == '__construct':
+                return None
+            try:
+                method = klass.lookup_method(name, contextclass, static)
+            except VisibilityError:
+                return None
+            cache.store(klass, contextclass, name, static, method)
+        return method
+
     def get_this(self):
         w_this = self.topframeref().w_this
         if w_this is None:
@@ -471,6 +564,7 @@ class Interpreter(object):
         while self.output_buffer:
             self.output_buffer.flush()
             self.output_buffer = self.output_buffer.prev
+        self.output_sink.flush()
 
     def clean_buffers(self):
         while self.output_buffer:
@@ -509,19 +603,29 @@ class Interpreter(object):
             self._writestr(str)
 
     def _writestr(self, string):
-        os.write(1, string)
+        self.output_sink.write(string)
+
+    def write_output(self, data):
+        if self.request_output is not None:
+            self.request_output.write(data)
+        else:
+            pos = 0
+            while pos < len(data):
+                pos += os.write(1, data[pos:])
 
     def err_write(self, string):
         os.write(2, string)
 
     def send_headers(self):
         if self.cgi:
-            os.write(1, "\r\n")
+            lines = ["\r\n"]
             for k in self.headers:
-                os.write(1, k + "\r\n")
+                lines.append(k + "\r\n")
             for elem in self.extra_headers:
-                os.write(1, elem + "\r\n")
-            os.write(1, "\r\n")
+                lines.append(elem + "\r\n")
+            lines.append("\r\n")
+            # goes out together with the first chunk of the body
+            self._writestr(''.join(lines))
         self.headers = None
         self.extra_headers = None
 
@@ -624,8 +728,13 @@ class Interpreter(object):
         raise ExplicitExitException(255, '')
 
     def compile_bytecode(self, filename, source):
+        cache = self.bytecode_cache
+        if cache is not None:
+            bc = cache.load(self, filename)
+            if bc is not None:
+                return bc
         try:
-            return compile_php(filename, source, self.space, self)
+            bc = compile_php(filename, source, self.space, self)
         except (ParseError, LexerError) as exc:
             msg = "%s in %s on line %s" % (exc.message, filename,
                                            exc.source_pos)
@@ -636,6 +745,9 @@ class Interpreter(object):
                                            exc.lineno)
             self.log_error(constants.E_ERROR, msg)
             return None
+        if cache is not None:
+            cache.store(filename, source, bc)
+        return bc
 
     def run_main(self, space, bytecode, top_main=False):
         if not self._setup:
@@ -687,17 +799,43 @@ class Interpreter(object):
             if parent_frame is not None:
                 parent_frame.load_from_frame(frame)
 
+    def mark_included(self, filename):
+        if filename not in self.included_set:
+            self.included_set[filename] = None
+            self.included_files.append(filename)
+
+    def get_cached_file(self, absname):
+        """The bytecode of 'absname' if it was compiled before and the
+        file has not changed since, as far as the stat cache knows."""
+        bc = self.cached_files.get(absname, None)
+        if bc is None:
+            return None
+        mtime = self.space.stat_cache.mtime(absname)
+        if mtime != self.cached_mtimes[absname]:
+            return None
+        return bc
+
+    def cache_file(self, absname, bc):
+        self.cached_files[absname] = bc
+        self.cached_mtimes[absname] = self.space.stat_cache.mtime(absname)
+
     def compile_file(self, filename):
-        absname = os.path.abspath(filename)
-        if absname in self.cached_files:
-            bc = self.cached_files[absname]
-        else:
-            f = open(absname)
-            data = f.read()
-            f.close()
-            bc = compile_php(absname, data, self.space)
-            self.included_files.append(absname)
-            self.cached_files[absname] = bc
+        absname = self.space.stat_cache.abspath(filename)
+        bc = self.get_cached_file(absname)
+        if bc is None:
+            cache = self.bytecode_cache
+            bc = None
+            if cache is not None:
+                bc = cache.load(self, absname)
+            if bc is None:
+                f = open(absname)
+                data = f.read()
+                f.close()
+                bc = compile_php(absname, data, self.space)
+                if cache is not None:
+                    cache.store(absname, data, bc)
+            self.cache_file(absname, bc)
+        self.mark_included(absname)
         return bc
 
     def run_include(self, bc, parent_frame):
@@ -801,15 +939,16 @@ class Interpreter(object):
         return None
 
     def find_file(self, fname):
+        stat_cache = self.space.stat_cache
         try:
-            if not exists(fname):
+            if not stat_cache.exists(fname):
                 for path in self.include_path:
-                    if exists(os.path.join(path, fname)):
+                    if stat_cache.exists(os.path.join(path, fname)):
                         return os.path.join(path, fname)
             # this is stupid, but...
             actual_code_dir = dirname(
                 self.global_frame.bytecode.filename)
-            if exists(os.path.join(actual_code_dir, fname)):
+            if stat_cache.exists(os.path.join(actual_code_dir, fname)):
                 return os.path.join(actual_code_dir, fname)
             return fname
         except TypeError:
@@ -1129,7 +1268,7 @@ class Interpreter(object):
         func = None  # for RPython
         if space.is_str(w_name):
             name = space.str_w(w_name)
-            func = self.locate_function(name)
+            func = self.locate_function_at(bytecode, pc - 1, name)
         elif isinstance(w_name, W_InstanceObject):
             func = w_name.get_callable()
             if func is None:
@@ -1194,8 +1333,16 @@ class Interpreter(object):
     def GETMETH(self, bytecode, frame, space, arg, pc):
         w_base = frame.pop_ptr().deref(self, give_notice=True)
         name = space.str_w(frame.pop())
-        w_meth = self.getmeth(w_base, name,
-                              contextclass=frame.get_contextclass())
+        contextclass = frame.get_contextclass()
+        if (isinstance(w_base, W_InstanceObject) and
+                not isinstance(w_base, W_ClosureObject)):
+            method = self.lookup_method_at(bytecode, pc - 1,
+                                           w_base.getclass(), contextclass,
+                                           name, False)
+            if method is not None:
+                frame.push(w_base.bind_method(method))
+                return pc
+        w_meth = self.getmeth(w_base, name, contextclass=contextclass)
         frame.push(w_meth)
         return pc
 
@@ -1216,10 +1363,17 @@ class Interpreter(object):
         else:
             methname = space.str_w(w_meth)
         w_this = frame.w_this
-        w_meth = klass.getstaticmeth(methname,
-                                     contextclass=frame.get_contextclass(),
-                                     context_w_this=w_this,
-                                     thisclass=thisclass)
+        contextclass = frame.get_contextclass()
+        static = klass.is_static_call(contextclass, w_this)
+        method = self.lookup_method_at(bytecode, pc - 1, klass, contextclass,
+                                       methname, static)
+        if method is not None:
+            w_meth = klass.bind_static_method(method, static, w_this,
+                                              thisclass)
+        else:
+            w_meth = klass.getstaticmeth(methname, contextclass=contextclass,
+                                         context_w_this=w_this,
+                                         thisclass=thisclass)
         frame.push(w_meth)
         return pc
 
@@ -1251,8 +1405,11 @@ class Interpreter(object):
     @jit.unroll_safe
     def CALL(self, bytecode, frame, space, arg, pc):
         func = frame.pop()
-        args_w = [frame.peek_nth(arg - i - 1) for i in range(arg)]
-        w_res = func.call_args(self, args_w)
+        if isinstance(func, BuiltinFunction) and func.frame_runner is not None:
+            w_res = func.call_from_frame(self, frame, arg)
+        else:
+            args_w = [frame.peek_nth(arg - i - 1) for i in range(arg)]
+            w_res = func.call_args(self, args_w)
         frame.pop_n(arg)
         frame.push(w_res)
         return pc
@@ -1358,6 +1515,7 @@ class Interpreter(object):
                 extra = ''
             self.fatal("Cannot redeclare %s()%s" % (name, extra))
         self.functions[func_id] = func
+        self.function_version = VersionTag()
         return pc
 
     def DECLARE_CLASS(self, bytecode, frame, space, arg, pc):
@@ -1372,6 +1530,7 @@ class Interpreter(object):
                     name)
         self._class_set(cls_id, kls)
         kls.class_declaration_now_encountered(self)
+        self.class_version = VersionTag()
         return pc
 
     def LOAD_CLOSURE(self, bytecode, frame, space, arg, pc):
@@ -1607,7 +1766,8 @@ class Interpreter(object):
         name = self.space.str_w(frame.pop())
         #print "INCLUDE", name
         fname = self.find_file(name)
-        if once is True and fname in self.cached_files:
+        if (once is True and fname is not None and
+                self.space.stat_cache.abspath(fname) in self.included_set):
             frame.push(self.space.newint(1))
             return
         try:
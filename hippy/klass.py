@@ -105,14 +105,13 @@ class ClassBase(AbstractFunction):
             p = Property(name, self, access_flags)
             self.properties[name] = p
             self.property_decl.append(p)
-            if not p.is_static():
-                p.value = w_initial_value
-            else:
+            p.value = w_initial_value
+            if p.is_static():
                 if not isinstance(w_initial_value, W_Object):
                     r_value = w_initial_value
                 else:
                     r_value = W_Reference(w_initial_value)
-                p.r_value = r_value
+                p.r_value = p.initial_r_value = r_value
         elif not we_are_translated(): # compile time only
             prop = prop.build(self)
             self.properties[prop.name] = prop
@@ -334,6 +333,12 @@ class ClassBase(AbstractFunction):
                 raise
         return method
 
+    def lookup_method(self, name, contextclass, static):
+        """Like locate_method(), but without the fallback to __call() and
+        __callStatic(): always raises VisibilityError if the method cannot
+        be called from 'contextclass'."""
+        return self._lookup_method(name, contextclass, static)
+
     @jit.elidable
     def _lookup_method(self, name, contextclass, static):
         key = name.lower()
@@ -398,17 +403,26 @@ class ClassBase(AbstractFunction):
             if method is None:
                 raise interp.fatal("Cannot call constructor")
             return W_BoundMethod(context_w_this, thisclass, method.method_func)
-        if context_w_this is not None and self.is_parent_of(contextclass):
-            static = False
-            searchclass = contextclass
-        else:
-            static = True
+        static = self.is_static_call(contextclass, context_w_this)
+        if static:
             searchclass = self
+        else:
+            searchclass = contextclass
         try:
             method = self.locate_method(methname, contextclass, static=static,
                 searchclass=searchclass)
         except VisibilityError as e:
             raise interp.fatal(e.msg_fatal())
+        return self.bind_static_method(method, static, context_w_this,
+                                       thisclass)
+
+    def is_static_call(self, contextclass, context_w_this):
+        """False if calling 'Class::method()' from 'contextclass' passes
+        along the current $this."""
+        return not (context_w_this is not None and
+                    self.is_parent_of(contextclass))
+
+    def bind_static_method(self, method, static, context_w_this, thisclass):
         if static and not method.is_static():
             if context_w_this is None:
                 self._static_call_warning(method, "")
@@ -685,6 +699,11 @@ class BuiltinClass(ClassBase):
 
 
 class UserClass(ClassBase):
+    # what UserClass.initialize() built, saved on the first declaration
+    own_methods = None
+    own_constants_w = None
+    own_constructor_method = None
+
     def _property_decl(self, decl, ctx):
         if self.is_interface():
             raise CompilerError("Interfaces may not include member variables")
@@ -767,8 +786,39 @@ class UserClass(ClassBase):
             self._check_inheritance(method, parent_method)
             self._check_compatibility(interp, method, parent_method)
 
+    def _reset_declaration(self):
+        # The same class object is declared again by a later request
+        # in worker mode: forget everything computed from the parents.
+        self.methods = self.own_methods.copy()
+        self.constants_w = self.own_constants_w.copy()
+        self.constructor_method = self.own_constructor_method
+        self.properties = OrderedDict()
+        self.all_parents = {self.identifier: None}
+        self.parentclass = None
+        self.immediate_parents = None
+        self.custom_instance_class = None
+        self.is_iterator = False
+        self.base_map = Terminator()
+        self.initial_storage_w = None
+        for name in magic_methods_unrolled:
+            setattr(self, 'method' + name, None)
+
+    def reset_static_state(self):
+        for p in self.properties.itervalues():
+            if p.is_static():
+                p.reset_static_value()
+        for m in self.methods.itervalues():
+            if m.klass is self:
+                m.method_func.reset_static_state()
+
     def class_declaration_now_encountered(self, interp):
         self.space = space = interp.space
+        if self.own_methods is None:
+            self.own_methods = self.methods.copy()
+            self.own_constants_w = self.constants_w.copy()
+            self.own_constructor_method = self.constructor_method
+        else:
+            self._reset_declaration()
         for p in self.property_decl:
             self.properties[p.name] = p
 
@@ -850,6 +900,11 @@ class DelayedClassConstant(W_Root):
         w_result = w_cls.lookup_w_constant(space, self.name)
         return w_result
 
+    def ll_serialize(self, serializer):
+        serializer.write_char("K")
+        serializer.write_str(self.cls_name)
+        serializer.write_str(self.name)
+
 
 class ClassMember(object):
     _immutable_fields_ = ['access_flags']
@@ -885,6 +940,7 @@ class ClassMember(object):
 class Property(ClassMember):
     getter = None
     value = None
+    initial_r_value = None
 
     def __init__(self, name, klass, access_flags):
         ClassMember.__init__(self, access_flags)
@@ -908,8 +964,21 @@ class Property(ClassMember):
             return self
         copy = Property(self.name, self.klass, self.access_flags)
         copy.r_value = self.r_value
+        copy.initial_r_value = self.initial_r_value
+        copy.value = self.value
         return copy
 
+    def reset_static_value(self):
+        """Bind the static property to the reference it was declared
+        with again, holding the initial value, even if it was rebound
+        by 'A::$x = &$y' in the meantime."""
+        r_value = self.initial_r_value
+        if r_value is None:
+            return
+        self.r_value = r_value
+        if isinstance(r_value, W_Reference):
+            r_value.store(self.value)
+
     def getvalue(self, space):
         assert self.is_static()
         r_value = self.r_value
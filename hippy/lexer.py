@@ -1,5 +1,4 @@
 
-import sys
 from rply.token import BaseBox, Token
 from rply import ParsingError
 
@@ -320,54 +319,116 @@ the old one on the stack. Some tokens will pop stuff from the stack.
 """
 
 
-class Lexer(BaseLexer):
-    """ A simple regex-based lexer/tokenizer.
+# The scanners below recognize exactly what the rules above describe,
+# tried in order, but in a single pass over the input: the first
+# character selects the only rules that can match, through the tables
+# below, and keywords are found by looking up identifiers in a dict.
+# The rules are kept as the list of token names of the parser.
+
+KEYWORD_TOKENS = {}
+for _keyword, _name in KEYWORDS.items():
+    KEYWORD_TOKENS[_keyword.lower()] = _name
+
+CASTS = {
+    "int": 'T_INT_CAST',
+    "integer": 'T_INT_CAST',
+    "real": 'T_DOUBLE_CAST',
+    "double": 'T_DOUBLE_CAST',
+    "float": 'T_DOUBLE_CAST',
+    "string": 'T_STRING_CAST',
+    "binary": 'T_STRING_CAST',
+    "array": 'T_ARRAY_CAST',
+    "object": 'T_OBJECT_CAST',
+    "bool": 'T_BOOL_CAST',
+    "boolean": 'T_BOOL_CAST',
+    "unset": 'T_UNSET_CAST',
+    "unicode": 'T_UNICODE_CAST',
+}
 
-        See below for an example of usage.
-    """
-    def __init__(self, use_rsre=False):
-        """ Create a lexer.
+# operators and punctuation, by their first character, longest first
+OPERATORS = {
+    '+': [("+=", 'T_PLUS_EQUAL'), ("++", 'T_INC'), ("+", '+')],
+    '-': [("-=", 'T_MINUS_EQUAL'), ("--", 'T_DEC'),
+          ("->", 'T_OBJECT_OPERATOR'), ("-", '-')],
+    '*': [("*=", 'T_MUL_EQUAL'), ("*", '*')],
+    '/': [("/=", 'T_DIV_EQUAL'), ("/", '/')],
+    '.': [(".=", 'T_CONCAT_EQUAL'), (".", '.')],
+    '%': [("%=", 'T_MOD_EQUAL'), ("%", '%')],
+    '&': [("&=", 'T_AND_EQUAL'), ("&&", 'T_BOOLEAN_AND'), ("&", '&')],
+    '|': [("|=", 'T_OR_EQUAL'), ("||", 'T_BOOLEAN_OR'), ("|", '|')],
+    '^': [("^=", 'T_XOR_EQUAL'), ("^", '^')],
+    '<': [("<<=", 'T_SL_EQUAL'), ("<>", 'T_IS_NOT_EQUAL'),
+          ("<=", 'T_IS_SMALLER_OR_EQUAL'), ("<<", 'T_SL'), ("<", '<')],
+    '>': [(">>=", 'T_SR_EQUAL'), (">=", 'T_IS_GREATER_OR_EQUAL'),
+          (">>", 'T_SR'), (">", '>')],
+    '=': [("===", 'T_IS_IDENTICAL'), ("==", 'T_IS_EQUAL'),
+          ("=>", 'T_DOUBLE_ARROW'), ("=", '=')],
+    '!': [("!==", 'T_IS_NOT_IDENTICAL'), ("!=", 'T_IS_NOT_EQUAL'),
+          ("!", '!')],
+    ':': [("::", 'T_PAAMAYIM_NEKUDOTAYIM'), (":", ':')],
+    '?': [("?>", 'B_END_OF_CODE_BLOCK'), ("?", '?')],
+    '\\': [("\\", 'T_NS_SEPARATOR')],
+    ',': [(",", ',')],
+    ';': [(";", ';')],
+    '[': [("[", '[')],
+    ']': [("]", ']')],
+    '(': [("(", '(')],
+    ')': [(")", ')')],
+    '{': [("{", '{')],
+    '}': [("}", '}')],
+    '~': [("~", '~')],
+    '@': [("@", '@')],
+    '$': [("$", '$')],
+    '"': [('"', '"')],
+    '`': [("`", '`')],
+    '\n': [("\n", 'H_NEW_LINE')],
+    '\r': [("\r\n", 'H_NEW_LINE')],
+    '\t': [("\t", 'H_TABULATURE')],
+    ' ': [(" ", 'H_WHITESPACE')],
+    '\x00': [("\x00", 'T_END_HEREDOC')],
+}
 
-            rules:
-                A list of rules. Each rule is a `regex, type`
-                pair, where `regex` is the regular expression used
-                to recognize the token and `type` is the type
-                of the token to return when it's recognized.
+C_OTHER, C_LETTER, C_UNDERSCORE, C_DIGIT = range(4)
 
-        """
-        self.use_rsre = use_rsre
-        # initialize rules for all the possible contextes
-        self.rules = [None for _ in range(7)]
+CHAR_CLASS = [C_OTHER] * 256
+for _i in range(256):
+    if 'a' <= chr(_i) <= 'z' or 'A' <= chr(_i) <= 'Z':
+        CHAR_CLASS[_i] = C_LETTER
+    elif '0' <= chr(_i) <= '9':
+        CHAR_CLASS[_i] = C_DIGIT
+CHAR_CLASS[ord('_')] = C_UNDERSCORE
 
-        self.rules[CONTEXT_NORMAL] = self._compile_rules(RULES)
-        rules_no_kwds = self.rules[CONTEXT_NORMAL][len(KEYWORDS):]
-        self.rules[CONTEXT_OBJECT_ACCESS] = rules_no_kwds
 
-        rules = self._compile_rules(RULES_FOR_DOUBLE_QUOTE)
-        self.rules[CONTEXT_DOUBLEQUOTE] = rules
-        self.rules[CONTEXT_BACKTICK] = self._compile_rules(RULES_FOR_BACKTICK)
+def _is_letter(c):
+    return CHAR_CLASS[ord(c)] == C_LETTER
 
-        self.rules[CONTEXT_CURLY_BRACES] = self.rules[CONTEXT_NORMAL]
-        self.rules[CONTEXT_BRACKETS] = self._compile_rules(RULES_FOR_BRACKETS)
-        self.rules[CONTEXT_HEREDOC] = self._compile_rules(RULES_FOR_HEREDOC)
-        self.context_stack = [CONTEXT_NORMAL]
-        self.var_re = self._compile("\{[a-zA-Z_][a-zA-Z_0-9]*")
 
-        self.heredoc_finish = -1
-        self.heredoc_lgt = 0
+def _is_ident_start(c):
+    cls = CHAR_CLASS[ord(c)]
+    return cls == C_LETTER or cls == C_UNDERSCORE
 
-    def _compile(self, re):
-        if self.use_rsre:
-            from rpython.rlib.rsre.rsre_re import compile, M, DOTALL, IGNORECASE
-        else:
-            from re import compile, M, DOTALL, IGNORECASE
-        return compile(re, IGNORECASE | M | DOTALL)
 
-    def _compile_rules(self, rules):
-        compiled = []
-        for regex, type in rules:
-            compiled.append((self._compile(regex), type))
-        return compiled
+def _is_ident(c):
+    return CHAR_CLASS[ord(c)] != C_OTHER
+
+
+def _is_digit(c):
+    return CHAR_CLASS[ord(c)] == C_DIGIT
+
+
+def _is_hex_digit(c):
+    return _is_digit(c) or 'a' <= c <= 'f' or 'A' <= c <= 'F'
+
+
+class Lexer(BaseLexer):
+    """ A single-pass lexer/tokenizer.
+
+        See below for an example of usage.
+    """
+    def __init__(self):
+        self.context_stack = [CONTEXT_NORMAL]
+        self.heredoc_finish = -1
+        self.heredoc_lgt = 0
 
     def input(self, buf, pos, lineno):
         """ Initialize the lexer with a buffer as input.
@@ -402,35 +463,253 @@ class Lexer(BaseLexer):
             p += 1
         assert False
 
-    def _gettmpbuf(self, pos):
-        if self.use_rsre:
-            return None
+    def _endpos(self):
         if self.heredoc_finish >= 0:
-            return self.buf[pos:self.heredoc_finish]
-        else:
-            return self.buf[pos:]
-
-    def match(self, token_regex, tmp_buf, pos):
-        if self.use_rsre:
-            if self.heredoc_finish >= 0:
-                endpos = self.heredoc_finish
+            return self.heredoc_finish
+        return len(self.buf)
+
+    def _at(self, pos, end, s):
+        """Is 's' in the input at 'pos', before 'end'?"""
+        if pos + len(s) > end:
+            return False
+        for i in range(len(s)):
+            if self.buf[pos + i] != s[i]:
+                return False
+        return True
+
+    def _scan_ident(self, pos, end):
+        while pos < end and _is_ident(self.buf[pos]):
+            pos += 1
+        return pos
+
+    def _scan_digits(self, pos, end):
+        while pos < end and _is_digit(self.buf[pos]):
+            pos += 1
+        return pos
+
+    def _scan_quoted(self, pos, end):
+        """The end of the quoted string starting at 'pos', or -1."""
+        buf = self.buf
+        quote = buf[pos]
+        i = pos + 1
+        while i < end:
+            c = buf[i]
+            if c == quote:
+                return i + 1
+            if c == '\\':
+                if i + 1 >= end:
+                    return -1
+                i += 2
             else:
-                endpos = sys.maxint
-            m = token_regex.match(self.buf, pos=pos, endpos=endpos)
-        else:
-            m = token_regex.match(tmp_buf)
-        return m
-
-    def _getstartend(self, m):
-        if self.use_rsre:
-            start = m.start()
-            end = m.end()
+                i += 1
+        return -1
+
+    def _scan_exponent(self, pos, end):
+        """The end of '[eE][+-]?[0-9]+' at 'pos', or -1."""
+        buf = self.buf
+        if pos >= end or (buf[pos] != 'e' and buf[pos] != 'E'):
+            return -1
+        pos += 1
+        if pos < end and (buf[pos] == '+' or buf[pos] == '-'):
+            pos += 1
+        if pos >= end or not _is_digit(buf[pos]):
+            return -1
+        return self._scan_digits(pos, end)
+
+    def _scan_number(self, pos, end):
+        """Scan T_DNUMBER or T_LNUMBER at 'pos', which is a digit or a dot.
+        Returns (token type, end), or (None, pos) if there is no number."""
+        buf = self.buf
+        digits_end = self._scan_digits(pos, end)
+        has_digits = digits_end > pos
+        dot = digits_end < end and buf[digits_end] == '.'
+        if dot:
+            frac_end = self._scan_digits(digits_end + 1, end)
+            i = self._scan_exponent(frac_end, end)
+            if i >= 0:
+                return 'T_DNUMBER', i
+            if frac_end > digits_end + 1:
+                return 'T_DNUMBER', frac_end
+            if has_digits:
+                return 'T_DNUMBER', digits_end + 1
+            return None, pos
+        if not has_digits:
+            return None, pos
+        i = self._scan_exponent(digits_end, end)
+        if i >= 0:
+            return 'T_DNUMBER', i
+        if (buf[pos] == '0' and pos + 1 < end and
+                (buf[pos + 1] == 'x' or buf[pos + 1] == 'X')):
+            i = pos + 2
+            while i < end and _is_hex_digit(buf[i]):
+                i += 1
+            return 'T_LNUMBER', i
+        return 'T_LNUMBER', digits_end
+
+    def _scan_php(self, pos, end, keywords):
+        """Scan a token of PHP code at 'pos'.  Returns (token type, end),
+        or (None, pos) if no token is recognized."""
+        buf = self.buf
+        c = buf[pos]
+        if _is_ident_start(c):
+            if c == 'b' or c == 'B':
+                if self._at(pos + 1, end, '<<<'):
+                    i = buf.find('\n', pos + 4, end)
+                    if i >= 0:
+                        return 'T_START_HEREDOC', i + 1
+                elif self._at(pos + 1, end, '"') or self._at(pos + 1, end,
+                                                             "'"):
+                    i = self._scan_quoted(pos + 1, end)
+                    if i >= 0:
+                        return 'T_CONSTANT_ENCAPSED_STRING', i
+            i = self._scan_ident(pos + 1, end)
+            if keywords:
+                name = KEYWORD_TOKENS.get(buf[pos:i].lower(), None)
+                if name is not None:
+                    return name, i
+            return 'T_STRING', i
+        if _is_digit(c):
+            return self._scan_number(pos, end)
+        if c == '"' or c == "'":
+            i = self._scan_quoted(pos, end)
+            if i >= 0:
+                return 'T_CONSTANT_ENCAPSED_STRING', i
+        elif c == '$':
+            if pos + 1 < end and _is_ident_start(buf[pos + 1]):
+                return 'T_VARIABLE', self._scan_ident(pos + 2, end)
+        elif c == '#':
+            i = buf.find('\n', pos, end)
+            if i < 0:
+                i = end
+            return 'T_COMMENT', i
+        elif c == '/':
+            if self._at(pos, end, '/='):
+                return 'T_DIV_EQUAL', pos + 2
+            if self._at(pos, end, '//'):
+                i = buf.find('\n', pos, end)
+                if i < 0:
+                    i = end
+                return 'T_COMMENT', i
+            if self._at(pos, end, '/*'):
+                i = buf.find('*/', pos + 2, end)
+                if i >= 0:
+                    return 'T_COMMENT', i + 2
+        elif c == '.':
+            if not self._at(pos, end, '.='):
+                token_type, i = self._scan_number(pos, end)
+                if token_type is not None:
+                    return token_type, i
+        elif c == '<':
+            if self._at(pos, end, '<<<'):
+                i = buf.find('\n', pos + 3, end)
+                if i >= 0:
+                    return 'T_START_HEREDOC', i + 1
+        elif c == '(':
+            i = pos + 1
+            while i < end and _is_letter(buf[i]):
+                i += 1
+            if i < end and buf[i] == ')':
+                name = CASTS.get(buf[pos + 1:i].lower(), None)
+                if name is not None:
+                    return name, i + 1
+        return self._scan_operator(pos, end)
+
+    def _scan_operator(self, pos, end):
+        operators = OPERATORS.get(self.buf[pos], None)
+        if operators is not None:
+            for op, name in operators:
+                if self._at(pos, end, op):
+                    return name, pos + len(op)
+        return None, pos
+
+    def _scan_brackets(self, pos, end):
+        buf = self.buf
+        c = buf[pos]
+        if c == ']':
+            return ']', pos + 1
+        if c == '[':
+            return '[', pos + 1
+        if _is_digit(c):
+            return 'T_NUM_STRING', self._scan_digits(pos, end)
+        if c == '$' and pos + 1 < end and _is_ident_start(buf[pos + 1]):
+            return 'T_VARIABLE', self._scan_ident(pos + 2, end)
+        if _is_ident_start(c):
+            return 'T_STRING', self._scan_ident(pos + 1, end)
+        return None, pos
+
+    def _scan_encapsed(self, ctx, pos, end):
+        """The end of the T_ENCAPSED_AND_WHITESPACE text at 'pos' in a
+        double-quoted string, heredoc or backtick context.  A '$' or '{'
+        is part of the text unless it may start a variable."""
+        buf = self.buf
+        i = pos
+        while i < end:
+            c = buf[i]
+            if c == '\\':
+                if i + 1 < end:
+                    i += 2
+                    continue
+                if ctx == CONTEXT_HEREDOC:
+                    i += 1
+                    continue
+                break
+            elif c == '$':
+                if i + 1 < end:
+                    nxt = buf[i + 1]
+                    if nxt == '"':
+                        i += 1
+                        continue
+                    if not (_is_letter(nxt) or nxt == '{'):
+                        i += 2
+                        continue
+                break
+            elif c == '{':
+                if i + 1 < end and buf[i + 1] != '$':
+                    i += 2
+                    continue
+                break
+            elif c == '"' and ctx == CONTEXT_DOUBLEQUOTE:
+                break
+            elif (c == '`' or c == '}') and ctx == CONTEXT_BACKTICK:
+                break
+            i += 1
+        return i
+
+    def _scan_interpolated(self, ctx, pos, end):
+        buf = self.buf
+        c = buf[pos]
+        nxt = '\x00'
+        if pos + 1 < end:
+            nxt = buf[pos + 1]
+        if (c == '{' and nxt == '$') or (c == '$' and nxt == '{'):
+            return 'T_DOLLAR_OPEN_CURLY_BRACES', pos + 2
+        if ctx == CONTEXT_BACKTICK:
+            if c == '`':
+                return '`', pos + 1
+            if c == '}':
+                return '}', pos + 1
+            if c == '{':
+                return '{', pos + 1
+        if c == '$' and pos + 1 < end and _is_ident_start(nxt):
+            return 'T_VARIABLE', self._scan_ident(pos + 2, end)
+        if ctx != CONTEXT_HEREDOC and c == '-' and nxt == '>':
+            return 'T_OBJECT_OPERATOR', pos + 2
+        i = self._scan_encapsed(ctx, pos, end)
+        if i > pos:
+            return 'T_ENCAPSED_AND_WHITESPACE', i
+        if ctx == CONTEXT_DOUBLEQUOTE and c == '"':
+            return '"', pos + 1
+        return None, pos
+
+    def _scan(self, ctx, pos, end):
+        if ctx == CONTEXT_NORMAL or ctx == CONTEXT_CURLY_BRACES:
+            return self._scan_php(pos, end, True)
+        elif ctx == CONTEXT_OBJECT_ACCESS:
+            return self._scan_php(pos, end, False)
+        elif ctx == CONTEXT_BRACKETS:
+            return self._scan_brackets(pos, end)
         else:
-            start = self.pos + m.start()
-            end = self.pos + m.end()
-        assert start >= 0
-        assert end >= 0
-        return start, end
+            return self._scan_interpolated(ctx, pos, end)
 
     def token(self):
         """ Return the next token (a Token object) found in the
@@ -456,31 +735,24 @@ class Lexer(BaseLexer):
                 self.heredoc_lgt = 0
                 self.context_stack.pop()
                 return tok
-            tmp_buf = self._gettmpbuf(self.pos)
             ctx = self.context_stack[-1]
-            rules = self.rules[ctx]
-            for token_regex, token_type in rules:
-                pos = self.pos
-                assert pos >= 0
-                m = self.match(token_regex, tmp_buf, pos)
-                if m:
-                    start, end = self._getstartend(m)
-                    value = self.buf[start:end]
-                    if token_type == 'H_NEW_LINE':
-                        self.lineno += 1
-                    elif token_type == 'T_COMMENT':
-                        self.lineno += value.count('\n')
-                    elif token_type == 'T_CONSTANT_ENCAPSED_STRING':
-                        self.lineno += value.count("\n")
-                    # tokens changing the context
-                    tok = Token(token_type, value, self.lineno)
-                    tok = self.maybe_change_context(ctx, tok, token_type,
-                                                    end)
-                    self.last_token = token_type
-                    return tok
-
-            # if we're here, no rule matched
-            raise LexerError("unknown token", self.lineno)
+            start = self.pos
+            assert start >= 0
+            token_type, end = self._scan(ctx, start, self._endpos())
+            if token_type is None:
+                raise LexerError("unknown token", self.lineno)
+            value = self.buf[start:end]
+            if token_type == 'H_NEW_LINE':
+                self.lineno += 1
+            elif token_type == 'T_COMMENT':
+                self.lineno += value.count('\n')
+            elif token_type == 'T_CONSTANT_ENCAPSED_STRING':
+                self.lineno += value.count("\n")
+            # tokens changing the context
+            tok = Token(token_type, value, self.lineno)
+            tok = self.maybe_change_context(ctx, tok, token_type, end)
+            self.last_token = token_type
+            return tok
 
     def maybe_change_context(self, ctx, tok, token_type, endpos):
         # print self.context_stack, tok.name, tok.value
@@ -554,10 +826,11 @@ class Lexer(BaseLexer):
         elif (ctx == CONTEXT_CURLY_BRACES and token_type == "{"
               and self.last_token == "T_DOLLAR_OPEN_CURLY_BRACES"):
             # instead, we recognize it as a variable
-            tmp_buf = self._gettmpbuf(self.pos)
-            m = self.match(self.var_re, tmp_buf, self.pos)
-            assert m is not None
-            start, end = self._getstartend(m)
+            start = self.pos
+            end = self._endpos()
+            assert start >= 0
+            assert start + 1 < end and _is_ident_start(self.buf[start + 1])
+            end = self._scan_ident(start + 2, end)
             tok = Token("T_VARIABLE", self.buf[start:end], tok.lineno)
             self.pos = end
             return tok
@@ -3,7 +3,25 @@
 
 hippy [--gcdump dumpfile] [--cgi] <file.php> [php program options]
 
-and enjoy
+and enjoy. To serve many requests from one process, run
+
+hippy --worker [--max-requests N] [--max-memory MB] [<file.php>]
+
+which reads requests framed as described in hippy/worker.py on stdin
+and runs them in CGI mode,
+or start a pre-forked pool of such workers sharing a listening socket:
+
+hippy --listen <host:port|/path/to/socket> [--workers N|MIN:MAX]
+      [--max-requests N] [--max-memory MB] [<file.php>]
+
+Expired session files are removed, using the settings of hippy.ini, by
+
+hippy --session-gc
+
+and every .php file of a source tree is compiled ahead of time into the
+bytecode cache (opcache.file_cache in hippy.ini) by
+
+hippy --precompile <dir> [--jobs N]
 """
 
 import sys
@@ -32,6 +50,14 @@ def entry_point(argv):
     fname = None
     gcdump = None
     cgi = False
+    worker = False
+    session_gc = False
+    max_requests = 0
+    max_memory = 0
+    listen = None
+    pool_size = "1"
+    precompile = None
+    jobs = 0
     debugger_pipes = (-1, -1)
     while i < len(argv):
         arg = argv[i]
@@ -44,6 +70,58 @@ def entry_point(argv):
                 gcdump = argv[i]
             elif arg == '--cgi':
                 cgi = True
+            elif arg == '--worker':
+                worker = True
+            elif arg == '--session-gc':
+                session_gc = True
+            elif arg == '--max-requests':
+                if i == len(argv) - 1:
+                    print "--max-requests requires an argument"
+                    return 1
+                i += 1
+                try:
+                    max_requests = int(argv[i])
+                except ValueError:
+                    print "--max-requests requires an integer"
+                    return 1
+            elif arg == '--max-memory':
+                if i == len(argv) - 1:
+                    print "--max-memory requires an argument"
+                    return 1
+                i += 1
+                try:
+                    max_memory = int(argv[i]) * 1024 * 1024
+                except ValueError:
+                    print "--max-memory requires an integer"
+                    return 1
+            elif arg == '--listen':
+                if i == len(argv) - 1:
+                    print "--listen requires an argument"
+                    return 1
+                i += 1
+                listen = argv[i]
+            elif arg == '--workers':
+                if i == len(argv) - 1:
+                    print "--workers requires an argument"
+                    return 1
+                i += 1
+                pool_size = argv[i]
+            elif arg == '--precompile':
+                if i == len(argv) - 1:
+                    print "--precompile requires an argument"
+                    return 1
+                i += 1
+                precompile = argv[i]
+            elif arg == '--jobs':
+                if i == len(argv) - 1:
+                    print "--jobs requires an argument"
+                    return 1
+                i += 1
+                try:
+                    jobs = int(argv[i])
+                except ValueError:
+                    print "--jobs requires an integer"
+                    return 1
             elif arg == '--debugger_pipes':
                 assert i + 2 < len(argv)
                 debugger_pipes = (int(argv[i + 1]), int(argv[i + 2]))
@@ -56,6 +134,34 @@ def entry_point(argv):
             fname = arg
             break
         i += 1
+    if cgi and (worker or listen is not None):
+        print "--cgi cannot be combined with --worker or --listen: " \
+              "workers always run in CGI mode"
+        return 1
+    if session_gc:
+        from hippy.module.session.storage import run_session_gc
+        interp = Interpreter(getspace())
+        load_ini_data(interp, read_ini_file())
+        return run_session_gc(interp)
+    if precompile is not None:
+        from hippy.precompile import run_precompile, DEFAULT_JOBS
+        if jobs <= 0:
+            jobs = DEFAULT_JOBS
+        interp = Interpreter(getspace())
+        load_ini_data(interp, read_ini_file())
+        return run_precompile(interp, precompile, jobs)
+    if listen is not None:
+        from hippy.supervisor import run_supervisor, parse_pool_size
+        try:
+            min_workers, max_workers = parse_pool_size(pool_size)
+        except ValueError:
+            print "--workers requires N or MIN:MAX"
+            return 1
+        return run_supervisor(listen, fname, min_workers, max_workers,
+                              max_requests, max_memory)
+    if worker:
+        from hippy.worker import run_worker
+        return run_worker(fname, max_requests, max_memory)
     if not fname:
         print "php filename required"
         return 1
@@ -63,6 +169,22 @@ def entry_point(argv):
     return main(fname, rest_of_args, cgi, gcdump, debugger_pipes)
 
 
+def read_ini_file():
+    # the ini file situated in the current wc
+    try:
+        return open('hippy.ini').read()
+    except (OSError, IOError):
+        return None
+
+
+def load_ini_data(interp, ini_data):
+    if ini_data is not None:
+        try:
+            load_ini(interp, ini_data)
+        except:
+            os.write(2, "error reading `hippy.ini`")
+
+
 def main(filename, rest_of_args, cgi, gcdump, debugger_pipes=(-1, -1)):
     try:
         f = open(filename)
@@ -74,16 +196,7 @@ def main(filename, rest_of_args, cgi, gcdump, debugger_pipes=(-1, -1)):
     #
     space = getspace()
     interp = Interpreter(space)
-    # load the ini file situated in the current wc
-    try:
-        ini_data = open('hippy.ini').read()
-    except (OSError, IOError):
-        ini_data = None
-    if ini_data is not None:
-        try:
-            load_ini(interp, ini_data)
-        except:
-            os.write(2, "error reading `hippy.ini`")
+    load_ini_data(interp, read_ini_file())
     interp.setup(cgi, argv=[filename] + rest_of_args)
     absname = os.path.abspath(filename)
     bc = interp.compile_bytecode(absname, data)
@@ -92,8 +205,20 @@ def main(filename, rest_of_args, cgi, gcdump, debugger_pipes=(-1, -1)):
     # The script originally called is considered an "included file,"
     # so it will be listed together with the files
     # referenced by include and family.
-    interp.included_files.append(filename)
+    interp.mark_included(absname)
     #
+    exitcode = run_bytecode(interp, bc, debugger_pipes)
+    if gcdump is not None:
+        f = os.open(gcdump, os.O_CREAT | os.O_WRONLY, 0777)
+        dump_rpy_heap(f)
+        os.close(f)
+    return exitcode
+
+
+def run_bytecode(interp, bc, debugger_pipes=(-1, -1)):
+    """Run the main script of a request and shut the interpreter down.
+    Returns the exit code."""
+    space = interp.space
     exitcode = 0
     try:
         try:
@@ -120,12 +245,9 @@ def main(filename, rest_of_args, cgi, gcdump, debugger_pipes=(-1, -1)):
         print e.__str__()
         return 1
     except ExplicitExitException, e:
-        os.write(1, e.message)
+        interp._writestr(e.message)
+        interp.output_sink.flush()
         exitcode = e.code
-    if gcdump is not None:
-        f = os.open(gcdump, os.O_CREAT | os.O_WRONLY, 0777)
-        dump_rpy_heap(f)
-        os.close(f)
     return exitcode
 
 if __name__ == '__main__':
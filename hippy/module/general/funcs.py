@@ -447,7 +447,7 @@ def get_required_files():
 @wrap(['space',  StringArg(None)])
 def getenv(space, var):
     """ Gets the value of an environment variable"""
-    e = os.environ.get(var)
+    e = space.ec.interpreter.getenv(var)
     if e is None:
         return space.w_False
     return space.newstr(e)
@@ -108,3 +108,10 @@ def backtrace_to_applevel(space, tb):
 @wrap(['interp'])
 def debug_backtrace(interp):
     return backtrace_to_applevel(interp.space, interp.get_traceback())
+
+@wrap(['space'])
+def hippy_array_copies(space):
+    """Return how many arrays had their items copied so far in this
+    request.  Copying an array is lazy: this only counts the copies made
+    because a shared array was about to be modified."""
+    return space.newint(space.ec.array_copies)
@@ -0,0 +1,664 @@
+""" json module - json_encode(), json_decode() and their error state
+
+Encoding writes the whole document into one StringBuilder, sized up
+front with the estimate of serialize().  Decoding is a recursive
+descent parser over the input string; JSON arrays become list arrays,
+and objects decoded as arrays get a hash strategy unless their keys
+happen to be "0", "1", ... in order.
+"""
+
+from rpython.rlib.rstring import StringBuilder
+from rpython.rlib.rfloat import isinf, isnan
+
+from hippy.builtin import wrap, Optional
+from hippy.objects.base import W_Root
+from hippy.objects.arrayobject import W_ListArrayObject
+from hippy.objects.instanceobject import W_InstanceObject
+from hippy.objects.convert import convert_string_to_number
+from hippy.module.serialize import serialized_size_hint
+from hippy.constants import CONSTS
+
+JSON_HEX_TAG = CONSTS['json']['JSON_HEX_TAG']
+JSON_HEX_AMP = CONSTS['json']['JSON_HEX_AMP']
+JSON_HEX_APOS = CONSTS['json']['JSON_HEX_APOS']
+JSON_HEX_QUOT = CONSTS['json']['JSON_HEX_QUOT']
+JSON_FORCE_OBJECT = CONSTS['json']['JSON_FORCE_OBJECT']
+JSON_NUMERIC_CHECK = CONSTS['json']['JSON_NUMERIC_CHECK']
+JSON_UNESCAPED_SLASHES = CONSTS['json']['JSON_UNESCAPED_SLASHES']
+JSON_PRETTY_PRINT = CONSTS['json']['JSON_PRETTY_PRINT']
+JSON_UNESCAPED_UNICODE = CONSTS['json']['JSON_UNESCAPED_UNICODE']
+JSON_BIGINT_AS_STRING = CONSTS['json']['JSON_BIGINT_AS_STRING']
+
+JSON_ERROR_NONE = CONSTS['json']['JSON_ERROR_NONE']
+JSON_ERROR_DEPTH = CONSTS['json']['JSON_ERROR_DEPTH']
+JSON_ERROR_STATE_MISMATCH = CONSTS['json']['JSON_ERROR_STATE_MISMATCH']
+JSON_ERROR_CTRL_CHAR = CONSTS['json']['JSON_ERROR_CTRL_CHAR']
+JSON_ERROR_SYNTAX = CONSTS['json']['JSON_ERROR_SYNTAX']
+JSON_ERROR_UTF8 = CONSTS['json']['JSON_ERROR_UTF8']
+
+ERROR_MESSAGES = {
+    JSON_ERROR_NONE: "No error",
+    JSON_ERROR_DEPTH: "Maximum stack depth exceeded",
+    JSON_ERROR_STATE_MISMATCH: "State mismatch (invalid or malformed JSON)",
+    JSON_ERROR_CTRL_CHAR: "Control character error, possibly incorrectly "
+                          "encoded",
+    JSON_ERROR_SYNTAX: "Syntax error",
+    JSON_ERROR_UTF8: "Malformed UTF-8 characters, possibly incorrectly "
+                     "encoded",
+}
+
+DEFAULT_DEPTH = 512
+
+HEX_DIGITS = "0123456789abcdef"
+
+
+class JsonError(Exception):
+    def __init__(self, code):
+        self.code = code
+
+
+def utf8_char(s, i):
+    """Decode the UTF-8 character starting at s[i], which is not ASCII.
+    Returns (code point, length), or (-1, 1) if the sequence is
+    invalid: overlong forms and surrogates are refused."""
+    n = len(s)
+    c = ord(s[i])
+    if 0xc2 <= c <= 0xdf:
+        length = 2
+        cp = c & 0x1f
+        low = 0x80
+    elif 0xe0 <= c <= 0xef:
+        length = 3
+        cp = c & 0x0f
+        low = 0x800
+    elif 0xf0 <= c <= 0xf4:
+        length = 4
+        cp = c & 0x07
+        low = 0x10000
+    else:
+        return -1, 1
+    if i + length > n:
+        return -1, 1
+    for j in range(i + 1, i + length):
+        cc = ord(s[j])
+        if cc & 0xc0 != 0x80:
+            return -1, 1
+        cp = (cp << 6) | (cc & 0x3f)
+    if cp < low or cp > 0x10ffff or 0xd800 <= cp <= 0xdfff:
+        return -1, 1
+    return cp, length
+
+
+def append_utf8(builder, cp):
+    if cp < 0x80:
+        builder.append(chr(cp))
+    elif cp < 0x800:
+        builder.append(chr(0xc0 | (cp >> 6)))
+        builder.append(chr(0x80 | (cp & 0x3f)))
+    elif cp < 0x10000:
+        builder.append(chr(0xe0 | (cp >> 12)))
+        builder.append(chr(0x80 | ((cp >> 6) & 0x3f)))
+        builder.append(chr(0x80 | (cp & 0x3f)))
+    else:
+        builder.append(chr(0xf0 | (cp >> 18)))
+        builder.append(chr(0x80 | ((cp >> 12) & 0x3f)))
+        builder.append(chr(0x80 | ((cp >> 6) & 0x3f)))
+        builder.append(chr(0x80 | (cp & 0x3f)))
+
+
+def _append_u_escape(builder, cp):
+    builder.append('\\u')
+    builder.append(HEX_DIGITS[(cp >> 12) & 0xf])
+    builder.append(HEX_DIGITS[(cp >> 8) & 0xf])
+    builder.append(HEX_DIGITS[(cp >> 4) & 0xf])
+    builder.append(HEX_DIGITS[cp & 0xf])
+
+
+def _escape(c, options):
+    """The escape sequence of the ASCII character 'c', or None if it is
+    written as is."""
+    if c == '"':
+        if options & JSON_HEX_QUOT:
+            return '\\u0022'
+        return '\\"'
+    elif c == '\\':
+        return '\\\\'
+    elif c == '/':
+        if options & JSON_UNESCAPED_SLASHES:
+            return None
+        return '\\/'
+    elif c == '\b':
+        return '\\b'
+    elif c == '\f':
+        return '\\f'
+    elif c == '\n':
+        return '\\n'
+    elif c == '\r':
+        return '\\r'
+    elif c == '\t':
+        return '\\t'
+    elif c == '<' and options & JSON_HEX_TAG:
+        return '\\u003C'
+    elif c == '>' and options & JSON_HEX_TAG:
+        return '\\u003E'
+    elif c == '&' and options & JSON_HEX_AMP:
+        return '\\u0026'
+    elif c == "'" and options & JSON_HEX_APOS:
+        return '\\u0027'
+    elif ord(c) < 0x20:
+        return '\\u00' + HEX_DIGITS[ord(c) >> 4] + HEX_DIGITS[ord(c) & 0xf]
+    return None
+
+
+class JsonEncoder(object):
+    def __init__(self, space, options, max_depth):
+        self.space = space
+        self.options = options
+        self.max_depth = max_depth
+        self.depth = 0
+        self.error = JSON_ERROR_NONE
+        self.builder = None
+
+    def encode(self, w_value):
+        self.builder = StringBuilder(serialized_size_hint(self.space,
+                                                          w_value))
+        self.encode_value(w_value)
+        return self.builder.build()
+
+    def encode_value(self, w_value):
+        space = self.space
+        builder = self.builder
+        w_value = w_value.deref()
+        tp = w_value.tp
+        if tp == space.tp_null:
+            builder.append('null')
+        elif tp == space.tp_bool:
+            if space.is_true(w_value):
+                builder.append('true')
+            else:
+                builder.append('false')
+        elif tp == space.tp_int:
+            builder.append(str(space.int_w(w_value)))
+        elif tp == space.tp_float:
+            self.encode_float(space.float_w(w_value))
+        elif tp == space.tp_str:
+            self.encode_string(space.str_w(w_value))
+        elif tp == space.tp_array:
+            self.encode_array(w_value)
+        elif isinstance(w_value, W_InstanceObject):
+            self.encode_object(w_value)
+        else:
+            space.ec.warn("json_encode(): type is unsupported, encoded as "
+                          "null")
+            builder.append('null')
+
+    def encode_float(self, f):
+        space = self.space
+        if isinf(f) or isnan(f):
+            if isnan(f):
+                name = "NAN"
+            else:
+                name = "INF"
+            space.ec.warn("json_encode(): double %s does not conform to "
+                          "the JSON spec, encoded as 0" % name)
+            self.builder.append('0')
+            return
+        s = space.str_w(space.newfloat(f))
+        self.builder.append(s.replace('E', 'e'))
+
+    def encode_string(self, s):
+        space = self.space
+        options = self.options
+        if options & JSON_NUMERIC_CHECK:
+            w_number, valid = convert_string_to_number(s)
+            if valid and len(s) > 0:
+                if w_number.tp == space.tp_int:
+                    self.builder.append(str(space.int_w(w_number)))
+                else:
+                    self.encode_float(space.float_w(w_number))
+                return
+        self.encode_plain_string(s)
+
+    def encode_plain_string(self, s):
+        space = self.space
+        options = self.options
+        if not self._check_utf8(s):
+            space.ec.warn("json_encode(): Invalid UTF-8 sequence in "
+                          "argument")
+            self.error = JSON_ERROR_UTF8
+            self.builder.append('null')
+            return
+        builder = self.builder
+        builder.append('"')
+        start = 0
+        i = 0
+        n = len(s)
+        while i < n:
+            c = s[i]
+            if ord(c) >= 0x80:
+                if options & JSON_UNESCAPED_UNICODE:
+                    i += 1
+                    continue
+                cp, length = utf8_char(s, i)
+                builder.append_slice(s, start, i)
+                if cp >= 0x10000:
+                    cp -= 0x10000
+                    _append_u_escape(builder, 0xd800 | (cp >> 10))
+                    _append_u_escape(builder, 0xdc00 | (cp & 0x3ff))
+                else:
+                    _append_u_escape(builder, cp)
+                i += length
+                start = i
+                continue
+            escaped = _escape(c, options)
+            if escaped is not None:
+                builder.append_slice(s, start, i)
+                builder.append(escaped)
+                start = i + 1
+            i += 1
+        builder.append_slice(s, start, n)
+        builder.append('"')
+
+    def _check_utf8(self, s):
+        i = 0
+        n = len(s)
+        while i < n:
+            if ord(s[i]) < 0x80:
+                i += 1
+                continue
+            cp, length = utf8_char(s, i)
+            if cp < 0:
+                return False
+            i += length
+        return True
+
+    def _enter(self):
+        self.depth += 1
+        if self.depth > self.max_depth:
+            raise JsonError(JSON_ERROR_DEPTH)
+
+    def _newline(self):
+        if self.options & JSON_PRETTY_PRINT:
+            self.builder.append('\n')
+            for i in range(self.depth):
+                self.builder.append('    ')
+
+    def _is_list(self, w_arr):
+        if isinstance(w_arr, W_ListArrayObject):
+            return True
+        space = self.space
+        index = 0
+        with space.iter(w_arr) as itr:
+            while not itr.done():
+                w_key = itr.next_item(space)[0]
+                if (w_key.tp != space.tp_int or
+                        space.int_w(w_key) != index):
+                    return False
+                index += 1
+        return True
+
+    def encode_array(self, w_arr):
+        space = self.space
+        self._enter()
+        as_list = (not self.options & JSON_FORCE_OBJECT and
+                   self._is_list(w_arr))
+        if as_list:
+            self.builder.append('[')
+        else:
+            self.builder.append('{')
+        first = True
+        with space.iter(w_arr) as itr:
+            while not itr.done():
+                w_key, w_value = itr.next_item(space)
+                self._separator(first)
+                first = False
+                if not as_list:
+                    self._key(space.str_w(w_key))
+                self.encode_value(w_value)
+        self._close(first, as_list)
+
+    def encode_object(self, w_obj):
+        self._enter()
+        self.builder.append('{')
+        first = True
+        klass = w_obj.getclass()
+        dct_w = w_obj.get_instance_attrs()
+        for name, w_value in dct_w.iteritems():
+            key = klass.check_access_and_demangle_property(name, None)
+            if key is None:
+                continue
+            self._separator(first)
+            first = False
+            self._key(key)
+            self.encode_value(w_value)
+        self._close(first, False)
+
+    def _separator(self, first):
+        if not first:
+            self.builder.append(',')
+        self._newline()
+
+    def _key(self, key):
+        self.encode_plain_string(key)
+        if self.options & JSON_PRETTY_PRINT:
+            self.builder.append(': ')
+        else:
+            self.builder.append(':')
+
+    def _close(self, empty, as_list):
+        self.depth -= 1
+        if not empty:
+            self._newline()
+        if as_list:
+            self.builder.append(']')
+        else:
+            self.builder.append('}')
+
+
+def _is_ws(c):
+    return c == ' ' or c == '\t' or c == '\n' or c == '\r'
+
+
+class JsonDecoder(object):
+    def __init__(self, space, s, assoc, max_depth, options):
+        self.space = space
+        self.s = s
+        self.pos = 0
+        self.assoc = assoc
+        self.max_depth = max_depth
+        self.options = options
+        self.depth = 0
+
+    def decode(self):
+        w_value = self.decode_value()
+        self._skip_ws()
+        if self.pos < len(self.s):
+            raise JsonError(JSON_ERROR_SYNTAX)
+        return w_value
+
+    def _skip_ws(self):
+        s = self.s
+        i = self.pos
+        while i < len(s) and _is_ws(s[i]):
+            i += 1
+        self.pos = i
+
+    def _next_char(self):
+        """Skip whitespace, return the next character without consuming
+        it, or '\\0' at the end."""
+        self._skip_ws()
+        if self.pos >= len(self.s):
+            return '\0'
+        return self.s[self.pos]
+
+    def _literal(self, word, w_value):
+        end = self.pos + len(word)
+        if self.s[self.pos:end] != word:
+            raise JsonError(JSON_ERROR_SYNTAX)
+        self.pos = end
+        return w_value
+
+    def decode_value(self):
+        space = self.space
+        c = self._next_char()
+        if c == '{':
+            return self.decode_object()
+        elif c == '[':
+            return self.decode_array()
+        elif c == '"':
+            return space.newstr(self.decode_string())
+        elif c == 't':
+            return self._literal('true', space.w_True)
+        elif c == 'f':
+            return self._literal('false', space.w_False)
+        elif c == 'n':
+            return self._literal('null', space.w_Null)
+        elif c == '-' or '0' <= c <= '9':
+            return self.decode_number()
+        raise JsonError(JSON_ERROR_SYNTAX)
+
+    def _enter(self):
+        self.depth += 1
+        if self.depth >= self.max_depth:
+            raise JsonError(JSON_ERROR_DEPTH)
+
+    def decode_array(self):
+        self._enter()
+        self.pos += 1
+        items_w = []
+        if self._next_char() == ']':
+            self.pos += 1
+        else:
+            while True:
+                items_w.append(self.decode_value())
+                c = self._next_char()
+                self.pos += 1
+                if c == ']':
+                    break
+                if c != ',':
+                    raise JsonError(JSON_ERROR_SYNTAX)
+        self.depth -= 1
+        return self.space.new_array_from_list(items_w)
+
+    def decode_object(self):
+        space = self.space
+        self._enter()
+        self.pos += 1
+        keys = []
+        values_w = []
+        if self._next_char() == '}':
+            self.pos += 1
+        else:
+            while True:
+                if self._next_char() != '"':
+                    raise JsonError(JSON_ERROR_SYNTAX)
+                keys.append(self.decode_string())
+                if self._next_char() != ':':
+                    raise JsonError(JSON_ERROR_SYNTAX)
+                self.pos += 1
+                values_w.append(self.decode_value())
+                c = self._next_char()
+                self.pos += 1
+                if c == '}':
+                    break
+                if c != ',':
+                    raise JsonError(JSON_ERROR_SYNTAX)
+        self.depth -= 1
+        if self.assoc:
+            return self._make_array(keys, values_w)
+        interp = space.ec.interpreter
+        w_obj = space.default_object(interp)
+        for i in range(len(keys)):
+            key = keys[i]
+            if not key:
+                key = "_empty_"
+            w_obj.setattr(interp, key, values_w[i], None)
+        return w_obj
+
+    def _make_array(self, keys, values_w):
+        space = self.space
+        sequential = True
+        for i in range(len(keys)):
+            if keys[i] != str(i):
+                sequential = False
+                break
+        if sequential:
+            return space.new_array_from_list(values_w)
+        pairs = [(space.newstr(keys[i]), values_w[i])
+                 for i in range(len(keys))]
+        return space.new_array_from_pairs(pairs)
+
+    def decode_string(self):
+        s = self.s
+        self.pos += 1
+        builder = None
+        start = self.pos
+        i = start
+        n = len(s)
+        while True:
+            if i >= n:
+                raise JsonError(JSON_ERROR_SYNTAX)
+            c = s[i]
+            if c == '"':
+                break
+            if c == '\\':
+                if builder is None:
+                    builder = StringBuilder()
+                builder.append_slice(s, start, i)
+                i = self._decode_escape(builder, i + 1)
+                start = i
+                continue
+            if ord(c) < 0x20:
+                raise JsonError(JSON_ERROR_CTRL_CHAR)
+            if ord(c) >= 0x80:
+                cp, length = utf8_char(s, i)
+                if cp < 0:
+                    raise JsonError(JSON_ERROR_UTF8)
+                i += length
+                continue
+            i += 1
+        self.pos = i + 1
+        if builder is None:
+            assert i >= start
+            return s[start:i]
+        builder.append_slice(s, start, i)
+        return builder.build()
+
+    def _hex4(self, i):
+        s = self.s
+        if i + 4 > len(s):
+            raise JsonError(JSON_ERROR_SYNTAX)
+        cp = 0
+        for j in range(i, i + 4):
+            c = s[j]
+            if '0' <= c <= '9':
+                digit = ord(c) - ord('0')
+            elif 'a' <= c <= 'f':
+                digit = ord(c) - ord('a') + 10
+            elif 'A' <= c <= 'F':
+                digit = ord(c) - ord('A') + 10
+            else:
+                raise JsonError(JSON_ERROR_SYNTAX)
+            cp = cp * 16 + digit
+        return cp
+
+    def _decode_escape(self, builder, i):
+        """Decode the escape sequence after the backslash at s[i - 1],
+        return the position after it."""
+        s = self.s
+        if i >= len(s):
+            raise JsonError(JSON_ERROR_SYNTAX)
+        c = s[i]
+        if c == '"' or c == '\\' or c == '/':
+            builder.append(c)
+        elif c == 'b':
+            builder.append('\b')
+        elif c == 'f':
+            builder.append('\f')
+        elif c == 'n':
+            builder.append('\n')
+        elif c == 'r':
+            builder.append('\r')
+        elif c == 't':
+            builder.append('\t')
+        elif c == 'u':
+            cp = self._hex4(i + 1)
+            i += 4
+            if (0xd800 <= cp <= 0xdbff and i + 6 < len(s) and
+                    s[i + 1] == '\\' and s[i + 2] == 'u'):
+                low = self._hex4(i + 3)
+                if 0xdc00 <= low <= 0xdfff:
+                    cp = 0x10000 + ((cp - 0xd800) << 10) + (low - 0xdc00)
+                    i += 6
+            append_utf8(builder, cp)
+        else:
+            raise JsonError(JSON_ERROR_SYNTAX)
+        return i + 1
+
+    def decode_number(self):
+        space = self.space
+        s = self.s
+        start = self.pos
+        i = start
+        n = len(s)
+        if i < n and s[i] == '-':
+            i += 1
+        if i < n and s[i] == '0':
+            i += 1
+        elif i < n and '1' <= s[i] <= '9':
+            while i < n and '0' <= s[i] <= '9':
+                i += 1
+        else:
+            raise JsonError(JSON_ERROR_SYNTAX)
+        is_float = False
+        if i < n and s[i] == '.':
+            i += 1
+            if not (i < n and '0' <= s[i] <= '9'):
+                raise JsonError(JSON_ERROR_SYNTAX)
+            while i < n and '0' <= s[i] <= '9':
+                i += 1
+            is_float = True
+        if i < n and (s[i] == 'e' or s[i] == 'E'):
+            i += 1
+            if i < n and (s[i] == '+' or s[i] == '-'):
+                i += 1
+            if not (i < n and '0' <= s[i] <= '9'):
+                raise JsonError(JSON_ERROR_SYNTAX)
+            while i < n and '0' <= s[i] <= '9':
+                i += 1
+            is_float = True
+        self.pos = i
+        assert i >= start
+        text = s[start:i]
+        w_number, _ = convert_string_to_number(text)
+        if is_float:
+            return space.newfloat(space.float_w(w_number))
+        if (w_number.tp != space.tp_int and
+                self.options & JSON_BIGINT_AS_STRING):
+            return space.newstr(text)
+        return w_number
+
+
+@wrap(['interp', W_Root, Optional(int), Optional(int)])
+def json_encode(interp, w_value, options=0, depth=DEFAULT_DEPTH):
+    """ json_encode - Returns the JSON representation of a value """
+    encoder = JsonEncoder(interp.space, options, depth)
+    try:
+        res = encoder.encode(w_value)
+    except JsonError as e:
+        interp.json_error_code = e.code
+        return interp.space.w_False
+    interp.json_error_code = encoder.error
+    return interp.space.newstr(res)
+
+
+@wrap(['interp', str, Optional(bool), Optional(int), Optional(int)])
+def json_decode(interp, json, assoc=False, depth=DEFAULT_DEPTH, options=0):
+    """ json_decode - Decodes a JSON string """
+    space = interp.space
+    interp.json_error_code = JSON_ERROR_NONE
+    if not json:
+        return space.w_Null
+    if depth <= 0:
+        interp.warn("json_decode(): Depth must be greater than zero")
+        return space.w_Null
+    decoder = JsonDecoder(space, json, assoc, depth, options)
+    try:
+        return decoder.decode()
+    except JsonError as e:
+        interp.json_error_code = e.code
+        return space.w_Null
+
+
+@wrap(['interp'])
+def json_last_error(interp):
+    """ json_last_error - Returns the last error occurred """
+    return interp.space.newint(interp.json_error_code)
+
+
+@wrap(['interp'])
+def json_last_error_msg(interp):
+    """ json_last_error_msg - Returns the error string of the last
+    json_encode() or json_decode() call """
+    return interp.space.newstr(ERROR_MESSAGES.get(interp.json_error_code,
+                                                  "Unknown error"))
@@ -1,12 +1,111 @@
+from rpython.rlib import jit
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+class VersionTag(object):
+    pass
+
+
+class CacheEntry(object):
+    _immutable_fields_ = ['pattern', 'pce']
+
+    def __init__(self, pattern, pce):
+        self.pattern = pattern
+        self.pce = pce
+        self.prev = None
+        self.next = None
 
 
 class RegexpCache(object):
-    # TODO: this should use an LRU cache, and be elidable for the JIT.
-    def __init__(self, space):
+    """ A bounded LRU cache of compiled regexps, keyed by the pattern
+    string including delimiters and modifiers.
+
+    Lookups go through an elidable function of the pattern and of a
+    version tag that changes whenever an entry is evicted or replaced,
+    so that in a trace the compiled regexp of a constant pattern is a
+    constant too. Adding a pattern keeps the version: a miss that the
+    JIT constant-folded before is checked again with a plain dictionary
+    lookup.
+    """
+    _immutable_fields_ = ['version?']
+
+    def __init__(self, space, capacity=DEFAULT_CACHE_SIZE):
         self._contents = {}
+        # doubly-linked list of entries, most recently used first
+        self._head = None
+        self._tail = None
+        self.capacity = capacity
+        self.version = VersionTag()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def size(self):
+        return len(self._contents)
 
     def get(self, pattern):
+        entry = self._lookup(pattern, self.version)
+        if entry is None:
+            entry = self._contents.get(pattern, None)
+            if entry is None:
+                self.misses += 1
+                return None
+        self.hits += 1
+        if entry is not self._head:
+            self._unlink(entry)
+            self._push_front(entry)
+        return entry.pce
+
+    @jit.elidable
+    def _lookup(self, pattern, version):
         return self._contents.get(pattern, None)
 
     def set(self, pattern, compiled_regexp):
-        self._contents[pattern] = compiled_regexp
+        old = self._contents.get(pattern, None)
+        if old is not None:
+            self._unlink(old)
+        entry = CacheEntry(pattern, compiled_regexp)
+        self._contents[pattern] = entry
+        self._push_front(entry)
+        if self._shrink() or old is not None:
+            self.version = VersionTag()
+
+    def set_capacity(self, capacity):
+        if capacity < 1:
+            capacity = 1
+        self.capacity = capacity
+        if self._shrink():
+            self.version = VersionTag()
+
+    def _shrink(self):
+        evicted = False
+        while len(self._contents) > self.capacity:
+            entry = self._tail
+            assert entry is not None
+            self._unlink(entry)
+            del self._contents[entry.pattern]
+            self.evictions += 1
+            evicted = True
+        return evicted
+
+    def _push_front(self, entry):
+        entry.prev = None
+        entry.next = self._head
+        if self._head is not None:
+            self._head.prev = entry
+        self._head = entry
+        if self._tail is None:
+            self._tail = entry
+
+    def _unlink(self, entry):
+        if entry.prev is not None:
+            entry.prev.next = entry.next
+        else:
+            self._head = entry.next
+        if entry.next is not None:
+            entry.next.prev = entry.prev
+        else:
+            self._tail = entry.prev
+        entry.prev = None
+        entry.next = None
@@ -900,3 +900,16 @@ def preg_split(interp, pattern, subject, limit=-1, flags=0):
 @wrap(['interp'])
 def preg_last_error(interp):
     return interp.space.wrap(interp.regexp_error_code)
+
+
+@wrap(['space'])
+def preg_cache_stats(space):
+    """ Non-standard: statistics about the compiled regexp cache. """
+    cache = space.regex_cache
+    return space.new_array_from_pairs([
+        (space.wrap('size'), space.wrap(cache.size())),
+        (space.wrap('capacity'), space.wrap(cache.capacity)),
+        (space.wrap('hits'), space.wrap(cache.hits)),
+        (space.wrap('misses'), space.wrap(cache.misses)),
+        (space.wrap('evictions'), space.wrap(cache.evictions)),
+    ])
@@ -5,6 +5,7 @@
 from hippy.objects.reference import W_Reference
 from hippy.objects.convert import convert_string_to_number
 from hippy.builtin_klass import k_incomplete
+from rpython.rlib.rarithmetic import ovfcheck
 
 
 class SerializerMemo(object):
@@ -37,21 +38,53 @@ class SerializerError(Exception):
 class EOFError(SerializerError):
     pass
 
+# how much is read at a time when unserializing from a stream
+STREAM_CHUNK_SIZE = 8192
+
+# enough for any integer field, its sign and its delimiter
+MAX_INT_FIELD = 22
+
+
 class StreamIO(object):
-    def __init__(self, s):
+    """The input of the unserializer: the string 's', or, when 'source'
+    is given, a window on a stream.  Then 's' is the part of the stream
+    read but not parsed yet, refilled by source.read(size) as the parser
+    needs more data, so the stream is never read as a whole.
+    """
+
+    def __init__(self, s, source=None):
         self.pos = 0
         self.error_pos = 0
         self.s = s
+        self.source = source
+
+    def _fill(self, n):
+        """Make 's' hold at least 'n' bytes from 'pos' on, if the stream
+        has them."""
+        if self.source is None:
+            return
+        while len(self.s) - self.pos < n:
+            data = self.source.read(max(n, STREAM_CHUNK_SIZE))
+            if not data:
+                return
+            start = self.pos
+            assert start >= 0
+            self.s = self.s[start:] + data
+            self.pos = 0
 
     def readchr(self):
         prev_pos = self.pos
         assert prev_pos >= 0
         if prev_pos >= len(self.s):
-            raise SerializerError("Unexpected end of data")
-        self.pos += 1
+            self._fill(1)
+            prev_pos = self.pos
+            if prev_pos >= len(self.s):
+                raise SerializerError("Unexpected end of data")
+        self.pos = prev_pos + 1
         return self.s[prev_pos]
 
     def read(self, n):
+        self._fill(n)
         start = self.pos
         assert start >= 0
         stop = start + n
@@ -70,19 +103,50 @@ class StreamIO(object):
         start = self.pos
         assert start >= 0
         newpos = self.s.find(delim, start)
+        while newpos < 0 and self.source is not None:
+            searched = len(self.s) - self.pos
+            self._fill(searched + 1)
+            if len(self.s) - self.pos == searched:
+                break
+            newpos = self.s.find(delim, self.pos + searched)
         if newpos < 0:
             raise EOFError("unexpected end of stream")
+        start = self.pos
+        assert start >= 0
         res = self.s[start:newpos]
         self.pos = newpos + 1
         return res
 
     def read_int_until(self, delim):
-        s = self.read_until(delim)
+        """Parse the decimal integer that ends with 'delim' where it is,
+        instead of slicing it out for int()."""
+        self._fill(MAX_INT_FIELD)
+        s = self.s
+        i = self.pos
+        assert i >= 0
+        end = len(s)
+        negative = False
+        if i < end and (s[i] == '-' or s[i] == '+'):
+            negative = s[i] == '-'
+            i += 1
+        digits_start = i
+        value = 0
         try:
-            value = int(s)
-        except ValueError:
+            while i < end and '0' <= s[i] <= '9':
+                digit = ord(s[i]) - ord('0')
+                if negative:
+                    value = ovfcheck(value * 10 - digit)
+                else:
+                    value = ovfcheck(value * 10 + digit)
+                i += 1
+        except OverflowError:
             raise SerializerError("bad count")
-        return value
+        if i < end and s[i] == delim and i > digits_start:
+            self.pos = i + 1
+            return value
+        if s.find(delim, i) < 0:
+            raise EOFError("unexpected end of stream")
+        raise SerializerError("bad count")
 
     def read_nonneg_int_until(self, delim):
         value = self.read_int_until(delim)
@@ -170,12 +234,7 @@ def load_primitive(space, fp, type_):
         return space.w_Null
     elif type_ == 'i':
         fp.expect(':')
-        data = fp.read_until(';')
-        try:
-            i = int(data)
-        except ValueError:
-            raise SerializerError('bad int')
-        return space.wrap(i)
+        return space.wrap(fp.read_int_until(';'))
     elif type_ == 'd':
         fp.expect(':')
         data = fp.read_until(';')
@@ -226,6 +285,56 @@ def load_ref(space, fp, memo):
     return w_result
 
 
+def unserialize_stream(space, source):
+    """Unserialize the value that 'source', anything with a read(size)
+    method such as a BufferedStream, starts with, reading it in chunks
+    rather than as one string.  What is read past the end of the value
+    is dropped.  Returns None if the data is malformed."""
+    fp = StreamIO("", source)
+    try:
+        return load_ref(space, fp, UnserializerMemo())
+    except SerializerError:
+        return None
+
+
+# serialized_size_hint() visits at most this many array elements
+SIZE_HINT_NODES = 1024
+
+
+class SizeHint(object):
+    def __init__(self, budget):
+        self.budget = budget
+
+    def estimate(self, space, w_obj):
+        w_obj = w_obj.deref()
+        if w_obj.tp == space.tp_str:
+            return space.strlen(w_obj) + 12
+        if w_obj.tp != space.tp_array:
+            return 16
+        length = space.arraylen(w_obj)
+        if length > self.budget:
+            # out of budget: a guess from the length alone
+            self.budget = 0
+            return 32 * length + 12
+        self.budget -= length
+        size = 12
+        with space.iter(w_obj) as itr:
+            while not itr.done():
+                w_key, w_value = itr.next_item(space)
+                size += self.estimate(space, w_key)
+                size += self.estimate(space, w_value)
+        return size
+
+
+def serialized_size_hint(space, w_obj):
+    """A cheap estimate of the length of the serialization of 'w_obj', to
+    size the builder up front: strings count for their length plus their
+    header, other scalars and objects for a few bytes.  Only the first
+    SIZE_HINT_NODES elements are looked at, so that the cost stays bounded
+    for big or repeatedly referenced arrays."""
+    return SizeHint(SIZE_HINT_NODES).estimate(space, w_obj)
+
+
 def unserialize(space,  s):
     """Unserialize the string s.
 
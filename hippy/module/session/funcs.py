@@ -2,6 +2,9 @@ from hippy.builtin import wrap
 from hippy.builtin import Optional
 from hippy.builtin import BoolArg
 from hippy.objects.base import W_Root
+from hippy.objects.instanceobject import W_InstanceObject
+from hippy.error import InvalidCallback
+from hippy.module.session.storage import UserStorage
 from collections import OrderedDict
 
 PHP_WHITESPACE = '\x0b\0'
@@ -61,6 +64,19 @@ def session_destroy(interp):
     return interp.space.w_True
 
 
+@wrap(['interp'])
+def session_gc(interp):
+    """Perform session data garbage collection"""
+    ses = interp.session
+    if not ses.is_active():
+        interp.warn("session_gc(): Session is not active")
+        return interp.space.w_False
+    removed = ses.get_storage().gc(interp, ses.gc_maxlifetime)
+    if removed < 0:
+        return interp.space.w_False
+    return interp.space.newint(removed)
+
+
 @wrap(['interp'])
 def session_encode(interp):
     """Encodes the current session data as a session encoded string"""
@@ -229,9 +245,43 @@ def session_set_cookie_params(interp, w_lifetime, path=None, domain=None,
     return space.w_Null
 
 
-def session_set_save_handler():
+SAVE_HANDLER_METHODS = ['open', 'close', 'read', 'write', 'destroy', 'gc']
+
+
+@wrap(['interp', 'args_w'])
+def session_set_save_handler(interp, args_w):
     """Sets user-level session storage functions"""
-    pass
+    space = interp.space
+    if interp.session.is_active():
+        interp.warn("session_set_save_handler(): Cannot change save "
+                    "handler when session is active")
+        return space.w_False
+    callbacks = []
+    if len(args_w) >= 1 and isinstance(args_w[0].deref(), W_InstanceObject):
+        w_handler = args_w[0].deref()
+        for methname in SAVE_HANDLER_METHODS:
+            try:
+                callbacks.append(
+                    space._get_callback_from_instance(w_handler, methname))
+            except InvalidCallback as e:
+                interp.warn("session_set_save_handler(): Argument 1 is "
+                            "not a valid callback: %s" % e.msg)
+                return space.w_False
+    elif len(args_w) >= 6:
+        for i in range(6):
+            w_callback = space.get_callback('session_set_save_handler',
+                                            i + 1, args_w[i].deref())
+            if w_callback is None:
+                return space.w_False
+            callbacks.append(w_callback)
+    else:
+        interp.warn("session_set_save_handler() expects at least 6 "
+                    "parameters, %d given" % len(args_w))
+        return space.w_False
+    interp.session.set_save_handler(interp, UserStorage(
+        callbacks[0], callbacks[1], callbacks[2],
+        callbacks[3], callbacks[4], callbacks[5]))
+    return space.w_True
 
 
 @wrap(['interp', 'args_w'])
@@ -1,12 +1,11 @@
 from rpython.rlib.rstring import StringBuilder
 from rpython.rlib import rmd5
 from hippy.module.serialize import EOFError, StreamIO, SerializerMemo,\
-     SerializerError, UnserializerMemo, load_ref
-from rpython.rlib.objectmodel import we_are_translated
-from rpython.rlib.rstring import assert_str0
+     SerializerError, UnserializerMemo, load_ref, serialized_size_hint
+from hippy.module.session.storage import FileStorage, ProcessRandom
+from hippy.objects.resources.file_resource import BufferedStream
 from collections import OrderedDict
 import time
-import os
 
 PHP_SESSION_DISABLED = 0
 PHP_SESSION_NONE = 1
@@ -14,6 +13,28 @@ PHP_SESSION_ACTIVE = 2
 
 SERIALIZE_HANDLERS = ('php',)
 
+_random = ProcessRandom()
+
+
+class DigestingStream(BufferedStream):
+    """ A BufferedStream that keeps the md5 of what was read through it,
+    so that a session file can be unserialized as it is read and still
+    be compared with the data written back for session.lazy_write.
+    """
+
+    def __init__(self, f):
+        BufferedStream.__init__(self, f)
+        self.md5 = rmd5.RMD5()
+
+    def read(self, size):
+        data = BufferedStream.read(self, size)
+        self.md5.update(data)
+        return data
+
+
+def digest(data):
+    return rmd5.RMD5(data).digest()
+
 
 def serialize_hash(w_obj, var_hash):
     if w_obj in var_hash:
@@ -30,6 +51,9 @@ class Session(object):
     def __init__(self, interp):
         self.status = PHP_SESSION_NONE
         self.session_id = ""
+        self.file_storage = FileStorage()
+        self.user_storage = None
+        self.read_digest = None
         self.init_settings(interp)
         if self.auto_start:
             self.start(interp)
@@ -64,19 +88,21 @@ class Session(object):
         else:
             cookie_id = space.str_w(w_cookie_id)
             self.session_id = cookie_id
-        path = interp.space.str_w(interp.config.get_ini_w('session.save_path'))
-        fname = self.name + "-" + self.session_id
-        dest = os.path.join(path, fname)
-        try:
-            f = open(dest)
-            data = f.read()
-            f.close()
-        except OSError:
-            dct = None
-        except IOError:
-            dct = None
+        storage = self.get_storage()
+        if not storage.open(interp, self.save_path, self.name):
+            interp.warn("session_start(): Failed to initialize storage "
+                        "module: %s (path: %s)" % (self.save_handler,
+                                                   self.save_path))
+        if storage is self.file_storage:
+            dct = self.read_file_storage(interp)
         else:
-            dct = self.unserialize(interp, data)
+            data = storage.read(interp, self.session_id)
+            self.read_digest = digest(data)
+            if data:
+                dct = self.unserialize(interp, data)
+            else:
+                dct = None
+        self.maybe_gc(interp, storage)
         w_ses = self.get_session_var(interp)
         if dct is None:
             w_ses.store(space.new_array_from_rdict(OrderedDict()))
@@ -86,27 +112,39 @@ class Session(object):
                 d[k] = w_v
             w_ses.store(space.new_array_from_rdict(d))
 
-    def create_session_file(self, interp, val):
-        if self.status != PHP_SESSION_ACTIVE:
-            return
-        space = interp.space
-        path = space.str_w(interp.config.get_ini_w('session.save_path'))
-        fname = self.name + "-" + self.session_id
-        dest = os.path.join(path, fname)
+    def read_file_storage(self, interp):
+        """Unserialize the session file straight from the file, without
+        reading it as a whole first."""
+        f = self.file_storage.open_file(self.session_id)
+        if f is None:
+            self.read_digest = digest("")
+            return None
+        stream = DigestingStream(f)
         try:
-            f = open(dest, "w")
-            f.write(val)
+            dct = self.unserialize_from(interp, StreamIO("", stream))
+        finally:
             f.close()
-        except OSError:
-            interp.warn(
-                "session_start(): open(%s, O_RDWR) failed")
+        self.read_digest = stream.md5.digest()
+        return dct
+
+    def write_session_data(self, interp, val):
+        """Store the session through the save handler. If the lazy_write
+        setting is on and the data did not change since it was read,
+        only the timestamp of the session is updated."""
+        if self.status != PHP_SESSION_ACTIVE:
             return
-        except IOError, e:
-            if not we_are_translated():
-                interp.warn(
-                    "session_start(): open(%s, O_RDWR) "
-                    "failed: %s (%d)" % (dest, e.strerror, e.errno))
+        storage = self.get_storage()
+        if self.lazy_write and digest(val) == self.read_digest:
+            storage.update_timestamp(interp, self.session_id, val)
+        else:
+            storage.write(interp, self.session_id, val)
+        storage.close(interp)
+
+    def maybe_gc(self, interp, storage):
+        if self.gc_probability <= 0 or self.gc_divisor <= 0:
             return
+        if _random.random() * self.gc_divisor < self.gc_probability:
+            storage.gc(interp, self.gc_maxlifetime)
 
     def create_id(self):
         d = rmd5.RMD5(str(time.time()))
@@ -114,16 +152,11 @@ class Session(object):
 
     def destroy(self, interp):
         if self.status == PHP_SESSION_ACTIVE:
-            path = interp.space.str_w(interp.config.get_ini_w('session.save_path'))
-            fname = self.name + "-" + self.session_id
-            dest = os.path.join(path, fname)
-            try:
-                assert dest is not None
-                dest = assert_str0(dest)
-                os.remove(dest)
-            except:
-                pass
+            storage = self.get_storage()
+            storage.destroy(interp, self.session_id)
+            storage.close(interp)
             self.session_id = ""
+            self.read_digest = None
             self.status = PHP_SESSION_NONE
 
     def deactivate(self):
@@ -157,6 +190,27 @@ class Session(object):
             self.module_name = space.str_w(w_module_name)
         self.serialize_handler = space.str_w(config.get_ini_w(
             'session.serialize_handler'))
+        self.save_handler = space.str_w(config.get_ini_w(
+            'session.save_handler'))
+        self.lazy_write = space.is_true(config.get_ini_w(
+            'session.lazy_write'))
+        self.gc_probability = space.int_w(config.get_ini_w(
+            'session.gc_probability'))
+        self.gc_divisor = space.int_w(config.get_ini_w(
+            'session.gc_divisor'))
+        self.gc_maxlifetime = space.int_w(config.get_ini_w(
+            'session.gc_maxlifetime'))
+
+    def get_storage(self):
+        if self.save_handler == 'user' and self.user_storage is not None:
+            return self.user_storage
+        return self.file_storage
+
+    def set_save_handler(self, interp, storage):
+        self.user_storage = storage
+        interp.config.set_ini_w('session.save_handler',
+                                interp.space.newstr('user'))
+        self.save_handler = 'user'
 
     def is_active(self):
         return self.status == PHP_SESSION_ACTIVE
@@ -164,7 +218,7 @@ class Session(object):
     def write_close(self, interp):
         session_var = self.get_session_var(interp)
         serialize_val = self.serialize(interp, session_var)
-        self.create_session_file(interp, serialize_val)
+        self.write_session_data(interp, serialize_val)
         self.deactivate()
         return serialize_val
 
@@ -178,9 +232,9 @@ class Session(object):
         space = interp.space
         if not w_ses:
             return ""
-        res = StringBuilder()
-        memo = SerializerMemo()
         w_ses = w_ses.deref()
+        res = StringBuilder(serialized_size_hint(space, w_ses))
+        memo = SerializerMemo()
         with space.iter(w_ses.deref()) as itr:
             while not itr.done():
                 w_key, w_value = itr.next_item(space)
@@ -199,7 +253,9 @@ class Session(object):
         return res.build()
 
     def unserialize(self, interp, data):
-        fp = StreamIO(data)
+        return self.unserialize_from(interp, StreamIO(data))
+
+    def unserialize_from(self, interp, fp):
         d = OrderedDict()
         memo = UnserializerMemo()
         space = interp.space
@@ -0,0 +1,362 @@
+""" Session save handlers, selected by 'session.save_handler'.
+
+The 'files' handler stores every session in its own file under
+'session.save_path'. Like in PHP, the save path may be prefixed with a
+depth, as in "2;/var/lib/hippy/sessions", to spread the files over
+nested one-character subdirectories named after the first characters
+of the session id; it may also carry the mode of the files created,
+as in "2;0600;/var/lib/hippy/sessions". Nothing is locked: writes go
+to a temporary file that is renamed over the old one, so a reader
+always sees a complete session, and gc() can unlink a file at any time
+since a concurrent write simply creates it again.
+
+The 'user' handler calls the PHP callbacks registered with
+session_set_save_handler().
+
+Expired sessions are removed by gc(), which session_start() calls with
+a probability of session.gc_probability / session.gc_divisor. The
+'files' handler then looks at no more than session.gc_batch_size files,
+starting at a random place. 'hippy --session-gc' runs a full pass over
+the save path instead.
+"""
+
+import os
+import stat
+import time
+
+from rpython.rlib.rarithmetic import r_uint
+from rpython.rlib.rrandom import Random
+
+
+
+class ProcessRandom(object):
+    """ An rrandom.Random seeded from the time and the pid the first
+    time it is used in a process, including after a fork: its default
+    seed is a constant, which would make every fresh process draw the
+    same numbers.
+    """
+
+    def __init__(self):
+        self._random = Random()
+        self._pid = -1
+
+    def random(self):
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            now = time.time()
+            seconds = int(now)
+            micros = int((now - seconds) * 1000000)
+            self._random.init_genrand(r_uint(seconds) ^
+                                      (r_uint(micros) << 12) ^ r_uint(pid))
+        return self._random.random()
+
+_random = ProcessRandom()
+
+SESSION_ID_CHARS = ('abcdefghijklmnopqrstuvwxyz'
+                    'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789,-')
+
+
+def valid_session_id(session_id):
+    if not session_id:
+        return False
+    for c in session_id:
+        if c not in SESSION_ID_CHARS:
+            return False
+    return True
+
+
+class SessionStorage(object):
+    """ The interface of session save handlers. The methods mirror
+    those of PHP's SessionHandlerInterface. """
+
+    def open(self, interp, save_path, name):
+        return True
+
+    def close(self, interp):
+        return True
+
+    def read(self, interp, session_id):
+        """Return the serialized session, or "" if there is none."""
+        return ""
+
+    def write(self, interp, session_id, data):
+        return True
+
+    def update_timestamp(self, interp, session_id, data):
+        """Called instead of write() when the data did not change, so
+        that the session does not look idle to the garbage collector."""
+        return self.write(interp, session_id, data)
+
+    def destroy(self, interp, session_id):
+        return True
+
+    def gc(self, interp, maxlifetime):
+        """Remove the sessions idle for more than 'maxlifetime' seconds,
+        return how many were removed or -1 on failure."""
+        return 0
+
+
+def parse_save_path(save_path):
+    """Split "N;MODE;/path" into (N, MODE, path)."""
+    depth = 0
+    mode = 0600
+    parts = save_path.split(';')
+    if len(parts) == 1:
+        return depth, mode, save_path
+    try:
+        depth = int(parts[0])
+        if len(parts) > 2:
+            mode = int(parts[1], 8)
+    except ValueError:
+        return 0, mode, save_path
+    if depth < 0:
+        depth = 0
+    return depth, mode, parts[len(parts) - 1]
+
+
+class FileStorage(SessionStorage):
+    def __init__(self):
+        self.depth = 0
+        self.mode = 0600
+        self.path = ''
+        self.name = ''
+
+    def open(self, interp, save_path, name):
+        self.depth, self.mode, self.path = parse_save_path(save_path)
+        self.name = name
+        return True
+
+    def session_dir(self, session_id):
+        path = self.path
+        for i in range(min(self.depth, len(session_id))):
+            path = os.path.join(path, session_id[i])
+        return path
+
+    def session_file(self, session_id):
+        return os.path.join(self.session_dir(session_id),
+                            self.name + "-" + session_id)
+
+    def read(self, interp, session_id):
+        if not valid_session_id(session_id):
+            return ""
+        try:
+            fd = os.open(self.session_file(session_id), os.O_RDONLY, 0)
+        except OSError:
+            return ""
+        try:
+            chunks = []
+            while True:
+                data = os.read(fd, 65536)
+                if not data:
+                    break
+                chunks.append(data)
+        finally:
+            os.close(fd)
+        return ''.join(chunks)
+
+    def open_file(self, session_id):
+        """The session file opened for reading, or None if there is no
+        such session."""
+        if not valid_session_id(session_id):
+            return None
+        try:
+            return open(self.session_file(session_id), 'rb')
+        except (IOError, OSError):
+            return None
+
+    def _makedirs(self, path):
+        if path == self.path or os.path.isdir(path):
+            return
+        self._makedirs(os.path.dirname(path))
+        try:
+            os.mkdir(path, 0700)
+        except OSError:
+            pass    # created concurrently
+
+    def write(self, interp, session_id, data):
+        if not valid_session_id(session_id):
+            return False
+        dirname = self.session_dir(session_id)
+        dest = self.session_file(session_id)
+        tmp = '%s.%d.tmp' % (dest, os.getpid())
+        try:
+            self._makedirs(dirname)
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         self.mode)
+            try:
+                pos = 0
+                while pos < len(data):
+                    pos += os.write(fd, data[pos:])
+            finally:
+                os.close(fd)
+            os.rename(tmp, dest)
+        except OSError, e:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            interp.warn("session_write_close(): write of session data "
+                        "to %s failed: %s" % (dest, os.strerror(e.errno)))
+            return False
+        return True
+
+    def update_timestamp(self, interp, session_id, data):
+        if not valid_session_id(session_id):
+            return False
+        try:
+            os.utime(self.session_file(session_id), None)
+        except OSError:
+            # the file is gone, e.g. collected in the meantime
+            return self.write(interp, session_id, data)
+        return True
+
+    def destroy(self, interp, session_id):
+        if not valid_session_id(session_id):
+            return False
+        try:
+            os.unlink(self.session_file(session_id))
+        except OSError:
+            return False
+        return True
+
+    def gc(self, interp, maxlifetime):
+        batch_size = interp.space.int_w(
+            interp.config.get_ini_w('session.gc_batch_size'))
+        if batch_size < 1:
+            batch_size = 1
+        report = self.collect(maxlifetime, batch_size)
+        return report.removed
+
+    def collect(self, maxlifetime, limit=0):
+        """Remove the session files not modified for 'maxlifetime'
+        seconds.  If 'limit' is positive, stop after looking at that
+        many files; such passes start at a random place, so that
+        successive ones cover the whole save path."""
+        report = GCReport()
+        cutoff = time.time() - maxlifetime
+        dirs = []
+        self._list_dirs(self.path, self.depth, dirs)
+        start = 0
+        if limit > 0:
+            start = int(_random.random() * len(dirs))
+        for i in range(len(dirs)):
+            dirname = dirs[(start + i) % len(dirs)]
+            if not self._collect_dir(dirname, cutoff, limit, report):
+                break
+        return report
+
+    def _list_dirs(self, path, depth, dirs):
+        if depth == 0:
+            dirs.append(path)
+            return
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return
+        for name in names:
+            if len(name) == 1 and name in SESSION_ID_CHARS:
+                subdir = os.path.join(path, name)
+                if os.path.isdir(subdir):
+                    self._list_dirs(subdir, depth - 1, dirs)
+
+    def _collect_dir(self, dirname, cutoff, limit, report):
+        prefix = self.name + "-"
+        try:
+            names = [name for name in os.listdir(dirname)
+                     if name.startswith(prefix)]
+        except OSError:
+            return True
+        count = len(names)
+        offset = 0
+        if limit > 0 and count > 0:
+            offset = int(_random.random() * count)
+        for i in range(count):
+            if limit > 0 and report.scanned >= limit:
+                return False
+            name = names[(offset + i) % count]
+            report.collect_file(os.path.join(dirname, name), cutoff)
+        return True
+
+
+class GCReport(object):
+    def __init__(self):
+        self.scanned = 0
+        self.removed = 0
+        self.freed = 0      # bytes
+
+    def collect_file(self, path, cutoff):
+        self.scanned += 1
+        try:
+            st = os.lstat(path)
+            if not stat.S_ISREG(st.st_mode) or st.st_mtime >= cutoff:
+                return
+            os.unlink(path)
+        except OSError:
+            return
+        self.removed += 1
+        self.freed += int(st.st_size)
+
+
+def run_session_gc(interp):
+    """Entry point of 'hippy --session-gc': collect the whole save path
+    of the 'files' handler as configured, and report what was reclaimed.
+    """
+    space = interp.space
+    config = interp.config
+    storage = FileStorage()
+    storage.open(interp, config.get_ini_str('session.save_path'),
+                 config.get_ini_str('session.name'))
+    maxlifetime = space.int_w(config.get_ini_w('session.gc_maxlifetime'))
+    report = storage.collect(maxlifetime)
+    os.write(1, "session gc: %s: scanned %d files, removed %d, "
+             "reclaimed %d bytes\n" % (storage.path, report.scanned,
+                                        report.removed, report.freed))
+    return 0
+
+
+class UserStorage(SessionStorage):
+    """The callbacks registered with session_set_save_handler()."""
+
+    def __init__(self, w_open, w_close, w_read, w_write, w_destroy, w_gc):
+        self.w_open = w_open
+        self.w_close = w_close
+        self.w_read = w_read
+        self.w_write = w_write
+        self.w_destroy = w_destroy
+        self.w_gc = w_gc
+
+    def open(self, interp, save_path, name):
+        space = interp.space
+        return space.is_true(space.call_args(
+            self.w_open, [space.newstr(save_path), space.newstr(name)]))
+
+    def close(self, interp):
+        space = interp.space
+        return space.is_true(space.call_args(self.w_close, []))
+
+    def read(self, interp, session_id):
+        space = interp.space
+        w_data = space.call_args(self.w_read, [space.newstr(session_id)])
+        if not space.is_true(w_data):
+            return ""
+        return space.str_w(w_data)
+
+    def write(self, interp, session_id, data):
+        space = interp.space
+        return space.is_true(space.call_args(
+            self.w_write, [space.newstr(session_id), space.newstr(data)]))
+
+    def destroy(self, interp, session_id):
+        space = interp.space
+        return space.is_true(space.call_args(
+            self.w_destroy, [space.newstr(session_id)]))
+
+    def gc(self, interp, maxlifetime):
+        space = interp.space
+        w_res = space.call_args(self.w_gc, [space.newint(maxlifetime)])
+        if w_res.deref().tp == space.tp_bool:
+            if space.is_true(w_res):
+                return 0
+            return -1
+        return space.int_w(w_res)
@@ -2,6 +2,7 @@ import os
 from hippy.builtin import (wrap_method, Optional, ThisUnwrapper,
     handle_as_exception, StreamContextArg, Nullable)
 from hippy.objects.instanceobject import W_InstanceObject
+from hippy.objects.iterator import W_BaseIterator
 from hippy.objects.intobject import W_IntObject
 from hippy.objects.resources.file_resource import W_FileResource
 from hippy.error import PHPException
@@ -12,6 +13,7 @@ from hippy.module.standard.file.funcs import (_is_dir, _is_file, _is_link,
     _fopen, _basename, FopenError)
 from rpython.rlib import rpath
 from hippy import consts
+from hippy.csvparser import parse_csv, csv_char, wrap_csv_fields
 
 
 class W_SplFileInfo(W_InstanceObject):
@@ -31,17 +33,26 @@ class W_SplFileInfo(W_InstanceObject):
 class W_SplFileObject(W_SplFileInfo):
     delimiter = None
     enclosure = None
+    escape = None
     open_mode = None
+    w_res = None
+    w_current = None    # what current() returns, once read
 
     def __init__(self, klass, dct_w):
         W_InstanceObject.__init__(self, klass, dct_w)
 
+    def _create_iter(self, space, contextclass, byref):
+        if self.w_res is not None and _iterates_natively(self.getclass()):
+            return W_SplFileIterator(space.ec.interpreter, self)
+        return W_SplFileInfo._create_iter(self, space, contextclass, byref)
+
     def clone(self, interp, contextclass):
         w_res = W_InstanceObject.clone(self, interp, contextclass)
         w_res.file_name = self.file_name
         w_res.path_name = self.path_name
         w_res.delimiter = self.delimiter
         w_res.enclosure = self.enclosure
+        w_res.escape = self.escape
         w_res.open_mode = self.open_mode
         return w_res
 
@@ -389,14 +400,127 @@ SFO_SKIP_EMPTY = 4
 SFO_READ_CSV = 8
 
 
-def _sfo_readline(interp, sfo):
+def _sfo_readline(interp, sfo, drop_nl=True):
     if sfo.open_mode not in ('w', 'a', 'x', 'c'):
-        return sfo.w_res.readline(sfo.flags & SFO_DROP_NEW_LINE)
+        return sfo.w_res.readline(
+            drop_nl and (sfo.flags & SFO_DROP_NEW_LINE) != 0)
     else:
         raise PHPException(k_RuntimeException.call_args(
             interp, [interp.space.wrap("SplFileObject: File cannot be read")]))
 
 
+def _read_current(interp, sfo):
+    """Read the next line as current() returns it: a string, or with
+    READ_CSV the array of its fields.  With SKIP_EMPTY, empty lines are
+    passed over.  Returns None at the end of the file."""
+    space = interp.space
+    w_res = sfo.w_res
+    assert isinstance(w_res, W_FileResource)
+    while True:
+        if sfo.flags & SFO_READ_CSV:
+            line = _sfo_readline(interp, sfo, False)
+            if not line:
+                return None
+            fields = parse_csv(line, w_res, sfo.delimiter[0],
+                               sfo.enclosure[0], sfo.escape[0])
+            if fields is None and sfo.flags & SFO_SKIP_EMPTY:
+                _skip_line(w_res)
+                continue
+            return wrap_csv_fields(space, fields)
+        line = _sfo_readline(interp, sfo)
+        if not line:
+            if w_res.feof():
+                return None
+            if sfo.flags & SFO_SKIP_EMPTY:
+                _skip_line(w_res)
+                continue
+        return space.newstr(line)
+
+
+def _skip_line(w_res):
+    # skipped lines still count in key()
+    w_res.cur_line = None
+    w_res.cur_line_no += 1
+
+
+def _rewind(interp, sfo):
+    try:
+        sfo.w_res.rewind()
+    except OSError, e:
+        raise PHPException(k_RuntimeException.call_args(
+            interp, [interp.space.wrap(
+                "SplFileObject::rewind(): %s" % os.strerror(e.errno))]))
+    sfo.w_current = None
+    if sfo.flags & SFO_READ_AHEAD:
+        sfo.w_current = _read_current(interp, sfo)
+
+
+def _valid(sfo):
+    if sfo.flags & SFO_READ_AHEAD:
+        return sfo.w_current is not None
+    return not sfo.w_res.feof()
+
+
+def _current(interp, sfo):
+    if sfo.w_current is None:
+        sfo.w_current = _read_current(interp, sfo)
+        if sfo.w_current is None:
+            return interp.space.newstr("")
+    return sfo.w_current
+
+
+def _next(interp, sfo):
+    w_res = sfo.w_res
+    assert isinstance(w_res, W_FileResource)
+    w_res.cur_line = None
+    sfo.w_current = None
+    if sfo.flags & SFO_READ_AHEAD:
+        sfo.w_current = _read_current(interp, sfo)
+    w_res.cur_line_no += 1
+
+
+_ITERATOR_METHODS = ['rewind', 'valid', 'current', 'key', 'next']
+
+
+def _iterates_natively(klass):
+    """Whether 'klass', SplFileObject or a subclass of it, keeps the
+    iteration methods of SplFileObject."""
+    for name in _ITERATOR_METHODS:
+        if klass.methods[name].getclass() is not SplFileObjectClass:
+            return False
+    return True
+
+
+class W_SplFileIterator(W_BaseIterator):
+    """The iterator of foreach over an SplFileObject.  It follows the
+    protocol of W_InstanceIterator, but calls the helpers behind
+    rewind(), valid(), current(), key() and next() directly instead of
+    going through method calls, so that each step is reading the next
+    line from the buffered stream of the file and wrapping it."""
+
+    def __init__(self, interp, sfo):
+        self.interp = interp
+        self.sfo = sfo
+        self.started = False
+        _rewind(interp, sfo)
+
+    def next(self, space):
+        return _current(self.interp, self.sfo)
+
+    def next_item(self, space):
+        w_value = _current(self.interp, self.sfo)
+        w_res = self.sfo.w_res
+        assert isinstance(w_res, W_FileResource)
+        return space.newint(w_res.cur_line_no), w_value
+
+    def done(self):
+        if self.started:
+            _next(self.interp, self.sfo)
+        else:
+            self.started = True
+        return not _valid(self.sfo)
+
+
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject), str, Optional(str),
               Optional(bool), Optional(Nullable(StreamContextArg(None)))],
              name='SplFileObject::__construct',
@@ -407,6 +531,7 @@ def sfo_construct(interp, this, filename, open_mode='r',
     this.path_name = rpath.realpath(filename)
     this.delimiter = ","
     this.enclosure = '"'
+    this.escape = "\\"
     this.flags = 0
     this.open_mode = open_mode
     this.use_include_path = use_include_path
@@ -442,20 +567,13 @@ def sfo_construct(interp, this, filename, open_mode='r',
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
              name='SplFileObject::rewind')
 def sfo_rewind(interp, this):
-    try:
-        this.w_res.rewind()
-    except OSError, e:
-        raise PHPException(k_RuntimeException.call_args(
-            interp, [interp.space.wrap(
-                "SplFileObject::rewind(): %s" % os.strerror(e.errno))]))
-    if this.flags & SFO_READ_AHEAD:
-        _sfo_readline(interp, this)
+    _rewind(interp, this)
 
 
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
              name='SplFileObject::valid')
 def sfo_valid(interp, this):
-    return interp.space.newbool(not this.w_res.feof())
+    return interp.space.newbool(_valid(this))
 
 
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject), int],
@@ -466,7 +584,12 @@ def sfo_seek(interp, this, line_pos):
             interp, [interp.space.wrap(
                 "SplFileObject::seek(): Can't seek file %s "
                 "to negative line %d" % (this.file_name, line_pos))]))
-    this.w_res.seek_to_line(line_pos, this.flags & SFO_DROP_NEW_LINE)
+    w_res = this.w_res
+    assert isinstance(w_res, W_FileResource)
+    w_res.seek_to_line(line_pos, (this.flags & SFO_DROP_NEW_LINE) != 0)
+    this.w_current = None
+    if w_res.cur_line is not None:
+        this.w_current = interp.space.newstr(w_res.cur_line)
 
 
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
@@ -517,7 +640,8 @@ def _fgets(interp, this):
     if not line:
         w_res.eof = True
         return interp.space.w_False
-    return interp.space.newstr(line)
+    this.w_current = interp.space.newstr(line)
+    return this.w_current
 
 
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject), 'args_w'],
@@ -556,15 +680,6 @@ def sfo_key(interp, this):
     return interp.space.newint(w_res.cur_line_no)
 
 
-def _current(interp, this):
-    w_res = this.w_res
-    assert isinstance(w_res, W_FileResource)
-    res = w_res.cur_line
-    if not res:
-        res = _sfo_readline(interp, this)
-    return interp.space.wrap(res)
-
-
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
              name='SplFileObject::current')
 def sfo_current(interp, this):
@@ -580,12 +695,7 @@ def sfo_tostring(interp, this):
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
              name='SplFileObject::next')
 def sfo_next(interp, this):
-    w_res = this.w_res
-    assert isinstance(w_res, W_FileResource)
-    w_res.cur_line = None
-    if this.flags & SFO_READ_AHEAD:
-        _sfo_readline(interp, this)
-    w_res.cur_line_no += 1
+    _next(interp, this)
 
 
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
@@ -653,10 +763,37 @@ def sfo_fgetss(interp, this):
     raise NotImplementedError
 
 
-@wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
+@wrap_method(['interp', ThisUnwrapper(W_SplFileObject), Optional(str),
+              Optional(str), Optional(str)],
              name='SplFileObject::fgetcsv')
-def sfo_fgetcsv(interp, this):
-    raise NotImplementedError
+def sfo_fgetcsv(interp, this, delimiter=None, enclosure=None, escape=None):
+    space = interp.space
+    funcname = 'SplFileObject::fgetcsv'
+    delimiter = csv_char(space, funcname, 'delimiter',
+                         this.delimiter if delimiter is None else delimiter)
+    if delimiter is None:
+        return space.w_False
+    enclosure = csv_char(space, funcname, 'enclosure',
+                         this.enclosure if enclosure is None else enclosure)
+    if enclosure is None:
+        return space.w_False
+    escape = csv_char(space, funcname, 'escape',
+                      this.escape if escape is None else escape)
+    if escape is None:
+        return space.w_False
+    return _fgetcsv(interp, this, delimiter[0], enclosure[0], escape[0])
+
+
+def _fgetcsv(interp, this, delimiter, enclosure, escape):
+    line = _sfo_readline(interp, this, False)
+    w_res = this.w_res
+    assert isinstance(w_res, W_FileResource)
+    if not line:
+        w_res.eof = True
+        return interp.space.w_False
+    fields = parse_csv(line, w_res, delimiter, enclosure, escape)
+    this.w_current = wrap_csv_fields(interp.space, fields)
+    return this.w_current
 
 
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
@@ -680,13 +817,28 @@ def sfo_fscanf(interp, this):
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
              name='SplFileObject::getCsvControl')
 def sfo_get_csv_control(interp, this):
-    raise NotImplementedError
+    space = interp.space
+    return space.new_array_from_list([space.newstr(this.delimiter),
+                                      space.newstr(this.enclosure),
+                                      space.newstr(this.escape)])
 
 
-@wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
+@wrap_method(['interp', ThisUnwrapper(W_SplFileObject), Optional(str),
+              Optional(str), Optional(str)],
              name='SplFileObject::setCsvControl')
-def sfo_set_csv_control(interp, this):
-    raise NotImplementedError
+def sfo_set_csv_control(interp, this, delimiter=",", enclosure='"',
+                        escape="\\"):
+    space = interp.space
+    funcname = 'SplFileObject::setCsvControl'
+    delimiter = csv_char(space, funcname, 'delimiter', delimiter)
+    enclosure = csv_char(space, funcname, 'enclosure', enclosure)
+    escape = csv_char(space, funcname, 'escape', escape)
+    if delimiter is None or enclosure is None or escape is None:
+        return space.w_False
+    this.delimiter = delimiter
+    this.enclosure = enclosure
+    this.escape = escape
+    return space.w_Null
 
 
 @wrap_method(['interp', ThisUnwrapper(W_SplFileObject)],
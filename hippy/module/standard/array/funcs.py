@@ -2,18 +2,22 @@ from rpython.rlib.rarithmetic import ovfcheck
 
 from hippy.objects.base import W_Root
 from hippy.objects.reference import W_Reference
-from hippy.objects.arrayobject import new_rdict, W_ArrayObject
+from hippy.objects.arrayobject import (new_rdict, W_ArrayObject,
+                                      W_ListArrayObject)
 from hippy.objects.instanceobject import W_InstanceObject
 from hippy.objects.nullobject import W_NullObject
 from hippy.builtin import (
     wrap, Optional, ArrayArg, UniqueArray, register_builtin_function,
     BuiltinFunction, ExitFunctionWithError)
 from hippy.objects.intobject import W_IntObject
+from hippy.objects.floatobject import W_FloatObject
 from rpython.rlib.rrandom import Random
 from rpython.rlib.objectmodel import newlist_hint
 from hippy.sort import (
-    KEY, VALUE, _sort, SUPPORTED_SORT_TYPES, SORT_REGULAR,
-    SORT_DESC, SORT_ASC, _multisort)
+    KEY, VALUE, _sort, SUPPORTED_SORT_TYPES, SORT_REGULAR, SORT_NUMERIC,
+    SORT_DESC, SORT_ASC, _multisort, IntSort, FloatSort)
+from hippy.valueindex import (
+    LOOSE, STRICT, STRING, find_value, get_value_index)
 import sys
 from collections import OrderedDict
 from hippy.objects.arrayobject import try_convert_str_to_int
@@ -127,12 +131,13 @@ def array_diff_assoc(space, args_w):
         while not w_iter.done():
             w_key, w_val = w_iter.next_item(space)
             for w_arg in args_w:
-                with space.iter(w_arg) as w_arg_iter:
-                    while not w_arg_iter.done():
-                        w_arg_key, w_arg_val = w_arg_iter.next_item(space)
-                        if space.is_w(space.as_string(w_key), space.as_string(w_arg_key)) and \
-                                space.is_w(space.as_string(w_val), space.as_string(w_arg_val)):
-                            space.rdict_remove(rdict, w_arg_key)
+                if not w_arg.isset_index(space, w_key):
+                    continue
+                w_arg_val = space.getitem(w_arg, w_key)
+                if space.is_w(space.as_string(w_val),
+                              space.as_string(w_arg_val)):
+                    space.rdict_remove(rdict, w_key)
+                    break
     return space.new_array_from_rdict(rdict)
 
 
@@ -252,16 +257,15 @@ def array_diff(space, args_w):
             raise _not_an_array(i + 1)
     w_arr = args_w[0]
     rdict = space.get_rdict_from_array(w_arr)
-    args_w = [space.as_array(w_arg) for w_arg in args_w[1:]]
+    indexes = [get_value_index(space, space.as_array(w_arg), STRING)
+               for w_arg in args_w[1:]]
     with space.iter(w_arr) as w_df_iter:
         while not w_df_iter.done():
             w_df_key, w_df_val = w_df_iter.next_item(space)
-            for w_arg in args_w:
-                with space.iter(w_arg) as w_iter:
-                    while not w_iter.done():
-                        _, w_val = w_iter.next_item(space)
-                        if space.str_eq(w_df_val, w_val):
-                            space.rdict_remove(rdict, w_df_key)
+            for index in indexes:
+                if index.find(w_df_val) >= 0:
+                    space.rdict_remove(rdict, w_df_key)
+                    break
     return space.new_array_from_rdict(rdict)
 
 
@@ -284,6 +288,10 @@ def array_fill(space, sidx, num, w_value):
         return space.w_False
 
     if sidx == 0:
+        if isinstance(w_value, W_IntObject):
+            return space.new_array_from_ints([w_value.intval] * num)
+        if isinstance(w_value, W_FloatObject):
+            return space.new_array_from_floats([w_value.floatval] * num)
         return space.new_array_from_list([w_value] * num)
 
     d = new_rdict()
@@ -499,20 +507,15 @@ def array_intersect(space, args_w):
             raise _not_an_array(i + 1)
     w_arr = args_w[0]
     rdict = space.get_rdict_from_array(w_arr)
-    args_w = args_w[1:]
+    indexes = [get_value_index(space, w_arg, STRING) for w_arg in args_w[1:]]
 
     with space.iter(w_arr) as w_arr_iter:
         while not w_arr_iter.done():
             w_arr_key, w_arr_val = w_arr_iter.next_item(space)
-            exists = 0
-            for i, w_arg in enumerate(args_w):
-                with space.iter(w_arg) as w_iter:
-                    while not w_iter.done():
-                        _, w_val = w_iter.next_item(space)
-                        if space.str_eq(w_arr_val, w_val):
-                            exists += 1
-            if exists < len(args_w):
-                space.rdict_remove(rdict, w_arr_key)
+            for index in indexes:
+                if index.find(w_arr_val) < 0:
+                    space.rdict_remove(rdict, w_arr_key)
+                    break
     return space.new_array_from_rdict(rdict)
 
 
@@ -684,7 +687,7 @@ SORT_DEFAULTS = SORT_ASC, SORT_REGULAR
 
 class ArrayMultisortFunction(BuiltinFunction):
     name = identifier = _fullname = 'array_multisort'
-    runner = None
+    runner = frame_runner = None
 
     def __init__(self):
         pass
@@ -994,21 +997,11 @@ def array_reverse(space, w_arr, preserve=False):
 def array_search(space, w_needle, w_haystack, strict=False):
     """ Searches the array for a given value and
     returns the corresponding key if successful """
-    with space.iter(w_haystack) as itr:
-        while not itr.done():
-            w_key, w_val = itr.next_item(space)
-            w_res = space.eq(w_needle, w_val)
-            if space.is_true(w_res):
-                if strict:
-                    if w_val.tp == w_needle.tp:
-                        return w_key
-                    else:
-                        return space.w_False
-                else:
-                    return w_key
-            else:
-                continue
-    return space.w_False
+    w_key = find_value(space, w_haystack, w_needle,
+                       STRICT if strict else LOOSE)
+    if w_key is None:
+        return space.w_False
+    return w_key
 
 
 @wrap(['space', 'reference'])
@@ -1104,6 +1097,14 @@ def _splice_add(space, new_arr, w_subs):
 @wrap(['space', ArrayArg(None)])
 def array_sum(space, w_arr):
     """ Calculate the sum of values in an array """
+    if isinstance(w_arr, W_ListArrayObject):
+        if w_arr.ints is not None:
+            return _sum_ints(space, w_arr.ints)
+        if w_arr.floats is not None:
+            total = 0.0
+            for f in w_arr.floats:
+                total += f
+            return space.newfloat(total)
     res = 0
     is_float = False
     with space.iter(w_arr) as itr:
@@ -1120,6 +1121,20 @@ def array_sum(space, w_arr):
     return space.newint(int(res))
 
 
+def _sum_ints(space, ints):
+    total = 0
+    for i in range(len(ints)):
+        try:
+            total = ovfcheck(total + ints[i])
+        except OverflowError:
+            # like PHP, continue the sum with floats
+            res = float(total)
+            for j in range(i, len(ints)):
+                res += ints[j]
+            return space.newfloat(res)
+    return space.newint(total)
+
+
 @wrap(['space', 'args_w'])
 def array_udiff_assoc(space, args_w):
     """ Computes the difference of arrays with additional index check,
@@ -1379,16 +1394,23 @@ def array_uintersect(space, args_w):
 @wrap(['space', ArrayArg(None), Optional(int)])
 def array_unique(space, w_arr, sort_type=0):
     """ Removes duplicate values from an array """
-    pairs = [(w_k, space.as_string(w_v))
-             for w_k, w_v in w_arr.as_pair_list(space)]
-    _sort(space, pairs, sort_type=sort_type, elem=VALUE)
-    last_val = None
     d = w_arr.get_rdict_from_array()
-    for w_k, w_v in pairs:
-        next_val = space.str_w(w_v)
-        if last_val == next_val:
-            del d[space.str_w(w_k)]
-        last_val = next_val
+    if sort_type == SORT_NUMERIC:
+        seen_num = {}
+        for w_k, w_v in w_arr.as_pair_list(space):
+            f = space.float_w(w_v)
+            if f in seen_num:
+                del d[space.str_w(w_k)]
+            else:
+                seen_num[f] = None
+    else:
+        seen = {}
+        for w_k, w_v in w_arr.as_pair_list(space):
+            s = space.str_w(space.as_string(w_v))
+            if s in seen:
+                del d[space.str_w(w_k)]
+            else:
+                seen[s] = None
     return space.new_array_from_rdict(d)
 
 
@@ -1600,10 +1622,9 @@ def each(space, w_arr):
 @wrap(['space', 'unique_array'])
 def end(space, w_arr):
     """ Set the internal pointer of an array to its last element """
-    length = w_arr.arraylen()
-    if length == 0:
+    if w_arr.arraylen() == 0:
         return space.w_False
-    w_arr.current_idx = length - 1
+    w_arr._pointer_end()
     return w_arr._current(space)
 
 
@@ -1684,16 +1705,9 @@ def extract(space, w_arr, w_extr=None, prefix=None):
 @wrap(['space', W_Root, ArrayArg(None), Optional(bool)])
 def in_array(space, w_needle, w_haystack, strict=False):
     """ Checks if a value exists in an array """
-    with space.iter(w_haystack) as itr:
-        while not itr.done():
-            w_key, w_val = itr.next_item(space)
-            if space.eq_w(w_val, w_needle):
-                if strict:
-                    if w_val.tp == w_needle.tp:
-                        return space.w_True
-                else:
-                    return space.w_True
-    return space.w_False
+    w_key = find_value(space, w_haystack, w_needle,
+                       STRICT if strict else LOOSE)
+    return space.newbool(w_key is not None)
 
 
 @wrap(['space', 'unique_array'])
@@ -1775,23 +1789,16 @@ def natcasesort(space, w_ref):
 @wrap(['space', 'unique_array'])
 def next(space, w_arr):
     """ Advance the internal array pointer of an array """
-    length = w_arr.arraylen()
-    current_idx = w_arr.current_idx + 1
-    if current_idx >= length:
-        w_arr.current_idx = length
+    if not w_arr._pointer_next():
         return space.w_False
-    w_arr.current_idx = current_idx
     return w_arr._current(space)
 
 
 @wrap(['space', 'unique_array'])
 def prev(space, w_arr):
     """ Rewind the internal array pointer """
-    length = w_arr.arraylen()
-    current_idx = min(w_arr.current_idx, length) - 1
-    if current_idx < 0:
+    if not w_arr._pointer_prev():
         return space.w_False
-    w_arr.current_idx = current_idx
     return w_arr._current(space)
 
 
@@ -1858,7 +1865,11 @@ def _range(space, w_start, w_end, step=None):
         s = space.int_w(w_start)
         e = space.int_w(w_end)
         if step == int(step):
-            l = [space.wrap(int(x)) for x in _xrange(s, e, step)]
+            if abs(s - e) < step and abs(s - e) != 0:
+                space.ec.warn("range(): step exceeds the specified range")
+                return space.w_False
+            return space.new_array_from_ints(
+                [int(x) for x in _xrange(s, e, step)])
         else:
             l = [space.wrap(x) for x in _xrange(s, e, step)]
     elif w_start.tp == w_end.tp == space.tp_str:
@@ -1893,7 +1904,7 @@ def _range(space, w_start, w_end, step=None):
 @wrap(['space', 'unique_array'])
 def reset(space, w_arr):
     """ Set the internal pointer of an array to its first element """
-    w_arr.current_idx = 0
+    w_arr._pointer_reset()
     return w_arr._current(space)
 
 
@@ -1906,7 +1917,11 @@ def rsort(space, w_ref, sort_type=0):
                       "to be array, %s given"
                       % space.get_type_name(w_arr.tp))
         return space.w_False
-    values = w_arr._values(space)
+    w_sorted = _sort_unboxed(space, w_arr, sort_type, True)
+    if w_sorted is not None:
+        w_ref.store(w_sorted)
+        return space.w_True
+    values = list(w_arr._values(space))
     _sort(space, values, sort_type=sort_type)
     values.reverse()
     w_ref.store(space.new_array_from_list(values))
@@ -1948,12 +1963,39 @@ def sort(space, w_ref, sort_type=0):
                       "to be array, %s given"
                       % space.get_type_name(w_arr.tp))
         return space.w_False
+    w_sorted = _sort_unboxed(space, w_arr, sort_type, False)
+    if w_sorted is not None:
+        w_ref.store(w_sorted)
+        return space.w_True
     values = list(w_arr._values(space))
     _sort(space, values, sort_type=sort_type)
     w_ref.store(space.new_array_from_list(values))
     return space.w_True
 
 
+def _sort_unboxed(space, w_arr, sort_type, reverse):
+    """Sort a list of unboxed ints or floats without boxing them, for
+    the sort types that compare them as numbers.  Return None for the
+    other arrays."""
+    if sort_type != SORT_REGULAR and sort_type != SORT_NUMERIC:
+        return None
+    if not isinstance(w_arr, W_ListArrayObject):
+        return None
+    if w_arr.ints is not None:
+        ints = w_arr.ints[:]
+        IntSort(ints).sort()
+        if reverse:
+            ints.reverse()
+        return space.new_array_from_ints(ints)
+    if w_arr.floats is not None:
+        floats = w_arr.floats[:]
+        FloatSort(floats).sort()
+        if reverse:
+            floats.reverse()
+        return space.new_array_from_floats(floats)
+    return None
+
+
 @wrap(['space', 'reference', 'callback'])
 def uasort(space, w_ref, w_callback):
     """ Sort an array with a user-defined comparison "
@@ -1,15 +1,17 @@
 import os, sys
+from stat import S_ISDIR
 from collections import OrderedDict
 from hippy.objects.base import W_Root
 from hippy.builtin import (
     wrap, Optional, FileResourceArg, FilenameArg, LongArg,
     BoolArg, StringArg, StreamContextArg, Resource, Nullable)
-from hippy.objects.resources.file_resource import W_FileResource
+from hippy.objects.resources.file_resource import (W_FileResource,
+    read_range, copy_to_output)
 from hippy.objects.resources.dir_resource import W_DirResource
 from hippy.objects.resources.stream_context import W_StreamContext
 from hippy.sort import _sort
-from rpython.rlib.rstring import StringBuilder
-from rpython.rlib.objectmodel import we_are_translated
+from hippy.csvparser import parse_csv, csv_char, wrap_csv_fields
+from rpython.rlib.objectmodel import we_are_translated, compute_hash
 from rpython.rlib import rfile # for side effects
 from rpython.rlib import rpath
 
@@ -42,6 +44,7 @@ def chgrp(space, fname, w_gid):
         return space.w_False
     gid = space.int_w(w_gid)
     try:
+        space.stat_cache.invalidate(fname)
         os.chown(fname, -1, gid)
         return space.w_True
     except OSError:
@@ -57,6 +60,7 @@ def _chmod(space, dirname, mode):
 
     mode = 0x7FFFFFFF & mode
     try:
+        space.stat_cache.invalidate(dirname)
         os.chmod(dirname, mode)
         return space.w_True
     except OSError:
@@ -76,6 +80,7 @@ def chown(space, fname, uid):
         return space.w_False
 
     try:
+        space.stat_cache.invalidate(fname)
         os.chown(fname, uid, -1)
         return space.w_True
     except OSError:
@@ -86,7 +91,10 @@ def chown(space, fname, uid):
 @wrap(['space', Optional(bool), Optional(str)])
 def clearstatcache(space, clear_realpath_cache=False, fname=None):
     """ clearstatcache - Clears file status cache """
-    pass
+    if clear_realpath_cache:
+        space.stat_cache.clear()
+    else:
+        space.stat_cache.clear_stats()
 
 
 @wrap(['space', str, str, Optional(Nullable(StreamContextArg(None)))], name="copy")
@@ -118,6 +126,7 @@ def _copy(space, source, dest, w_stream_ctx=None):
             pass
 
         f1 = open(source, "r")
+        space.stat_cache.invalidate(dest)
         f2 = open(dest, "w")
         while True:
             buf = f1.read(4096)
@@ -316,7 +325,44 @@ def fgetc(space, w_res):
        Optional(StringArg(False)), Optional(StringArg(False))])
 def fgetcsv(space, w_res, length=0, delimiter=',', enclosure='"', escape='\\'):
     """ fgetcsv - Gets line from file pointer and parse for CSV fields """
-    raise NotImplementedError
+    if not _check_stream(space, 'fgetcsv', w_res):
+        return space.w_False
+    assert isinstance(w_res, W_FileResource)
+    if length < 0:
+        space.ec.warn("fgetcsv(): Length parameter may not be negative")
+        return space.w_False
+    delimiter = csv_char(space, 'fgetcsv', 'delimiter', delimiter)
+    if delimiter is None:
+        return space.w_False
+    enclosure = csv_char(space, 'fgetcsv', 'enclosure', enclosure)
+    if enclosure is None:
+        return space.w_False
+    escape = csv_char(space, 'fgetcsv', 'escape', escape)
+    if escape is None:
+        return space.w_False
+    limit = length if length > 0 else -1
+    try:
+        line = w_res.readline(False, limit)
+        if not line:
+            return space.w_False
+        fields = parse_csv(line, w_res, delimiter[0], enclosure[0],
+                           escape[0], limit)
+    except IOError:
+        return space.w_False
+    return wrap_csv_fields(space, fields)
+
+
+def _check_stream(space, funcname, w_res):
+    if w_res.tp == space.tp_bool:
+        space.ec.warn("%s() expects parameter 1 to be "
+                      "resource, boolean given" % funcname)
+        return False
+    assert isinstance(w_res, W_FileResource)
+    if not w_res.is_valid():
+        space.ec.warn("%s(): %d is not a valid stream resource"
+                      % (funcname, w_res.res_id))
+        return False
+    return True
 
 
 @wrap(['space', FileResourceArg(False), 'num_args',
@@ -348,19 +394,10 @@ def fgets(space, w_res, num_args, size=0):
         except IOError:
             return space.w_False
     try:
-        idx = 1
-        c = w_res.read(1)
-        line = StringBuilder()
-        line.append(c)
-        while c != os.linesep:
-            if idx > size - 2:
-                break
-            idx += 1
-            c = w_res.read(1)
-            line.append(c)
-            if not c:
-                w_res.eof = True
-        return space.newstr(line.build())
+        line = w_res.readline(False, size - 1)
+        if not line:
+            return space.w_False
+        return space.newstr(line)
     except IOError:
         return space.w_False
 
@@ -381,7 +418,7 @@ def file_exists(space, fname):
                       "to be a valid path, string given")
         return space.w_Null
     try:
-        return space.wrap(rpath.exists(fname))
+        return space.wrap(space.stat_cache.exists(fname))
     except TypeError:
         return space.w_False
 
@@ -407,20 +444,21 @@ def file_get_contents(space, fname, num_args, use_include_path=False,
     fname = space.ec.interpreter.find_file(fname)
     if fname is None:
         return space.w_False
+    if num_args < 4 or offset < 0:
+        offset = 0
+    if num_args >= 5:
+        if maxlen < 0:
+            space.ec.warn("file_get_contents(): length must be "
+                          "greater than or equal to zero")
+            return space.w_False
+    else:
+        maxlen = -1
     try:
         f = open(fname, 'r')
-        res = f.read()
-        f.close()
-        if num_args >= 4 and offset >= 0:
-            if num_args >= 5:
-                if maxlen < 0:
-                    space.ec.warn("file_get_contents(): length must be "
-                                  "greater than or equal to zero")
-                    return space.w_False
-                res = res[offset:maxlen + offset]
-            else:
-                res = res[offset:]
-
+        try:
+            res = read_range(f, offset, maxlen)
+        finally:
+            f.close()
         return space.newstr(res)
     except OSError:
         space.ec.warn("file_get_contents(%s): failed to "
@@ -474,6 +512,7 @@ def file_put_contents(space, fname, w_data, mode=0, w_ctx=None):
     if data is None:
         return space.w_False
     try:
+        space.stat_cache.invalidate(fname)
         if append:
             f = open(fname, 'a+')
         else:
@@ -519,17 +558,24 @@ def _file(space, fname, flags=0, w_ctx=None):
     skip_empty_lines = flags & 4 != 0
     try:
         _fname = os.path.normpath(fname)
-        arr_list = []
         fstream = open(_fname)
-        line = fstream.readline()
-        while line != '':
-            if ignore_new_lines:
-                line = line.rstrip('\n')
-            if skip_empty_lines and line == "":
-                line = fstream.readline()
-                continue
-            arr_list.append(space.newstr(line))
-            line = fstream.readline()
+        try:
+            data = read_range(fstream)
+        finally:
+            fstream.close()
+        arr_list = []
+        start = 0
+        while start < len(data):
+            assert start >= 0
+            end = data.find('\n', start)
+            if end < 0:
+                end = len(data)
+                stop = end
+            else:
+                stop = end if ignore_new_lines else end + 1
+            if not (skip_empty_lines and stop == start):
+                arr_list.append(space.newstr(data[start:stop]))
+            start = end + 1
         return space.new_array_from_list(arr_list)
     except OSError:
         space.ec.warn("file(%s): failed to open stream: "
@@ -549,7 +595,7 @@ def fileatime(space, fname):
     if fname == "":
         return space.w_Null
     try:
-        res = os.stat(fname).st_atime
+        res = space.stat_cache.stat(fname).st_atime
         return space.wrap(int(res))
     except OSError:
         space.ec.warn("fileatime(): stat failed for %s" % fname)
@@ -564,7 +610,7 @@ def filectime(space, fname):
     if fname == "":
         return space.w_Null
     try:
-        res = os.stat(fname).st_ctime
+        res = space.stat_cache.stat(fname).st_ctime
         return space.wrap(int(res))
     except OSError:
         space.ec.warn("filectime(): stat failed for %s" % fname)
@@ -581,7 +627,7 @@ def _filegroup(space, fname):
     if fname == "":
         return space.w_False
     try:
-        res = os.stat(fname).st_gid
+        res = space.stat_cache.stat(fname).st_gid
         return space.wrap(res)
     except OSError:
         space.ec.warn("filegroup(): stat failed for %s" % fname)
@@ -607,7 +653,7 @@ def _fileinode(space, fname):
         return space.w_False
 
     try:
-        res = os.stat(fname).st_ino
+        res = space.stat_cache.stat(fname).st_ino
         return space.wrap(res)
     except OSError:
         space.ec.warn("fileinode(): stat failed for %s" % fname)
@@ -630,7 +676,7 @@ def filemtime(space, fname):
     if fname == "":
         return space.w_Null
     try:
-        res = os.stat(fname).st_mtime
+        res = space.stat_cache.stat(fname).st_mtime
         return space.wrap(int(res))
     except OSError:
         space.ec.warn("filemtime(): stat failed for %s" % fname)
@@ -650,7 +696,7 @@ def fileowner(space, fname):
         return space.w_False
 
     try:
-        res = os.stat(fname).st_uid
+        res = space.stat_cache.stat(fname).st_uid
         return space.wrap(res)
     except OSError:
         space.ec.warn("fileowner(): stat failed for %s" % fname)
@@ -672,7 +718,7 @@ def fileperms(space, fname):
         return space.w_False
 
     try:
-        res = os.stat(fname).st_mode
+        res = space.stat_cache.stat(fname).st_mode
         return space.wrap(res)
     except OSError:
         space.ec.warn("fileperms(): stat failed for %s" % fname)
@@ -691,7 +737,7 @@ def filesize(space, fname):
 
     try:
         assert fname is not None
-        res = os.stat(fname).st_size
+        res = space.stat_cache.stat(fname).st_size
         return space.wrap(res)
     except OSError:
         space.ec.warn("filesize(): stat failed for %s" % fname)
@@ -786,6 +832,8 @@ def _fopen(space, fname, mode, w_use_include_path=False, w_ctx=None):
         mode = mode.replace("x", "w")
 
     try:
+        if not mode.startswith('r'):
+            space.stat_cache.invalidate(fname)
         w_res = W_FileResource(space, fname, mode)
         w_res.open()
         return w_res
@@ -1023,7 +1071,7 @@ def is_dir(space, dname):
 def _is_dir(space, dname):
     try:
         assert dname is not None
-        res = os.path.isdir(dname)
+        res = space.stat_cache.isdir(dname)
     except TypeError:
         res = False
     return space.wrap(res)
@@ -1058,7 +1106,7 @@ def _is_file(space, fname):
         return space.w_Null
     try:
         assert fname is not None
-        return space.wrap(os.path.isfile(fname))
+        return space.wrap(space.stat_cache.isfile(fname))
     except OSError:
         return space.w_False
     except TypeError:
@@ -1148,6 +1196,7 @@ def _link(space, source, dest):
     if not is_in_basedir(space, 'link', rpath.realpath(source)):
         return space.w_False
     try:
+        space.stat_cache.invalidate(dest)
         os.link(source, dest)
         return space.w_True
     except OSError, e:
@@ -1210,6 +1259,7 @@ def _mkdir(space, dirname, mode=0777, recursive=False, w_ctx=None):
     if not is_in_basedir(space, 'mkdir', rpath.realpath(dirname)):
         return space.w_False
 
+    space.stat_cache.invalidate(dirname)
     try:
         if not os.path.isdir(dirname):
             if recursive:
@@ -1327,8 +1377,7 @@ def popen(space, command, mode):
     try:
         a = os.popen(command, mode)
         w_res = W_FileResource(space, '<proc>', 'w+')
-        w_res.resource = a
-        w_res.state = 1
+        w_res.attach(a)
         return w_res
     except OSError:
         space.ec.warn("popen(%s,%s):" % (command, mode))
@@ -1357,10 +1406,11 @@ def readfile(space, fname, use_include_path=False, w_ctx=None):
         fname = space.ec.interpreter.find_file(fname)
     try:
         f = open(fname, 'r')
-        res = f.read()
-        space.ec.interpreter.writestr(res)
-        f.close()
-        return space.newint(len(res))
+        try:
+            res = copy_to_output(space.ec.interpreter, f)
+        finally:
+            f.close()
+        return space.newint(res)
     except OSError, e:
         space.ec.warn("readfile(%s): failed to open stream: "
                       "%s" % (fname, os.strerror(e.errno)))
@@ -1391,8 +1441,28 @@ def readlink(space, linkname):
         space.ec.warn("readlink(): %s" % os.strerror(e.errno))
         return space.w_False
 
-""" realpath_cache_get - Get realpath cache entries """
-""" realpath_cache_size - Get realpath cache size """
+@wrap(['space'])
+def realpath_cache_get(space):
+    """ realpath_cache_get - Get realpath cache entries """
+    pairs = []
+    for entry in space.stat_cache.realpath_entries():
+        realpath = entry.realpath
+        if realpath is None:
+            realpath = entry.path
+        w_entry = space.new_array_from_pairs([
+            (space.newstr('key'), space.newint(compute_hash(entry.path))),
+            (space.newstr('is_dir'), space.newbool(S_ISDIR(entry.mode))),
+            (space.newstr('realpath'), space.newstr(realpath)),
+            (space.newstr('expires'), space.newint(int(entry.expires))),
+        ])
+        pairs.append((space.newstr(entry.path), w_entry))
+    return space.new_array_from_pairs(pairs)
+
+
+@wrap(['space'])
+def realpath_cache_size(space):
+    """ realpath_cache_size - Get realpath cache size """
+    return space.newint(space.stat_cache.used)
 
 
 @wrap(['space', FilenameArg(None)])
@@ -1401,8 +1471,8 @@ def realpath(space, fname):
     if not is_in_basedir(space, 'realpath', fname):
         return space.w_False
     try:
-        path = rpath.realpath(fname)
-        if rpath.exists(path):
+        path = space.stat_cache.realpath(fname)
+        if path is not None:
             return space.wrap(path)
         return space.w_False
     except OSError:
@@ -1429,6 +1499,8 @@ def rename(space, source, dest, w_ctx=None):
         return space.w_False
 
     try:
+        space.stat_cache.invalidate(source)
+        space.stat_cache.invalidate(dest)
         os.rename(source, dest)
         return space.w_True
     except OSError, e:
@@ -1467,6 +1539,7 @@ def _rmdir(space, dirname, w_ctx=None):
         return space.w_False
 
     try:
+        space.stat_cache.invalidate(dirname)
         os.rmdir(dirname)
         return space.w_True
     except OSError, e:
@@ -1481,7 +1554,7 @@ def _rmdir(space, dirname, w_ctx=None):
 def _stat(space, fname):
     if fname == '':
         return space.w_False
-    sr = os.stat(fname)
+    sr = space.stat_cache.stat(fname)
     rdict_w = OrderedDict()
     stats = [
         ("dev", space.newint(int(sr.st_dev))),
@@ -1540,6 +1613,7 @@ def symlink(space, source, dest):
     if not is_in_basedir(space, 'symlink', rpath.realpath(dest)):
         return space.w_False
     try:
+        space.stat_cache.invalidate(dest)
         os.symlink(source, dest)
         return space.w_True
     except OSError,  e:
@@ -1570,6 +1644,7 @@ def tempnam(space, dname, prefix):
         return space.w_False
 
     try:
+        space.stat_cache.invalidate(res)
         w_res = W_FileResource(space, res, 'w+')
         w_res.open()
         w_res.chmod(0600)
@@ -1588,8 +1663,7 @@ def tmpfile(space):
     """ tmpfile - Creates a temporary file """
     fd = os.tmpfile()
     w_res = W_FileResource(space, '<tmpfile>', 'w+')
-    w_res.resource = fd
-    w_res.state = 1
+    w_res.attach(fd)
     return w_res
 
 
@@ -1607,6 +1681,7 @@ def touch(space, fname, mtime=-1, atime=-1):
     if fname == "":
         return space.w_False
     try:
+        space.stat_cache.invalidate(fname)
         if not rpath.exists(fname):
             open(fname, 'w').close()
         if atime != -1:
@@ -1636,6 +1711,7 @@ def _unlink(space, fname, w_ctx=None):
         return space.w_False
 
     try:
+        space.stat_cache.invalidate(fname)
         os.remove(fname)
         return space.w_True
     except OSError, e:
@@ -1655,6 +1731,7 @@ def _chdir(space, dname):
     try:
         if not os.path.isdir(dname):
             space.ec.warn("chdir(): Not a directory (errno 20)")
+        space.stat_cache.chdir()
         os.chdir(dname)
         return space.w_True
     except OSError:
@@ -1669,6 +1746,7 @@ def chroot(space, dname):
     try:
         path = os.path.join(os.getcwd(), dname)
         assert path is not None
+        space.stat_cache.clear()
         w_res = space.wrap(os.chroot(path))
         os.chdir('/')
         return w_res
@@ -1783,6 +1861,39 @@ def stream_context_create(space, args_w):
     return W_StreamContext(space)
 
 
+@wrap(['space', FileResourceArg(False), int, Optional(str)], error=False)
+def stream_get_line(space, w_res, length, ending=''):
+    """ stream_get_line - Gets line from stream resource up to a given
+    delimiter """
+    if not _check_stream(space, 'stream_get_line', w_res):
+        return space.w_False
+    assert isinstance(w_res, W_FileResource)
+    if length < 0:
+        space.ec.warn("stream_get_line(): The maximum allowed length "
+                      "must be greater than or equal to zero")
+        return space.w_False
+    if length == 0:
+        length = 8192
+    try:
+        line = w_res.read_until(ending, length)
+    except IOError:
+        return space.w_False
+    if line is None:
+        return space.w_False
+    return space.newstr(line)
+
+
+@wrap(['space', FileResourceArg(False), int], error=False)
+def stream_set_read_buffer(space, w_res, size):
+    """ stream_set_read_buffer - Set read file buffering on the given
+    stream """
+    if not _check_stream(space, 'stream_set_read_buffer', w_res):
+        return space.w_False
+    assert isinstance(w_res, W_FileResource)
+    w_res.set_read_buffer(size)
+    return space.newint(0)
+
+
 @wrap(['space', W_Root])
 def get_resource_type(space, w_obj):
     if space.is_resource(w_obj):
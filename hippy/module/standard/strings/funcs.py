@@ -12,6 +12,7 @@ from hippy.objspace import ObjSpace, getspace, PHP_WHITESPACE
 from hippy.builtin import (
     wrap, Optional, LongArg, StringArg, BoolArg, ExitFunctionWithError)
 from hippy.objects.resources.file_resource import W_FileResource
+from hippy.csvparser import parse_csv, csv_char, wrap_csv_fields
 from hippy.error import ConvertError
 from hippy.objects.base import W_Root
 from hippy.constants import CONSTS
@@ -22,6 +23,7 @@ from rpython.rlib.rarithmetic import r_uint
 from hippy.objects.convert import strtol
 from rpython.rlib.rarithmetic import intmask, ovfcheck
 from hippy.module.standard.math.funcs import _bin
+from hippy.module.standard.strings.multireplace import Automaton, table_key
 
 # Side-effect: register the functions defined there:
 from hippy import locale
@@ -123,8 +125,12 @@ def _apply_charmap(string, charmap, alloc):
     return s
 
 
-def _pairs_from_array(space, w_replacements):
-    pairs = {}
+def _replacement_automaton(space, w_replacements):
+    """The automaton of strtr() with the array 'w_replacements'."""
+    keys = []
+    values = []
+    key_builder = StringBuilder()
+    key_builder.append('t')
     with space.iter(w_replacements) as w_iter:
         while not w_iter.done():
             w_key, w_val = w_iter.next_item(space)
@@ -132,36 +138,16 @@ def _pairs_from_array(space, w_replacements):
             if len(key) == 0:
                 raise ValidationError
             val = space.str_w(w_val)
-            pairs.setdefault(len(key), {})[key] = val
-    return pairs
-
-
-def _apply_replacement(pairs, string):
-    if not pairs:
-        return string
-    minlen = sys.maxint
-    maxlen = 0
-    for pair in pairs:
-        minlen = min(minlen, pair)
-        maxlen = max(maxlen, pair)
-    builder = StringBuilder(len(string))
-    i = 0
-    while i < len(string):
-        j = min(maxlen, len(string) - i)
-        while j >= minlen:
-            substr = string[i:i + j]
-            try:
-                builder.append(pairs[j][substr])
-                i += j
-                break
-            except KeyError:
-                pass
-            j -= 1
-        else:
-            builder.append(string[i])
-            i += 1
-    s = builder.build()
-    return s
+            keys.append(key)
+            values.append(val)
+            table_key(key_builder, key)
+            table_key(key_builder, val)
+    cache_key = key_builder.build()
+    automaton = space.replace_cache.get(cache_key)
+    if automaton is None:
+        automaton = Automaton(keys, values)
+        space.replace_cache.set(cache_key, automaton)
+    return automaton
 
 
 def charmask(space, char_list, caller):
@@ -1318,11 +1304,21 @@ def sha1(space, s, raw_output=False):
 #    """Parses input from a string according to a format."""
 #    raise NotImplementedError()
 
-#
-#@wrap(['space', 'args_w'])
-#def str_getcsv(space, args_w):
-#    """Parse a CSV string into an array."""
-#    raise NotImplementedError()
+
+@wrap(['space', str, Optional(str), Optional(str), Optional(str)])
+def str_getcsv(space, input, delimiter=',', enclosure='"', escape='\\'):
+    """Parse a CSV string into an array."""
+    delimiter = csv_char(space, 'str_getcsv', 'delimiter', delimiter)
+    if delimiter is None:
+        return space.w_False
+    enclosure = csv_char(space, 'str_getcsv', 'enclosure', enclosure)
+    if enclosure is None:
+        return space.w_False
+    escape = csv_char(space, 'str_getcsv', 'escape', escape)
+    if escape is None:
+        return space.w_False
+    fields = parse_csv(input, None, delimiter[0], enclosure[0], escape[0])
+    return wrap_csv_fields(space, fields)
 
 
 STR_PAD_RIGHT = CONSTS['standard']['STR_PAD_RIGHT']
@@ -1407,28 +1403,69 @@ def _do_replace(search, replace, subject, case_insensitive):
     return s.build(), count
 
 
-def _str_xreplace_item(space, w_search, w_replace, subject, w_count,
-        case_insensitive):
-    if w_search.tp == space.tp_array:
-        count = 0
-        s = subject
-        search_iter = space.create_iter(w_search)
-        n_search = space.arraylen(w_search)
-        repls = _broadcast_as_list(w_replace, n_search, "", space.str_w)
-        for i in range(n_search):
-            _, w_val = search_iter.next_item(space)
-            search = space.str_w(w_val)
-            s, _count = _do_replace(search, repls[i], s, case_insensitive)
-            count += _count
-        return s, count
+def _search_automaton(space, searches, case_insensitive):
+    """The automaton finding the non-empty 'searches' of str_replace(),
+    in lowercase for str_ireplace()."""
+    keys = []
+    key_builder = StringBuilder()
+    if case_insensitive:
+        key_builder.append('i')
+    else:
+        key_builder.append('s')
+    for search in searches:
+        if len(search) == 0:
+            continue
+        if case_insensitive:
+            search = locale.lower(search)
+        keys.append(search)
+        table_key(key_builder, search)
+    cache_key = key_builder.build()
+    automaton = space.replace_cache.get(cache_key)
+    if automaton is None:
+        automaton = Automaton(keys, [])
+        space.replace_cache.set(cache_key, automaton)
+    return automaton
+
+
+def _do_replace_all(searches, repls, automaton, subject, case_insensitive):
+    """Replace each of the 'searches' in turn, in the result of the
+    previous ones.  Until something is replaced, the searches that do not
+    occur in 'subject' are skipped: one pass of the automaton finds them
+    all."""
+    if case_insensitive:
+        occurs = automaton.occurrences(locale.lower(subject))
     else:
-        search = space.str_w(w_search)
-        replace = space.str_w(w_replace)
-        return _do_replace(search, replace, subject, case_insensitive)
+        occurs = automaton.occurrences(subject)
+    s = subject
+    count = 0
+    j = 0
+    for i in range(len(searches)):
+        search = searches[i]
+        if len(search) == 0:
+            continue
+        found = occurs[j]
+        j += 1
+        if not found and count == 0:
+            continue
+        s, _count = _do_replace(search, repls[i], s, case_insensitive)
+        count += _count
+    return s, count
 
 
 def _str_xreplace(space, w_search, w_replace, w_subject, w_count,
         case_insensitive):
+    searches = None
+    repls = None
+    automaton = None
+    if w_search.tp == space.tp_array:
+        searches = []
+        with space.iter(w_search) as w_iter:
+            while not w_iter.done():
+                _, w_val = w_iter.next_item(space)
+                searches.append(space.str_w(w_val))
+        repls = _broadcast_as_list(w_replace, len(searches), "",
+                                   space.str_w)
+        automaton = _search_automaton(space, searches, case_insensitive)
     if w_subject.tp == space.tp_array:
         subject_iter = space.create_iter(w_subject)
         n = space.arraylen(w_subject)
@@ -1440,8 +1477,13 @@ def _str_xreplace(space, w_search, w_replace, w_subject, w_count,
                 result.append((key, w_val))
                 continue
             subject = space.str_w(w_val)
-            s, _count = _str_xreplace_item(space, w_search, w_replace,
-                    subject, w_count, case_insensitive)
+            if automaton is not None:
+                s, _count = _do_replace_all(searches, repls, automaton,
+                                            subject, case_insensitive)
+            else:
+                s, _count = _do_replace(space.str_w(w_search),
+                                        space.str_w(w_replace), subject,
+                                        case_insensitive)
             count += _count
             result.append((key, space.newstr(s)))
         if w_count is not None:
@@ -1449,8 +1491,13 @@ def _str_xreplace(space, w_search, w_replace, w_subject, w_count,
         return space.new_array_from_pairs(result)
     else:
         subject = space.str_w(w_subject)
-        s, count = _str_xreplace_item(space, w_search, w_replace, subject,
-                w_count, case_insensitive)
+        if automaton is not None:
+            s, count = _do_replace_all(searches, repls, automaton, subject,
+                                       case_insensitive)
+        else:
+            s, count = _do_replace(space.str_w(w_search),
+                                   space.str_w(w_replace), subject,
+                                   case_insensitive)
         if w_count is not None:
             w_count.store(space.newint(count))
         return space.newstr(s)
@@ -1952,10 +1999,11 @@ def strtr(space, string, w_from, to=None):
         if not string:
             return space.newstr(string)
         try:
-            pairs = _pairs_from_array(space, w_from)
+            automaton = _replacement_automaton(space, w_from)
         except ValidationError:
             return space.w_False
-        return space.newstr(_apply_replacement(pairs, string))
+        result, _ = automaton.replace(string)
+        return space.newstr(result)
     else:
         if not string:
             return space.newstr(string)
@@ -0,0 +1,193 @@
+""" Aho-Corasick automata matching many strings at once, for strtr() with
+an array of replacements and str_replace() with an array of searches.
+
+strtr() replaces, scanning from left to right, the longest of its keys
+that starts at the leftmost position where any of them does: that is
+Automaton.replace().  str_replace() applies its searches one after the
+other, each one to the result of the previous ones, so it cannot be done
+in a single pass in general; but Automaton.occurrences() tells in one
+pass which of the searches occur in the subject at all, and a search
+that does not occur can be skipped as long as nothing was replaced yet.
+
+Building an automaton costs more than one scan with it, so the automata
+are kept in a ReplaceCache on the space, keyed by the contents of the
+table: the same tables tend to be used over and over.
+"""
+
+from rpython.rlib.rstring import StringBuilder
+
+DEFAULT_CACHE_SIZE = 64
+
+
+class Automaton(object):
+    """ The automaton of the non-empty strings 'keys'.  'replacements' is
+    empty, or the replacement of each key; if a key is repeated, the last
+    replacement wins.
+
+    The states are numbered, 0 is the initial one, and are the nodes of
+    the trie of the keys: 'depth' is the length of the prefix that a state
+    stands for.  'fail' leads to the state of the longest proper suffix
+    of that prefix which is a state too, and 'match' to the state of the
+    longest key that is a suffix of it, or -1.
+    """
+    _immutable_fields_ = ['children[*]', 'root[*]', 'depth[*]', 'fail[*]',
+                          'match[*]', 'terminal[*]', 'key_state[*]',
+                          'replacements[*]']
+
+    def __init__(self, keys, replacements):
+        children = [{}]
+        depth = [0]
+        terminal = [-1]
+        key_state = []
+        for i in range(len(keys)):
+            key = keys[i]
+            assert len(key) > 0
+            state = 0
+            for c in key:
+                nxt = children[state].get(c, -1)
+                if nxt < 0:
+                    nxt = len(children)
+                    children.append({})
+                    depth.append(depth[state] + 1)
+                    terminal.append(-1)
+                    children[state][c] = nxt
+                state = nxt
+            terminal[state] = i
+            key_state.append(state)
+        self.children = children
+        self.depth = depth
+        self.terminal = terminal
+        self.key_state = key_state
+        self.replacements = replacements
+        root = [0] * 256
+        for c, nxt in children[0].items():
+            root[ord(c)] = nxt
+        self.root = root
+        self._compute_links()
+
+    def _compute_links(self):
+        # breadth-first, so that the links of the shorter prefixes are
+        # known when they are needed
+        n = len(self.children)
+        fail = [0] * n
+        match = [-1] * n
+        queue = [0]
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i += 1
+            if self.terminal[state] >= 0:
+                match[state] = state
+            elif state != 0:
+                match[state] = match[fail[state]]
+            for c, nxt in self.children[state].items():
+                if state == 0:
+                    fail[nxt] = 0
+                else:
+                    fail[nxt] = self._step(fail, fail[state], c)
+                queue.append(nxt)
+        self.fail = fail
+        self.match = match
+
+    def _step(self, fail, state, c):
+        while True:
+            if state == 0:
+                return self.root[ord(c)]
+            nxt = self.children[state].get(c, -1)
+            if nxt >= 0:
+                return nxt
+            state = fail[state]
+
+    def next_state(self, state, c):
+        return self._step(self.fail, state, c)
+
+    def replace(self, string):
+        """Replace the keys in 'string' like strtr(): leftmost first, and
+        the longest one at a given position.  Returns the new string and
+        the number of replacements."""
+        builder = None
+        copied = 0
+        count = 0
+        pos = 0
+        state = 0
+        # the best match found so far, string[best_start:best_end]
+        best_state = -1
+        best_start = 0
+        best_end = 0
+        n = len(string)
+        while True:
+            if pos < n:
+                state = self.next_state(state, string[pos])
+                pos += 1
+                if best_state < 0 or pos - self.depth[state] <= best_start:
+                    # this match, if any, starts where the prefix matched
+                    # by 'state' does or later: it is only better than the
+                    # current best if it starts before it, or at the same
+                    # position and ends later
+                    m = self.match[state]
+                    if m >= 0:
+                        start = pos - self.depth[m]
+                        if best_state < 0 or start <= best_start:
+                            best_state = m
+                            best_start = start
+                            best_end = pos
+                    continue
+                # no match can start at or before 'best_start' any more
+            elif best_state < 0:
+                break
+            if builder is None:
+                builder = StringBuilder(n)
+            builder.append_slice(string, copied, best_start)
+            builder.append(self.replacements[self.terminal[best_state]])
+            copied = best_end
+            count += 1
+            pos = best_end
+            state = 0
+            best_state = -1
+        if builder is None:
+            return string, 0
+        builder.append_slice(string, copied, n)
+        return builder.build(), count
+
+    def occurrences(self, string):
+        """Which of the keys occur in 'string', as a list of booleans."""
+        seen = [False] * len(self.children)
+        state = 0
+        for c in string:
+            state = self.next_state(state, c)
+            m = self.match[state]
+            # the keys that end here, longest first; the ones after an
+            # already seen key were seen at the same time
+            while m >= 0 and not seen[m]:
+                seen[m] = True
+                m = self.match[self.fail[m]]
+        return [seen[state] for state in self.key_state]
+
+
+class ReplaceCache(object):
+    """ The automata of the recently used replacement tables, by key.
+    There are at most 'capacity' of them: when full, the cache starts
+    again from empty.
+    """
+
+    def __init__(self, capacity=DEFAULT_CACHE_SIZE):
+        self._contents = {}
+        self.capacity = capacity
+
+    def size(self):
+        return len(self._contents)
+
+    def get(self, key):
+        return self._contents.get(key, None)
+
+    def set(self, key, automaton):
+        if len(self._contents) >= self.capacity:
+            self._contents.clear()
+        self._contents[key] = automaton
+
+
+def table_key(builder, s):
+    """Add 's' to the cache key being built in 'builder'."""
+    builder.append(str(len(s)))
+    builder.append(':')
+    builder.append(s)
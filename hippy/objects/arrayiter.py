@@ -22,6 +22,48 @@ class W_ListArrayIterator(W_BaseIterator):
         self.finished = self.index == len(self.storage_w)
         return space.wrap(index), w_value
 
+class W_IntListArrayIterator(W_BaseIterator):
+
+    def __init__(self, ints):
+        self.ints = ints
+        self.index = 0
+        self.finished = len(ints) == 0
+
+    def next(self, space):
+        index = self.index
+        w_value = space.newint(self.ints[index])
+        self.index = index + 1
+        self.finished = self.index == len(self.ints)
+        return w_value
+
+    def next_item(self, space):
+        index = self.index
+        w_value = space.newint(self.ints[index])
+        self.index = index + 1
+        self.finished = self.index == len(self.ints)
+        return space.wrap(index), w_value
+
+class W_FloatListArrayIterator(W_BaseIterator):
+
+    def __init__(self, floats):
+        self.floats = floats
+        self.index = 0
+        self.finished = len(floats) == 0
+
+    def next(self, space):
+        index = self.index
+        w_value = space.newfloat(self.floats[index])
+        self.index = index + 1
+        self.finished = self.index == len(self.floats)
+        return w_value
+
+    def next_item(self, space):
+        index = self.index
+        w_value = space.newfloat(self.floats[index])
+        self.index = index + 1
+        self.finished = self.index == len(self.floats)
+        return space.wrap(index), w_value
+
 class ListArrayIteratorRef(W_BaseIterator):
     def __init__(self, space, r_array):
         self.r_array = r_array
@@ -69,45 +111,82 @@ class W_RDictArrayIterator(W_BaseIterator):
         key, w_value = self.dctiter.next()
         return wrap_array_key(space, key), w_value
 
-class RDictArrayIteratorRef(W_BaseIterator):
+class OrderedHashIteratorRef(W_BaseIterator):
+    """Iterating by reference over a hash array, which may be modified
+    during the iteration.  The iterator remembers the slot of the next
+    key (see OrderedKeysMixin in arrayobject.py).  If the slots were
+    rebuilt since, because the array was compacted, copied, or changed
+    strategy, it finds its place again from the last key returned.
+    """
+
     def __init__(self, space, r_array):
         self.r_array = r_array
-        self.index = 0
-        self.finished = self.is_finished()
-
-    def get_current_value(self):
-        key = self._current_index()
-        w_array = self.r_array.deref()
-        return w_array._getitem_str(key)
+        self.slot = 0
+        self.version = r_array.deref_temp()._slots_version()
+        self.w_lastkey = None
+        self.visited = 0
+        self.finished = self._find_slot(space) < 0
 
-    def _current_index(self):
+    def _find_slot(self, space):
         # NB: the array must be deref'd every time, in case it's been mutated
-        # between two calls to next()/next_item().
-        w_array = self.r_array.deref_temp()
-        keylist = w_array._getkeylist()
-        try:
-            return keylist[self.index]
-        except IndexError:
-            return None
-
-    def is_finished(self):
+        # between two calls to next()/next_item().  It may even have been
+        # given a string key, and switched to another strategy.
         w_array = self.r_array.deref_temp()
-        return self.index == w_array.arraylen()
+        version = w_array._slots_version()
+        if version != self.version:
+            slot = w_array._remap_slot(self.version, self.slot)
+            if slot < 0 and self.w_lastkey is not None:
+                slot = w_array._slot_after_key(space, self.w_lastkey)
+            if slot < 0:
+                slot = w_array._slot_of_ordinal(self.visited)
+            self.slot = slot
+            self.version = version
+        self.slot = w_array._next_live_slot(self.slot)
+        return self.slot
 
     def next(self, space):
-        r_value = self.get_current_value()
-        self.index += 1
-        self.finished = self.is_finished()
+        _, r_value = self.next_item(space)
         return r_value
 
     def next_item(self, space):
-        r_value = self.get_current_value()
-        key = self._current_index()
-        if key is None:
+        slot = self._find_slot(space)
+        if slot < 0:
+            self.finished = True
             return None, None
-        self.index += 1
-        self.finished = self.is_finished()
-        return wrap_array_key(space, key), r_value
+        w_key = self.r_array.deref_temp()._slot_key_w(space, slot)
+        w_array = self.r_array.deref()
+        r_value = w_array._lookup_item_ref(space, w_key)
+        self.w_lastkey = w_key
+        self.visited += 1
+        self.slot = slot + 1
+        self.finished = self._find_slot(space) < 0
+        return w_key, r_value
+
+
+class RDictArrayIteratorRef(OrderedHashIteratorRef):
+    pass
+
+
+class W_IntDictArrayIterator(W_BaseIterator):
+    def __init__(self, intdct_w):
+        self.intdct_w = intdct_w
+        self.dctiter = intdct_w.iteritems()
+        self.remaining = len(intdct_w)
+        self.finished = self.remaining == 0
+
+    def next(self, space):
+        self.remaining -= 1
+        self.finished = self.remaining == 0
+        return self.dctiter.next()[1]
+
+    def next_item(self, space):
+        self.remaining -= 1
+        self.finished = self.remaining == 0
+        key, w_value = self.dctiter.next()
+        return space.newint(key), w_value
+
+class IntDictArrayIteratorRef(OrderedHashIteratorRef):
+    pass
 
 
 class W_FixedIterator(W_BaseIterator):
@@ -3,6 +3,8 @@ from rpython.rlib.objectmodel import specialize, we_are_translated
 from rpython.rlib.rarithmetic import intmask
 
 from hippy.objects.base import W_Object
+from hippy.objects.intobject import W_IntObject
+from hippy.objects.floatobject import W_FloatObject
 from hippy.objects.reference import W_Reference, VirtualReference
 from hippy.objects.convert import force_float_to_int_in_any_way
 from hippy.error import ConvertError
@@ -18,6 +20,17 @@ def new_rdict():
     return OrderedDict()
 
 
+def new_intdict():
+    return OrderedDict()
+
+
+def intdict_to_rdict(intdct_w):
+    d = new_rdict()
+    for key, w_value in intdct_w.iteritems():
+        d[str(key)] = w_value
+    return d
+
+
 def try_convert_str_to_int(key):
     # try to convert 'key' from a string to an int, but carefully:
     # we must not remove any space, make sure the result does not
@@ -92,11 +105,48 @@ class W_ArrayObject(W_Object):
     This base class defines the general methods that can be implemented
     without needing to call (too often) the arraylen(), _getitem_str()
     and _getitem_int() methods.
+
+    copy() is O(1): the copy shares the storage of the original, and
+    both are flagged with '_shares_storage'.  The first of them that is
+    changed in place makes its own copy of the items first, in
+    _unshare_storage().
     """
 
+    _shares_storage = False
+
+    # see hippy/valueindex.py
+    _value_index = None
+    _value_probes = 0
+
+    def _note_copy(self):
+        """Called whenever the items of the array are actually copied."""
+        self.space.ec.array_copies += 1
+        self._note_making_a_copy()
+
+    def _make_storage_unique(self):
+        """Call before changing the storage in place."""
+        if self._shares_storage:
+            self._note_copy()
+            self._unshare_storage()
+            self._shares_storage = False
+        if self._value_probes:
+            self._value_index = None
+            self._value_probes = 0
+
+    def _unshare_storage(self):
+        raise NotImplementedError("abstract base class")
+
     @staticmethod
     def new_array_from_list(space, lst_w):
-        return W_ListArrayObject(space, lst_w)
+        return new_list_array(space, lst_w)
+
+    @staticmethod
+    def new_array_from_ints(space, ints):
+        return W_ListArrayObject(space, None, ints=ints)
+
+    @staticmethod
+    def new_array_from_floats(space, floats):
+        return W_ListArrayObject(space, None, floats=floats)
 
     @staticmethod
     def new_array_from_rdict(space, dct_w):
@@ -104,7 +154,8 @@ class W_ArrayObject(W_Object):
 
     @staticmethod
     def new_array_from_pairs(space, pairs_ww, allow_bogus=False):
-        rdct_w = new_rdict()
+        intdct_w = new_intdict()
+        rdct_w = None
         next_idx = 0
         for w_key, w_value in pairs_ww:
             if w_key is not None:
@@ -127,9 +178,19 @@ class W_ArrayObject(W_Object):
             if as_str is None:
                 if as_int >= next_idx:
                     next_idx = as_int + 1
+                if rdct_w is None:
+                    intdct_w[as_int] = w_value
+                    continue
                 as_str = str(as_int)
+            elif rdct_w is None:
+                # first string key: switch to string keys
+                rdct_w = intdict_to_rdict(intdct_w)
             rdct_w[as_str] = w_value
 
+        if rdct_w is None and len(intdct_w) > 0:
+            return W_IntDictArrayObject(space, intdct_w, next_idx=next_idx)
+        if rdct_w is None:
+            rdct_w = new_rdict()
         return W_RDictArrayObject(space, rdct_w, next_idx=next_idx)
 
     def copy_item(self):
@@ -297,6 +358,52 @@ class W_ArrayObject(W_Object):
     def _inplace_pop(self, space):
         raise NotImplementedError("abstract")
 
+    def _pointer_reset(self):
+        self.current_idx = 0
+
+    def _pointer_end(self):
+        self.current_idx = self.arraylen() - 1
+
+    def _pointer_next(self):
+        """Advance the internal pointer; return False if it went past the
+        last item."""
+        length = self.arraylen()
+        current_idx = self.current_idx + 1
+        if current_idx >= length:
+            self.current_idx = length
+            return False
+        self.current_idx = current_idx
+        return True
+
+    def _pointer_prev(self):
+        """Move the internal pointer back; return False, without moving
+        it, if it is on the first item."""
+        current_idx = min(self.current_idx, self.arraylen()) - 1
+        if current_idx < 0:
+            return False
+        self.current_idx = current_idx
+        return True
+
+    # the slots of the keys of the hash strategies, see OrderedKeysMixin
+
+    def _slots_version(self):
+        raise NotImplementedError("abstract")
+
+    def _remap_slot(self, version, slot):
+        raise NotImplementedError("abstract")
+
+    def _next_live_slot(self, slot):
+        raise NotImplementedError("abstract")
+
+    def _slot_of_ordinal(self, index):
+        raise NotImplementedError("abstract")
+
+    def _slot_key_w(self, space, slot):
+        raise NotImplementedError("abstract")
+
+    def _slot_after_key(self, space, w_key):
+        raise NotImplementedError("abstract")
+
     def get_rdict_from_array(self):
         raise NotImplementedError("abstract")
 
@@ -352,6 +459,14 @@ class W_ArrayObject(W_Object):
         array_serialize(self, space, builder, memo)
         return False # counted in array_serialize
 
+    def ll_serialize(self, serializer):
+        dct_w = self.as_rdict()
+        serializer.write_char("h")
+        serializer.write_int(len(dct_w))
+        for key, w_value in dct_w.iteritems():
+            serializer.write_str(key)
+            serializer.write_wrapped_item(w_value)
+
     def add(self, space, other_array):
         assert isinstance(other_array, W_ArrayObject)
 
@@ -369,74 +484,223 @@ class ListItemVRef(VirtualReference):
         self.index = index
 
     def deref(self):
-        return self.w_array.lst_w[self.index]
+        return self.w_array._getitem_boxed(self.index)
 
     def store(self, w_value, unique=False):
-        self.w_array.lst_w[self.index] = w_value
+        self.w_array._store_at(self.index, w_value)
 
     def __repr__(self):
         return '<ListItemVRef>'
 
+
+def new_list_array(space, lst_w, current_idx=0):
+    """Make a W_ListArrayObject of the items 'lst_w', unboxing them if
+    they are all ints or all floats."""
+    if not lst_w:
+        return W_ListArrayObject(space, None, current_idx, ints=[])
+    w_first = lst_w[0]
+    if isinstance(w_first, W_IntObject):
+        ints = [0] * len(lst_w)
+        for i in range(len(lst_w)):
+            w_item = lst_w[i]
+            if not isinstance(w_item, W_IntObject):
+                break
+            ints[i] = w_item.intval
+        else:
+            return W_ListArrayObject(space, None, current_idx, ints=ints)
+    elif isinstance(w_first, W_FloatObject):
+        floats = [0.0] * len(lst_w)
+        for i in range(len(lst_w)):
+            w_item = lst_w[i]
+            if not isinstance(w_item, W_FloatObject):
+                break
+            floats[i] = w_item.floatval
+        else:
+            return W_ListArrayObject(space, None, current_idx, floats=floats)
+    return W_ListArrayObject(space, lst_w, current_idx)
+
+
 class W_ListArrayObject(W_ArrayObject):
+    """An array whose keys are 0, 1, ..., n-1 in this order.  Exactly one
+    of 'ints', 'floats' and 'lst_w' holds the items: lists of only ints
+    or only floats keep them unboxed, and switch in place to boxed items
+    in 'lst_w' on the first store of anything else.  Empty lists start
+    as 'ints'.
+    """
     _has_string_keys = False
 
-    def __init__(self, space, lst_w, current_idx=0):
+    def __init__(self, space, lst_w, current_idx=0, ints=None, floats=None):
         self.space = space
         self.lst_w = lst_w
+        self.ints = ints
+        self.floats = floats
         self.current_idx = current_idx
 
-    def as_unique_arraylist(self):
-        self._note_making_a_copy()
-        lst_w = [item.copy_item() for item in self.lst_w]
-        return W_ListArrayObject(self.space, lst_w, current_idx=self.current_idx)
+    def _generalize(self):
+        """Switch to boxed items and return the list of them."""
+        lst_w = self.lst_w
+        if lst_w is None:
+            ints = self.ints
+            if ints is not None:
+                lst_w = [W_IntObject(i) for i in ints]
+                self.ints = None
+            else:
+                floats = self.floats
+                assert floats is not None
+                lst_w = [W_FloatObject(f) for f in floats]
+                self.floats = None
+            self.lst_w = lst_w
+        return lst_w
+
+    def _getitem_boxed(self, index):
+        ints = self.ints
+        if ints is not None:
+            return W_IntObject(ints[index])
+        floats = self.floats
+        if floats is not None:
+            return W_FloatObject(floats[index])
+        return self.lst_w[index]
+
+    def _store_at(self, index, w_value):
+        self._make_storage_unique()
+        ints = self.ints
+        if ints is not None:
+            if isinstance(w_value, W_IntObject):
+                ints[index] = w_value.intval
+                return
+        else:
+            floats = self.floats
+            if floats is not None and isinstance(w_value, W_FloatObject):
+                floats[index] = w_value.floatval
+                return
+        self._generalize()[index] = w_value
+
+    def _append(self, w_value):
+        self._make_storage_unique()
+        ints = self.ints
+        if ints is not None:
+            if isinstance(w_value, W_IntObject):
+                ints.append(w_value.intval)
+                return
+            if not ints and isinstance(w_value, W_FloatObject):
+                self.ints = None
+                self.floats = [w_value.floatval]
+                return
+        else:
+            floats = self.floats
+            if floats is not None and isinstance(w_value, W_FloatObject):
+                floats.append(w_value.floatval)
+                return
+        self._generalize().append(w_value)
+
+    def _delete_last(self):
+        self._make_storage_unique()
+        ints = self.ints
+        if ints is not None:
+            ints.pop()
+            return
+        floats = self.floats
+        if floats is not None:
+            floats.pop()
+            return
+        self.lst_w.pop()
+
+    def _unshare_storage(self):
+        if self.ints is not None:
+            self.ints = self.ints[:]
+        elif self.floats is not None:
+            self.floats = self.floats[:]
+        else:
+            self.lst_w = [item.copy_item() for item in self.lst_w]
 
     def as_list_w(self):
-        return self.lst_w[:]
+        if self.lst_w is not None:
+            return self.lst_w[:]
+        return [self._getitem_boxed(i) for i in range(self.arraylen())]
 
     def as_unique_arraydict(self):
-        self._note_making_a_copy()
+        self._note_copy()
         d = self.as_rdict()   # make a fresh dictionary
         return W_RDictArrayObject(self.space, d,
-                                  next_idx=len(self.lst_w),
+                                  next_idx=self.arraylen(),
                                   current_idx=self.current_idx)
 
+    def as_unique_intdict(self):
+        self._note_copy()
+        d = new_intdict()
+        for i in range(self.arraylen()):
+            d[i] = self._getitem_boxed(i).copy_item()
+        return W_IntDictArrayObject(self.space, d,
+                                    next_idx=self.arraylen(),
+                                    current_idx=self.current_idx)
+
     def arraylen(self):
+        ints = self.ints
+        if ints is not None:
+            return len(ints)
+        floats = self.floats
+        if floats is not None:
+            return len(floats)
         return len(self.lst_w)
 
     def as_rdict(self):
         d = new_rdict()
-        for i in range(len(self.lst_w)):
-            d[str(i)] = self.lst_w[i].copy_item()
+        for i in range(self.arraylen()):
+            d[str(i)] = self._getitem_boxed(i).copy_item()
         return d
 
     def get_rdict_from_array(self):
         return self.as_rdict()
 
+    def _slots_version(self):
+        return 0
+
+    def _remap_slot(self, version, slot):
+        if version == 0:
+            return slot
+        return -1
+
+    def _next_live_slot(self, slot):
+        if slot < self.arraylen():
+            return slot
+        return -1
+
+    def _slot_of_ordinal(self, index):
+        return index
+
+    def _slot_key_w(self, space, slot):
+        return space.newint(slot)
+
+    def _slot_after_key(self, space, w_key):
+        try:
+            as_int, as_str = convert_to_index(space, w_key)
+        except CannotConvertToIndex:
+            return -1
+        if as_str is not None or not 0 <= as_int < self.arraylen():
+            return -1
+        return as_int + 1
+
     def _current(self, space):
         index = self.current_idx
-        if 0 <= index < len(self.lst_w):
-            return self.lst_w[index]
+        if 0 <= index < self.arraylen():
+            return self._getitem_boxed(index)
         else:
             return space.w_False
 
     def _key(self, space):
         index = self.current_idx
-        if 0 <= index < len(self.lst_w):
+        if 0 <= index < self.arraylen():
             return space.newint(index)
         else:
             return space.w_Null
 
     def _getitem_int(self, index):
-        if index >= 0:
-            try:
+        if 0 <= index < self.arraylen():
+            if self.lst_w is not None:
                 res = self.lst_w[index]
-            except IndexError:
-                pass
-            else:
                 if isinstance(res, W_Reference):
                     return res
-                else:
-                    return ListItemVRef(self, index)
+            return ListItemVRef(self, index)
         return None
 
     def _getitem_str(self, key):
@@ -447,27 +711,27 @@ class W_ListArrayObject(W_ArrayObject):
         return self._getitem_int(i)
 
     def _appenditem(self, w_obj, as_ref=False):
-        self.lst_w.append(w_obj)
+        self._append(w_obj)
 
     def _setitem_int(self, index, w_value, as_ref, unique_item=False):
         length = self.arraylen()
         if index >= length:
             if index > length:
                 return self._convert_and_setitem_int(index, w_value)
-            self.lst_w.append(w_value)
+            self._append(w_value)
             return self
         #
         if index < 0:
             return self._convert_and_setitem_int(index, w_value)
         #
         # If overwriting an existing W_Reference object, we only update
-        # the value in the reference.  Else we need to update 'lst_w'.
-        if not as_ref:
+        # the value in the reference.  Else we need to update the items.
+        if not as_ref and self.lst_w is not None:
             w_old = self.lst_w[index]
             if isinstance(w_old, W_Reference):
                 w_old.store(w_value, unique_item)
                 return self
-        self.lst_w[index] = w_value
+        self._store_at(index, w_value)
         return self
 
     def _setitem_str(self, key, w_value, as_ref,
@@ -480,7 +744,7 @@ class W_ListArrayObject(W_ArrayObject):
             return self._setitem_int(i, w_value, as_ref, unique_item)
 
     def _convert_and_setitem_int(self, index, w_value):
-        res = self.as_unique_arraydict()
+        res = self.as_unique_intdict()
         return res._setitem_int(index, w_value, False)
 
     def _convert_and_setitem_str(self, key, w_value):
@@ -488,15 +752,16 @@ class W_ListArrayObject(W_ArrayObject):
         return res._setitem_str(key, w_value, False)
 
     def _unsetitem_int(self, index):
-        if index < 0 or index >= self.arraylen():
+        length = self.arraylen()
+        if index < 0 or index >= length:
             return self
-        if index == self.arraylen() - 1:
-            del self.lst_w[index]
-            if self.current_idx > len(self.lst_w):
-                self.current_idx = len(self.lst_w)
+        if index == length - 1:
+            self._delete_last()
+            if self.current_idx > length - 1:
+                self.current_idx = length - 1
             return self
         else:
-            return self.as_unique_arraydict()._unsetitem_int(index)
+            return self.as_unique_intdict()._unsetitem_int(index)
 
     def _unsetitem_str(self, key):
         try:
@@ -518,7 +783,12 @@ class W_ListArrayObject(W_ArrayObject):
             return self._isset_int(i)
 
     def create_iter(self, space, contextclass=None):
-        from hippy.objects.arrayiter import W_ListArrayIterator
+        from hippy.objects.arrayiter import (W_ListArrayIterator,
+            W_IntListArrayIterator, W_FloatListArrayIterator)
+        if self.ints is not None:
+            return W_IntListArrayIterator(self.ints)
+        if self.floats is not None:
+            return W_FloatListArrayIterator(self.floats)
         return W_ListArrayIterator(self.lst_w)
 
     def create_iter_ref(self, space, r_self, contextclass=None):
@@ -526,14 +796,31 @@ class W_ListArrayObject(W_ArrayObject):
         return ListArrayIteratorRef(space, r_self)
 
     def copy(self):
-        return self.as_unique_arraylist()
+        self._shares_storage = True
+        w_copy = W_ListArrayObject(self.space, self.lst_w, self.current_idx,
+                                   ints=self.ints, floats=self.floats)
+        w_copy._shares_storage = True
+        return w_copy
 
     def _inplace_pop(self, space):
+        self._make_storage_unique()
         self.current_idx = 0
+        ints = self.ints
+        if ints is not None:
+            return W_IntObject(ints.pop())
+        floats = self.floats
+        if floats is not None:
+            return W_FloatObject(floats.pop())
         return self.lst_w.pop()
 
     def _values(self, space):
-        return self.lst_w
+        if self.lst_w is not None:
+            return self.lst_w
+        return self.as_list_w()
+
+    def ll_serialize(self, serializer):
+        serializer.write_char("l")
+        serializer.write_wrapped_list(self._values(self.space))
 
 class DictItemVRef(VirtualReference):
     def __init__(self, w_array, index):
@@ -544,15 +831,214 @@ class DictItemVRef(VirtualReference):
         return self.w_array.dct_w[self.index]
 
     def store(self, w_value, unique=False):
+        self.w_array._make_storage_unique()
         self.w_array.dct_w[self.index] = w_value
 
 
-class W_RDictArrayObject(W_ArrayObject):
+class SlotsVersion(object):
+    last = 0
+
+slots_version = SlotsVersion()
+
+
+def new_slots_version():
+    slots_version.last += 1
+    return slots_version.last
+
+
+class OrderedKeysMixin(object):
+    """The positions of the keys of the hash strategies, in insertion
+    order.  They are only built by the operations that need positions:
+    the internal pointer (current(), next(), ...) and iterating by
+    reference.  From then on, every key keeps the slot it was inserted
+    at, a removed key leaves a hole, and 'current_idx' is a slot, so
+    that moving the pointer or an iterator is O(1) whatever is inserted
+    or removed in the meantime.  Until then, 'current_idx' is the
+    position of the item in the dict, which is the same thing.
+
+    Once there are more holes than keys, the slots are compacted.  This
+    gives them a new '_version', and '_remap' tells where the slots of
+    the previous version went.
+    """
+    _mixin_ = True
+
+    _slots = None       # keys; a removed key stays in its slot
+    _keypos = None      # {key: slot} for the keys in the array
+    _nholes = 0
+    _version = 0
+    _remap = None
+    _remap_version = 0
+
+    def _ensure_slots(self):
+        if self._slots is None:
+            slots = self._get_dict().keys()
+            keypos = {}
+            for i in range(len(slots)):
+                keypos[slots[i]] = i
+            self._slots = slots
+            self._keypos = keypos
+            self._nholes = 0
+            self._version = new_slots_version()
+
+    def _slot_is_live(self, slot):
+        return self._keypos.get(self._slots[slot], -1) == slot
+
+    def _key_added(self, key):
+        """Call when 'key' is inserted in the dict."""
+        slots = self._slots
+        if slots is not None:
+            self._keypos[key] = len(slots)
+            slots.append(key)
+
+    def _remove_key_slot(self, key):
+        """Call before removing 'key' from the dict."""
+        if self._slots is None:
+            if self.current_idx == 0:
+                return
+            # the pointer must stay on the same item
+            self._ensure_slots()
+        del self._keypos[key]
+        self._nholes += 1
+        if self._nholes > 16 and self._nholes > len(self._keypos):
+            self._compact_slots()
+
+    def _compact_slots(self):
+        slots = self._slots
+        keypos = self._keypos
+        remap = [0] * (len(slots) + 1)
+        new_slots = []
+        for slot in range(len(slots)):
+            remap[slot] = len(new_slots)
+            key = slots[slot]
+            if keypos.get(key, -1) == slot:
+                keypos[key] = len(new_slots)
+                new_slots.append(key)
+        remap[len(slots)] = len(new_slots)
+        self.current_idx = remap[min(self.current_idx, len(slots))]
+        self._slots = new_slots
+        self._nholes = 0
+        self._remap = remap
+        self._remap_version = self._version
+        self._version = new_slots_version()
+
+    def _copy_slots(self, w_copy):
+        w_copy._slots = self._slots
+        w_copy._keypos = self._keypos
+        w_copy._nholes = self._nholes
+        w_copy._version = self._version
+        w_copy._remap = self._remap
+        w_copy._remap_version = self._remap_version
+
+    def _unshare_slots(self):
+        if self._slots is not None:
+            self._slots = self._slots[:]
+            self._keypos = self._keypos.copy()
+
+    def _current_ordinal(self):
+        """The position of the internal pointer in iteration order."""
+        if self._slots is None:
+            return self.current_idx
+        count = 0
+        for slot in range(min(self.current_idx, len(self._slots))):
+            if self._slot_is_live(slot):
+                count += 1
+        return count
+
+    def _slots_version(self):
+        self._ensure_slots()
+        return self._version
+
+    def _remap_slot(self, version, slot):
+        """Translate a slot of the given version of the slots into the
+        current version, or return -1 if that version is unknown."""
+        if version == self._version:
+            return slot
+        remap = self._remap
+        if remap is not None and version == self._remap_version:
+            return remap[min(slot, len(remap) - 1)]
+        return -1
+
+    def _next_live_slot(self, slot):
+        """The first slot >= 'slot' holding a key, or -1."""
+        self._ensure_slots()
+        while slot < len(self._slots):
+            if self._slot_is_live(slot):
+                return slot
+            slot += 1
+        return -1
+
+    def _prev_live_slot(self, slot):
+        """The last slot < 'slot' holding a key, or -1."""
+        slot = min(slot, len(self._slots))
+        while slot > 0:
+            slot -= 1
+            if self._slot_is_live(slot):
+                return slot
+        return -1
+
+    def _slot_of_ordinal(self, index):
+        """The slot of the item at position 'index' in iteration order."""
+        self._ensure_slots()
+        for slot in range(len(self._slots)):
+            if self._slot_is_live(slot):
+                if index == 0:
+                    return slot
+                index -= 1
+        return len(self._slots)
+
+    def _slot_key_w(self, space, slot):
+        return self._wrap_key(space, self._slots[slot])
+
+    def _current_slot(self):
+        """The slot of the item under the internal pointer, or -1."""
+        slot = self._next_live_slot(self.current_idx)
+        if slot >= 0:
+            self.current_idx = slot
+        return slot
+
+    def _current(self, space):
+        slot = self._current_slot()
+        if slot < 0:
+            return space.w_False
+        return self._get_dict()[self._slots[slot]]
+
+    def _key(self, space):
+        slot = self._current_slot()
+        if slot < 0:
+            return space.w_Null
+        return self._wrap_key(space, self._slots[slot])
+
+    def _pointer_end(self):
+        self._ensure_slots()
+        slot = self._prev_live_slot(len(self._slots))
+        if slot >= 0:
+            self.current_idx = slot
+
+    def _pointer_next(self):
+        slot = self._current_slot()
+        if slot >= 0:
+            slot = self._next_live_slot(slot + 1)
+        if slot < 0:
+            self.current_idx = len(self._slots)
+            return False
+        self.current_idx = slot
+        return True
+
+    def _pointer_prev(self):
+        slot = self._current_slot()
+        if slot < 0:
+            slot = len(self._slots)
+        slot = self._prev_live_slot(slot)
+        if slot < 0:
+            return False
+        self.current_idx = slot
+        return True
+
+
+class W_RDictArrayObject(OrderedKeysMixin, W_ArrayObject):
     _has_string_keys = True
     strategy_name = 'hash'
 
-    _keylist = None
-
     def __init__(self, space, dct_w, next_idx, current_idx=0):
         if not we_are_translated():
             assert isinstance(dct_w, OrderedDict)
@@ -571,39 +1057,39 @@ class W_RDictArrayObject(W_ArrayObject):
         return self.dct_w.copy()
 
     def as_unique_arraydict(self):
-        self._note_making_a_copy()
+        self._note_copy()
         return W_RDictArrayObject(self.space, self.as_rdict(),
                                   next_idx=self.next_idx,
-                                  current_idx=self.current_idx)
+                                  current_idx=self._current_ordinal())
+
+    def _unshare_storage(self):
+        self.dct_w = self.as_rdict()
+        self._unshare_slots()
 
     def as_list_w(self):
         return self.dct_w.values()
 
     def _getkeylist(self):
-        keylist = self._keylist
-        if keylist is None:
-            keylist = self.dct_w.keys()
-            self._keylist = keylist
-        return keylist
+        return self.dct_w.keys()
 
-    def _keylist_changed(self):
-        self._keylist = None
+    def _get_dict(self):
+        return self.dct_w
 
-    def _current(self, space):
-        keylist = self._getkeylist()
-        index = self.current_idx
-        if 0 <= index < len(keylist):
-            return self.dct_w[keylist[index]]
-        else:
-            return space.w_False
+    def _wrap_key(self, space, key):
+        return wrap_array_key(space, key)
 
-    def _key(self, space):
-        keylist = self._getkeylist()
-        index = self.current_idx
-        if 0 <= index < len(keylist):
-            return wrap_array_key(space, keylist[index])
-        else:
-            return space.w_Null
+    def _slot_after_key(self, space, w_key):
+        try:
+            as_int, as_str = convert_to_index(space, w_key)
+        except CannotConvertToIndex:
+            return -1
+        if as_str is None:
+            as_str = str(as_int)
+        self._ensure_slots()
+        slot = self._keypos.get(as_str, -1)
+        if slot < 0:
+            return -1
+        return slot + 1
 
     def arraylen(self):
         return len(self.dct_w)
@@ -641,8 +1127,9 @@ class W_RDictArrayObject(W_ArrayObject):
                 w_old.store(w_value, unique_item)
                 return self
         # Else update the 'dct_w'.
-        if self._keylist is not None and key not in self.dct_w:
-            self._keylist_changed()
+        self._make_storage_unique()
+        if self._slots is not None and key not in self.dct_w:
+            self._key_added(key)
         self.dct_w[key] = w_value
         # Blah
         try:
@@ -660,31 +1147,9 @@ class W_RDictArrayObject(W_ArrayObject):
     def _unsetitem_str(self, key):
         if key not in self.dct_w:
             return self
-        # XXX slow hacks to know if we must decrement current_idx or not:
-        # this is if and only if the removed item is before current_idx.
-        current_idx = self.current_idx
-        if current_idx > 0:
-            keylist = self._getkeylist()
-            length = len(self.dct_w)
-            if current_idx <= length // 2:
-                # look on the left of current_idx
-                for i in range(current_idx):
-                    if keylist[i] == key:
-                        # found: decrement current_idx
-                        self.current_idx = current_idx - 1
-                        break
-            else:
-                # look on the right of current_idx
-                for i in range(current_idx, length):
-                    if keylist[i] == key:
-                        # found: don't decrement current_idx
-                        break
-                else:
-                    # not found: decrement current_idx
-                    self.current_idx = current_idx - 1
-        #
+        self._make_storage_unique()
+        self._remove_key_slot(key)
         del self.dct_w[key]
-        self._keylist_changed()
         return self
 
     def _isset_int(self, index):
@@ -702,14 +1167,20 @@ class W_RDictArrayObject(W_ArrayObject):
         return RDictArrayIteratorRef(space, r_self)
 
     def copy(self):
-        return self.as_unique_arraydict()
+        self._shares_storage = True
+        w_copy = W_RDictArrayObject(self.space, self.dct_w, self.next_idx,
+                                    self.current_idx)
+        self._copy_slots(w_copy)
+        w_copy._shares_storage = True
+        return w_copy
 
     def _inplace_pop(self, space):
+        self._make_storage_unique()
+        self.current_idx = 0
         key, w_value = self.dct_w.popitem()
-        self._keylist_changed()
+        self._remove_key_slot(key)
         if key == str(self.next_idx - 1):
             self.next_idx -= 1
-        self.current_idx = 0
         return w_value
 
     def _values(self, space):
@@ -720,6 +1191,216 @@ class W_RDictArrayObject(W_ArrayObject):
                                 self, suffix)
 
 
+class IntDictItemVRef(VirtualReference):
+    def __init__(self, w_array, index):
+        self.w_array = w_array
+        self.index = index
+
+    def deref(self):
+        return self.w_array.intdct_w[self.index]
+
+    def store(self, w_value, unique=False):
+        self.w_array._make_storage_unique()
+        self.w_array.intdct_w[self.index] = w_value
+
+
+class W_IntDictArrayObject(OrderedKeysMixin, W_ArrayObject):
+    """An ordered hash whose keys are all integers, like sparse arrays or
+    maps from ids to rows.  The keys are stored as ints, so that lookups
+    need neither formatting nor hashing a string.  Inserting a string key
+    that does not look like an integer turns it into a
+    W_RDictArrayObject.
+    """
+    _has_string_keys = False
+    strategy_name = 'int_hash'
+
+    def __init__(self, space, intdct_w, next_idx, current_idx=0):
+        if not we_are_translated():
+            assert isinstance(intdct_w, OrderedDict)
+        self.space = space
+        self.intdct_w = intdct_w
+        self.next_idx = next_idx
+        self.current_idx = current_idx
+
+    def as_rdict(self):
+        new_dict = new_rdict()
+        for key, w_value in self.intdct_w.iteritems():
+            new_dict[str(key)] = w_value.copy_item()
+        return new_dict
+
+    def get_rdict_from_array(self):
+        return intdict_to_rdict(self.intdct_w)
+
+    def _copy_intdict(self):
+        new_dict = new_intdict()
+        for key, w_value in self.intdct_w.iteritems():
+            new_dict[key] = w_value.copy_item()
+        return new_dict
+
+    def _unshare_storage(self):
+        self.intdct_w = self._copy_intdict()
+        self._unshare_slots()
+
+    def as_unique_intdict(self):
+        self._note_copy()
+        return W_IntDictArrayObject(self.space, self._copy_intdict(),
+                                    next_idx=self.next_idx,
+                                    current_idx=self._current_ordinal())
+
+    def as_unique_arraydict(self):
+        self._note_copy()
+        return W_RDictArrayObject(self.space, self.as_rdict(),
+                                  next_idx=self.next_idx,
+                                  current_idx=self._current_ordinal())
+
+    def as_list_w(self):
+        return self.intdct_w.values()
+
+    def _getintkeylist(self):
+        return self.intdct_w.keys()
+
+    def _get_dict(self):
+        return self.intdct_w
+
+    def _wrap_key(self, space, key):
+        return space.newint(key)
+
+    def _slot_after_key(self, space, w_key):
+        try:
+            as_int, as_str = convert_to_index(space, w_key)
+        except CannotConvertToIndex:
+            return -1
+        if as_str is not None:
+            try:
+                as_int = try_convert_str_to_int(as_str)
+            except ValueError:
+                return -1
+        self._ensure_slots()
+        slot = self._keypos.get(as_int, -1)
+        if slot < 0:
+            return -1
+        return slot + 1
+
+    def arraylen(self):
+        return len(self.intdct_w)
+
+    def _getitem_int(self, index):
+        try:
+            res = self.intdct_w[index]
+        except KeyError:
+            return None
+        if isinstance(res, W_Reference):
+            return res
+        else:
+            return IntDictItemVRef(self, index)
+
+    def _getitem_str(self, key):
+        try:
+            i = try_convert_str_to_int(key)
+        except ValueError:
+            return None
+        return self._getitem_int(i)
+
+    def _appenditem(self, w_obj, as_ref=False):
+        res = self._setitem_int(self.next_idx, w_obj, as_ref)
+        assert res is self
+
+    def _setitem_int(self, index, w_value, as_ref, unique_item=False):
+        # If overwriting an existing W_Reference object, we only update
+        # the value in the reference and return 'self'.
+        if not as_ref:
+            try:
+                w_old = self.intdct_w[index]
+            except KeyError:
+                w_old = None
+            if isinstance(w_old, W_Reference):   # and is not None
+                w_old.store(w_value, unique_item)
+                return self
+        # Else update the 'intdct_w'.
+        self._make_storage_unique()
+        if self._slots is not None and index not in self.intdct_w:
+            self._key_added(index)
+        self.intdct_w[index] = w_value
+        if self.next_idx <= index:
+            self.next_idx = index + 1
+        return self
+
+    def _setitem_str(self, key, w_value, as_ref,
+                     unique_array=False, unique_item=False):
+        try:
+            i = try_convert_str_to_int(key)
+        except ValueError:
+            return self._convert_and_setitem_str(key, w_value, as_ref)
+        else:
+            return self._setitem_int(i, w_value, as_ref, unique_item)
+
+    def _convert_and_setitem_str(self, key, w_value, as_ref):
+        res = self.as_unique_arraydict()
+        return res._setitem_str(key, w_value, as_ref)
+
+    def _unsetitem_int(self, index):
+        if index not in self.intdct_w:
+            return self
+        self._make_storage_unique()
+        self._remove_key_slot(index)
+        del self.intdct_w[index]
+        return self
+
+    def _unsetitem_str(self, key):
+        try:
+            i = try_convert_str_to_int(key)
+        except ValueError:
+            return self     # str key, so not in the array at all
+        else:
+            return self._unsetitem_int(i)
+
+    def _isset_int(self, index):
+        return index in self.intdct_w
+
+    def _isset_str(self, key):
+        try:
+            i = try_convert_str_to_int(key)
+        except ValueError:
+            return False
+        else:
+            return self._isset_int(i)
+
+    def create_iter(self, space, contextclass=None):
+        from hippy.objects.arrayiter import W_IntDictArrayIterator
+        return W_IntDictArrayIterator(self.intdct_w)
+
+    def create_iter_ref(self, space, r_self, contextclass=None):
+        from hippy.objects.arrayiter import IntDictArrayIteratorRef
+        return IntDictArrayIteratorRef(space, r_self)
+
+    def copy(self):
+        self._shares_storage = True
+        w_copy = W_IntDictArrayObject(self.space, self.intdct_w,
+                                      self.next_idx, self.current_idx)
+        self._copy_slots(w_copy)
+        w_copy._shares_storage = True
+        return w_copy
+
+    def _inplace_pop(self, space):
+        self._make_storage_unique()
+        self.current_idx = 0
+        key, w_value = self.intdct_w.popitem()
+        self._remove_key_slot(key)
+        if key == self.next_idx - 1:
+            self.next_idx -= 1
+        return w_value
+
+    def _values(self, space):
+        return self.intdct_w.values()
+
+    def ll_serialize(self, serializer):
+        serializer.write_char("h")
+        serializer.write_int(len(self.intdct_w))
+        for key, w_value in self.intdct_w.iteritems():
+            serializer.write_str(str(key))
+            serializer.write_wrapped_item(w_value)
+
+
 def array_var_dump(dct_w, space, indent, recursion, w_reckey, header):
     if w_reckey in recursion:
         return '%s*RECURSION*\n' % indent
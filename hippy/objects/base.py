@@ -23,6 +23,11 @@ class W_Root(object):
         """Evaluate for use as a default value"""
         raise TypeError("This object cannot be used as a default value")
 
+    def ll_serialize(self, serializer):
+        """Write this compile-time constant with the bytecode
+        Serializer"""
+        raise NotImplementedError("This object cannot be serialized")
+
     def _note_making_a_copy(self):
         pass       # for test_refcount
 
@@ -53,6 +53,12 @@ class W_BoolObject(W_Object):
     def eval_static(self, space):
         return self
 
+    def ll_serialize(self, serializer):
+        if self.boolval:
+            serializer.write_char("t")
+        else:
+            serializer.write_char("f")
+
     def serialize(self, space, builder, memo):
         builder.append("b:%d;" % self.boolval)
         return True
@@ -128,6 +128,10 @@ class W_FloatObject(W_Object):
     def eval_static(self, space):
         return self
 
+    def ll_serialize(self, serializer):
+        serializer.write_char("d")
+        serializer.write_float(self.floatval)
+
     def serialize(self, space, builder, memo):
         prec = space.int_w(space.ec.interpreter.config.get_ini_w('serialize_precision')) or 17
         _str = self._repr(prec=prec)
@@ -365,13 +365,16 @@ class W_InstanceObject(W_Object):
         return w_res
 
     def getmeth(self, space, name, contextclass=None):
-        cls = self.getclass()
-        method = cls.locate_method(name, contextclass, static=False)
+        method = self.getclass().locate_method(name, contextclass,
+                                               static=False)
+        return self.bind_method(method)
+
+    def bind_method(self, method):
         if method.is_static():
             w_instance = None
         else:
             w_instance = self
-        return W_BoundMethod(w_instance, cls, method.method_func)
+        return W_BoundMethod(w_instance, self.getclass(), method.method_func)
 
     def get_callable(self):
         return self.getclass().get_invoke_method(self)
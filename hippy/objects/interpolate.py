@@ -20,3 +20,9 @@ class W_StrInterpolation(W_Object):
             r.append(s)
         frame.pop_n(c)
         return space.newstr(''.join(r))
+
+    def ll_serialize(self, serializer):
+        serializer.write_char("I")
+        serializer.write_int(len(self.strings))
+        for s in self.strings:
+            serializer.write_optional_str(s)
@@ -1,4 +1,4 @@
-import sys, struct
+import sys
 from rpython.rlib import jit
 from rpython.rlib.rarithmetic import ovfcheck, intmask
 from hippy.objects.base import W_Object
@@ -158,9 +158,9 @@ class W_IntObject(W_Object):
         builder.append("i:%d;" % self.intval)
         return True
 
-    def ll_serialize(self, builder):
-        builder.append("i")
-        builder.append(struct.pack("l", self.intval))
+    def ll_serialize(self, serializer):
+        serializer.write_char("i")
+        serializer.write_int(self.intval)
 
     def eval_static(self, space):
         return self
@@ -40,6 +40,9 @@ class W_NullObject(W_Object):
     def eval_static(self, space):
         return self
 
+    def ll_serialize(self, serializer):
+        serializer.write_char("n")
+
     def serialize(self, space, builder, memo):
         builder.append("N;")
         return True
@@ -105,6 +105,11 @@ class W_Reference(W_Root):
         self.deref().serialize(space, builder, memo)
         return True
 
+    def ll_serialize(self, serializer):
+        # only used for the initial value of 'static' variables
+        serializer.write_char("r")
+        serializer.write_wrapped_item(self.deref_temp())
+
     # compat hack: prevent direct reads/writes from 'w_value'
     w_value = property(None, None)
 
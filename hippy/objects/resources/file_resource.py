@@ -4,6 +4,207 @@ from hippy.objects.resources import W_Resource
 
 CLOSE, OPEN, NONE = range(3)
 
+DEFAULT_BUFFER_SIZE = 8192
+
+# the size of the chunks in which readfile() and fpassthru() copy a file
+# to the output
+PASSTHRU_CHUNK_SIZE = 65536
+
+
+def read_range(f, offset=0, maxlen=-1):
+    """Read 'maxlen' bytes of the file 'f' from 'offset', or up to the end
+    of the file if 'maxlen' is negative.  Only that range is read.  The
+    remaining size of a regular file is known from fstat(), so it is read
+    with one read() of the right size instead of a growing buffer."""
+    if offset > 0:
+        f.seek(offset, 0)
+    if maxlen >= 0:
+        return f.read(maxlen)
+    try:
+        size = int(os.fstat(f.fileno()).st_size) - offset
+    except OSError:
+        size = 0
+    if size <= 0:
+        # pipes and the like, or a file shorter than the offset
+        return f.read()
+    data = f.read(size)
+    rest = f.read()
+    if rest:
+        # it grew in the meantime
+        data += rest
+    return data
+
+
+def copy_to_output(interp, f):
+    """Write the rest of the file 'f', or anything with a read(size)
+    method, to the output of 'interp' in chunks: without an output
+    buffer, each chunk goes straight to the client and the file is never
+    held in memory as a whole.  Returns the number of bytes written."""
+    total = 0
+    while True:
+        data = f.read(PASSTHRU_CHUNK_SIZE)
+        if not data:
+            break
+        interp.writestr(data)
+        total += len(data)
+    return total
+
+
+class BufferedStream(object):
+    """Read buffering on top of a file object.  Reads are served from
+    'buf', from 'pos' on, which is refilled 'buffer_size' bytes at a
+    time; lines are found with str.find() on the buffer instead of
+    reading the file byte by byte.  Before anything that needs the
+    position of the underlying file (writing, seeking, truncating), the
+    unread part of the buffer is dropped and the file seeked back.
+
+    Like C stdio, which the file is built on, requires, switching between
+    reading and writing goes through a flush and an absolute seek to the
+    logical position: 'writing' tells which one was done last.
+    """
+
+    def __init__(self, f, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.f = f
+        self.buffer_size = buffer_size
+        self.buf = ""
+        self.pos = 0
+        self.writing = False
+
+    def set_buffer_size(self, size):
+        if size < 1:
+            size = 1
+        self.buffer_size = size
+
+    def _unread(self):
+        return len(self.buf) - self.pos
+
+    def _fill(self):
+        """Replace the buffer with the next chunk of the file; return
+        False at end of file."""
+        self.buf = self.f.read(self.buffer_size)
+        self.pos = 0
+        return len(self.buf) > 0
+
+    def _grow(self):
+        """Append the next chunk of the file to the unread part of the
+        buffer; return False at end of file.  The chunk is at least as
+        large as what is already unread, so that looking for the end of
+        a long line stays linear."""
+        unread = self.buf[self.pos:]
+        data = self.f.read(max(self.buffer_size, len(unread)))
+        if not data:
+            return False
+        self.buf = unread + data
+        self.pos = 0
+        return True
+
+    def _find(self, sub, limit):
+        """The position in 'buf' of the first 'sub' in the next 'limit'
+        bytes (no limit if negative), or -1 if there is none before the
+        limit or the end of the file.  Grows the buffer as needed."""
+        start = self.pos
+        while True:
+            end = len(self.buf)
+            if limit >= 0 and end > self.pos + limit:
+                end = self.pos + limit
+            i = self.buf.find(sub, start, end)
+            if i >= 0:
+                return i
+            if limit >= 0 and end == self.pos + limit:
+                return -1
+            # 'sub' may straddle the end of what we have
+            rel = max(end - len(sub) + 1 - self.pos, 0)
+            if not self._grow():
+                return -1
+            start = self.pos + rel
+
+    def _take(self, end):
+        assert end >= self.pos
+        data = self.buf[self.pos:end]
+        self.pos = end
+        return data
+
+    def _take_at_most(self, limit):
+        end = len(self.buf)
+        if limit >= 0 and end > self.pos + limit:
+            end = self.pos + limit
+        return self._take(end)
+
+    def _start_reading(self):
+        if self.writing:
+            self.f.flush()
+            self.f.seek(self.f.tell(), 0)
+            self.writing = False
+
+    def read(self, size):
+        self._start_reading()
+        if self._unread() >= size:
+            return self._take(self.pos + size)
+        parts = [self._take(len(self.buf))]
+        remaining = size - len(parts[0])
+        while remaining > 0:
+            if remaining >= self.buffer_size:
+                data = self.f.read(remaining)
+                if not data:
+                    break
+            else:
+                if not self._fill():
+                    break
+                data = self._take_at_most(remaining)
+            parts.append(data)
+            remaining -= len(data)
+        return ''.join(parts)
+
+    def readline(self, limit=-1):
+        """Read up to and including the next newline, or at most 'limit'
+        bytes if 'limit' is not negative.  Returns '' at end of file."""
+        if limit == 0:
+            return ''
+        self._start_reading()
+        i = self._find('\n', limit)
+        if i >= 0:
+            return self._take(i + 1)
+        return self._take_at_most(limit)
+
+    def read_until(self, ending, limit):
+        """Read up to 'ending', which is consumed but not returned, or at
+        most 'limit' bytes.  Returns None at end of file."""
+        self._start_reading()
+        if self._unread() == 0 and not self._fill():
+            return None
+        if not ending:
+            return self.read(limit)
+        i = self._find(ending, limit)
+        if i >= 0:
+            data = self._take(i)
+            self.pos += len(ending)
+            return data
+        return self._take_at_most(limit)
+
+    def tell(self):
+        return self.f.tell() - self._unread()
+
+    def sync(self):
+        """Drop the buffer, moving the file back to the logical position,
+        before writing to the file."""
+        if self.writing:
+            return
+        logical_pos = self.tell()
+        self.buf = ""
+        self.pos = 0
+        self.f.seek(logical_pos, 0)
+        self.writing = True
+
+    def seek(self, offset, whence):
+        if whence == 1:
+            offset += self.tell()
+            whence = 0
+        self.buf = ""
+        self.pos = 0
+        self.f.seek(offset, whence)
+        self.writing = False
+
+
 class W_FileResource(W_Resource):
 
     def __init__(self, space, filename, mode):
@@ -18,10 +219,14 @@ class W_FileResource(W_Resource):
         self.first_line = None
 
     def open(self):
-        self.resource = open(self.filename, self.mode)
-        self.state = OPEN
+        self.attach(open(self.filename, self.mode))
         self.resource.seek(0)
 
+    def attach(self, f):
+        self.resource = f
+        self.stream = BufferedStream(f)
+        self.state = OPEN
+
     def close(self):
         try:
             self.resource.close()
@@ -31,7 +236,7 @@ class W_FileResource(W_Resource):
             return False
 
     def read(self, size=1024):
-        data = self.resource.read(size)
+        data = self.stream.read(size)
         if len(data) < size:
             self.eof = True
         return data
@@ -40,47 +245,60 @@ class W_FileResource(W_Resource):
         if length <= 0:
             return 0
         towrite = data[:length]
+        self.stream.sync()
         self.resource.write(towrite)
         self.cur_line_no += towrite.count(os.linesep)
         return min(length, len(data))
 
     def writeall(self, data):
+        self.stream.sync()
         self.resource.write(data)
         return len(data)
 
     def passthru(self):
-        res = self.resource.read()
-        self.space.ec.interpreter.writestr(res)
-        return len(res)
+        return copy_to_output(self.space.ec.interpreter, self.stream)
 
     def feof(self):
         return self.eof
 
     def seek(self, length, mode):
         self.eof = False
-        self.resource.seek(length, mode)
+        self.stream.seek(length, mode)
 
     def tell(self):
         """ this is done not in the php way
         in php position of pointer is kept in data structure
         so i.e seek during append mode does not call sytem tell"""
-        return self.resource.tell()
+        return self.stream.tell()
 
-    def readline(self, drop_nl=False):
-        data = self.resource.readline()
+    def readline(self, drop_nl=False, limit=-1):
+        data = self.stream.readline(limit)
         to_add = 0
         if self.cur_line:
             to_add = 1
-        if not data or data[-1] != '\n':
+        if not data or (data[-1] != '\n' and
+                        (limit < 0 or len(data) < limit)):
             self.eof = True
         if drop_nl:
-            i = data.find(os.linesep)
-            if i > 0:
-                data = data[:i]
+            end = len(data)
+            if end > 0 and data[end - 1] == '\n':
+                end -= 1
+                if end > 0 and data[end - 1] == '\r':
+                    end -= 1
+                data = data[:end]
         self.cur_line = data
         self.cur_line_no += to_add
         return data
 
+    def read_until(self, ending, limit):
+        data = self.stream.read_until(ending, limit)
+        if data is None:
+            self.eof = True
+        return data
+
+    def set_read_buffer(self, size):
+        self.stream.set_buffer_size(size)
+
     def seek_to_line(self, line, drop_nl=False):
         self.rewind()
         while self.cur_line_no < line and not self.feof():
@@ -99,10 +317,11 @@ class W_FileResource(W_Resource):
         self.eof = False
         self.cur_line = None
         self.cur_line_no = 0
-        return self.resource.seek(0, 0)
+        return self.stream.seek(0, 0)
 
     def truncate(self, size):
         try:
+            self.stream.sync()
             self.resource.truncate(size)
             return True
         except OSError:
@@ -5,6 +5,10 @@ from hippy.objects.reference import VirtualReference
 from hippy.objects.convert import convert_string_to_number, strtol
 from hippy.error import ConvertError, OffsetError
 
+# concatenations producing at least this many characters give a
+# W_ConcatStringObject instead of a flat string
+CONCAT_BUFFER_THRESHOLD = 64
+
 class StringOffset(VirtualReference):
     """A very special kind of reference that points to a single character
     inside a string.
@@ -152,8 +156,11 @@ class W_StringObject(W_Object):
         return self.as_number().uminus(space)
 
     def strconcat(self, space, w_other):
-        # XXX improve
-        return W_ConstStringObject(self.unwrap() + space.str_w(w_other))
+        s = self.unwrap()
+        other = space.str_w(w_other)
+        if len(s) + len(other) < CONCAT_BUFFER_THRESHOLD:
+            return W_ConstStringObject(s + other)
+        return new_concat_string(s, other)
 
     def _setitem_ref(self, space, w_arg, w_ref):
         raise OffsetError('cannot set item by reference on a string')
@@ -202,9 +209,17 @@ class W_StringObject(W_Object):
         return w_obj.int_w(space)
 
     def serialize(self, space, builder, memo):
-        builder.append("s:%d:\"%s\";" % (self.strlen(), self.unwrap()))
+        # appended piecewise: formatting would copy the whole string once
+        # more before it gets into the builder
+        builder.append("s:%d:\"" % self.strlen())
+        builder.append(self.unwrap())
+        builder.append("\";")
         return True
 
+    def ll_serialize(self, serializer):
+        serializer.write_char("s")
+        serializer.write_str(self.unwrap())
+
 
 class StringMixin(object):
     """This is a mixin to provide a more efficient implementation for
@@ -350,5 +365,79 @@ class W_MutableStringObject(StringMixin, W_StringObject):
     def unwrap(self):
         return str(self._arrayval)
 
+
+class ConcatBuffer(object):
+    """An append-only buffer shared by a chain of W_ConcatStringObjects.
+    Each of them is a prefix of the buffer."""
+
+    def __init__(self, size_hint):
+        self.builder = StringBuilder(size_hint)
+        self.length = 0
+        self._built = ""
+
+    def append(self, s):
+        self.builder.append(s)
+        self.length += len(s)
+
+    def build(self):
+        """The content of the buffer. It is only built again after
+        something was appended, so that all the prefixes share it."""
+        if len(self._built) != self.length:
+            self._built = self.builder.build()
+        return self._built
+
+
+def new_concat_string(left, right):
+    buffer = ConcatBuffer(len(left) + len(right))
+    buffer.append(left)
+    buffer.append(right)
+    return W_ConcatStringObject(buffer, buffer.length)
+
+
+class W_ConcatStringObject(StringMixin, W_StringObject):
+    """The result of a concatenation. If the left operand of the next
+    concatenation is the longest string built so far in its buffer, the
+    right operand is appended to the buffer in place, so that building
+    a string with '.=' in a loop takes linear time. The flat string is
+    only built when the content is needed.
+    """
+
+    def __init__(self, buffer, length):
+        self.buffer = buffer
+        self.length = length
+        self._flat = None
+
+    def strlen(self):
+        return self.length
+
+    def character(self, index):
+        return self.unwrap()[index]
+
+    def unwrap(self):
+        if self._flat is None:
+            s = self.buffer.build()
+            if len(s) != self.length:
+                assert self.length >= 0
+                s = s[:self.length]
+            self._flat = s
+        return self._flat
+
+    def strconcat(self, space, w_other):
+        other = space.str_w(w_other)
+        buffer = self.buffer
+        if buffer.length != self.length:
+            # someone else already appended to the buffer
+            return new_concat_string(self.unwrap(), other)
+        buffer.append(other)
+        return W_ConcatStringObject(buffer, buffer.length)
+
+    def copy(self):
+        return self.as_mutable_string()
+
+    def as_mutable_string(self):
+        self._note_making_a_copy()
+        return W_MutableStringObject(bytearray(self.unwrap()))
+
+
 SINGLE_CHAR_STRING = [W_ConstStringObject(chr(_i)) for _i in range(256)]
 EMPTY_STRING = W_ConstStringObject("")
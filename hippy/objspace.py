@@ -21,6 +21,8 @@ from hippy.objects.resources.dir_resource import W_DirResource
 from hippy.objects.resources.stream_context import W_StreamContext
 from hippy.objects.convert import convert_string_to_number
 from hippy.module.regex.cache import RegexpCache
+from hippy.module.standard.strings.multireplace import ReplaceCache
+from hippy.statcache import StatCache
 from hippy.builtin_klass import k_stdClass
 
 
@@ -45,6 +47,7 @@ def my_cmp(one, two):
 class ExecutionContext(object):
     def __init__(self, space):
         self.interpreter = None
+        self.array_copies = 0   # arrays whose items were really copied
 
     def notice(self, msg):
         self.interpreter.notice(msg)
@@ -105,6 +108,8 @@ class ObjSpace(object):
 
     def __init__(self, config=None):
         self.regex_cache = RegexpCache(self)
+        self.replace_cache = ReplaceCache()
+        self.stat_cache = StatCache()
         self.ec = ExecutionContext(self)
 
     def int_w(self, w_obj):
@@ -298,6 +303,12 @@ class ObjSpace(object):
     def new_array_from_list(self, lst_w):
         return W_ArrayObject.new_array_from_list(self, lst_w)
 
+    def new_array_from_ints(self, ints):
+        return W_ArrayObject.new_array_from_ints(self, ints)
+
+    def new_array_from_floats(self, floats):
+        return W_ArrayObject.new_array_from_floats(self, floats)
+
     def new_array_from_rdict(self, rdict_w):
         return W_ArrayObject.new_array_from_rdict(self, rdict_w)
 
@@ -786,10 +797,11 @@ class ObjSpace(object):
         raise InvalidCallback("no array or string given")
 
     def serialize(self, w_obj):
-        from hippy.module.serialize import SerializerMemo
+        from hippy.module.serialize import (SerializerMemo,
+                                            serialized_size_hint)
 
         assert not isinstance(w_obj, W_Reference)
-        builder = StringBuilder()
+        builder = StringBuilder(serialized_size_hint(self, w_obj))
         w_obj.serialize(self, builder, SerializerMemo())
         return builder.build()
 
@@ -2,7 +2,6 @@ from hippy.lexer import Token, Lexer
 from hippy.sourceparser import SourceParser, LexerWrapper, ParseError, get_lexer
 from hippy.astcompiler import compile_ast
 
-from rpython.rlib.objectmodel import we_are_translated
 
 MODE_LITERAL = 0
 MODE_EQUALSIGN = 1
@@ -11,7 +10,7 @@ MODE_PHPCODE = 2
 
 class PHPLexerWrapper(LexerWrapper):
     def __init__(self, source, filename="", interp=None):
-        self.lexer = get_lexer(we_are_translated())
+        self.lexer = get_lexer()
         self.source = source
         self.startlineno = 1
         self.startindex = 0
@@ -0,0 +1,223 @@
+""" Ahead-of-time compilation of a whole source tree into the bytecode
+cache, 'hippy --precompile <dir> [--jobs N]'.
+
+Every .php file under the directory is compiled and stored with the
+same BytecodeCache that requests read, in the 'opcache.file_cache'
+directory of hippy.ini, so that a deploy can warm the cache once instead
+of having the first requests pay for parsing.
+
+The files are dealt out, biggest first and round-robin, to a pool of
+forked workers. Each worker compiles its share and reports one line per
+file on a shared pipe:
+
+    "<status> <microseconds> <path>\\t<message>\\n"
+
+where <status> is one of the STATUS_* below. The lines are kept shorter
+than PIPE_BUF, so that they are written atomically.
+"""
+
+import os
+import stat
+import time
+
+from rpython.rlib.listsort import make_timsort_class
+
+from hippy.ast import CompilerError
+from hippy.bytecache import open_bytecode_cache
+from hippy.lexer import LexerError
+from hippy.phpcompiler import compile_php
+from hippy.sourceparser import ParseError
+
+DEFAULT_JOBS = 4
+
+STATUS_OK = 'ok'               # compiled and stored
+STATUS_FRESH = 'fresh'         # the cache entry is already up to date
+STATUS_UNCACHEABLE = 'skip'    # compiled, but cannot be cached
+STATUS_FAILED = 'fail'
+
+MAX_MESSAGE = 1024
+
+
+def find_sources(root):
+    """All the .php files under 'root', as (size, path) pairs. Symbolic
+    links to directories are not followed."""
+    found = []
+    pending = [root]
+    while pending:
+        dirname = pending.pop()
+        try:
+            names = os.listdir(dirname)
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(dirname, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                pending.append(path)
+            elif stat.S_ISREG(st.st_mode) and name.endswith('.php'):
+                found.append((int(st.st_size), path))
+    return found
+
+
+def _bigger(a, b):
+    return a[0] > b[0]
+
+BiggestFirstSort = make_timsort_class(lt=_bigger)
+
+
+def deal(sources, jobs):
+    """Split 'sources' into 'jobs' shares of about the same total size."""
+    BiggestFirstSort(sources).sort()
+    shares = [[] for i in range(jobs)]
+    for i in range(len(sources)):
+        shares[i % jobs].append(sources[i][1])
+    return shares
+
+
+def compile_file(interp, cache, path):
+    """Compile 'path' into 'cache'. Returns (status, message)."""
+    if cache.load(interp, path) is not None:
+        return STATUS_FRESH, ''
+    try:
+        f = open(path)
+        source = f.read()
+        f.close()
+    except (OSError, IOError):
+        return STATUS_FAILED, "cannot read the file"
+    try:
+        bc = compile_php(path, source, interp.space, interp)
+    except (ParseError, LexerError) as exc:
+        return STATUS_FAILED, "%s on line %s" % (exc.message,
+                                                 exc.source_pos)
+    except CompilerError as exc:
+        return STATUS_FAILED, "%s on line %s" % (exc.msg, exc.lineno)
+    if not cache.store(path, source, bc):
+        return STATUS_UNCACHEABLE, ''
+    return STATUS_OK, ''
+
+
+def format_usec(usec):
+    """'usec' microseconds as milliseconds, e.g. "12.045 ms"."""
+    frac = str(usec % 1000)
+    return "%d.%s%s ms" % (usec // 1000, "0" * (3 - len(frac)), frac)
+
+
+def format_report(status, usec, path, message):
+    message = message.replace('\n', ' ')
+    if len(message) > MAX_MESSAGE:
+        message = message[:MAX_MESSAGE]
+    return "%s %d %s\t%s\n" % (status, usec, path, message)
+
+
+def compile_share(interp, cache, paths, report_fd):
+    for path in paths:
+        start = time.time()
+        status, message = compile_file(interp, cache, path)
+        usec = int((time.time() - start) * 1000000)
+        os.write(report_fd, format_report(status, usec, path, message))
+
+
+class Summary(object):
+    def __init__(self):
+        self.counts = {STATUS_OK: 0, STATUS_FRESH: 0, STATUS_UNCACHEABLE: 0,
+                       STATUS_FAILED: 0}
+        self.buf = ''
+
+    def feed(self, data, out_fd):
+        """Print the complete report lines of 'data' to 'out_fd'."""
+        self.buf += data
+        while True:
+            end = self.buf.find('\n')
+            if end < 0:
+                break
+            assert end >= 0
+            line = self.buf[:end]
+            self.buf = self.buf[end + 1:]
+            self.print_line(line, out_fd)
+
+    def print_line(self, line, out_fd):
+        i = line.find(' ')
+        j = line.find(' ', i + 1)
+        k = line.find('\t', j + 1)
+        if i < 0 or j < 0 or k < 0:
+            return
+        status = line[:i]
+        try:
+            usec = int(line[i + 1:j])
+        except ValueError:
+            return
+        path = line[j + 1:k]
+        message = line[k + 1:]
+        if status not in self.counts:
+            return
+        self.counts[status] += 1
+        if status == STATUS_FAILED:
+            os.write(out_fd, "FAILED %s: %s\n" % (path, message))
+        elif status == STATUS_FRESH:
+            os.write(out_fd, "up to date  %s\n" % path)
+        else:
+            note = ""
+            if status == STATUS_UNCACHEABLE:
+                note = " (not cacheable)"
+            os.write(out_fd, "%s  %s%s\n" % (format_usec(usec), path, note))
+
+
+def run_precompile(interp, root, jobs=DEFAULT_JOBS, out_fd=1):
+    """Entry point of 'hippy --precompile': compile every .php file under
+    'root' into the bytecode cache with 'jobs' worker processes. Returns
+    the exit code, 1 if any file failed."""
+    cache = open_bytecode_cache(interp.config)
+    if cache is None:
+        os.write(2, "--precompile requires opcache.file_cache to name a "
+                    "directory in hippy.ini\n")
+        return 1
+    if jobs < 1:
+        jobs = 1
+    start = time.time()
+    sources = find_sources(os.path.abspath(root))
+    shares = deal(sources, jobs)
+    report_r, report_w = os.pipe()
+    pids = []
+    for share in shares:
+        if not share:
+            continue
+        pid = os.fork()
+        if pid == 0:
+            os.close(report_r)
+            exitcode = 0
+            try:
+                compile_share(interp, cache, share, report_w)
+            except Exception:
+                os.write(2, "hippy precompile worker %d: unhandled error\n"
+                         % os.getpid())
+                exitcode = 1
+            os._exit(exitcode)
+        pids.append(pid)
+    os.close(report_w)
+    summary = Summary()
+    while True:
+        data = os.read(report_r, 4096)
+        if not data:
+            break
+        summary.feed(data, out_fd)
+    os.close(report_r)
+    exitcode = 0
+    for pid in pids:
+        _, status = os.waitpid(pid, 0)
+        if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+            os.write(2, "hippy precompile worker %d died, status %d\n" %
+                     (pid, status))
+            exitcode = 1
+    counts = summary.counts
+    elapsed = int((time.time() - start) * 1000000)
+    os.write(out_fd, "precompiled %d files in %s with %d jobs: %d "
+             "compiled, %d up to date, %d not cacheable, %d failed\n" % (
+                 len(sources), format_usec(elapsed), len(pids),
+                 counts[STATUS_OK], counts[STATUS_FRESH],
+                 counts[STATUS_UNCACHEABLE], counts[STATUS_FAILED]))
+    if counts[STATUS_FAILED] > 0:
+        exitcode = 1
+    return exitcode
@@ -1,7 +1,7 @@
 from rpython.rlib.listsort import make_timsort_class
 from rpython.rlib.objectmodel import specialize
 from rpython.rlib.unroll import unrolling_iterable
-from hippy.module.standard.strings.funcs import _strnatcmp
+from hippy.module.standard.strings.funcs import _strnatcmp, rstrcmp
 from hippy.locale import strcoll_u
 
 NONE, KEY, VALUE = range(3)
@@ -38,6 +38,9 @@ def _get_key_func(sort_type):
 def default_cmp(space, w_a, w_b):
     return space._compare(w_a, w_b)
 
+def string_cmp(space, w_a, w_b):
+    return rstrcmp(space.str_w(w_a), space.str_w(w_b))
+
 def natcmp(space, w_a, w_b):
     return _strnatcmp(space.str_w(w_a), space.str_w(w_b))
 
@@ -47,7 +50,7 @@ def locale_cmp(space, w_a, w_b):
 cmp_funcs = {
     SORT_REGULAR: default_cmp, SORT_REGULAR | SORT_FLAG_CASE: default_cmp,
     SORT_NUMERIC: default_cmp, SORT_NUMERIC | SORT_FLAG_CASE: default_cmp,
-    SORT_STRING: default_cmp, SORT_STRING | SORT_FLAG_CASE: default_cmp,
+    SORT_STRING: string_cmp, SORT_STRING | SORT_FLAG_CASE: string_cmp,
     SORT_LOCALE_STRING: locale_cmp, SORT_LOCALE_STRING | SORT_FLAG_CASE: locale_cmp,
     SORT_NATURAL: natcmp, SORT_NATURAL | SORT_FLAG_CASE: natcmp,
 }
@@ -145,6 +148,11 @@ def _sort(space, values, cmp=None, sort_type=0, elem=NONE, reverse=False):
     raise Exception("unreachable code")
 
 
+# for the lists of unboxed ints or floats of W_ListArrayObject
+IntSort = make_timsort_class()
+FloatSort = make_timsort_class()
+
+
 _TimSort = make_timsort_class()
 class MultiSort(_TimSort):
     def __init__(self, space, list, key_funcs, cmp_funcs, signs):
@@ -1,7 +1,7 @@
 from rply import ParserGenerator
 from hippy.lexer import PRECEDENCES, Lexer, ALL_RULES, BaseLexer
 from hippy import consts
-from rpython.rlib.objectmodel import specialize, we_are_translated
+from rpython.rlib.objectmodel import specialize
 from hippy.ast import (
     Block, Assignment, RefAssignment, Stmt, ConstantInt, BinOp, Variable,
     NamedVariable, ConstantStr, Echo, ConstantFloat, If, SuffixOp, PrefixOp,
@@ -2001,12 +2001,12 @@ class SourceParser(BaseParser):
 
 
 @specialize.memo()
-def get_lexer(are_we_translated):
-    return Lexer(use_rsre=are_we_translated)
+def get_lexer():
+    return Lexer()
 
 
 def parse(space, _source, startlineno):
-    lx = get_lexer(we_are_translated())
+    lx = get_lexer()
     lx.input(_source + ';', 0, startlineno)
     parser = SourceParser(space, lx)
     return parser.parse()
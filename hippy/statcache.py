@@ -0,0 +1,210 @@
+""" Caches for file system lookups, the equivalent of PHP's realpath
+cache and stat cache.
+
+The realpath cache remembers, for an absolute path, what a single
+stat() said about it: whether it exists, its type and its mtime, plus
+its canonical name once asked for. Entries expire after
+realpath_cache_ttl seconds, and at most realpath_cache_size bytes are
+used. It lives on the space, so in worker mode it is shared by all the
+requests of a process. Include resolution, file_exists(), is_file(),
+is_dir() and realpath() go through it.
+
+The stat cache keeps the full stat() results asked for by filemtime(),
+filesize(), stat() and friends, for the current request only.
+
+Failed stat() calls are not cached, so a file that appears is seen at
+once. clearstatcache() empties both caches; the builtins that modify
+the file system only drop the entries of the paths they touched.
+"""
+
+import os
+import stat
+import time
+
+from rpython.rlib import rpath
+
+DEFAULT_REALPATH_CACHE_SIZE = 16 * 1024
+DEFAULT_REALPATH_CACHE_TTL = 120
+
+# approximate bookkeeping cost of an entry, on top of its strings
+ENTRY_OVERHEAD = 64
+MAX_STAT_ENTRIES = 256
+
+
+def parse_ini_size(s):
+    """Parse a size like '16K', '4M' or '1G' as found in php.ini."""
+    s = s.strip()
+    if not s:
+        return 0
+    multiplier = 1
+    last = s[-1].lower()
+    if last == 'k':
+        multiplier = 1024
+    elif last == 'm':
+        multiplier = 1024 * 1024
+    elif last == 'g':
+        multiplier = 1024 * 1024 * 1024
+    if multiplier != 1:
+        end = len(s) - 1
+        assert end >= 0
+        s = s[:end]
+    try:
+        return int(s) * multiplier
+    except ValueError:
+        return 0
+
+
+class RealpathEntry(object):
+    def __init__(self, path, mode, mtime, expires):
+        self.path = path
+        self.mode = mode        # 0 if the path does not exist
+        self.mtime = mtime
+        self.expires = expires
+        self.realpath = None    # computed on demand
+
+    def exists(self):
+        return self.mode != 0
+
+    def size(self):
+        res = ENTRY_OVERHEAD + len(self.path)
+        if self.realpath is not None:
+            res += len(self.realpath)
+        return res
+
+
+class StatCache(object):
+    def __init__(self, max_size=DEFAULT_REALPATH_CACHE_SIZE,
+                 ttl=DEFAULT_REALPATH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = {}
+        self.used = 0
+        self.stats = {}
+        self.cwd = None
+
+    def set_size(self, max_size):
+        self.max_size = max_size
+        if self.used > max_size:
+            self.clear()
+
+    def set_ttl(self, ttl):
+        self.ttl = ttl
+
+    def clear(self):
+        self.entries.clear()
+        self.used = 0
+        self.stats.clear()
+        self.cwd = None
+
+    def clear_stats(self):
+        self.stats.clear()
+
+    def invalidate(self, path):
+        """Forget what is known about 'path' and, as it may be a
+        directory that was removed or renamed, about everything below
+        it."""
+        key = self.abspath(path)
+        prefix = key + '/'
+        stale = [entry for entry in self.entries.itervalues()
+                 if entry.path == key or entry.path.startswith(prefix)]
+        for entry in stale:
+            self._remove(entry)
+        stale_stats = [name for name in self.stats
+                       if name == key or name.startswith(prefix)]
+        for name in stale_stats:
+            del self.stats[name]
+
+    def chdir(self):
+        """To be called when the current directory changed."""
+        self.cwd = None
+
+    def abspath(self, path):
+        """Like os.path.abspath(), without a getcwd() call per path."""
+        if not path.startswith('/'):
+            if self.cwd is None:
+                self.cwd = os.getcwd()
+            path = self.cwd + '/' + path
+        return os.path.normpath(path)
+
+    def lookup(self, path):
+        """Return the RealpathEntry of 'path', calling stat() only if it
+        is not in the cache or has expired."""
+        key = self.abspath(path)
+        now = time.time()
+        entry = self.entries.get(key, None)
+        if entry is not None:
+            if entry.expires > now:
+                return entry
+            self._remove(entry)
+        try:
+            st = os.stat(key)
+        except OSError:
+            return RealpathEntry(key, 0, 0, now)
+        entry = RealpathEntry(key, st.st_mode, int(st.st_mtime),
+                              now + self.ttl)
+        self._add(entry, now)
+        return entry
+
+    def _add(self, entry, now):
+        size = entry.size()
+        if self.used + size > self.max_size:
+            self._purge_expired(now)
+            if self.used + size > self.max_size:
+                return      # full: just don't cache it, like PHP
+        self.entries[entry.path] = entry
+        self.used += size
+
+    def _remove(self, entry):
+        del self.entries[entry.path]
+        self.used -= entry.size()
+
+    def _purge_expired(self, now):
+        expired = [entry for entry in self.entries.itervalues()
+                   if entry.expires <= now]
+        for entry in expired:
+            self._remove(entry)
+
+    def exists(self, path):
+        return self.lookup(path).exists()
+
+    def isfile(self, path):
+        return stat.S_ISREG(self.lookup(path).mode)
+
+    def isdir(self, path):
+        return stat.S_ISDIR(self.lookup(path).mode)
+
+    def mtime(self, path):
+        """The mtime of 'path', or -1 if it does not exist."""
+        entry = self.lookup(path)
+        if not entry.exists():
+            return -1
+        return entry.mtime
+
+    def realpath(self, path):
+        """The canonical name of 'path', or None if it does not exist."""
+        entry = self.lookup(path)
+        if not entry.exists():
+            return None
+        if entry.realpath is None:
+            realpath = rpath.realpath(entry.path)
+            if self.entries.get(entry.path, None) is entry:
+                self.used += len(realpath)
+            entry.realpath = realpath
+        return entry.realpath
+
+    def stat(self, path):
+        """os.stat(path), cached until the end of the request. Failures
+        are not cached."""
+        key = self.abspath(path)
+        if key in self.stats:
+            return self.stats[key]
+        st = os.stat(key)
+        if len(self.stats) >= MAX_STAT_ENTRIES:
+            self.stats.clear()
+        self.stats[key] = st
+        return st
+
+    def realpath_entries(self):
+        now = time.time()
+        return [entry for entry in self.entries.itervalues()
+                if entry.expires > now]
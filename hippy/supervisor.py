@@ -0,0 +1,268 @@
+""" Pre-forking supervisor for worker mode.
+
+The supervisor opens one listening socket and forks a pool of workers
+that all accept() on it. Every accepted connection speaks the protocol
+of hippy/worker.py and may carry any number of requests. Each worker
+keeps its interpreter, and so its compiled files and JIT traces, for
+its whole life.
+
+Workers report on a shared status pipe when they pick up a connection
+("B <pid>\\n") and when they are done with it ("I <pid>\\n"). The pool
+is grown, up to max_workers, whenever no worker is idle, meaning that
+new connections are queueing in the listen backlog; a worker that has
+been idle for longer than idle_timeout is retired as long as more than
+min_workers are running. Workers that crash, or leave because they used
+up their request or memory budget, are replaced.
+
+Each worker also holds the read end of a private control pipe. The
+supervisor retires a worker by closing the write end; since the same
+happens when the supervisor itself dies, workers never outlive it.
+"""
+
+import os
+import time
+
+from rpython.rlib import rpoll, rsignal, rsocket
+
+from hippy.main import read_ini_file
+from hippy.objspace import getspace
+from hippy.worker import Worker, WorkerConnection
+
+
+def parse_address(address):
+    """Return the family and the rsocket address of 'address', which
+    is either host:port or the path of a unix socket. Raises ValueError
+    for a malformed port."""
+    pos = address.rfind(':')
+    if pos < 0 or '/' in address:
+        return rsocket.AF_UNIX, rsocket.UNIXAddress(address)
+    port = int(address[pos + 1:])
+    host = address[:pos]
+    if not host:
+        host = '0.0.0.0'
+    return rsocket.AF_INET, rsocket.INETAddress(host, port)
+
+
+def open_listener(address, backlog=128):
+    family, addr = parse_address(address)
+    if family == rsocket.AF_UNIX:
+        try:
+            os.unlink(address)
+        except OSError:
+            pass
+    sock = rsocket.RSocket(family, rsocket.SOCK_STREAM)
+    if family == rsocket.AF_INET:
+        sock.setsockopt_int(rsocket.SOL_SOCKET, rsocket.SO_REUSEADDR, 1)
+    sock.bind(addr)
+    sock.listen(backlog)
+    # several workers are woken up for every connection, the ones that
+    # lose the race must not block in accept()
+    sock.setblocking(False)
+    return sock
+
+
+def _report(status_fd, state, pid):
+    # shorter than PIPE_BUF, so the write is atomic
+    os.write(status_fd, "%s %d\n" % (state, pid))
+
+
+def ignore_sigpipe():
+    """A client that goes away in the middle of a response must make
+    write() fail with EPIPE instead of killing the worker."""
+    rsignal.pypysig_ignore(rsignal.SIGPIPE)
+
+
+def serve_listener(worker, sock, ctl_fd, status_fd):
+    """Worker side: serve connections from 'sock' until the worker is
+    exhausted or 'ctl_fd' is closed by the supervisor."""
+    pid = os.getpid()
+    fds = {sock.fd: rpoll.POLLIN, ctl_fd: rpoll.POLLIN}
+    while not worker.exhausted():
+        try:
+            ready = rpoll.poll(fds, -1)
+        except rpoll.PollError:
+            continue
+        for fd, events in ready:
+            if fd == ctl_fd:
+                return 0
+        try:
+            fd, _ = sock.accept()
+        except rsocket.SocketError:
+            continue
+        _report(status_fd, 'B', pid)
+        worker.conn = WorkerConnection(fd, fd)
+        try:
+            worker.serve()
+        except OSError:
+            pass    # the client went away
+        os.close(fd)
+        worker.conn = None
+        _report(status_fd, 'I', pid)
+    return 0
+
+
+class WorkerProcess(object):
+    def __init__(self, pid, ctl_fd):
+        self.pid = pid
+        self.ctl_fd = ctl_fd
+        self.busy = False
+        self.idle_since = time.time()
+
+    def retiring(self):
+        return self.ctl_fd < 0
+
+    def retire(self):
+        os.close(self.ctl_fd)
+        self.ctl_fd = -1
+
+
+class Supervisor(object):
+    def __init__(self, sock, script=None, min_workers=1, max_workers=1,
+                 max_requests=0, max_memory=0, ini_data=None,
+                 idle_timeout=10.0):
+        assert 0 < min_workers <= max_workers
+        self.sock = sock
+        self.script = script
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.max_requests = max_requests
+        self.max_memory = max_memory
+        self.ini_data = ini_data
+        self.idle_timeout = idle_timeout
+        self.workers = {}
+        self.status_r = -1
+        self.status_w = -1
+        self.status_buf = ''
+
+    def run(self):
+        self.status_r, self.status_w = os.pipe()
+        while True:
+            self.reap()
+            self.adjust(time.time())
+            self.read_status(1000)
+
+    def spawn(self):
+        ctl_r, ctl_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ctl_w)
+            os.close(self.status_r)
+            for w in self.workers.values():
+                if not w.retiring():
+                    os.close(w.ctl_fd)
+            exitcode = 1
+            try:
+                exitcode = self.run_worker(ctl_r)
+            except Exception:
+                os.write(2, "hippy worker %d: unhandled error\n" %
+                         os.getpid())
+            os._exit(exitcode)
+        os.close(ctl_r)
+        self.workers[pid] = WorkerProcess(pid, ctl_w)
+        return pid
+
+    def run_worker(self, ctl_fd):
+        worker = Worker(getspace(), None, self.script, self.ini_data,
+                        self.max_requests, self.max_memory)
+        ignore_sigpipe()
+        return serve_listener(worker, self.sock, ctl_fd, self.status_w)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError:
+                return
+            if pid == 0:
+                return
+            w = self.workers.get(pid, None)
+            if w is None:
+                continue
+            del self.workers[pid]
+            if not w.retiring():
+                w.retire()
+            if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+                os.write(2, "hippy worker %d died, status %d\n" %
+                         (pid, status))
+
+    def read_status(self, timeout):
+        try:
+            ready = rpoll.poll({self.status_r: rpoll.POLLIN}, timeout)
+        except rpoll.PollError:
+            return
+        if not ready:
+            return
+        self.status_buf += os.read(self.status_r, 4096)
+        now = time.time()
+        while True:
+            end = self.status_buf.find('\n')
+            if end < 0:
+                break
+            assert end >= 0
+            line = self.status_buf[:end]
+            self.status_buf = self.status_buf[end + 1:]
+            self.update_status(line, now)
+
+    def update_status(self, line, now):
+        if len(line) < 3:
+            return
+        try:
+            pid = int(line[2:])
+        except ValueError:
+            return
+        w = self.workers.get(pid, None)
+        if w is None:
+            return
+        w.busy = line[0] == 'B'
+        if not w.busy:
+            w.idle_since = now
+
+    def adjust(self, now):
+        """Spawn or retire workers according to the current load."""
+        running = 0
+        oldest_idle = None
+        idle = 0
+        for w in self.workers.values():
+            if w.retiring():
+                continue
+            running += 1
+            if not w.busy:
+                idle += 1
+                if (oldest_idle is None or
+                        w.idle_since < oldest_idle.idle_since):
+                    oldest_idle = w
+        if running < self.min_workers:
+            for i in range(self.min_workers - running):
+                self.spawn()
+        elif idle == 0 and running < self.max_workers:
+            self.spawn()
+        elif (idle > 1 and running > self.min_workers and
+              oldest_idle is not None and
+              now - oldest_idle.idle_since > self.idle_timeout):
+            oldest_idle.retire()
+
+
+def parse_pool_size(s):
+    """Parse the --workers argument, N or MIN:MAX."""
+    pos = s.find(':')
+    if pos < 0:
+        min_workers = max_workers = int(s)
+    else:
+        min_workers = int(s[:pos])
+        max_workers = int(s[pos + 1:])
+    if min_workers <= 0 or max_workers < min_workers:
+        raise ValueError
+    return min_workers, max_workers
+
+
+def run_supervisor(address, script, min_workers, max_workers, max_requests,
+                   max_memory):
+    try:
+        sock = open_listener(address)
+    except (ValueError, rsocket.SocketError):
+        os.write(2, "cannot listen on %s\n" % address)
+        return 1
+    supervisor = Supervisor(sock, script, min_workers, max_workers,
+                            max_requests, max_memory, read_ini_file())
+    supervisor.run()
+    return 0
@@ -0,0 +1,270 @@
+""" Hash indexes of the values of an array, for in_array(),
+array_search(), array_diff() and friends.
+
+Loose comparison is not transitive, so the values cannot simply be
+hashed by a canonical form.  Instead, an index files every value in one
+or more buckets, chosen so that all the values that may compare equal
+to a needle are found in the few buckets looked up for that needle.
+The candidates are then checked in array order with the comparison
+itself, which gives the same result as a linear scan.
+
+For loose comparison, strings are filed by their numeric value apart
+from the ints and floats: the numeric strings in 'num_strs', and the
+others, which only == a number through their numeric prefix (PHP5's
+0 == "abc"), in 'str_nums'.  A string needle never needs the latter,
+so that looking up a string does not go through all the strings with
+no numeric prefix at all, which share the bucket of 0.
+
+Comparison modes:
+
+  LOOSE    ==, as in in_array() and array_search()
+  STRICT   ===, as in their strict mode
+  STRING   space.str_eq(), as in array_diff() and array_intersect()
+
+The index of an array is kept on it, in '_value_index', until the
+array is changed in place; arrays holding references are not memoized,
+as their values can change behind their back.  find_value() only
+builds an index on the second lookup in the same array since it was
+last changed: a single in_array() is cheaper as a scan.
+"""
+
+from hippy.objects.reference import W_Reference
+from hippy.objects.convert import convert_string_to_number
+
+LOOSE, STRICT, STRING = range(3)
+
+# smaller arrays are always scanned
+MIN_INDEX_LENGTH = 8
+
+
+def matches(space, mode, w_needle, w_value):
+    if mode == STRICT:
+        return space.is_w(w_value, w_needle)
+    elif mode == LOOSE:
+        return space.eq_w(w_value, w_needle)
+    return space.str_eq(w_needle, w_value)
+
+
+def _add(buckets, key, pos):
+    try:
+        buckets[key].append(pos)
+    except KeyError:
+        buckets[key] = [pos]
+
+
+class ValueIndex(object):
+    def __init__(self, space, mode):
+        self.space = space
+        self.mode = mode
+        self.keys_w = []
+        self.values_w = []
+        self.by_num = {}        # float -> positions
+        self.by_str = {}        # str -> positions
+        self.num_strs = {}      # float -> positions of numeric strings
+        self.str_nums = {}      # float -> positions of the other strings
+        self.nulls = []
+        self.trues = []
+        self.falses = []
+        self.others = []        # arrays, objects, resources
+        self.has_refs = False
+
+    def add(self, w_key, w_value):
+        if isinstance(w_value, W_Reference):
+            self.has_refs = True
+        w_value = w_value.deref()
+        space = self.space
+        pos = len(self.values_w)
+        self.keys_w.append(w_key)
+        self.values_w.append(w_value)
+        tp = w_value.tp
+        if self.mode == STRING:
+            if tp == space.tp_array or tp == space.tp_object:
+                self.others.append(pos)
+            else:
+                self._add_string_form(space.str_w(w_value), pos)
+        elif tp == space.tp_int or tp == space.tp_float:
+            self._add_num(space.float_w(w_value), pos)
+        elif tp == space.tp_str:
+            s = space.str_w(w_value)
+            _add(self.by_str, s, pos)
+            if self.mode == LOOSE:
+                w_number, valid = convert_string_to_number(s)
+                if valid:
+                    self._add_num(space.float_w(w_number), pos,
+                                  self.num_strs)
+                else:
+                    self._add_num(space.float_w(w_number), pos,
+                                  self.str_nums)
+        elif tp == space.tp_null:
+            self.nulls.append(pos)
+        elif tp == space.tp_bool:
+            if space.is_true(w_value):
+                self.trues.append(pos)
+            else:
+                self.falses.append(pos)
+        else:
+            self.others.append(pos)
+
+    def _add_num(self, f, pos, buckets=None):
+        if f != f:
+            return      # NaN is equal to nothing
+        if f == 0.0:
+            f = 0.0     # and not -0.0
+        if buckets is None:
+            buckets = self.by_num
+        _add(buckets, f, pos)
+
+    def _add_string_form(self, s, pos):
+        # two string forms are equal if they are both numeric with the
+        # same value, or else identical
+        w_number, valid = convert_string_to_number(s)
+        if valid:
+            self._add_num(self.space.float_w(w_number), pos)
+        else:
+            _add(self.by_str, s, pos)
+
+    def _num_candidates(self, f, res, buckets=None):
+        if f == 0.0:
+            f = 0.0
+        if buckets is None:
+            buckets = self.by_num
+        try:
+            res.extend(buckets[f])
+        except KeyError:
+            pass
+
+    def _str_candidates(self, s, res):
+        try:
+            res.extend(self.by_str[s])
+        except KeyError:
+            pass
+
+    def _candidates(self, w_needle):
+        """The positions of the values that may be equal to 'w_needle',
+        or None if that needle needs a scan."""
+        space = self.space
+        tp = w_needle.tp
+        res = []
+        if self.mode == STRING:
+            if tp == space.tp_array or tp == space.tp_object:
+                return None
+            s = space.str_w(w_needle)
+            w_number, valid = convert_string_to_number(s)
+            if valid:
+                self._num_candidates(space.float_w(w_number), res)
+            else:
+                self._str_candidates(s, res)
+            res.extend(self.others)
+        elif self.mode == STRICT:
+            if tp == space.tp_int or tp == space.tp_float:
+                self._num_candidates(space.float_w(w_needle), res)
+            elif tp == space.tp_str:
+                self._str_candidates(space.str_w(w_needle), res)
+            elif tp == space.tp_null:
+                res.extend(self.nulls)
+            elif tp == space.tp_bool:
+                if space.is_true(w_needle):
+                    res.extend(self.trues)
+                else:
+                    res.extend(self.falses)
+            else:
+                return None
+        else:
+            if tp == space.tp_int or tp == space.tp_float:
+                f = space.float_w(w_needle)
+                self._num_candidates(f, res)
+                self._num_candidates(f, res, self.num_strs)
+                self._num_candidates(f, res, self.str_nums)
+            elif tp == space.tp_str:
+                s = space.str_w(w_needle)
+                self._str_candidates(s, res)
+                w_number, valid = convert_string_to_number(s)
+                f = space.float_w(w_number)
+                self._num_candidates(f, res)
+                if valid:
+                    # other numeric strings compare as numbers, the
+                    # rest only as identical strings
+                    self._num_candidates(f, res, self.num_strs)
+                if not s:
+                    res.extend(self.nulls)
+            elif tp == space.tp_null:
+                res.extend(self.nulls)
+                res.extend(self.falses)
+                self._num_candidates(0.0, res)
+                self._str_candidates("", res)
+                res.extend(self.others)
+                return res
+            else:
+                # bools are equal to about everything
+                return None
+            if space.is_true(w_needle):
+                res.extend(self.trues)
+            else:
+                res.extend(self.nulls)
+                res.extend(self.falses)
+            res.extend(self.others)
+        return res
+
+    def find(self, w_needle):
+        """The position of the first value equal to 'w_needle', or -1."""
+        space = self.space
+        w_needle = w_needle.deref()
+        candidates = self._candidates(w_needle)
+        if candidates is None:
+            for pos in range(len(self.values_w)):
+                if matches(space, self.mode, w_needle, self.values_w[pos]):
+                    return pos
+            return -1
+        candidates.sort()
+        last = -1
+        for pos in candidates:
+            if pos == last:
+                continue
+            if matches(space, self.mode, w_needle, self.values_w[pos]):
+                return pos
+            last = pos
+        return -1
+
+    def find_key(self, w_needle):
+        pos = self.find(w_needle)
+        if pos < 0:
+            return None
+        return self.keys_w[pos]
+
+
+def get_value_index(space, w_arr, mode):
+    """The index of the values of the array 'w_arr', memoized on it."""
+    index = w_arr._value_index
+    if index is not None and index.mode == mode:
+        return index
+    index = ValueIndex(space, mode)
+    with space.iter(w_arr) as itr:
+        while not itr.done():
+            w_key, w_value = itr.next_item(space)
+            index.add(w_key, w_value)
+    if not index.has_refs:
+        w_arr._value_index = index
+        # so that _make_storage_unique() knows there is an index to drop
+        w_arr._value_probes += 1
+    return index
+
+
+def find_value(space, w_arr, w_needle, mode):
+    """The key of the first value of 'w_arr' equal to 'w_needle', or
+    None."""
+    index = w_arr._value_index
+    if index is None or index.mode != mode:
+        if w_arr.arraylen() < MIN_INDEX_LENGTH or w_arr._value_probes == 0:
+            w_arr._value_probes += 1
+            return _scan(space, w_arr, w_needle, mode)
+        index = get_value_index(space, w_arr, mode)
+    return index.find_key(w_needle)
+
+
+def _scan(space, w_arr, w_needle, mode):
+    with space.iter(w_arr) as itr:
+        while not itr.done():
+            w_key, w_value = itr.next_item(space)
+            if matches(space, mode, w_needle, w_value):
+                return w_key
+    return None
@@ -0,0 +1,229 @@
+""" Long-running worker mode: one process serves many requests, keeping
+the compiled bytecode and the JIT traces warm between them.
+
+Requests and responses are framed on a pair of file descriptors
+(stdin/stdout by default). A request is
+
+    R <env_len> <body_len>\\n
+    <env_len bytes: NUL-separated KEY=VALUE pairs><body_len bytes: body>
+
+and the response is any number of output chunks followed by the exit
+code of the script:
+
+    D <len>\\n<len bytes of output>
+    E <exitcode>\\n
+
+The script run is the request's SCRIPT_FILENAME, or the one given on
+the command line. The worker exits with status 0 when its input is
+closed, after max_requests requests, or once its resident memory grows
+over max_memory bytes.
+"""
+
+import os
+
+from hippy.interpreter import Interpreter
+from hippy.main import read_ini_file, load_ini_data, run_bytecode
+from hippy.objspace import getspace
+
+
+class ProtocolError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class WorkerRequest(object):
+    def __init__(self, environ, body):
+        self.environ = environ
+        self.body = body
+
+
+def parse_environ(data):
+    environ = {}
+    for item in data.split('\x00'):
+        if not item:
+            continue
+        pos = item.find('=')
+        if pos <= 0:
+            raise ProtocolError("malformed environment entry")
+        environ[item[:pos]] = item[pos + 1:]
+    return environ
+
+
+def _parse_length(s):
+    try:
+        res = int(s)
+    except ValueError:
+        raise ProtocolError("bad length %s" % s)
+    if res < 0:
+        raise ProtocolError("bad length %s" % s)
+    return res
+
+
+class WorkerConnection(object):
+    """The framed protocol on a pair of file descriptors."""
+
+    def __init__(self, in_fd, out_fd):
+        self.in_fd = in_fd
+        self.out_fd = out_fd
+        self.buf = ''
+        self.pos = 0
+
+    def _fill(self):
+        data = os.read(self.in_fd, 65536)
+        if not data:
+            return False
+        pos = self.pos
+        assert pos >= 0
+        self.buf = self.buf[pos:] + data
+        self.pos = 0
+        return True
+
+    def read_line(self):
+        """Return the next line without its newline, or None at EOF."""
+        while True:
+            end = self.buf.find('\n', self.pos)
+            if end >= 0:
+                start = self.pos
+                assert start >= 0
+                self.pos = end + 1
+                return self.buf[start:end]
+            if not self._fill():
+                if self.pos < len(self.buf):
+                    raise ProtocolError("truncated request header")
+                return None
+
+    def read_exact(self, length):
+        while len(self.buf) - self.pos < length:
+            if not self._fill():
+                raise ProtocolError("truncated request")
+        start = self.pos
+        end = start + length
+        assert start >= 0
+        self.pos = end
+        return self.buf[start:end]
+
+    def read_request(self):
+        """Return the next WorkerRequest, or None at end of input."""
+        line = self.read_line()
+        if line is None:
+            return None
+        parts = line.split(' ')
+        if len(parts) != 3 or parts[0] != 'R':
+            raise ProtocolError("bad request header %s" % line)
+        env_len = _parse_length(parts[1])
+        body_len = _parse_length(parts[2])
+        environ = parse_environ(self.read_exact(env_len))
+        return WorkerRequest(environ, self.read_exact(body_len))
+
+    def _write_all(self, data):
+        pos = 0
+        while pos < len(data):
+            pos += os.write(self.out_fd, data[pos:])
+
+    def write(self, data):
+        if data:
+            self._write_all("D %d\n" % len(data))
+            self._write_all(data)
+
+    def end_response(self, exitcode):
+        self._write_all("E %d\n" % exitcode)
+
+
+def get_rss():
+    """Resident set size of this process in bytes, or 0 if unknown."""
+    try:
+        fd = os.open('/proc/self/status', os.O_RDONLY, 0)
+    except OSError:
+        return 0
+    try:
+        data = os.read(fd, 4096)
+    finally:
+        os.close(fd)
+    for line in data.split('\n'):
+        if line.startswith('VmRSS:'):
+            parts = line[len('VmRSS:'):].strip().split(' ')
+            try:
+                return int(parts[0]) * 1024
+            except ValueError:
+                return 0
+    return 0
+
+
+class Worker(object):
+    def __init__(self, space, conn, script=None, ini_data=None,
+                 max_requests=0, max_memory=0):
+        self.interp = Interpreter(space)
+        self.conn = conn
+        self.script = script
+        self.ini_data = ini_data
+        self.max_requests = max_requests
+        self.max_memory = max_memory
+        self.served = 0
+        self.over_memory = False
+
+    def exhausted(self):
+        """True once the worker has used up its request or memory budget
+        and should be replaced by a fresh process."""
+        if self.max_requests > 0 and self.served >= self.max_requests:
+            return True
+        return self.over_memory
+
+    def serve(self):
+        while not self.exhausted():
+            try:
+                request = self.conn.read_request()
+            except ProtocolError as e:
+                os.write(2, "hippy worker: %s\n" % e.msg)
+                return 1
+            if request is None:
+                break
+            exitcode = self.handle_request(request)
+            self.conn.end_response(exitcode)
+            if self.max_memory > 0 and get_rss() > self.max_memory:
+                self.over_memory = True
+        return 0
+
+    def handle_request(self, request):
+        interp = self.interp
+        if self.served > 0:
+            interp.reset_request_state()
+        self.served += 1
+        interp.environ = request.environ
+        interp.request_body = request.body
+        interp.request_output = self.conn
+        load_ini_data(interp, self.ini_data)
+        filename = request.environ.get('SCRIPT_FILENAME', self.script)
+        if not filename:
+            return self.no_input_file()
+        interp.setup(True, argv=[filename])
+        absname = interp.space.stat_cache.abspath(filename)
+        bc = interp.get_cached_file(absname)
+        if bc is None:
+            try:
+                f = open(absname)
+                data = f.read()
+                f.close()
+            except (OSError, IOError):
+                return self.no_input_file()
+            bc = interp.compile_bytecode(absname, data)
+            if bc is None:
+                interp.flush_buffers()
+                return 1
+            interp.cache_file(absname, bc)
+        interp.mark_included(absname)
+        return run_bytecode(interp, bc)
+
+    def no_input_file(self):
+        interp = self.interp
+        interp.setup(True)
+        interp.header("Status: 404 Not Found", True)
+        interp.writestr("No input file specified.\n")
+        interp.flush_buffers()
+        return 1
+
+
+def run_worker(script, max_requests, max_memory=0, in_fd=0, out_fd=1):
+    conn = WorkerConnection(in_fd, out_fd)
+    worker = Worker(getspace(), conn, script, read_ini_file(), max_requests,
+                    max_memory)
+    return worker.serve()
@@ -101,6 +101,7 @@ class TestArrayObject(BaseTestInterpreter):
         w_array = space.new_array_from_list([w_x])
         w_array = doset_not_inplace(space, w_array, space.newint(100), w_y)
         assert w_array.as_dict() == {"0": w_x, "100": w_y}
+        assert w_array.strategy_name == 'int_hash'
 
     def test_list2hash_str(self):
         space = self.space
@@ -136,7 +137,8 @@ class TestArrayObject(BaseTestInterpreter):
             assert not w_array._has_string_keys
             w_array = dounset_not_inplace(space, w_array, w_0)
             assert w_array.as_dict() == {"1": w_y}
-            assert w_array._has_string_keys   # for now
+            assert w_array.strategy_name == 'int_hash'
+            assert not w_array._has_string_keys
 
     def test_unsetitem_hash(self):
         space = self.space
@@ -208,7 +210,11 @@ class TestArrayObject(BaseTestInterpreter):
                                      "100": w_y,
                                      "102": w_y,
                                      '256': w_y}
-        doset(space, w_array, space.newstr("monday"), w_y)
+        # only int keys so far: the first string key switches to a hash
+        assert w_array.strategy_name == 'int_hash'
+        w_array = doset_not_inplace(space, w_array, space.newstr("monday"),
+                                    w_y)
+        assert w_array.strategy_name == 'hash'
         doappend(space, w_array, w_y)
         assert w_array.as_dict() == {"0": w_x, "1": w_x, "2": w_x, "99": w_y,
                                      "100": w_y, "102": w_y, '256': w_y,
@@ -321,3 +327,88 @@ class TestArrayObject(BaseTestInterpreter):
         w_item2 = space.newstr("bok2")
         doappend(space, w_array, w_item2)
         assert w_array.as_dict() == {"-5": w_item, "0": w_item2}
+
+    def test_int_keys_from_pairs(self):
+        space = self.space
+        w_x = space.newstr("x")
+        w_y = space.newstr("y")
+        w_array = space.new_array_from_pairs([(space.newint(7), w_x),
+                                              (space.newstr("-3"), w_y)])
+        assert w_array.strategy_name == 'int_hash'
+        assert w_array.intdct_w.keys() == [7, -3]
+        assert w_array.as_dict() == {"7": w_x, "-3": w_y}
+        doappend(space, w_array, w_x)
+        assert w_array.intdct_w.keys() == [7, -3, 8]
+        w_item = space.getitem(w_array, space.newstr("7"))
+        assert space.is_w(w_item, w_x)
+        assert w_array.isset_index(space, space.newint(-3))
+        assert not w_array.isset_index(space, space.newstr("x"))
+        dounset(space, w_array, space.newint(7))
+        assert w_array.intdct_w.keys() == [-3, 8]
+
+    def test_int_keys_to_hash(self):
+        space = self.space
+        w_x = space.newstr("x")
+        w_y = space.newstr("y")
+        w_array = space.new_array_from_pairs([(space.newint(7), w_x)])
+        doset(space, w_array, space.newstr("12"), w_x)
+        w_array = doset_not_inplace(space, w_array, space.newstr("a"), w_y)
+        assert w_array.strategy_name == 'hash'
+        assert w_array._getkeylist() == ["7", "12", "a"]
+        doappend(space, w_array, w_y)
+        assert w_array._getkeylist() == ["7", "12", "a", "13"]
+
+    def test_mixed_keys_from_pairs(self):
+        space = self.space
+        w_x = space.newstr("x")
+        w_array = space.new_array_from_pairs([(space.newint(7), w_x),
+                                              (space.newstr("a"), w_x),
+                                              (None, w_x)])
+        assert w_array.strategy_name == 'hash'
+        assert w_array._getkeylist() == ["7", "a", "8"]
+
+    def test_copy_shares_storage(self):
+        space = self.space
+        w_x = space.newstr("x")
+        w_array = space.new_array_from_pairs([(space.newstr("a"), w_x)])
+        copies = space.ec.array_copies
+        w_copy = w_array.copy()
+        assert w_copy.dct_w is w_array.dct_w
+        doset(space, w_copy, space.newstr("b"), w_x)
+        assert w_copy.dct_w is not w_array.dct_w
+        assert w_array.dct_w.keys() == ["a"]
+        assert w_copy.dct_w.keys() == ["a", "b"]
+        # the original still shares its storage with the copy of it
+        # that may exist elsewhere, so it copies it too
+        dounset(space, w_array, space.newstr("a"))
+        assert w_array.arraylen() == 0
+        assert space.ec.array_copies == copies + 2
+
+    def test_key_slots(self):
+        space = self.space
+        w_x = space.newstr("x")
+        pairs = [(space.newstr("k%d" % i), w_x) for i in range(40)]
+        w_array = space.new_array_from_pairs(pairs)
+        # the slots are only built for the internal pointer
+        assert w_array._slots is None
+        w_array._pointer_end()
+        assert w_array.current_idx == 39
+        assert w_array._slots is not None
+        version = w_array._version
+        for i in range(20):
+            dounset(space, w_array, space.newstr("k%d" % i))
+        # removed keys leave holes: the pointer did not move
+        assert w_array.current_idx == 39
+        assert w_array._version == version
+        dounset(space, w_array, space.newstr("k20"))
+        # more holes than keys: the slots are compacted
+        assert w_array._version != version
+        assert w_array._slots == ["k%d" % i for i in range(21, 40)]
+        assert w_array.current_idx == 18
+        assert space.str_w(w_array._key(space)) == "k39"
+        assert w_array._remap_slot(version, 25) == 4
+        doset(space, w_array, space.newstr("new"), w_x)
+        assert w_array._pointer_next()
+        assert space.str_w(w_array._key(space)) == "new"
+        assert not w_array._pointer_next()
+        assert w_array._getkeylist() == w_array._slots
@@ -1,5 +1,7 @@
 import sys
-from hippy.objects.strobject import W_ConstStringObject
+from hippy.objects.strobject import (W_ConstStringObject,
+                                     W_ConcatStringObject)
+from hippy.objspace import getspace
 
 from testing.test_interpreter import BaseTestInterpreter
 
@@ -8,8 +10,54 @@ def test_is_numeric():
     assert W_ConstStringObject(' +').is_numeric() is False
     assert W_ConstStringObject('abc').is_numeric() is False
 
+def test_concat_shares_buffer():
+    space = getspace()
+    w_a = space.concat(space.newstr("x" * 40), space.newstr("y" * 40))
+    assert isinstance(w_a, W_ConcatStringObject)
+    w_b = space.concat(w_a, space.newstr("b"))
+    assert w_b.buffer is w_a.buffer
+    # w_a is not the end of the buffer any more: this one must copy
+    w_c = space.concat(w_a, space.newstr("c"))
+    assert w_c.buffer is not w_a.buffer
+    assert space.str_w(w_a) == "x" * 40 + "y" * 40
+    assert space.str_w(w_b) == "x" * 40 + "y" * 40 + "b"
+    assert space.str_w(w_c) == "x" * 40 + "y" * 40 + "c"
+    w_d = space.concat(w_b, space.newstr("d"))
+    assert space.str_w(w_d).endswith("bd")
+    assert w_d.strlen() == 82
+    assert space.concat(space.newstr("a"), space.newstr("b")).unwrap() == "ab"
+
+def test_concat_prefixes_share_build():
+    space = getspace()
+    w_a = space.concat(space.newstr("x" * 64), space.newstr("a"))
+    w_b = space.concat(w_a, space.newstr("b"))
+    w_c = space.concat(w_b, space.newstr("c"))
+    assert w_c.unwrap() == "x" * 64 + "abc"
+    built = w_a.buffer.build()
+    assert w_a.unwrap() == "x" * 64 + "a"
+    assert w_b.unwrap() == "x" * 64 + "ab"
+    assert w_a.buffer.build() is built
+    w_d = space.concat(w_c, space.newstr("d"))
+    assert w_d.unwrap() == "x" * 64 + "abcd"
+    assert w_a.buffer.build() is not built
+
 class TestStrObject(BaseTestInterpreter):
 
+    def test_concat_loop(self):
+        output = self.run('''
+        $s = "";
+        $t = "";
+        for ($i = 0; $i < 200; $i++) {
+            $s .= $i % 10;
+            if ($i == 100) { $t = $s; $t .= "!"; }
+        }
+        echo strlen($s), $s[150], $t[101], substr($s, 0, 12);
+        ''')
+        assert self.space.int_w(output[0]) == 200
+        assert self.space.str_w(output[1]) == "0"
+        assert self.space.str_w(output[2]) == "!"
+        assert self.space.str_w(output[3]) == "012345678901"
+
     def test_uplusplus(self):
         w = ["Hippy warning: '++' on a string <digits><character><digits> "
              "is dangerous: if <character> would be E, it "
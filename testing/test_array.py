@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import py
-from hippy.objects.arrayiter import RDictArrayIteratorRef
+import sys
+from hippy.objects.arrayiter import (RDictArrayIteratorRef,
+                                     IntDictArrayIteratorRef)
 from hippy.objects.intobject import W_IntObject as W_Int
 from hippy.objects.strobject import W_ConstStringObject as W_Str
 from hippy.objects.reference import W_Reference
@@ -24,6 +26,23 @@ def test_iter_ref():
     assert (w_k, w_v.deref()) == (W_Int(2), W_Str('2'))
     assert it.finished
 
+def test_iter_ref_int_keys():
+    space = ObjSpace()
+    w_arr = space.new_array_from_pairs([(W_Int(5), W_Int(1)),
+                                        (W_Int(3), W_Str("x"))])
+    r_arr = W_Reference(w_arr)
+    it = w_arr.create_iter_ref(space, r_arr)
+    assert isinstance(it, IntDictArrayIteratorRef)
+    w_k, w_v = it.next_item(space)
+    assert (w_k, w_v.deref()) == (W_Int(5), W_Int(1))
+    # a string key switches the array to string keys under our feet
+    r_arr.store(w_arr._setitem_str("y", W_Str("y"), False))
+    w_k, w_v = it.next_item(space)
+    assert (w_k, w_v.deref()) == (W_Int(3), W_Str('x'))
+    w_k, w_v = it.next_item(space)
+    assert (w_k, w_v.deref()) == (W_Str('y'), W_Str('y'))
+    assert it.finished
+
 class TestArrayDirect(object):
     def create_array_strats(self, space):
         # int, float, mix, empty, hash, copy
@@ -615,6 +634,28 @@ class TestArray(BaseTestInterpreter):
         assert self.space.is_true(output[6]) is False
         assert self.space.is_true(output[7]) is True
 
+    def test_in_array_repeated(self):
+        output = self.run('''
+        $a = array();
+        for ($i = 0; $i < 50; $i++) { $a[] = $i * 2; }
+        $a[] = "abc";
+        $a[] = NULL;
+        $found = 0;
+        for ($i = 0; $i < 100; $i++) {
+            if (in_array($i, $a)) { $found++; }
+        }
+        echo $found;
+        echo in_array("10", $a), in_array("10", $a, true);
+        echo array_search("abc", $a), array_search("abc", $a, true);
+        echo array_search(NULL, $a, true);
+        $a[] = 1;
+        echo in_array(1, $a);
+        echo array_search(0, $a, true);
+        echo array_search(3.0, $a), array_search(4.0, $a);
+        ''')
+        assert [self.space.str_w(s) for s in output] == [
+            '50', '1', '', '0', '50', '51', '1', '0', '', '2']
+
     def test_array_intersect(self):
         output = self.run('''
         $arr1 = array(1, 2, "hello", 'world');
@@ -840,6 +881,50 @@ class TestArray(BaseTestInterpreter):
         assert [self.space.str_w(s) for s in output] == [
             'b', 'a', 'b', 'c', 'b', 'c', '', '']
 
+    def test_pointer_across_inserts_and_unsets(self):
+        output = self.run('''
+        $a = array("x" => 1, "y" => 2, "z" => 3);
+        next($a);
+        $a["w"] = 4;
+        unset($a["x"]);
+        echo key($a);
+        unset($a["y"]);
+        echo key($a);
+        end($a);
+        echo key($a);
+        prev($a);
+        unset($a["z"]);
+        echo key($a);
+        echo prev($a) === false;
+        $b = array(5 => 1, 7 => 2, 9 => 3);
+        for ($i = 0; $i < 100; $i++) { $b[100 + $i] = $i; }
+        next($b);
+        next($b);
+        for ($i = 0; $i < 100; $i++) { unset($b[100 + $i]); }
+        echo key($b);
+        echo next($b) === false;
+        ''')
+        assert [self.space.str_w(s) for s in output] == [
+            'y', 'z', 'w', 'w', '1', '9', '1']
+
+    def test_foreach_ref_unset_ahead(self):
+        output = self.run('''
+        $a = array();
+        for ($i = 0; $i < 50; $i++) { $a["k$i"] = $i; }
+        $seen = 0;
+        foreach ($a as $k => &$v) {
+            if ($v == 10) {
+                for ($j = 11; $j < 45; $j++) { unset($a["k$j"]); }
+                $a["new"] = 99;
+            }
+            $seen += $v;
+        }
+        echo $seen;
+        echo count($a);
+        ''')
+        assert [self.space.str_w(s) for s in output] == [
+            str(sum(range(11)) + sum(range(45, 50)) + 99), '17']
+
     def test_compact(self):
         output = self.run('''
         $city  = "San Francisco";
@@ -927,6 +1012,22 @@ class TestArray(BaseTestInterpreter):
         assert self.space.int_w(output[0]) == 1
         assert self.space.int_w(output[1]) == 1
 
+    def test_array_diff_intersect_hashed(self):
+        output = self.run('''
+        $a = array();
+        $b = array();
+        for ($i = 0; $i < 30; $i++) { $a["k$i"] = $i; }
+        for ($i = 0; $i < 30; $i += 3) { $b[] = (string)$i; }
+        $b[] = 1.0;
+        $d = array_diff($a, $b);
+        echo count($d), isset($d["k1"]), isset($d["k2"]);
+        $c = array_intersect($a, $b, array(3, "6", 1));
+        echo implode(",", array_keys($c));
+        echo implode(",", array_unique(array(3, "3", 1, 3.0, "a", 1, "a")));
+        ''')
+        assert [self.space.str_w(s) for s in output] == [
+            '19', '', '1', 'k1,k3,k6', '3,1,a']
+
     def test_array_diff_assoc(self):
         output = self.run('''
         $array1 = array("a" => "green", "b" => "brown", "c" => "blue", "red");
@@ -1293,6 +1394,54 @@ class TestArray(BaseTestInterpreter):
         ''')
         assert self.space.str_w(output[0]) == "13"
 
+    def test_array_copies_counter(self):
+        output = self.run('''
+        function f($a) { return $a; }
+        $x = 7;
+        $a = array(1, 2, $x);
+        $b = f($a);
+        $c = $b;
+        echo hippy_array_copies();
+        $c[] = 8;
+        $c[] = 9;
+        echo hippy_array_copies();
+        $a["x"] = 1;
+        echo hippy_array_copies();
+        echo count($a) . count($b) . count($c);
+        ''')
+        assert [self.space.str_w(w) for w in output] == [
+            "0", "1", "2", "435"]
+
+    def test_array_sum_unboxed(self):
+        output = self.run('''
+        echo array_sum(range(1, 99));
+        echo array_sum(array(PHP_INT_MAX, 1, 1));
+        echo array_sum(array_fill(0, 4, 0.5));
+        ''')
+        assert self.space.int_w(output[0]) == 4950
+        assert self.space.float_w(output[1]) == float(sys.maxint) + 2
+        assert self.space.float_w(output[2]) == 2.0
+
+    def test_sort_unboxed(self):
+        output = self.run('''
+        $a = array(3, 1, 2);
+        sort($a);
+        echo implode(",", $a);
+        rsort($a);
+        echo implode(",", $a);
+        $a = array(2.5, -1.5, 0.5);
+        sort($a, SORT_NUMERIC);
+        echo implode(",", $a);
+        $a = array(10, 9);
+        sort($a, SORT_STRING);
+        echo implode(",", $a);
+        $a = array("10", "9", "1e1");
+        sort($a, SORT_STRING);
+        echo implode(",", $a);
+        ''')
+        assert [self.space.str_w(w) for w in output] == [
+            "1,2,3", "3,2,1", "-1.5,0.5,2.5", "10,9", "10,1e1,9"]
+
     def test_array_sum_float(self):
         output = self.run('''
         $a = array(1.0, 2.2, 3.4, 4.6);
@@ -2034,29 +2183,35 @@ class TestArray(BaseTestInterpreter):
         assert space.str_w(space.getitem(w_arr, space.wrap(1))) == 'b'
 
         w_arr2 = space.setitem(w_arr, space.wrap(11), space.wrap(15))
-        assert w_arr2.strategy_name == 'hash'
-        assert w_arr2._getkeylist() == ['0', '1', '2', '3', '4', '5', '11']
-        assert w_arr2.arraylen() == len(w_arr2.dct_w)
+        assert w_arr2.strategy_name == 'int_hash'
+        assert w_arr2._getintkeylist() == [0, 1, 2, 3, 4, 5, 11]
+        assert w_arr2.arraylen() == len(w_arr2.intdct_w)
 
         w_arr3 = space.setitem(w_arr2, space.wrap(11), space.wrap(15))
-        assert w_arr3._getkeylist() == ['0', '1', '2', '3', '4', '5', '11']
-        assert w_arr3.arraylen() == len(w_arr3.dct_w)
+        assert w_arr3._getintkeylist() == [0, 1, 2, 3, 4, 5, 11]
+        assert w_arr3.arraylen() == len(w_arr3.intdct_w)
 
         w_arr4 = w_arr3._unsetitem(space, space.wrap(0))
-        assert w_arr4._getkeylist() == ['1', '2', '3', '4', '5', '11']
-        assert w_arr4.arraylen() == len(w_arr4.dct_w)
+        assert w_arr4._getintkeylist() == [1, 2, 3, 4, 5, 11]
+        assert w_arr4.arraylen() == len(w_arr4.intdct_w)
 
         w_arr5 = space.setitem(w_arr4, space.wrap(0), space.wrap(15))
-        assert w_arr5._getkeylist() == ['1', '2', '3', '4', '5', '11', '0']
-        assert w_arr5.arraylen() == len(w_arr5.dct_w)
+        assert w_arr5._getintkeylist() == [1, 2, 3, 4, 5, 11, 0]
+        assert w_arr5.arraylen() == len(w_arr5.intdct_w)
 
         w_arr6 = space.setitem(w_arr5, space.wrap(11), space.wrap(15))
-        assert w_arr6._getkeylist() == ['1', '2', '3', '4', '5', '11', '0']
-        assert w_arr6.arraylen() == len(w_arr2.dct_w)
+        assert w_arr6._getintkeylist() == [1, 2, 3, 4, 5, 11, 0]
+        assert w_arr6.arraylen() == len(w_arr2.intdct_w)
 
         w_arr7 = space.setitem(w_arr6, space.newstr('11'), space.wrap(15))
-        assert w_arr7._getkeylist() == ['1', '2', '3', '4', '5', '11', '0']
-        assert w_arr7.arraylen() == len(w_arr2.dct_w)
+        assert w_arr7._getintkeylist() == [1, 2, 3, 4, 5, 11, 0]
+        assert w_arr7.arraylen() == len(w_arr2.intdct_w)
+
+        w_arr8 = space.setitem(w_arr7, space.newstr('x'), space.wrap(16))
+        assert w_arr8.strategy_name == 'hash'
+        assert w_arr8._getkeylist() == ['1', '2', '3', '4', '5', '11', '0',
+                                        'x']
+        assert space.int_w(space.getitem(w_arr8, space.wrap(11))) == 15
 
     def test_array_intersect_key(self):
         output = self.run('''
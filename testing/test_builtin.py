@@ -119,6 +119,45 @@ def php_foo(interp, args_w, w_this, thisclass):
 """
 
 
+def test_frame_builder():
+    def incr(space, a, increment=1):
+        return space.newint(a + increment)
+    signature = ['space', 'reference', Optional(int)]
+    builder = BuiltinFunctionBuilder(signature, incr)
+    assert builder.make_frame_source() == """\
+@unroll_safe
+def php_incr_from_frame(interp, frame, nb_args):
+    space = interp.space
+    if nb_args < 1:
+        warn_at_least(space, fname, 1, nb_args)
+    if nb_args > 2:
+        warn_at_most(space, fname, 2, nb_args)
+    arg2 = default2
+    arg0 = space
+    w_arg = frame.peek_nth(nb_args - 1)
+    arg1 = check_reference(space, w_arg, fname)
+    if nb_args > 1:
+        w_arg = frame.peek_nth(nb_args - 2).deref_unique()
+        try:
+            arg2 = w_arg.as_int_arg(space)
+        except ConvertError:
+            raise argument_not(interp, "long", fname, 2, w_arg.tp, error_handler)
+    return ll_func(arg0, arg1, arg2)
+"""
+    assert builder.make_frame_source(check_num_args=False) is None
+
+    def many(space, a, b, c, d, e):
+        pass
+    signature = ['space', int, int, int, int, int]
+    builder = BuiltinFunctionBuilder(signature, many)
+    assert builder.make_frame_source() is None
+
+    def varargs(space, args_w):
+        pass
+    builder = BuiltinFunctionBuilder(['space', 'args_w'], varargs)
+    assert builder.make_frame_source() is None
+
+
 class TestBuiltinDirect(object):
     def test_call_args(self):
         space = ObjSpace()
@@ -192,6 +231,28 @@ class TestBuiltin(BaseTestInterpreter):
             stripslashes(new Test);
             ''')
 
+    def test_call_from_frame(self):
+        interp = MockInterpreter(self.space)
+        assert interp.locate_function("strlen").frame_runner is not None
+        assert interp.locate_function("max").frame_runner is None
+        output = self.run("""
+        $a = array(3, 1, 2);
+        $n = 0;
+        echo strlen(str_repeat("ab", strlen("xyz"))), sort($a), $a[0];
+        echo str_pad("x", 3), str_pad("x", 3, "-", STR_PAD_LEFT);
+        echo substr_count("a,b,c", ","), is_int($n), max(1, count($a), 2);
+        """)
+        assert map(self.space.str_w, output) == [
+            '6', '1', '1', 'x  ', '--x', '2', '1', '3']
+
+    def test_call_from_frame_wrong_args(self):
+        output = self.run("""
+        echo strlen(), strlen("a", "b"), strlen("abc");
+        """, ["Warning: strlen() expects exactly 1 parameter, 0 given",
+              "Warning: strlen() expects exactly 1 parameter, 2 given"])
+        assert output == [self.space.w_Null, self.space.w_Null,
+                          self.space.wrap(3)]
+
     def test_builtin_sin_cos(self):
         output = self.run("""
         $i = 1.5707963267948966;
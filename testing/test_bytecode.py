@@ -1,7 +1,12 @@
+import os
+import time
+import tempfile
+import py
 
 from hippy.objspace import getspace
 from hippy.phpcompiler import compile_php
 from hippy.bytecode import unserialize
+from hippy.bytecache import BytecodeCache
 from testing.test_interpreter import MockInterpreter
 
 class TestBytecode(object):
@@ -56,3 +61,137 @@ class TestBytecode(object):
         interp.run_main(space, bc2)
         assert space.int_w(interp.output[0]) == 3
         
+
+    def test_serialize_constants(self):
+        source = """<?
+        $a = 1.5;
+        $b = "xyz";
+        $c = array(1, 2, "a" => true);
+        echo "$b-$a";
+        echo $c["a"];
+        echo null;
+        ?>"""
+        space = getspace()
+        bc = compile_php('<input>', source, space)
+        interp = MockInterpreter(space)
+        bc2 = unserialize(bc.serialize(), interp)
+        assert bc.dump() == bc2.dump()
+        interp.run_main(space, bc2)
+        assert space.str_w(interp.output[0]) == 'xyz-1.5'
+        assert interp.output[1] is space.w_True
+
+    def test_serialize_floats(self):
+        source = "<? echo 2.5e-300, 1.7976931348623157e308, 0.1; ?>"
+        space = getspace()
+        bc = compile_php('<input>', source, space)
+        interp = MockInterpreter(space)
+        bc2 = unserialize(bc.serialize(), interp)
+        floats = [space.float_w(w_c) for w_c in bc2.consts
+                  if w_c.tp == space.tp_float]
+        assert sorted(floats) == [2.5e-300, 0.1, 1.7976931348623157e308]
+
+    def test_serialize_function_details(self):
+        source = """<?
+        function f($a, array $b=null, $c=PHP_INT_SIZE, $d=array(1, 2)) {
+            static $n = 10;
+            $n++;
+            return $n + $a + $c + count($d);
+        }
+        $x = 5;
+        $g = function($y) use ($x) { return $x + $y; };
+        echo f(1);
+        echo $g(2);
+        ?>"""
+        space = getspace()
+        bc = compile_php('<input>', source, space)
+        interp = MockInterpreter(space)
+        bc2 = unserialize(bc.serialize(), interp)
+        f = bc2.user_functions[0]
+        assert f.typehints == [(1, 'array', True)]
+        interp.run_main(space, bc2)
+        assert space.int_w(interp.output[0]) == 11 + 1 + 8 + 2
+        assert space.int_w(interp.output[1]) == 7
+
+    def test_serialize_class_details(self):
+        source = """<?
+        interface I { const A = 3; }
+        class X implements I {
+            const B = 4;
+            public $p = array(1);
+            static $s = 5;
+            function get() { return self::A + self::B + X::$s; }
+            function closure() { return function() { return $this->p; }; }
+        }
+        class Y extends X {
+            function Y() { $this->q = 1; }
+        }
+        $y = new Y();
+        echo $y->get();
+        echo $y->q;
+        $f = $y->closure();
+        echo count($f());
+        ?>"""
+        space = getspace()
+        bc = compile_php('<input>', source, space)
+        interp = MockInterpreter(space)
+        bc2 = unserialize(bc.serialize(), interp)
+        interp.run_main(space, bc2)
+        assert [space.int_w(w) for w in interp.output] == [12, 1, 1]
+
+
+class TestBytecodeCache(object):
+    def setup_method(self, meth):
+        self.tmpdir = py.path.local(tempfile.mkdtemp())
+        self.cachedir = self.tmpdir.ensure('cache', dir=True)
+
+    def write_source(self, name, source, age=60):
+        f = self.tmpdir.join(name)
+        f.write(source)
+        mtime = time.time() - age
+        os.utime(str(f), (mtime, mtime))
+        return str(f)
+
+    def test_store_and_load(self):
+        space = getspace()
+        fname = self.write_source('x.php', '<? echo 40 + 2; ?>')
+        cache = BytecodeCache(str(self.cachedir))
+        interp = MockInterpreter(space)
+        assert cache.load(interp, fname) is None
+        bc = compile_php(fname, open(fname).read(), space)
+        assert cache.store(fname, open(fname).read(), bc)
+        bc2 = cache.load(interp, fname)
+        assert bc2 is not None
+        assert bc2.dump() == bc.dump()
+        assert (cache.hits, cache.misses) == (1, 1)
+        interp.run_main(space, bc2)
+        assert space.int_w(interp.output[0]) == 42
+
+    def test_invalidation(self):
+        space = getspace()
+        fname = self.write_source('x.php', '<? echo 1; ?>')
+        cache = BytecodeCache(str(self.cachedir))
+        interp = MockInterpreter(space)
+        bc = compile_php(fname, open(fname).read(), space)
+        assert cache.store(fname, open(fname).read(), bc)
+        self.write_source('x.php', '<? echo 12; ?>', age=30)
+        assert cache.load(interp, fname) is None
+
+    def test_recently_modified_is_not_stored(self):
+        space = getspace()
+        fname = self.write_source('x.php', '<? echo 1; ?>', age=0)
+        cache = BytecodeCache(str(self.cachedir))
+        bc = compile_php(fname, open(fname).read(), space)
+        assert not cache.store(fname, open(fname).read(), bc)
+        assert self.cachedir.listdir() == []
+
+    def test_corrupted_entry(self):
+        space = getspace()
+        fname = self.write_source('x.php', '<? echo 1; ?>')
+        cache = BytecodeCache(str(self.cachedir))
+        interp = MockInterpreter(space)
+        bc = compile_php(fname, open(fname).read(), space)
+        assert cache.store(fname, open(fname).read(), bc)
+        path = cache.cache_path(fname)
+        data = open(path).read()
+        open(path, 'w').write(data[:-10])
+        assert cache.load(interp, fname) is None
@@ -372,3 +372,158 @@ class TestFileOps(BaseTestInterpreter):
         ''')
 
         assert self.space.str_w(output[0]) == '/tmp'
+
+    def test_stat_cache_invalidated_by_writes(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.txt')
+        output = self.run('''
+        $f = "%s";
+        echo file_exists($f);
+        file_put_contents($f, "abc");
+        echo file_exists($f), filesize($f);
+        echo is_dir("%s");
+        $size = realpath_cache_size();
+        unlink($f);
+        echo file_exists($f);
+        echo realpath_cache_size() < $size, realpath_cache_size() > 0;
+        clearstatcache(true);
+        echo realpath_cache_size();
+        ''' % (f, tmpdir))
+        assert [self.space.is_true(i) for i in output] == [
+            False, True, True, True, False, True, True, False]
+        assert self.space.int_w(output[2]) == 3
+
+    def test_included_file_is_recompiled_when_changed(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.php')
+        f.write('<?php return 1;')
+        os.utime(str(f), (1000, 1000))
+        output = self.run('''
+        echo include("%s");
+        file_put_contents("%s", "<?php return 2;");
+        echo include("%s");
+        ''' % (f, f, f))
+        assert [self.space.int_w(i) for i in output] == [1, 2]
+
+    def test_fgets_length(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.txt')
+        f.write('abcdef\ngh\nlast')
+        output = self.run('''
+        $h = fopen("%s", "r");
+        echo fgets($h, 4);
+        echo fgets($h, 10);
+        echo fgets($h);
+        echo feof($h);
+        echo fgets($h);
+        echo feof($h);
+        echo fgets($h);
+        ''' % f)
+        assert [self.space.str_w(i) for i in output] == [
+            'abc', 'def\n', 'gh\n', '', 'last', '1', '']
+        assert output[-1] == self.space.w_False
+
+    def test_fgetcsv(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.csv')
+        f.write('a,"b ""c""",d\n\n"multi\nline", x ;y\r\nlast')
+        output = self.run('''
+        $h = fopen("%s", "r");
+        while (($row = fgetcsv($h)) !== false) {
+            echo count($row), implode("|", $row);
+        }
+        echo fgetcsv(fopen("%s", "r")) === false;
+        rewind($h);
+        fgets($h);
+        fgets($h);
+        echo implode("|", fgetcsv($h, 0, ";"));
+        ''' % (f, tmpdir.join('empty.csv').ensure()))
+        assert [self.space.str_w(i) for i in output] == [
+            '3', 'a|b "c"|d', '1', '', '2', 'multi\nline| x ;y', '1', 'last',
+            '1', 'multi\nline, x |y']
+
+    def test_stream_get_line(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.txt')
+        f.write('one||two||||three')
+        output = self.run('''
+        $h = fopen("%s", "r");
+        echo stream_set_read_buffer($h, 2);
+        while (($line = stream_get_line($h, 100, "||")) !== false) {
+            echo $line;
+        }
+        rewind($h);
+        echo stream_get_line($h, 5);
+        echo stream_get_line($h, 0, "t");
+        echo stream_get_line($h, 0, "t");
+        echo stream_get_line($h, 0, "t");
+        ''' % f)
+        assert [self.space.str_w(i) for i in output] == [
+            '0', 'one', 'two', '', 'three', 'one||', '', 'wo||||', 'hree']
+
+    def test_buffered_read_write_interleaved(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.txt')
+        f.write('0123456789\nabcdef\n')
+        output = self.run('''
+        $h = fopen("%s", "r+");
+        echo fgets($h, 3);
+        echo ftell($h);
+        fwrite($h, "XY");
+        echo ftell($h);
+        echo fgets($h);
+        fseek($h, -3, SEEK_CUR);
+        echo fread($h, 2);
+        fseek($h, 0);
+        echo fread($h, 100);
+        ''' % f)
+        assert [self.space.str_w(i) for i in output] == [
+            '01', '2', '4', '456789\n', '89', '01XY456789\nabcdef\n']
+
+    def test_file_get_contents_range(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.txt')
+        f.write('0123456789')
+        output = self.run('''
+        $f = "%s";
+        echo file_get_contents($f);
+        echo file_get_contents($f, false, null, 3);
+        echo file_get_contents($f, false, null, 3, 4);
+        echo file_get_contents($f, false, null, 8, 10);
+        echo file_get_contents($f, false, null, 20);
+        echo file_get_contents($f, false, null, 0, 0);
+        ''' % f)
+        assert [self.space.str_w(i) for i in output] == [
+            '0123456789', '3456789', '3456', '89', '', '']
+
+    def test_file_lines(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.txt')
+        f.write('a\n\nb\nc')
+        output = self.run('''
+        $f = "%s";
+        echo implode("|", file($f));
+        echo implode("|", file($f, FILE_IGNORE_NEW_LINES));
+        echo implode("|", file($f, FILE_IGNORE_NEW_LINES |
+                                   FILE_SKIP_EMPTY_LINES));
+        ''' % f)
+        assert [self.space.str_w(i) for i in output] == [
+            'a\n|\n|b\n|c', 'a||b|c', 'a|b|c']
+
+    def test_readfile_fpassthru(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.txt')
+        data = ''.join([chr(i % 256) for i in range(200000)])
+        f.write(data, 'wb')
+        output = self.run('echo readfile("%s");' % f)
+        # copied in chunks, not as one string
+        assert len(output) == 5
+        assert ''.join(output[:-1]) == data
+        assert self.space.int_w(output[-1]) == 200000
+        output = self.run('''
+        $h = fopen("%s", "r");
+        fread($h, 10);
+        echo fpassthru($h);
+        ''' % f)
+        assert ''.join(output[:-1]) == data[10:]
+        assert self.space.int_w(output[-1]) == 199990
@@ -0,0 +1,137 @@
+from hippy.inlinecache import (FunctionCache, MethodCache, VersionTag,
+                               MAX_ENTRIES)
+from testing.test_interpreter import BaseTestInterpreter
+
+
+class TestCallSiteCache(object):
+
+    def test_function_cache_states(self):
+        cache = FunctionCache()
+        version = VersionTag()
+        assert cache.lookup(version, 'f0') is None
+        cache.store('f0', 'func0')
+        assert cache.lookup(version, 'f0') == 'func0'
+        for i in range(1, MAX_ENTRIES):
+            assert cache.lookup(version, 'f%d' % i) is None
+            cache.store('f%d' % i, 'func%d' % i)
+        for i in range(MAX_ENTRIES):
+            assert cache.lookup(version, 'f%d' % i) == 'func%d' % i
+        assert not cache.megamorphic
+        cache.store('g', 'funcg')
+        assert cache.megamorphic
+        assert cache.lookup(version, 'f0') is None
+        cache.store('f0', 'func0')
+        assert cache.lookup(version, 'f0') is None
+
+    def test_new_version_empties_the_cache(self):
+        cache = MethodCache()
+        version = VersionTag()
+        cache.lookup(version, 'A', None, 'm', False)
+        cache.store('A', None, 'm', False, 'A::m')
+        assert cache.lookup(version, 'A', None, 'm', False) == 'A::m'
+        assert cache.lookup(version, 'A', 'A', 'm', False) is None
+        assert cache.lookup(version, 'A', None, 'm', True) is None
+        assert cache.lookup(version, 'B', None, 'm', False) is None
+        version = VersionTag()
+        assert cache.lookup(version, 'A', None, 'm', False) is None
+        assert cache.size() == 0
+
+
+class TestInlineCaches(BaseTestInterpreter):
+
+    def test_polymorphic_method_call(self):
+        output = self.run('''
+        class A { function name() { return "A"; } }
+        class B extends A { function name() { return "B"; } }
+        class C extends A { }
+        function name_of($o) { return $o->name(); }
+        foreach (array(new A, new B, new C, new B, new A) as $o) {
+            echo name_of($o);
+        }
+        ''')
+        assert map(self.space.str_w, output) == ['A', 'B', 'A', 'B', 'A']
+
+    def test_megamorphic_method_call(self):
+        source = ['class K0 { function n() { return 0; } }']
+        for i in range(1, MAX_ENTRIES + 3):
+            source.append('class K%d extends K%d { function n() '
+                          '{ return %d; } }' % (i, i - 1, i))
+        source.append('''
+        $objs = array();
+        for ($i = 0; $i < %d; $i++) { $k = "K$i"; $objs[] = new $k; }
+        $res = array();
+        for ($j = 0; $j < 3; $j++) {
+            foreach ($objs as $o) { $res[] = $o->n(); }
+        }
+        echo implode(",", $res);
+        ''' % (MAX_ENTRIES + 3))
+        output = self.run('\n'.join(source))
+        expected = ','.join([str(i) for i in range(MAX_ENTRIES + 3)] * 3)
+        assert self.space.str_w(output[0]) == expected
+
+    def test_function_declared_between_calls(self):
+        output = self.run('''
+        function call_it($name) { return $name(); }
+        function first() { return 1; }
+        echo call_it("first");
+        if (true) {
+            function second() { return 2; }
+        }
+        echo call_it("second"), call_it("first"), call_it("FIRST");
+        ''')
+        assert map(self.space.int_w, output) == [1, 2, 1, 1]
+
+    def test_private_method_depends_on_context(self):
+        output = self.run('''
+        class P {
+            private function f() { return "P"; }
+            function callf($o) { return $o->f(); }
+        }
+        class Q extends P {
+            public function f() { return "Q"; }
+            function callq($o) { return $o->f(); }
+        }
+        function outside($o) { return $o->f(); }
+        $p = new P; $q = new Q;
+        echo $p->callf($q), $q->callq($q), outside($q);
+        echo $p->callf($q), $q->callq($q), outside($q);
+        ''')
+        assert map(self.space.str_w, output) == ['P', 'Q', 'Q'] * 2
+
+    def test_call_fallback_is_not_cached(self):
+        output = self.run('''
+        class A {
+            private function secret() { return "secret"; }
+            function __call($name, $args) { return "__call $name"; }
+            function get($o) { return $o->secret(); }
+        }
+        function get($o) { return $o->secret(); }
+        $a = new A;
+        echo get($a), $a->get($a), get($a), $a->get($a);
+        ''')
+        assert map(self.space.str_w, output) == [
+            '__call secret', 'secret', '__call secret', 'secret']
+
+    def test_static_call_with_this(self):
+        output = self.run('''
+        class A {
+            function who() { return get_class($this); }
+            static function sw() { return "static"; }
+            function viaparent() { return A::who(); }
+        }
+        class B extends A { }
+        $a = new A; $b = new B;
+        for ($i = 0; $i < 2; $i++) {
+            echo $b->viaparent(), $a->viaparent(), A::sw();
+        }
+        ''')
+        assert map(self.space.str_w, output) == ['B', 'A', 'static'] * 2
+
+    def test_static_call_warning_is_repeated(self):
+        with self.warnings(['Strict Standards: Non-static method A::m() '
+                            'should not be called statically'] * 2):
+            output = self.run('''
+            class A { function m() { return 1; } }
+            for ($i = 0; $i < 2; $i++) { echo A::m(); }
+            ''')
+        assert map(self.space.int_w, output) == [1, 1]
@@ -11,7 +11,8 @@ from hippy.objects.floatobject import W_FloatObject
 from hippy.phpcompiler import compile_php
 from hippy.ast import CompilerError
 from hippy.error import FatalError, ExplicitExitException
-from hippy.objects.arrayobject import W_ListArrayObject, W_RDictArrayObject
+from hippy.objects.arrayobject import (W_ListArrayObject, W_RDictArrayObject,
+                                       W_IntDictArrayObject)
 from hippy.objects.reference import W_Reference
 from hippy.objects.boolobject import W_BoolObject
 from testing.directrunner import DirectInterpreter
@@ -196,12 +197,17 @@ class BaseTestInterpreter(object):
         elif isinstance(w_item, W_FloatObject):
             return space.float_w(w_item)
         elif isinstance(w_item, W_ListArrayObject):
-            return [self.unwrap(w_x) for w_x in w_item.lst_w]
+            return [self.unwrap(w_x) for w_x in w_item.as_list_w()]
         elif isinstance(w_item, W_RDictArrayObject):
             o = OrderedDict()
             for key, w_value in w_item.dct_w.iteritems():
                 o[key] = self.unwrap(w_value)
             return o
+        elif isinstance(w_item, W_IntDictArrayObject):
+            o = OrderedDict()
+            for key, w_value in w_item.intdct_w.iteritems():
+                o[str(key)] = self.unwrap(w_value)
+            return o
         elif space.is_str(w_item):
             return space.str_w(w_item)
         elif isinstance(w_item, W_Reference):
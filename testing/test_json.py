@@ -0,0 +1,128 @@
+from testing.test_interpreter import BaseTestInterpreter
+
+
+class TestJson(BaseTestInterpreter):
+
+    def strings(self, output):
+        # var_dump() writes plain strings to the output, echo W_Roots
+        return [w if isinstance(w, str) else self.space.str_w(w)
+                for w in output]
+
+    def test_encode_scalars(self):
+        output = self.run(r'''
+        echo json_encode(null), json_encode(true), json_encode(false);
+        echo json_encode(42), json_encode(-1.5), json_encode(1e100);
+        echo json_encode("a/b\"c\\d\n\t\x01");
+        echo json_encode("caf\xc3\xa9 \xf0\x9f\x98\x80");
+        ''')
+        assert map(self.space.str_w, output) == [
+            'null', 'true', 'false', '42', '-1.5', '1.0e+100',
+            r'"a\/b\"c\\d\n\t\u0001"', r'"caf\u00e9 \ud83d\ude00"']
+
+    def test_encode_flags(self):
+        output = self.run(r'''
+        echo json_encode("<a href='x'>&\"/</a>", JSON_HEX_TAG | JSON_HEX_AMP |
+                         JSON_HEX_APOS | JSON_HEX_QUOT);
+        echo json_encode("a/\xc3\xa9", JSON_UNESCAPED_SLASHES |
+                                       JSON_UNESCAPED_UNICODE);
+        echo json_encode(array("12", "1.5", "x"), JSON_NUMERIC_CHECK);
+        echo json_encode(array(1, 2), JSON_FORCE_OBJECT);
+        echo json_encode(array(), JSON_FORCE_OBJECT);
+        ''')
+        assert map(self.space.str_w, output) == [
+            r'"\u003Ca href=\u0027x\u0027\u003E\u0026\u0022\/\u003C\/a\u003E"',
+            '"a/\xc3\xa9"', '[12,1.5,"x"]', '{"0":1,"1":2}', '{}']
+
+    def test_encode_arrays_and_objects(self):
+        output = self.run('''
+        $a = array(1, 2, 3);
+        unset($a[1]);
+        echo json_encode(array(1, array(), "x" => array("y" => null)));
+        echo json_encode(array(0 => "a", 1 => "b"));
+        echo json_encode($a);
+        class A { public $x = 1; protected $y = 2; private $z = 3;
+                  public $w = array(1); }
+        echo json_encode(new A);
+        ''')
+        assert map(self.space.str_w, output) == [
+            '{"0":1,"1":[],"x":{"y":null}}', '["a","b"]', '{"0":1,"2":3}',
+            '{"x":1,"w":[1]}']
+
+    def test_encode_pretty_print(self):
+        output = self.run('''
+        echo json_encode(array("a" => array(1, 2), "b" => array(),
+                               "c" => new stdClass), JSON_PRETTY_PRINT);
+        ''')
+        assert self.space.str_w(output[0]) == (
+            '{\n    "a": [\n        1,\n        2\n    ],\n'
+            '    "b": [],\n    "c": {}\n}')
+
+    def test_encode_errors(self):
+        with self.warnings(["Warning: json_encode(): Invalid UTF-8 "
+                            "sequence in argument"]):
+            output = self.run(r'''
+            echo json_encode("a\xff");
+            echo json_last_error();
+            ''')
+        assert map(self.space.str_w, output) == ['null', '5']
+        output = self.run('''
+        var_dump(json_encode(array(array(1)), 0, 1));
+        echo json_last_error(), json_last_error_msg();
+        echo json_encode(array(array(1)), 0, 2);
+        echo json_last_error();
+        ''')
+        assert self.strings(output) == [
+            'bool(false)\n', '1', 'Maximum stack depth exceeded', '[[1]]',
+            '0']
+
+    def test_decode(self):
+        output = self.run(r'''
+        $a = json_decode('[1, -2.5e1, "x\u00e9\ud83d\ude00\/", true, null]');
+        echo $a[0], $a[1], $a[2], $a[3];
+        var_dump($a[4]);
+        $o = json_decode('{"a": {"b": [1, 2]}, "": 3}');
+        echo get_class($o), $o->a->b[1], $o->_empty_;
+        $arr = json_decode('{"a": {"b": 1}, "0": 2}', true);
+        echo $arr["a"]["b"], $arr[0];
+        echo count(json_decode('{"0": "x", "1": "y"}', true));
+        ''')
+        assert self.strings(output) == [
+            '1', '-25', 'x\xc3\xa9\xf0\x9f\x98\x80/', '1', 'NULL\n',
+            'stdClass', '2', '3', '1', '2', '2']
+
+    def test_decode_numbers(self):
+        output = self.run('''
+        var_dump(json_decode("12"));
+        var_dump(json_decode("1.0"));
+        var_dump(json_decode("123456789012345678901234567890"));
+        var_dump(json_decode("123456789012345678901234567890", false, 512,
+                             JSON_BIGINT_AS_STRING));
+        ''')
+        assert self.strings(output) == [
+            'int(12)\n', 'float(1)\n', 'float(1.2345678901235E+29)\n',
+            'string(30) "123456789012345678901234567890"\n']
+
+    def test_decode_errors(self):
+        output = self.run(r'''
+        foreach (array('[1,]', '{"a" 1}', "[\"\x01\"]", "\"\xff\"", '01',
+                       'TRUE', '[1] x', '') as $s) {
+            var_dump(json_decode($s));
+            echo json_last_error();
+        }
+        var_dump(json_decode('[[1]]', true, 2));
+        echo json_last_error_msg();
+        echo count(json_decode('[[1]]', true, 3));
+        ''')
+        res = self.strings(output)
+        assert res[0::2][:8] == ['NULL\n'] * 8
+        assert res[1::2][:8] == ['4', '4', '3', '5', '4', '4', '4', '0']
+        assert res[16:] == ['NULL\n', 'Maximum stack depth exceeded', '1']
+
+    def test_roundtrip(self):
+        output = self.run('''
+        $data = array("list" => range(1, 5), "map" => array("k" => "v/\\"w"),
+                      "f" => 0.5, "n" => null, "s" => "caf\\xc3\\xa9");
+        echo json_encode(json_decode(json_encode($data), true)) ==
+             json_encode($data);
+        ''')
+        assert self.space.str_w(output[0]) == '1'
@@ -135,3 +135,54 @@ class TestLexer(object):
     def test_backtick_10(self):
         r = self.lex('`echo "`')
         assert r == ['`', 'T_ENCAPSED_AND_WHITESPACE', '`']
+
+    def lex_values(self, input):
+        self.lexer.input(input, 0, 0)
+        return [(i.name, i.value) for i in self.lexer.tokens() if i]
+
+    def test_keywords(self):
+        assert self.lex("ECHO Echo echo1 print_r __FILE__ __file__") == [
+            "T_ECHO", "T_ECHO", "T_STRING", "T_STRING", "T_FILE", "T_FILE"]
+        assert self.lex("$x->class->Array") == [
+            "T_VARIABLE", "T_OBJECT_OPERATOR", "T_STRING",
+            "T_OBJECT_OPERATOR", "T_STRING"]
+
+    def test_numbers(self):
+        assert self.lex_values("1 1.5 .5 1. 1e5 1.E-3 .e2 0x1F 0X 012") == [
+            ("T_LNUMBER", "1"), ("T_DNUMBER", "1.5"), ("T_DNUMBER", ".5"),
+            ("T_DNUMBER", "1."), ("T_DNUMBER", "1e5"),
+            ("T_DNUMBER", "1.E-3"), ("T_DNUMBER", ".e2"),
+            ("T_LNUMBER", "0x1F"), ("T_LNUMBER", "0X"),
+            ("T_LNUMBER", "012")]
+        assert self.lex_values("1e+ $a.=.5") == [
+            ("T_LNUMBER", "1"), ("T_STRING", "e"), ("+", "+"),
+            ("T_VARIABLE", "$a"), ("T_CONCAT_EQUAL", ".="),
+            ("T_DNUMBER", ".5")]
+
+    def test_operators_and_casts(self):
+        assert self.lex("a <<= b <> c === d !== e :: f => g") == [
+            "T_STRING", "T_SL_EQUAL", "T_STRING", "T_IS_NOT_EQUAL",
+            "T_STRING", "T_IS_IDENTICAL", "T_STRING", "T_IS_NOT_IDENTICAL",
+            "T_STRING", "T_PAAMAYIM_NEKUDOTAYIM", "T_STRING",
+            "T_DOUBLE_ARROW", "T_STRING"]
+        assert self.lex("(INT)$a (integer) (string)(bool)( int)") == [
+            "T_INT_CAST", "T_VARIABLE", "T_INT_CAST", "T_STRING_CAST",
+            "T_BOOL_CAST", "(", "T_STRING", ")"]
+
+    def test_comments(self):
+        self.lexer.input("a /* x\n y */ b // c\n# d\n/*", 0, 0)
+        toks = [(tok.name, tok.lineno) for tok in self.lexer.tokens()]
+        assert toks == [("T_STRING", 0), ("T_STRING", 1), ("/", 3),
+                        ("*", 3)]
+
+    def test_unknown_token(self):
+        from hippy.lexer import LexerError
+        import py
+        self.lexer.input("$a = 'unterminated;", 0, 0)
+        with py.test.raises(LexerError):
+            list(self.lexer.tokens())
+
+    def test_large_input(self):
+        source = "$a = array(1, 'x', \"y$z\");\n" * 20000
+        assert len(self.lex(source)) == 20000 * 14
+        assert self.lexer.lineno == 20000
@@ -156,3 +156,42 @@ Stack trace:
             assert output == str(E_ALL & ~E_NOTICE)
         finally:
             os.chdir(d)
+
+    def test_cgi_output_is_batched(self, capfd):
+        output = self.run('''<?
+        for ($i = 0; $i < 3000; $i++) { echo $i % 10; }
+        ob_start();
+        echo "x";
+        ob_end_flush();
+        flush();
+        exit("!");
+        ?>''', capfd, cgi=True)
+        expected = ''.join([str(i % 10) for i in range(3000)]) + "x!"
+        assert output == "\r\nContent-Type: text/html\r\n\r\n" + expected
+
+
+class FakeInterp(object):
+    def __init__(self):
+        self.writes = []
+
+    def write_output(self, data):
+        self.writes.append(data)
+
+
+def test_output_sink():
+    from hippy.buffering import OutputSink
+    interp = FakeInterp()
+    sink = OutputSink(interp, limit=10)
+    sink.implicit_flush = False
+    for c in "abcdefghijkl":
+        sink.write(c)
+    assert interp.writes == ["abcdefghij"]
+    sink.write("0123456789abc")
+    assert interp.writes == ["abcdefghij", "kl", "0123456789abc"]
+    sink.write("m")
+    sink.flush()
+    sink.flush()
+    assert interp.writes[-1] == "m"
+    sink.implicit_flush = True
+    sink.write("n")
+    assert interp.writes[-1] == "n"
@@ -0,0 +1,95 @@
+import os
+import time
+import tempfile
+import py
+
+from hippy.objspace import getspace
+from hippy.bytecache import BytecodeCache
+from hippy.precompile import (find_sources, deal, compile_file, format_usec,
+                              run_precompile, STATUS_OK, STATUS_FRESH,
+                              STATUS_UNCACHEABLE, STATUS_FAILED)
+from testing.test_interpreter import MockInterpreter
+
+
+class TestPrecompile(object):
+    def setup_method(self, meth):
+        self.tmpdir = py.path.local(tempfile.mkdtemp())
+        self.root = self.tmpdir.ensure('www', dir=True)
+        self.cachedir = self.tmpdir.ensure('cache', dir=True)
+        self.space = getspace()
+        self.interp = MockInterpreter(self.space)
+        self.interp.config.set_ini_w('opcache.file_cache',
+                                     self.space.newstr(str(self.cachedir)))
+
+    def write_source(self, name, source, age=60):
+        f = self.root.join(name)
+        f.write(source, ensure=True)
+        mtime = time.time() - age
+        os.utime(str(f), (mtime, mtime))
+        return str(f)
+
+    def test_find_sources_and_deal(self):
+        a = self.write_source('a.php', '<? echo 1;')
+        b = self.write_source('lib/b.php', '<? echo 1; echo 2; echo 3;')
+        c = self.write_source('lib/deep/c.php', '<? echo 12;')
+        self.write_source('README.txt', 'not php')
+        sources = find_sources(str(self.root))
+        assert sorted([path for size, path in sources]) == sorted([a, b, c])
+        assert deal(sources, 2) == [[b, a], [c]]
+        assert deal(sources, 4) == [[b], [c], [a], []]
+
+    def test_compile_file(self):
+        cache = BytecodeCache(str(self.cachedir))
+        fname = self.write_source('x.php', '<? echo 40 + 2; ?>')
+        assert compile_file(self.interp, cache, fname) == (STATUS_OK, '')
+        assert compile_file(self.interp, cache, fname) == (STATUS_FRESH, '')
+        bc = cache.load(self.interp, fname)
+        self.interp.run_main(self.space, bc)
+        assert self.space.int_w(self.interp.output[0]) == 42
+        fname = self.write_source('new.php', '<? echo 1; ?>', age=0)
+        assert compile_file(self.interp, cache, fname) == (
+            STATUS_UNCACHEABLE, '')
+        fname = self.write_source('bad.php', '<? echo 1 +; ?>')
+        status, message = compile_file(self.interp, cache, fname)
+        assert status == STATUS_FAILED
+        assert 'on line 1' in message
+
+    def test_format_usec(self):
+        assert format_usec(12045) == "12.045 ms"
+        assert format_usec(7) == "0.007 ms"
+        assert format_usec(3000000) == "3000.000 ms"
+
+    def test_run_precompile(self):
+        good = [self.write_source('p%d.php' % i, '<? echo %d; ?>' % i)
+                for i in range(5)]
+        bad = self.write_source('sub/bad.php', '<? function {')
+        out = self.tmpdir.join('out')
+        fd = os.open(str(out), os.O_WRONLY | os.O_CREAT, 0644)
+        try:
+            assert run_precompile(self.interp, str(self.root), 3, fd) == 1
+        finally:
+            os.close(fd)
+        lines = out.read().splitlines()
+        assert len(lines) == 7
+        assert lines[-1].startswith("precompiled 6 files in ")
+        assert lines[-1].endswith(" with 3 jobs: 5 compiled, 0 up to date, "
+                                  "0 not cacheable, 1 failed")
+        assert ("FAILED %s: " % bad) in '\n'.join(lines)
+        cache = BytecodeCache(str(self.cachedir))
+        for fname in good:
+            assert cache.load(self.interp, fname) is not None
+        os.unlink(bad)
+        out.remove()
+        fd = os.open(str(out), os.O_WRONLY | os.O_CREAT, 0644)
+        try:
+            assert run_precompile(self.interp, str(self.root), 2, fd) == 0
+        finally:
+            os.close(fd)
+        assert out.read().splitlines()[-1].endswith(
+            " with 2 jobs: 0 compiled, 5 up to date, 0 not cacheable, "
+            "0 failed")
+
+    def test_no_cache_dir(self):
+        self.interp.config.set_ini_w('opcache.file_cache',
+                                     self.space.newstr(''))
+        assert run_precompile(self.interp, str(self.root), 1) == 1
@@ -221,3 +221,32 @@ array(3) {
         count($a);
         ''')
         assert ''.join(output) == ""
+
+    def test_nested_array_copied_lazily(self):
+        output = self.run('''
+        $x = 7;
+        $a = array(array(5, $x), array("a"));
+        $b = $a;
+        $b[1][] = "b";
+        ''')
+        # the outer array and $b[1] are copied, but not $b[0]
+        assert ''.join(output) == """\
+array(2) {
+  [0]=>
+  array(2) {
+    [0]=>
+    int(5)
+    [1]=>
+    int(7)
+  }
+  [1]=>
+  array(1) {
+    [0]=>
+    string(1) "a"
+  }
+}
+array(1) {
+  [0]=>
+  string(1) "a"
+}
+"""
@@ -452,3 +452,44 @@ class TestRegex(BaseTestInterpreter):
         echo $m;
         ''')
         assert output[0].dump() == "array(array(array('', 0), array('', 2)))"
+
+    def test_cache_stats(self):
+        output = self.run('''
+        ini_set("pcre.cache_size", 2);
+        preg_match("/a/", "a");
+        preg_match("/a/", "a");
+        preg_match("/b/", "b");
+        preg_match("/c/", "c");
+        preg_match("/a/", "a");
+        $s = preg_cache_stats();
+        echo $s["size"], $s["capacity"], $s["evictions"] > 0;
+        ''')
+        assert self.space.int_w(output[0]) == 2
+        assert self.space.int_w(output[1]) == 2
+        assert self.space.is_true(output[2])
+
+
+def test_regexp_cache_lru():
+    from hippy.module.regex.cache import RegexpCache
+    cache = RegexpCache(None, capacity=2)
+    cache.set("/a/", "A")
+    version = cache.version
+    cache.set("/b/", "B")
+    # adding an entry keeps the version, evicting one changes it
+    assert cache.version is version
+    assert cache.get("/a/") == "A"
+    cache.set("/c/", "C")
+    assert cache.version is not version
+    assert cache.get("/b/") is None
+    assert cache.get("/a/") == "A"
+    assert cache.get("/c/") == "C"
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+    cache.set_capacity(1)
+    assert cache.size() == 1
+    assert cache.get("/c/") == "C"
+    assert cache.evictions == 2
+    version = cache.version
+    cache.set("/c/", "C2")
+    assert cache.version is not version
+    assert cache.get("/c/") == "C2"
+    assert cache.size() == 1
@@ -454,3 +454,65 @@ echo serialize($c);
                  ["Notice: unserialize(): Error at offset 9 of 9 bytes"])
         self.run("unserialize('R:-1;');",
                  ["Notice: unserialize(): Error at offset 5 of 5 bytes"])
+
+    def test_unserialize_int_limits(self):
+        output = self.run('''
+        echo unserialize('i:9223372036854775807;');
+        echo unserialize('i:-9223372036854775808;') == -PHP_INT_MAX - 1;
+        echo unserialize('i:+12;');
+        $a = unserialize('a:2:{i:-3;s:1:"x";i:10;i:-7;}');
+        echo $a[-3], $a[10];
+        ''')
+        assert self.space.int_w(output[0]) == 9223372036854775807
+        assert output[1] == self.space.w_True
+        assert self.space.int_w(output[2]) == 12
+        assert self.space.str_w(output[3]) == "x"
+        assert self.space.int_w(output[4]) == -7
+        self.run("unserialize('i:9223372036854775808;');",
+                 ["Notice: unserialize(): Error at offset 0 of 22 bytes"])
+
+    def test_serialize_large_strings(self):
+        output = self.run('''
+        $a = array("k" => str_repeat("x", 100000), 5 => array("y", 1.5));
+        $s = serialize($a);
+        echo strlen($s);
+        echo unserialize($s) === $a;
+        ''')
+        assert self.space.int_w(output[0]) == 100058
+        assert output[1] == self.space.w_True
+
+    def test_unserialize_stream(self):
+        import py, tempfile
+        from hippy.module.serialize import unserialize_stream
+        from hippy.objects.resources.file_resource import BufferedStream
+        f = py.path.local(tempfile.mkstemp()[1])
+        f.write('a:2:{s:1:"a";s:10:"0123456789";i:1;a:1:{i:0;d:0.5;}}'
+                'trailing')
+        self.run('')
+        space = self.space
+        with open(str(f)) as stream:
+            w_res = unserialize_stream(space, BufferedStream(stream, 3))
+        w_arr = w_res.deref()
+        assert space.str_w(space.getitem(w_arr, space.newstr("a"))) == \
+            "0123456789"
+        w_inner = space.getitem(w_arr, space.newint(1))
+        assert space.float_w(space.getitem(w_inner, space.newint(0))) == 0.5
+        with open(str(f)) as stream:
+            stream.read(4)
+            assert unserialize_stream(space, BufferedStream(stream)) is None
+
+    def test_size_hint_is_bounded(self):
+        from hippy.module.serialize import (serialized_size_hint,
+                                            SIZE_HINT_NODES)
+        space = self.space
+        w_leaf = space.new_array_from_list([space.newstr("x" * 10)] * 10)
+        assert serialized_size_hint(space, w_leaf) == 12 + 10 * (16 + 22)
+        # the same array referenced over and over: 2**40 leaves
+        w_arr = w_leaf
+        for i in range(40):
+            w_arr = space.new_array_from_list([w_arr, w_arr])
+        assert serialized_size_hint(space, w_arr) > 0
+        w_big = space.new_array_from_list(
+            [space.newint(i) for i in range(SIZE_HINT_NODES + 1)])
+        assert serialized_size_hint(space, w_big) == \
+            32 * (SIZE_HINT_NODES + 1) + 12
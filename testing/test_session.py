@@ -0,0 +1,202 @@
+import os
+import tempfile
+import time
+import py
+from hippy.main import entry_point
+from hippy.module.session.storage import (parse_save_path, FileStorage,
+                                          valid_session_id, ProcessRandom)
+from testing.test_interpreter import BaseTestInterpreter
+
+
+def test_parse_save_path():
+    assert parse_save_path("/tmp") == (0, 0600, "/tmp")
+    assert parse_save_path("2;/tmp/s") == (2, 0600, "/tmp/s")
+    assert parse_save_path("1;0640;/tmp/s") == (1, 0640, "/tmp/s")
+    assert parse_save_path("x;/tmp/s") == (0, 0600, "x;/tmp/s")
+
+
+def test_process_random_is_seeded():
+    from rpython.rlib.rrandom import Random
+    first = ProcessRandom()
+    draws = [first.random() for i in range(3)]
+    time.sleep(0.01)
+    second = ProcessRandom()
+    assert [second.random() for i in range(3)] != draws
+    assert draws[0] != Random().random()
+
+
+def test_valid_session_id():
+    assert valid_session_id("abc-123,DEF")
+    assert not valid_session_id("")
+    assert not valid_session_id("../etc")
+    assert not valid_session_id("a/b")
+
+
+def make_sessions(tmpdir, depth, ids, age):
+    storage = FileStorage()
+    storage.open(None, "%d;%s" % (depth, tmpdir), "sess")
+    for session_id in ids:
+        path = storage.session_file(session_id)
+        py.path.local(path).write("x" * 10, ensure=True)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return storage
+
+
+def test_gc_collects_old_files():
+    tmpdir = py.path.local(tempfile.mkdtemp())
+    storage = make_sessions(tmpdir, 1, ['a1', 'a2', 'b1'], 3600)
+    make_sessions(tmpdir, 1, ['a3', 'c1'], 0)
+    tmpdir.join('a', 'other-a4').write('keep')
+    os.utime(str(tmpdir.join('a', 'other-a4')), (0, 0))
+    report = storage.collect(1440)
+    assert report.scanned == 5
+    assert report.removed == 3
+    assert report.freed == 30
+    assert sorted(tmpdir.join('a').listdir()) == [
+        tmpdir.join('a', 'other-a4'), tmpdir.join('a', 'sess-a3')]
+    assert tmpdir.join('c', 'sess-c1').check()
+
+
+def test_gc_limited_pass():
+    tmpdir = py.path.local(tempfile.mkdtemp())
+    storage = make_sessions(tmpdir, 0, ['s%d' % i for i in range(10)], 3600)
+    report = storage.collect(1440, limit=4)
+    assert report.scanned == 4
+    assert report.removed == 4
+    assert len(tmpdir.listdir()) == 6
+    report = storage.collect(1440)
+    assert report.removed == 6
+
+
+def test_session_gc_mode(capfd):
+    tmpdir = py.path.local(tempfile.mkdtemp())
+    make_sessions(tmpdir, 0, ['old'], 3600)
+    make_sessions(tmpdir, 0, ['new'], 0)
+    tmpdir.join('hippy.ini').write('session.save_path = "0;%s"\n'
+                                   'session.name = sess\n' % tmpdir)
+    cwd = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        assert entry_point(['hippy', '--session-gc']) == 0
+    finally:
+        os.chdir(cwd)
+    out, err = capfd.readouterr()
+    assert out == ("session gc: %s: scanned 2 files, removed 1, "
+                   "reclaimed 10 bytes\n" % tmpdir)
+    assert not tmpdir.join('sess-old').check()
+    assert tmpdir.join('sess-new').check()
+
+
+class TestSession(BaseTestInterpreter):
+    def setup_method(self, meth):
+        self.tmpdir = py.path.local(tempfile.mkdtemp())
+        self.env_copy = os.environ.copy()
+
+    def teardown_method(self, meth):
+        os.environ = self.env_copy
+
+    def start(self, save_path, body=''):
+        return self.run('''
+        ini_set("session.save_path", "%s");
+        ini_set("session.gc_probability", 0);
+        session_name("sess");
+        session_id("abcd");
+        session_start();
+        %s
+        ''' % (save_path, body))
+
+    def test_sharded_save_path(self):
+        self.start("2;%s" % self.tmpdir, '$_SESSION["a"] = 1;')
+        assert self.tmpdir.join('a', 'b', 'sess-abcd').read() == "a|i:1;"
+
+    def test_invalid_id_not_stored(self):
+        self.run('''
+        ini_set("session.save_path", "%s");
+        session_id("../abcd");
+        session_start();
+        $_SESSION["a"] = 1;
+        ''' % self.tmpdir)
+        assert self.tmpdir.listdir() == []
+
+    def test_unchanged_session_not_rewritten(self):
+        self.start(str(self.tmpdir), '$_SESSION["a"] = 1;')
+        f = self.tmpdir.join('sess-abcd')
+        ino = f.stat().ino
+        os.utime(str(f), (0, 0))
+        os.environ['HTTP_COOKIE'] = 'sess=abcd;'
+        output = self.start(str(self.tmpdir), 'echo $_SESSION["a"];')
+        assert self.unwrap(output[0]) == 1
+        # only the timestamp was updated
+        assert f.stat().ino == ino
+        assert f.mtime() > 0
+        self.start(str(self.tmpdir), '$_SESSION["a"] = 2;')
+        assert f.read() == "a|i:2;"
+        assert f.stat().ino != ino
+
+    def test_large_session_is_streamed(self):
+        self.start(str(self.tmpdir),
+                   '$_SESSION["a"] = str_repeat("x", 20000);'
+                   '$_SESSION["b"] = array(1, 2.5);')
+        f = self.tmpdir.join('sess-abcd')
+        data = f.read()
+        os.environ['HTTP_COOKIE'] = 'sess=abcd;'
+        output = self.start(str(self.tmpdir),
+                            'echo strlen($_SESSION["a"]);'
+                            'echo $_SESSION["b"][1];')
+        assert self.space.int_w(output[0]) == 20000
+        assert self.space.float_w(output[1]) == 2.5
+        assert f.read() == data
+
+    def test_destroy(self):
+        self.start(str(self.tmpdir), '$_SESSION["a"] = 1;')
+        assert self.tmpdir.join('sess-abcd').check()
+        os.environ['HTTP_COOKIE'] = 'sess=abcd;'
+        self.start(str(self.tmpdir), 'session_destroy();')
+        assert not self.tmpdir.join('sess-abcd').check()
+
+    def test_user_save_handler(self):
+        output = self.run('''
+        $store = array("abcd" => "a|i:5;");
+        function s_open($path, $name) { echo "open $name"; return true; }
+        function s_close() { echo "close"; return true; }
+        function s_read($id) { global $store; echo "read $id";
+                               return $store[$id]; }
+        function s_write($id, $data) { echo "write $id $data";
+                                       return true; }
+        function s_destroy($id) { return true; }
+        function s_gc($lifetime) { return true; }
+        session_set_save_handler("s_open", "s_close", "s_read", "s_write",
+                                 "s_destroy", "s_gc");
+        session_name("sess");
+        session_id("abcd");
+        session_start();
+        echo $_SESSION["a"];
+        $_SESSION["a"] = 6;
+        session_write_close();
+        ''')
+        assert [self.space.str_w(w) for w in output] == [
+            "open sess", "read abcd", "5", "write abcd a|i:6;", "close"]
+
+    def test_user_save_handler_object(self):
+        output = self.run('''
+        class H {
+            function open($path, $name) { return true; }
+            function close() { return true; }
+            function read($id) { return ""; }
+            function write($id, $data) { echo "write $data"; return true; }
+            function destroy($id) { return true; }
+            function gc($lifetime) { return true; }
+        }
+        echo session_set_save_handler(new H());
+        session_start();
+        $_SESSION["x"] = "y";
+        session_write_close();
+        ''')
+        assert [self.space.str_w(w) for w in output] == [
+            "1", 'write x|s:1:"y";']
+
+    def test_session_gc(self):
+        make_sessions(self.tmpdir, 0, ['old1', 'old2'], 3600)
+        output = self.start(str(self.tmpdir), 'echo session_gc();')
+        assert self.unwrap(output[0]) == 2
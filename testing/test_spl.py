@@ -524,3 +524,68 @@ class TestSplFileObject(BaseTestInterpreter):
 
         assert self.space.str_w(output[6]) == "3"
         assert self.space.str_w(output[7]) == ""
+
+    def test_sfo_fgetcsv(self):
+        f = py.path.local(tempfile.mkstemp()[1])
+        f.write('a,"b\nc",d\ne;f\n')
+        output = self.run('''
+        $file = new SplFileObject('%s');
+        echo implode("|", $file->fgetcsv());
+        $file->setCsvControl(";");
+        echo implode("|", $file->getCsvControl());
+        echo implode("|", $file->fgetcsv());
+        ''' % f)
+        assert [self.space.str_w(w_v) for w_v in output] == [
+            'a|b\nc|d', ';|"|\\', 'e|f']
+
+    def test_iterate_flags(self):
+        f = py.path.local(tempfile.mkstemp()[1])
+        f.write('a\n\nb\r\n\nc\n')
+        output = self.run('''
+        $file = new SplFileObject('%s');
+        $file->setFlags(SplFileObject::READ_AHEAD | SplFileObject::SKIP_EMPTY
+                        | SplFileObject::DROP_NEW_LINE);
+        foreach ($file as $n => $l) {
+            echo "$n:$l";
+        }
+        $file->setFlags(SplFileObject::DROP_NEW_LINE);
+        foreach ($file as $l) {
+            echo "[$l]";
+        }
+        ''' % f)
+        assert [self.space.str_w(w_v) for w_v in output] == [
+            "0:a", "2:b", "4:c", "[a]", "[]", "[b]", "[]", "[c]", "[]"]
+
+    def test_iterate_csv(self):
+        f = py.path.local(tempfile.mkstemp()[1])
+        f.write('a,"b\nc"\n\nd;e,f\n')
+        output = self.run('''
+        $file = new SplFileObject('%s');
+        $file->setFlags(SplFileObject::READ_CSV | SplFileObject::READ_AHEAD
+                        | SplFileObject::SKIP_EMPTY);
+        foreach ($file as $row) {
+            echo implode("|", $row);
+        }
+        $file->setCsvControl(";");
+        foreach ($file as $n => $row) {
+            echo "$n:" . implode("|", $row);
+        }
+        ''' % f)
+        assert [self.space.str_w(w_v) for w_v in output] == [
+            "a|b\nc", "d;e|f", '0:a,"b', '1:c"', "3:d|e,f"]
+
+    def test_iterate_overridden_current(self):
+        f = py.path.local(tempfile.mkstemp()[1])
+        f.write('a\nb\n')
+        output = self.run('''
+        class F extends SplFileObject {
+            function current() { return "<" . parent::current() . ">"; }
+        }
+        $file = new F('%s', 'r');
+        $file->setFlags(SplFileObject::DROP_NEW_LINE);
+        foreach ($file as $l) {
+            echo $l;
+        }
+        ''' % f)
+        assert [self.space.str_w(w_v) for w_v in output] == [
+            "<a>", "<b>", "<>"]
@@ -0,0 +1,88 @@
+import os
+import py
+from hippy.statcache import StatCache, parse_ini_size
+
+
+def test_parse_ini_size():
+    assert parse_ini_size("4096") == 4096
+    assert parse_ini_size("16K") == 16 * 1024
+    assert parse_ini_size("2m") == 2 * 1024 * 1024
+    assert parse_ini_size("junk") == 0
+
+
+class TestStatCache(object):
+    def setup_method(self, meth):
+        self.tmpdir = py.path.local.make_numbered_dir('hippy')
+        self.cache = StatCache()
+
+    def test_lookup_is_cached(self):
+        f = self.tmpdir.join('a.txt')
+        assert not self.cache.exists(str(f))
+        # negative results are not remembered
+        assert self.cache.realpath_entries() == []
+        f.write('x')
+        assert self.cache.exists(str(f))
+        f.remove()
+        assert self.cache.exists(str(f))
+        f.write('x')
+        assert self.cache.isfile(str(f))
+        assert not self.cache.isdir(str(f))
+        assert self.cache.isdir(str(self.tmpdir))
+
+    def test_ttl(self):
+        self.cache.set_ttl(0)
+        f = self.tmpdir.join('a.txt')
+        f.write('x')
+        assert self.cache.exists(str(f))
+        f.remove()
+        assert not self.cache.exists(str(f))
+
+    def test_invalidate(self):
+        sub = self.tmpdir.join('sub')
+        f = sub.join('a.txt')
+        g = self.tmpdir.join('b.txt')
+        f.write('x', ensure=True)
+        g.write('x')
+        for p in [sub, f, g]:
+            assert self.cache.exists(str(p))
+            self.cache.stat(str(p))
+        sub.remove()
+        g.remove()
+        self.cache.invalidate(str(sub))
+        assert not self.cache.exists(str(sub))
+        assert not self.cache.exists(str(f))
+        py.test.raises(OSError, self.cache.stat, str(f))
+        # other paths are left alone
+        assert self.cache.exists(str(g))
+        assert self.cache.stat(str(g)).st_size == 1
+
+    def test_relative_paths(self):
+        f = self.tmpdir.join('a.txt')
+        f.write('x')
+        old = os.getcwd()
+        os.chdir(str(self.tmpdir))
+        try:
+            assert self.cache.abspath('sub/../a.txt') == str(f)
+            assert self.cache.exists('a.txt')
+            assert self.cache.realpath('a.txt') == os.path.realpath(str(f))
+        finally:
+            os.chdir(old)
+
+    def test_size_limit(self):
+        self.cache.set_size(200)
+        for i in range(10):
+            f = self.tmpdir.join('f%d' % i)
+            f.write('x')
+            self.cache.exists(str(f))
+        assert 0 < self.cache.used <= 200
+        assert len(self.cache.realpath_entries()) < 10
+
+    def test_stat_cached_per_request(self):
+        f = self.tmpdir.join('a.txt')
+        f.write('x')
+        assert self.cache.stat(str(f)).st_size == 1
+        f.write('xyz')
+        assert self.cache.stat(str(f)).st_size == 1
+        self.cache.clear_stats()
+        assert self.cache.stat(str(f)).st_size == 3
+        py.test.raises(OSError, self.cache.stat, str(self.tmpdir.join('no')))
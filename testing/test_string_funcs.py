@@ -2,6 +2,7 @@ import pytest, sys
 
 from hippy.module.standard.strings.funcs import (unwrap_needle, intsign, rstrcmp, _split_word,
         _substr_window)
+from hippy.module.standard.strings.multireplace import Automaton
 from hippy.objspace import ObjSpace
 
 from testing.test_interpreter import BaseTestInterpreter
@@ -53,6 +54,27 @@ def test_substr_window(n, start, length, result):
     assert (start, end) == result
 
 
+@pytest.mark.parametrize(["pairs", "string", "expected"], [
+    [[("a", "1")], "", ("", 0)],
+    [[("ab", "1"), ("abcd", "2"), ("bc", "3")], "abcd abce bcx", (
+        "2 1ce 3x", 3)],
+    [[("he", "1"), ("she", "2"), ("hers", "3"), ("his", "4")], "ushers", (
+        "u2rs", 1)],
+    [[("x", "y"), ("y", "x")], "xyzzy", ("yxzzx", 3)],
+    [[("aaa", "3"), ("a", "1")], "aaaaa", ("311", 3)],
+    ])
+def test_automaton_replace(pairs, string, expected):
+    automaton = Automaton([key for key, _ in pairs], [val for _, val in pairs])
+    assert automaton.replace(string) == expected
+
+
+def test_automaton_occurrences():
+    automaton = Automaton(["he", "she", "hers", "his", "she", "x"], [])
+    assert automaton.occurrences("ushers") == [
+        True, True, True, False, True, False]
+    assert automaton.occurrences("") == [False] * 6
+
+
 class TestBuiltin(BaseTestInterpreter):
 
     @pytest.mark.parametrize(["input", "expected"], [
@@ -418,6 +440,19 @@ class TestBuiltin(BaseTestInterpreter):
         assert _as_list(output[0]) == ["Xab", "aXX"]
         assert self.space.int_w(output[1]) == 4
 
+    def test_str_replace_array_sequential(self):
+        output = self.run('''
+        $search = array("a", "b", "", "c");
+        $replace = array("b", "c", "z", "d");
+        echo str_replace($search, $replace, "abc", $count), $count;
+        echo str_replace($search, $replace, "xyz", $count), $count;
+        echo str_replace($search, $replace, "c", $count), $count;
+        echo str_ireplace(array("A", "b"), array("B", "x"), "aAbB", $count);
+        echo $count;
+        ''')
+        assert map(self.space.str_w, output) == [
+            "ddd", "6", "xyz", "0", "d", "1", "xxxx", "6"]
+
     def test_str_rot13(self):
         output = self.run('''
         echo str_rot13("PHp 5");
@@ -735,6 +770,18 @@ class TestBuiltin(BaseTestInterpreter):
         assert self.space.is_w(output[0], self.space.w_False)
         assert w == ["Warning: strtr(): The second argument is not an array"]
 
+    def test_strtr_array_leftmost_longest(self):
+        output = self.run('''
+        $table = array("<" => "&lt;", ">" => "&gt;", "&" => "&amp;",
+                       "<<" => "&laquo;", "ab" => "X", "abc" => "Y");
+        echo strtr("a<<b>&c <x>", $table);
+        echo strtr("abcab abd", $table);
+        echo strtr("plain", $table);
+        echo strtr("abc", array(1 => "one", "bc" => 2));
+        ''')
+        assert map(self.space.str_w, output) == [
+            "a&laquo;b&gt;&amp;c &lt;x&gt;", "YX Xd", "plain", "a2"]
+
     def test_substr_compare(self):
         output = self.run('''
         echo substr_compare("abcde", "bc", 1);
@@ -1333,3 +1380,14 @@ ooooord.''']
             '', 'rrr'
 
         ]
+
+    def test_str_getcsv(self):
+        output = self.run('''
+        echo implode("|", str_getcsv('a,"b,c",  "d""e" ,f'));
+        echo implode("|", str_getcsv("x;'y;z'", ";", "'"));
+        echo implode("|", str_getcsv('"one\ntwo",3'));
+        $r = str_getcsv("");
+        echo count($r), is_null($r[0]);
+        ''')
+        assert [self.space.str_w(w_v) for w_v in output] == [
+            'a|b,c|d"e |f', "x|y;z", 'one\ntwo|3', '1', '1']
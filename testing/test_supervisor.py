@@ -0,0 +1,113 @@
+import os
+import socket
+import py
+from hippy.objspace import getspace
+from hippy.supervisor import (Supervisor, WorkerProcess, parse_pool_size,
+                              open_listener, serve_listener)
+from hippy.worker import Worker
+from testing.test_worker import make_request, parse_responses
+
+
+class FakeSupervisor(Supervisor):
+    def __init__(self, *args, **kwds):
+        Supervisor.__init__(self, None, *args, **kwds)
+        self.next_pid = 100
+
+    def spawn(self):
+        r, w = os.pipe()
+        os.close(r)
+        pid = self.next_pid
+        self.next_pid += 1
+        self.workers[pid] = WorkerProcess(pid, w)
+        return pid
+
+    def running(self):
+        return len([w for w in self.workers.values() if not w.retiring()])
+
+
+def test_parse_pool_size():
+    assert parse_pool_size("4") == (4, 4)
+    assert parse_pool_size("2:8") == (2, 8)
+    py.test.raises(ValueError, parse_pool_size, "0")
+    py.test.raises(ValueError, parse_pool_size, "3:2")
+    py.test.raises(ValueError, parse_pool_size, "x")
+
+
+def test_adjust_grows_when_all_busy():
+    sup = FakeSupervisor(min_workers=2, max_workers=3)
+    sup.adjust(0)
+    assert sup.running() == 2
+    sup.update_status("B 100", 1)
+    sup.adjust(1)
+    assert sup.running() == 2
+    sup.update_status("B 101", 1)
+    sup.adjust(1)
+    assert sup.running() == 3
+    sup.update_status("B 102", 1)
+    sup.adjust(1)
+    assert sup.running() == 3
+
+
+def test_adjust_retires_idle_workers():
+    sup = FakeSupervisor(min_workers=1, max_workers=3, idle_timeout=10.0)
+    sup.adjust(0)
+    sup.update_status("B 100", 0)
+    sup.adjust(0)
+    sup.update_status("B 101", 0)
+    sup.adjust(0)
+    assert sup.running() == 3
+    for pid in (100, 101, 102):
+        sup.update_status("I %d" % pid, 5)
+    sup.adjust(10)
+    assert sup.running() == 3
+    sup.adjust(20)
+    assert sup.running() == 2
+    sup.adjust(20)
+    assert sup.running() == 1
+    sup.adjust(30)
+    assert sup.running() == 1
+
+
+def test_adjust_replaces_dead_workers():
+    sup = FakeSupervisor(min_workers=2, max_workers=2)
+    sup.adjust(0)
+    w = sup.workers.pop(100)
+    w.retire()
+    sup.adjust(0)
+    assert sup.running() == 2
+    assert 100 not in sup.workers
+
+
+def test_serve_listener():
+    tmpdir = py.path.local.make_numbered_dir('hippy')
+    script = tmpdir.join('hello.php')
+    script.write('<?php echo "hello";')
+    address = str(tmpdir.join('sock'))
+    sock = open_listener(address)
+    ctl_r, ctl_w = os.pipe()
+    status_r, status_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(ctl_w)
+            os.close(status_r)
+            worker = Worker(getspace(), None, str(script))
+            serve_listener(worker, sock, ctl_r, status_w)
+        finally:
+            os._exit(0)
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.connect(address)
+    s.sendall(make_request({}) * 2)
+    s.shutdown(socket.SHUT_WR)
+    data = ''
+    while True:
+        chunk = s.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    s.close()
+    os.close(ctl_w)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0
+    assert parse_responses(data) == [('hello', 0), ('hello', 0)]
+    assert os.read(status_r, 4096) == 'B %d\nI %d\n' % (pid, pid)
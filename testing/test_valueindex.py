@@ -0,0 +1,69 @@
+from hippy.objspace import ObjSpace
+from hippy.valueindex import (LOOSE, STRICT, STRING, ValueIndex, matches,
+                              get_value_index, find_value)
+from testing.test_interpreter import MockInterpreter
+
+
+def mixed_values(space):
+    return [space.newint(0), space.newint(1), space.newint(-5),
+            space.newint(10), space.newfloat(1.0), space.newfloat(-0.0),
+            space.newfloat(0.5), space.newfloat(10.0),
+            space.newstr(""), space.newstr("0"), space.newstr("1"),
+            space.newstr("abc"), space.newstr("10"), space.newstr("1e1"),
+            space.newstr(" 1"), space.newstr("0x1A"), space.newstr("12abc"),
+            space.newstr("-0"), space.newstr("0.5"), space.w_Null,
+            space.w_True, space.w_False, space.newint(26)]
+
+
+def test_index_agrees_with_scan():
+    space = ObjSpace()
+    MockInterpreter(space)      # converting floats to strings needs one
+    values_w = mixed_values(space)
+    for mode in [LOOSE, STRICT, STRING]:
+        for i in range(len(values_w)):
+            haystack_w = values_w[i:] + values_w[:i]
+            index = ValueIndex(space, mode)
+            for pos in range(len(haystack_w)):
+                index.add(space.newint(pos), haystack_w[pos])
+            for w_needle in values_w:
+                expected = -1
+                for pos in range(len(haystack_w)):
+                    if matches(space, mode, w_needle, haystack_w[pos]):
+                        expected = pos
+                        break
+                assert index.find(w_needle) == expected, (
+                    mode, haystack_w, w_needle)
+
+
+def test_string_needles_do_not_scan():
+    space = ObjSpace()
+    index = ValueIndex(space, LOOSE)
+    for i in range(200):
+        index.add(space.newint(i), space.newstr("v%d" % i))
+    index.add(space.newint(200), space.newint(0))
+    index.add(space.newint(201), space.newstr("12"))
+    assert index._candidates(space.newstr("v7")) == [7, 200]
+    assert index._candidates(space.newstr("nope")) == [200]
+    assert index._candidates(space.newstr("12.0")) == [201]
+    assert index.find(space.newstr("v150")) == 150
+    # 0 == "v0" in PHP5: an int needle still sees all of them
+    assert index.find(space.newint(0)) == 0
+    assert len(index._candidates(space.newint(0))) == 201
+
+
+def test_memoized_until_changed():
+    space = ObjSpace()
+    w_arr = space.new_array_from_list([space.newint(i) for i in range(20)])
+    assert space.int_w(find_value(space, w_arr, space.newint(7), LOOSE)) == 7
+    # the first lookup scans
+    assert w_arr._value_index is None
+    assert space.int_w(find_value(space, w_arr, space.newstr("8"),
+                                  LOOSE)) == 8
+    index = w_arr._value_index
+    assert index is not None
+    assert get_value_index(space, w_arr, LOOSE) is index
+    assert find_value(space, w_arr, space.newint(20), LOOSE) is None
+    w_arr.appenditem_inplace(space, space.newint(20))
+    assert w_arr._value_index is None
+    assert space.int_w(find_value(space, w_arr, space.newint(20),
+                                  LOOSE)) == 20
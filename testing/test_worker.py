@@ -0,0 +1,131 @@
+import os
+import py
+from hippy.objspace import getspace
+from hippy.worker import (Worker, WorkerConnection, ProtocolError,
+                          parse_environ)
+
+
+def make_request(environ, body=''):
+    env = ''.join(['%s=%s\x00' % (k, v) for k, v in environ.items()])
+    return 'R %d %d\n%s%s' % (len(env), len(body), env, body)
+
+
+def parse_responses(data):
+    responses = []
+    chunks = []
+    while data:
+        line, data = data.split('\n', 1)
+        kind, arg = line.split(' ')
+        if kind == 'D':
+            chunks.append(data[:int(arg)])
+            data = data[int(arg):]
+        else:
+            assert kind == 'E'
+            out = ''.join(chunks)
+            # the worker always runs in CGI mode: drop the headers
+            headers, out = out.split('\r\n\r\n', 1)
+            responses.append((out, int(arg)))
+            chunks = []
+    return responses
+
+
+class TestWorker(object):
+    def setup_method(self, meth):
+        self.tmpdir = py.path.local.make_numbered_dir('hippy')
+
+    def serve(self, requests, script=None, max_requests=0):
+        in_r, in_w = os.pipe()
+        out_r, out_w = os.pipe()
+        os.write(in_w, ''.join(requests))
+        os.close(in_w)
+        worker = Worker(getspace(), WorkerConnection(in_r, out_w), script,
+                        max_requests=max_requests)
+        res = worker.serve()
+        os.close(in_r)
+        os.close(out_w)
+        chunks = []
+        while True:
+            data = os.read(out_r, 65536)
+            if not data:
+                break
+            chunks.append(data)
+        os.close(out_r)
+        return res, parse_responses(''.join(chunks))
+
+    def script(self, name, source):
+        f = self.tmpdir.join(name)
+        f.write(source)
+        return str(f)
+
+    def test_parse_environ(self):
+        assert parse_environ('A=1\x00B=x=y\x00C=\x00') == {
+            'A': '1', 'B': 'x=y', 'C': ''}
+        py.test.raises(ProtocolError, parse_environ, '=x\x00')
+
+    def test_requests_are_isolated(self):
+        fname = self.script('count.php', '''<?php
+        if (!function_exists("f")) { function f() { return 1; } }
+        class A { static $hits = 0; }
+        function counter() { static $n = 0; return ++$n; }
+        A::$hits++;
+        $GLOBALS["x"] = isset($x) ? $x + 1 : 0;
+        echo counter(), counter(), A::$hits, $x, $_SERVER["REQ"];
+        ''')
+        res, responses = self.serve([make_request({'REQ': 'a'}),
+                                     make_request({'REQ': 'b'})], fname)
+        assert res == 0
+        assert responses == [('1210a', 0), ('1210b', 0)]
+
+    def test_static_property_rebound_by_reference(self):
+        fname = self.script('static.php', '''<?php
+        class C { const K = 5; static $k = self::K; }
+        class A { static $x = 1; }
+        class B extends A { }
+        echo A::$x, B::$x, C::$k;
+        $y = 7;
+        if ($_SERVER["REQ"] == "a") { A::$x = &$y; C::$k = &$y; }
+        $y++;
+        echo A::$x, C::$k;
+        ''')
+        res, responses = self.serve([make_request({'REQ': 'a'}),
+                                     make_request({'REQ': 'b'})], fname)
+        assert res == 0
+        assert responses == [('11588', 0), ('11515', 0)]
+
+    def test_script_filename_and_exit(self):
+        fname = self.script('exit.php', '<?php echo "x"; exit(3);')
+        res, responses = self.serve([
+            make_request({'SCRIPT_FILENAME': fname})])
+        assert responses == [('x', 3)]
+
+    def test_post_body(self):
+        fname = self.script('post.php', '<?php echo $_POST["a"];')
+        env = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': '3',
+               'CONTENT_TYPE': 'application/x-www-form-urlencoded'}
+        res, responses = self.serve([make_request(env, 'a=5')] * 2, fname)
+        assert responses == [('5', 0), ('5', 0)]
+
+    def test_include_once_per_request(self):
+        inc = self.script('inc.php', '<?php echo "inc";')
+        fname = self.script('main.php', '<?php include_once "%s";' % inc)
+        res, responses = self.serve([make_request({})] * 2, fname)
+        assert responses == [('inc', 0), ('inc', 0)]
+
+    def test_missing_script(self):
+        res, responses = self.serve([make_request({})])
+        assert len(responses) == 1
+        out, exitcode = responses[0]
+        assert exitcode == 1
+        assert out == 'No input file specified.\n'
+
+    def test_max_requests(self):
+        fname = self.script('one.php', '<?php echo 1;')
+        res, responses = self.serve([make_request({})] * 3, fname,
+                                    max_requests=2)
+        assert res == 0
+        assert responses == [('1', 0), ('1', 0)]
+
+    def test_bad_header(self):
+        res, responses = self.serve(['X 1 2\n'])
+        assert res == 1
+        assert responses == []